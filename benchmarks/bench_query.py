@@ -0,0 +1,295 @@
+"""
+Query-side benchmark of hashesdb.
+
+Synthesizes hashesDB databases with a given number of HASH rows (with a realistic mix of hash functions, including ssdeep and tlsh),
+times the commands that read or rewrite a database (search, batch search, search-duplicates, stats, compare, export and import)
+on each of them, and prints the results as JSON. Each timing is the median of several runs, executed on a new Db object.
+
+The report contains the git commit of the working tree and the synthesized databases depend only on their size and on the seed,
+so reports produced on different commits are comparable. With --database-dir, the synthesized databases are kept and reused by later runs.
+
+import inserts the exported rows one by one, so for databases with more than about 10^6 HASH rows it is best left out of --commands.
+
+Usage:
+	python benchmarks/bench_query.py [--sizes 10000 100000 ...] [--commands search stats ...] [--runs N] [--seed S]
+	                                 [--export-format csv] [--database-dir DIR] [--output FILE]
+"""
+
+import argparse
+import json
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from contextlib import redirect_stdout
+from datetime import datetime
+from io import StringIO
+from os import devnull, makedirs
+from os.path import abspath, dirname, exists, join
+from statistics import median
+from time import perf_counter
+
+SRC_DIR = join(dirname(abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC_DIR)
+
+#Probability that a file has a hash of each function (every file has a SWHID)
+FUNCTION_MIX = {'md5': 0.6, 'sha1': 0.6, 'sha256': 0.5, 'ssdeep': 0.4, 'tlsh': 0.4, 'xxh64': 0.2}
+
+#Number of hexadecimal digits of the synthesized hash values of each (non fuzzy) hash function
+HEX_DIGITS = {'md5': 32, 'sha1': 40, 'sha256': 64, 'xxh64': 16, 'swhid': 40}
+
+BASE64_CHARACTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/'
+
+#Rows inserted per executemany() call while a database is synthesized
+INSERT_CHUNK_SIZE = 100000
+
+#Number of hash values searched by the batch search and number of files given to search-duplicates
+BATCH_SEARCH_SIZE = 1000
+DUPLICATE_FILES = 20
+
+COMMANDS = ['search-hash', 'search-filename', 'search-function', 'batch-search', 'search-duplicates', 'stats', 'stats-recount', 'compare-ssdeep', 'compare-tlsh', 'export', 'import']
+
+def synthesize_hash_value(rng, func_name):
+	#Returns a random hash value that has the format of the values of the given hash function
+	if func_name == 'ssdeep':
+		block_size = 3 * 2 ** rng.randint(0, 10)
+		return f"{block_size}:{''.join(rng.choice(BASE64_CHARACTERS) for i in range(64))}:{''.join(rng.choice(BASE64_CHARACTERS) for i in range(32))}"
+	elif func_name == 'tlsh':
+		return 'T1' + '%070X' % rng.getrandbits(280)
+	elif func_name == 'swhid':
+		return 'swh:1:cnt:' + '%040x' % rng.getrandbits(160)
+	else:
+		return '%0*x' % (HEX_DIGITS[func_name], rng.getrandbits(HEX_DIGITS[func_name] * 4))
+
+def synthesize_database(database_path, hash_rows, seed, duplicate_files):
+	"""
+	Description
+	-----------
+	Creates a hashesDB database with (about) hash_rows rows in the HASH table.
+	The SWHIDs of the given duplicate files are inserted too, so that search-duplicates finds matches.
+
+	Parameters
+	-----------
+	database_path - string
+		The path of the new database
+
+	hash_rows - int
+		The number of rows of the HASH table
+
+	seed - int
+		The seed of the random values
+
+	duplicate_files - list of tuples
+		(path, SWHID) of the files given to search-duplicates
+	"""
+
+	from create import create
+
+	with open(devnull, 'w') as null_output, redirect_stdout(null_output):
+		create(database_path)
+
+	rng = random.Random(seed)
+	connection = sqlite3.connect(database_path)
+	connection.execute("PRAGMA synchronous = OFF")
+	connection.execute("INSERT INTO SCAN (scan_id, scan_hostname, scan_date, scan_return_code) VALUES (1, 'bench', ?, 0)", (datetime(2021, 1, 1).isoformat(' '),))
+	connection.execute("UPDATE DB_INFORMATION SET db_last_scan_id = 1")
+
+	extensions = ['.c', '.h', '.py', '.js', '.html', '.txt', '.md', '.json', '.so', '.png', '']
+	origins = ['bench-host-%d' % i for i in range(4)]
+	date = datetime(2021, 1, 1).isoformat(' ')
+
+	file_rows = []
+	hash_rows_chunk = []
+	file_id = 0
+	hash_count = 0
+
+	def flush():
+		connection.executemany("INSERT INTO FILE (id, scan_id, file_name, file_extension, file_path, file_size, date_created, date_modified, date_retrieved, swh_known, updated, origin) VALUES (?, 1, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?)", file_rows)
+		connection.executemany("INSERT INTO HASH (hash_value, hash_function_name, file_id) VALUES (?, ?, ?)", hash_rows_chunk)
+		file_rows.clear()
+		hash_rows_chunk.clear()
+
+	def add_file(file_path, swhid):
+		nonlocal file_id, hash_count
+		file_id += 1
+		file_name = file_path.rsplit('/', 1)[-1]
+		extension = file_name[file_name.rfind('.'):] if '.' in file_name else ''
+		file_rows.append((file_id, file_name, extension, file_path, rng.randint(0, 1 << 20), date, date, date, rng.choice([True, False, None]), rng.choice(origins)))
+		hash_rows_chunk.append((swhid, 'swhid', file_id))
+		hash_count += 1
+		for func_name, probability in FUNCTION_MIX.items():
+			if rng.random() < probability:
+				hash_rows_chunk.append((synthesize_hash_value(rng, func_name), func_name, file_id))
+				hash_count += 1
+		if len(hash_rows_chunk) >= INSERT_CHUNK_SIZE:
+			flush()
+
+	for file_path, swhid in duplicate_files:
+		add_file(file_path, swhid)
+
+	while hash_count < hash_rows:
+		directory = '/bench/d%d/d%d' % (file_id // 10000, (file_id // 100) % 100)
+		add_file(f"{directory}/file{file_id}{rng.choice(extensions)}", synthesize_hash_value(rng, 'swhid'))
+
+	flush()
+	connection.commit()
+	connection.close()
+
+def create_duplicate_files(folder, seed):
+	#Writes the files given to search-duplicates and returns a list of (path, SWHID)
+	from scan import compute_file_digest
+
+	rng = random.Random(seed)
+	makedirs(folder, exist_ok = True)
+	duplicate_files = []
+	for i in range(DUPLICATE_FILES):
+		file_path = join(folder, f"duplicate{i}.bin")
+		with open(file_path, 'wb') as f:
+			f.write(rng.getrandbits(8 * 4096).to_bytes(4096, 'little'))
+		duplicate_files.append((file_path, compute_file_digest(file_path, 'swhid')))
+	return duplicate_files
+
+def time_command(function, runs):
+	#Returns the median wall time (seconds) of several calls of function, with the output suppressed
+	timings = []
+	for i in range(runs):
+		with open(devnull, 'w') as null_output, redirect_stdout(null_output):
+			start = perf_counter()
+			function()
+			timings.append(perf_counter() - start)
+	return median(timings)
+
+def benchmark_database(database_path, work_folder, duplicate_files, commands, runs, export_format):
+	"""
+	Description
+	-----------
+	Times each of the given commands on a database and returns a dictionary that maps the command names to their median wall time (seconds).
+	Each run uses a new Db object, so that no command benefits from the session of another command.
+	"""
+
+	from sqlalchemy import text
+	from create import create
+	from db import Db
+
+	with open(devnull, 'w') as null_output, redirect_stdout(null_output):
+		db = Db(database_path)
+
+	#Sample the criteria of the searches and the hash ids of the comparisons from the database
+	session = db.db_session
+	sample_hashes = [row[0] for row in session.execute(text("SELECT hash_value FROM HASH WHERE hash_function_name = 'sha256' ORDER BY hash_id LIMIT 10"))]
+	sample_names = [row[0] for row in session.execute(text("SELECT file_name FROM FILE ORDER BY id DESC LIMIT 10"))]
+	batch_hashes = [row[0] for row in session.execute(text(f"SELECT hash_value FROM HASH ORDER BY hash_id DESC LIMIT {BATCH_SEARCH_SIZE // 2}"))]
+	batch_hashes += ['%040x' % i for i in range(BATCH_SEARCH_SIZE - len(batch_hashes))]
+	fuzzy_ids = {func_name: [row[0] for row in session.execute(text(f"SELECT hash_id FROM HASH WHERE hash_function_name = '{func_name}' ORDER BY hash_id LIMIT 40"))] for func_name in ['ssdeep', 'tlsh']}
+	del db, session
+
+	output_path = join(work_folder, 'search_output.csv')
+	export_folder = join(work_folder, 'export')
+	import_database_path = join(work_folder, 'import.db')
+
+	def with_db(method_name, *args):
+		def run():
+			db = Db(database_path)
+			getattr(db, method_name)(*args)
+			db.db_session.rollback()
+		return run
+
+	def import_export():
+		#The exported folder of the last 'export' run is imported into a new database
+		#import_db resets the database first and asks for confirmation, which is given through stdin
+		create(import_database_path, True)
+		db = Db(import_database_path)
+		stdin = sys.stdin
+		sys.stdin = StringIO('y\n')
+		try:
+			db.import_db(export_folder, export_format)
+		finally:
+			sys.stdin = stdin
+
+	benchmarks = {
+		'search-hash': with_db('search', sample_hashes, [], output_path),
+		'search-filename': with_db('search', [], sample_names, output_path),
+		'search-function': with_db('search', sample_hashes, [], output_path, ['sha256']),
+		'batch-search': with_db('batch_search', iter(batch_hashes), None, output_path),
+		'search-duplicates': with_db('search_duplicates', [path for path, swhid in duplicate_files], output_path),
+		'stats': with_db('stats'),
+		'stats-recount': with_db('stats', True),
+		'compare-ssdeep': with_db('compare', 'ssdeep', fuzzy_ids['ssdeep']),
+		'compare-tlsh': with_db('compare', 'tlsh', fuzzy_ids['tlsh']),
+		'export': with_db('export', export_folder, export_format, True),
+		'import': import_export,
+	}
+
+	#import needs the output of export
+	if 'import' in commands and 'export' not in commands:
+		time_command(benchmarks['export'], 1)
+
+	return {command: round(time_command(benchmarks[command], runs), 4) for command in commands}
+
+def git_commit():
+	#Returns the commit of the working tree (None outside of a git repository)
+	try:
+		completed = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd = dirname(abspath(__file__)), capture_output = True, text = True, check = True)
+		dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd = dirname(abspath(__file__)), capture_output = True, text = True, check = True)
+	except (OSError, subprocess.CalledProcessError):
+		return None
+	return completed.stdout.strip() + ('-dirty' if dirty.stdout.strip() else '')
+
+def main():
+	argument_parser = argparse.ArgumentParser(description = "Measure the cost of the hashesdb commands that query a database, as the database grows.")
+	argument_parser.add_argument('--sizes', nargs = '+', type = int, default = [10000, 100000], metavar = "HASH_ROWS", help = "numbers of HASH rows of the synthesized databases. default: 10000 100000")
+	argument_parser.add_argument('--commands', nargs = '+', choices = COMMANDS, default = COMMANDS, help = "commands to time. default: all")
+	argument_parser.add_argument('--runs', type = int, default = 3, help = "number of runs per command (the median is reported). default: 3")
+	argument_parser.add_argument('--seed', type = int, default = 0, help = "seed of the synthesized databases. default: 0")
+	argument_parser.add_argument('--export-format', default = 'csv', choices = ['csv', 'tsv', 'json', 'yaml', 'xml'], help = "file format of export and import. default: csv")
+	argument_parser.add_argument('--database-dir', metavar = "DIR", help = "keep the synthesized databases in DIR and reuse them in later runs")
+	argument_parser.add_argument('--output', metavar = "FILE", help = "write the JSON report to FILE instead of stdout")
+	args = argument_parser.parse_args()
+
+	results = []
+	with tempfile.TemporaryDirectory() as tmp_dir:
+		database_dir = abspath(args.database_dir) if args.database_dir else tmp_dir
+		makedirs(database_dir, exist_ok = True)
+		duplicate_files = create_duplicate_files(join(database_dir, f"duplicates_{args.seed}"), args.seed)
+
+		for size in args.sizes:
+			database_path = join(database_dir, f"bench_query_{size}_{args.seed}.db")
+			synthesis_seconds = None
+			if not exists(database_path):
+				start = perf_counter()
+				synthesize_database(database_path, size, args.seed, duplicate_files)
+				synthesis_seconds = round(perf_counter() - start, 2)
+
+			with sqlite3.connect(database_path) as connection:
+				files_count = connection.execute("SELECT COUNT(*) FROM FILE").fetchone()[0]
+				hashes_count = connection.execute("SELECT COUNT(*) FROM HASH").fetchone()[0]
+
+			work_folder = join(tmp_dir, f"work_{size}")
+			makedirs(work_folder)
+			results.append({
+				'hash_rows': hashes_count,
+				'file_rows': files_count,
+				'synthesis_seconds': synthesis_seconds,
+				'command_seconds': benchmark_database(database_path, work_folder, duplicate_files, args.commands, args.runs, args.export_format),
+			})
+
+	report = {
+		'commit': git_commit(),
+		'python': sys.version.split()[0],
+		'sqlite': sqlite3.sqlite_version,
+		'seed': args.seed,
+		'runs': args.runs,
+		'function_mix': FUNCTION_MIX,
+		'results': results,
+	}
+
+	report_json = json.dumps(report, indent = 2)
+	if args.output:
+		with open(args.output, 'w') as f:
+			f.write(report_json + '\n')
+	else:
+		print(report_json)
+
+if __name__ == '__main__':
+	main()
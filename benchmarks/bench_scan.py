@@ -0,0 +1,235 @@
+"""
+Scan throughput benchmark of hashesdb.
+
+Generates synthetic directory trees, scans each of them with Db.scan for every combination of the given hash function sets, job counts and
+commit modes, and prints the results as JSON: files/s, MB/s, the time spent in each stage of the scan and the peak RSS of the scan.
+Every scan runs in a fresh process on a new database, so the peak RSS of one scan does not affect the others.
+
+Trees (their sizes are multiplied by --scale):
+	small-files: many small files (0 - 4 KiB) in nested directories
+	large-files: a few large files (64 MiB), read through mmap
+	duplicates: many files whose contents are drawn from a small pool of distinct contents
+
+Stages (as measured by the scan itself and stored in the SCAN_METRICS table):
+	walk: time spent finding the files (os.scandir)
+	read_and_hash: time spent reading and hashing the files, summed over the threads (with --jobs > 1 it can exceed the wall time)
+	swh_lookup: time spent querying the SoftwareHeritage archive (0 unless --swh-lookups is given)
+	write: time spent inserting the rows into the database, without the SoftwareHeritage queries
+
+The SoftwareHeritage archive is not queried (swh_known is left empty), so the results do not depend on the network. Use --swh-lookups to query it.
+
+Usage:
+	python benchmarks/bench_scan.py [--trees small-files large-files duplicates] [--scale S] [--functions "" md5,sha1 ...]
+	                                [--jobs 1 4 ...] [--commit end checkpoint] [--checkpoint-files N] [--output FILE]
+"""
+
+import argparse
+import json
+import random
+import subprocess
+import sys
+import tempfile
+from os import makedirs, devnull
+from os.path import abspath, dirname, join
+from time import perf_counter
+
+SRC_DIR = join(dirname(abspath(__file__)), '..', 'src')
+
+#Number of files and size of the files of each tree, before they are multiplied by --scale
+TREES = {
+	'small-files': {'files': 20000, 'min_size': 0, 'max_size': 4096, 'distinct_contents': None},
+	'large-files': {'files': 4, 'min_size': 64 * 1024 * 1024, 'max_size': 64 * 1024 * 1024, 'distinct_contents': None},
+	'duplicates': {'files': 20000, 'min_size': 1024, 'max_size': 64 * 1024, 'distinct_contents': 50},
+}
+
+#Number of files in each directory of a generated tree
+FILES_PER_DIRECTORY = 100
+
+def random_bytes(rng, size):
+	#random.Random.randbytes() is not available before Python 3.9
+	return rng.getrandbits(size * 8).to_bytes(size, 'little') if size else b''
+
+def generate_tree(tree_path, tree_name, scale, seed = 0):
+	"""
+	Description
+	-----------
+	Writes the files of a synthetic tree. The same tree name, scale and seed always produce the same files.
+
+	Parameters
+	-----------
+	tree_path - string
+		The directory in which the tree will be generated
+
+	tree_name - string
+		A key of TREES
+
+	scale - float
+		The number of files (large-files: their size) is multiplied by this number
+
+	Returns
+	-----------
+	A tuple (number of files, number of bytes)
+	"""
+
+	spec = TREES[tree_name]
+	rng = random.Random(seed)
+	files_count = max(1, int(spec['files'] * scale)) if tree_name != 'large-files' else spec['files']
+	size_scale = scale if tree_name == 'large-files' else 1
+
+	#A 1 MiB block is generated once and repeated, so that large files are written quickly. Each file starts with its own random prefix.
+	block = random_bytes(rng, 1024 * 1024)
+	contents_pool = None
+	if spec['distinct_contents']:
+		contents_pool = [random_bytes(rng, rng.randint(spec['min_size'], spec['max_size'])) for i in range(spec['distinct_contents'])]
+
+	total_bytes = 0
+	for i in range(files_count):
+		directory = join(tree_path, *[f"d{(i // FILES_PER_DIRECTORY) // 10}", f"d{(i // FILES_PER_DIRECTORY) % 10}"])
+		if i % FILES_PER_DIRECTORY == 0:
+			makedirs(directory, exist_ok = True)
+
+		with open(join(directory, f"f{i}.bin"), 'wb') as f:
+			if contents_pool is not None:
+				data = rng.choice(contents_pool)
+				f.write(data)
+				total_bytes += len(data)
+			else:
+				size = int(rng.randint(spec['min_size'], spec['max_size']) * size_scale)
+				prefix = random_bytes(rng, min(size, 64))
+				f.write(prefix)
+				remaining = size - len(prefix)
+				while remaining > 0:
+					f.write(block[:remaining])
+					remaining -= min(remaining, len(block))
+				total_bytes += size
+
+	return files_count, total_bytes
+
+def run_scan(config):
+	"""
+	Description
+	-----------
+	Creates a new database, scans a tree and returns the measurements. It is executed in a separate process (see --worker).
+
+	Parameters
+	-----------
+	config - dictionary
+		The tree path, the hash functions, the number of jobs, the commit mode and the database path of the scan
+	"""
+
+	sys.path.insert(0, SRC_DIR)
+	import resource
+	from io import StringIO
+	from contextlib import redirect_stdout
+	from sqlalchemy import select
+	from create import create
+	from db import Db, read_scan_metrics
+	from table_classes import Scan
+	import scan
+
+	if not config['swh_lookups']:
+		scan.resolve_swhid = lambda swhid_hash: None
+
+	with redirect_stdout(StringIO()):
+		create(config['database_path'])
+		db = Db(config['database_path'])
+
+	checkpoint_files = config['checkpoint_files'] if config['commit'] == 'checkpoint' else None
+
+	#The messages printed for every file are part of the cost of a scan, so they are printed (to a null device) and not skipped
+	with open(devnull, 'w') as null_output, redirect_stdout(null_output):
+		start = perf_counter()
+		db.scan([[config['tree_path']], None, None], config['functions'], dirname(config['database_path']), True, True, None, config['jobs'], checkpoint_files)
+		seconds = perf_counter() - start
+
+	scan_id, scan_return_code = db.db_session.execute(select(Scan.scan_id, Scan.scan_return_code)).one()
+
+	#The scan times each stage once (the SoftwareHeritage queries are not part of the write stage), so the stages are taken from its metrics
+	metrics = read_scan_metrics(db.db_session, [scan_id]).get(scan_id, {})
+	stage_seconds = {
+		'walk': metrics.get('seconds:walk', 0.0),
+		'read_and_hash': sum(value for name, value in metrics.items() if name == 'seconds:read' or name.startswith('seconds:digest:')),
+		'swh_lookup': metrics.get('seconds:swh_lookup', 0.0),
+		'write': metrics.get('seconds:write', 0.0),
+	}
+	del db
+
+	#ru_maxrss is in kilobytes on Linux and in bytes on macOS
+	peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	peak_rss_mb = peak_rss / (1024 * 1024) if sys.platform == 'darwin' else peak_rss / 1024
+
+	return {'seconds': seconds, 'stage_seconds': stage_seconds, 'peak_rss_mb': peak_rss_mb, 'scan_return_code': scan_return_code}
+
+def main():
+	argument_parser = argparse.ArgumentParser(description = "Measure the scan throughput of hashesdb on synthetic trees.")
+	argument_parser.add_argument('--trees', nargs = '+', choices = list(TREES), default = list(TREES), help = "trees to scan. default: all")
+	argument_parser.add_argument('--scale', type = float, default = 1.0, help = "multiplies the number of files (large-files: their size). default: 1")
+	argument_parser.add_argument('--functions', nargs = '+', default = ['md5'], metavar = "FUNCTIONS", help = "comma separated hash function sets, '' for SWHID only. default: md5")
+	argument_parser.add_argument('--jobs', nargs = '+', type = int, default = [1], help = "numbers of threads. default: 1")
+	argument_parser.add_argument('--commit', nargs = '+', choices = ['end', 'checkpoint'], default = ['end'], help = "commit once at the end or with checkpoints. default: end")
+	argument_parser.add_argument('--checkpoint-files', type = int, default = 1000, metavar = "N", help = "files between checkpoints in checkpoint mode. default: 1000")
+	argument_parser.add_argument('--swh-lookups', action = 'store_true', help = "query the SoftwareHeritage archive for every file (requires network)")
+	argument_parser.add_argument('--seed', type = int, default = 0, help = "seed of the generated trees. default: 0")
+	argument_parser.add_argument('--output', metavar = "FILE", help = "write the JSON report to FILE instead of stdout")
+	argument_parser.add_argument('--worker', metavar = "CONFIG", help = argparse.SUPPRESS)
+	args = argument_parser.parse_args()
+
+	if args.worker:
+		print(json.dumps(run_scan(json.loads(args.worker))))
+		return
+
+	results = []
+	with tempfile.TemporaryDirectory() as tmp_dir:
+		for tree_name in args.trees:
+			tree_path = join(tmp_dir, tree_name)
+			files_count, total_bytes = generate_tree(tree_path, tree_name, args.scale, args.seed)
+
+			for functions in args.functions:
+				for jobs in args.jobs:
+					for commit in args.commit:
+						config = {
+							'tree_path': tree_path,
+							'database_path': join(tmp_dir, f"bench_scan_{len(results)}.db"),
+							'functions': [f for f in functions.split(',') if f],
+							'jobs': jobs,
+							'commit': commit,
+							'checkpoint_files': args.checkpoint_files,
+							'swh_lookups': args.swh_lookups,
+						}
+						completed = subprocess.run([sys.executable, abspath(__file__), '--worker', json.dumps(config)], capture_output = True, text = True, check = True)
+						measurement = json.loads(completed.stdout.strip().splitlines()[-1])
+
+						seconds = measurement['seconds']
+						results.append({
+							'tree': tree_name,
+							'files': files_count,
+							'bytes': total_bytes,
+							'functions': ['swhid'] + config['functions'],
+							'jobs': jobs,
+							'commit': commit,
+							'seconds': round(seconds, 4),
+							'files_per_second': round(files_count / seconds, 1) if seconds else None,
+							'mb_per_second': round(total_bytes / (1024 * 1024) / seconds, 2) if seconds else None,
+							'stage_seconds': {stage: round(value, 4) for stage, value in measurement['stage_seconds'].items()},
+							'peak_rss_mb': round(measurement['peak_rss_mb'], 1),
+							'scan_return_code': measurement['scan_return_code'],
+						})
+
+	report = {
+		'python': sys.version.split()[0],
+		'platform': sys.platform,
+		'scale': args.scale,
+		'seed': args.seed,
+		'swh_lookups': args.swh_lookups,
+		'results': results,
+	}
+
+	report_json = json.dumps(report, indent = 2)
+	if args.output:
+		with open(args.output, 'w') as f:
+			f.write(report_json + '\n')
+	else:
+		print(report_json)
+
+if __name__ == '__main__':
+	main()
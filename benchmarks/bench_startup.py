@@ -0,0 +1,120 @@
+"""
+Startup benchmark of the hashesdb command line tool.
+
+Measures the import time of the parser module and the wall time of a few trivial subcommands, each one executed in a fresh interpreter,
+and compares them with the startup budget defined below. The results are printed as JSON.
+
+Usage:
+	python benchmarks/bench_startup.py [--runs N] [--check]
+
+With --check, the script exits with status 1 if a measurement exceeds its budget.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from os.path import abspath, dirname, join
+from statistics import median
+from time import perf_counter
+
+SRC_DIR = join(dirname(abspath(__file__)), '..', 'src')
+PARSER_PATH = join(SRC_DIR, 'parser.py')
+
+#Modules that must not be loaded by commands that do not scan, hash or print tables
+HEAVY_MODULES = ['github', 'gitlab', 'requests', 'swh', 'ssdeep', 'tlsh', 'xxhash', 'prettytable', 'yaml', 'dicttoxml', 'sqlparse']
+
+#Startup budget (seconds), measured on top of the startup time of a bare interpreter
+STARTUP_BUDGET = {
+	'import parser': 0.35,
+	'--help': 0.40,
+	'about': 0.40,
+	'dbinfo': 0.45,
+	'search': 0.50,
+}
+
+def time_command(argv, runs):
+	"""
+	Description
+	-----------
+	Executes a command in a new process several times and returns the median wall time (seconds).
+
+	Parameters
+	-----------
+	argv - list of strings
+		The command that will be executed
+
+	runs - int
+		Number of times the command will be executed
+	"""
+
+	timings = []
+	for i in range(runs):
+		start = perf_counter()
+		subprocess.run(argv, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL, check = False)
+		timings.append(perf_counter() - start)
+	return median(timings)
+
+def import_time_of_parser():
+	"""
+	Description
+	-----------
+	Returns the cumulative import time (seconds) of the parser module, as reported by 'python -X importtime',
+	and the heavy modules that were loaded while importing it."""
+
+	probe = "import sys; sys.path.insert(0, %r); import parser; print(','.join(m for m in %r if m in sys.modules))" % (SRC_DIR, HEAVY_MODULES)
+	completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', probe], capture_output = True, text = True, check = True)
+
+	parser_import_time = None
+	for line in completed.stderr.splitlines():
+		#Format of each line: "import time: self [us] | cumulative | imported package"
+		fields = line.split('|')
+		if len(fields) == 3 and fields[2].strip() == 'parser':
+			parser_import_time = int(fields[1].strip()) / 1e6
+
+	heavy_modules_loaded = [m for m in completed.stdout.strip().split(',') if m]
+	return parser_import_time, heavy_modules_loaded
+
+def main():
+	argument_parser = argparse.ArgumentParser(description = "Measure the startup time of hashesdb subcommands.")
+	argument_parser.add_argument('--runs', type = int, default = 10, help = "number of runs per command. default: 10")
+	argument_parser.add_argument('--check', action = 'store_true', help = "exit with status 1 if a measurement exceeds its budget")
+	args = argument_parser.parse_args()
+
+	with tempfile.TemporaryDirectory() as tmp_dir:
+		db_path = join(tmp_dir, 'bench_startup.db')
+		subprocess.run([sys.executable, PARSER_PATH, 'create', '-d', db_path], stdout = subprocess.DEVNULL, check = True)
+
+		interpreter_time = time_command([sys.executable, '-c', 'pass'], args.runs)
+		parser_import_time, heavy_modules_loaded = import_time_of_parser()
+
+		commands = {
+			'--help': [sys.executable, PARSER_PATH, '--help'],
+			'about': [sys.executable, PARSER_PATH, 'about'],
+			'dbinfo': [sys.executable, PARSER_PATH, 'dbinfo', '-d', db_path],
+			'search': [sys.executable, PARSER_PATH, 'search', '-d', db_path, '--hash', '0' * 64],
+		}
+
+		measurements = {'import parser': parser_import_time}
+		for command_name, argv in commands.items():
+			measurements[command_name] = time_command(argv, args.runs) - interpreter_time
+
+	over_budget = [name for name, seconds in measurements.items() if seconds is None or seconds > STARTUP_BUDGET[name]]
+
+	report = {
+		'python': sys.version.split()[0],
+		'runs': args.runs,
+		'interpreter_startup_seconds': round(interpreter_time, 4),
+		'measurements_seconds': {name: (round(seconds, 4) if seconds is not None else None) for name, seconds in measurements.items()},
+		'budget_seconds': STARTUP_BUDGET,
+		'over_budget': over_budget,
+		'heavy_modules_loaded_by_parser': heavy_modules_loaded,
+	}
+	print(json.dumps(report, indent = 2))
+
+	if args.check and (over_budget or heavy_modules_loaded):
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main()
@@ -1,16 +1,18 @@
-from create import is_hashesdb_database, is_valid_db_path, create as create_create
+from create import is_hashesdb_database, is_valid_db_path, create as create_create, upgrade as create_upgrade
 from os.path import abspath, isfile, dirname
 from os import getcwd
 from sys import exit as sys_exit
 import sys
-from db import Db,NoDb,database_is_used
+from db import Db,NoDb,database_is_used,read_hash_file
+from itertools import chain
+from calibration import CALIBRATION_SECONDS
 
 class App:
 	"""
 	This is the main class of our application. It provides an interface used by the parser.
 	"""
 
-	def __init__(self, used_database_path_param = None):
+	def __init__(self, used_database_path_param = None, persistent_connection_flag = False):
 		"""
 		Description
 		-----------
@@ -21,6 +23,10 @@ class App:
 		used_database_path_param: string, optional
 			When set, the app starts and immediately tries to use a hashesDB database located at the given path(either relative or absolute path) 
 
+		persistent_connection_flag: boolean, optional
+			Default: False
+			When set, the databases used by the app keep their SQLite connection (and its cache) open between commands. Used by the hashesdb server.
+
 		Results
 		-----------
 		Initializes self.max_threads, self.working_directory and self.used_database.
@@ -32,6 +38,8 @@ class App:
 		#Set the working directory
 		self.working_directory = getcwd()
 
+		self.persistent_connection_flag = persistent_connection_flag
+
 		#Set used_database to NoDb. NoDb class represents the 'no database' used state.
 		self.used_database = NoDb()
 
@@ -129,6 +137,29 @@ class App:
 		db_absolute_path = abspath(path_param)
 		return create_create(db_absolute_path, overwrite_flag)
 
+	def upgrade(self, path_param):
+		"""
+		Description
+		-----------
+		Implementetion of the 'upgrade' command.
+		Upgrades a hashesDB database created by an older version of hashesdb to the current schema version, by calling the 'upgrade' function from src/create.py.
+		The database that is currently used can not be upgraded, since it already uses the current schema version.
+
+		Parameters
+		-----------
+		path_param: string
+			A path(relative or absolute) that specifies where the database is located. This has to be a path to a .db file.
+
+		Results
+		-----------
+		Returns True if the database uses the current schema version when the command ends. Otherwise it returns False."""
+
+		db_absolute_path = abspath(path_param)
+		if database_is_used(self.used_database) and self.used_database.get_database_path() == db_absolute_path:
+			print("This database is currently used. You must stop using it with the 'unuse' command before you upgrade it.")
+			return False
+		return create_upgrade(db_absolute_path)
+
 	def use(self, path_param, called_by_init = False):
 		"""
 		Description
@@ -184,7 +215,7 @@ class App:
 			if database_exists:
 				try:
 					del self.used_database #Deletes the NoDb() object
-					self.used_database = Db(db_absolute_path)
+					self.used_database = Db(db_absolute_path, self.persistent_connection_flag)
 				except Exception as e:
 					print("An error occured while trying to connect with the database. See more details below.")
 					print(e)
@@ -256,6 +287,16 @@ class App:
 			print("Error: Could not open docs/schema_documentation.txt")
 			print(e)
 
+	def verify(self):
+		"""
+		Description
+		-----------
+		Implementetion of the 'verify' command.
+		If a database is used then it compares its whole schema with the hashesDB schema. Otherwise it prints a warning message.
+		If we use a database when the function ends, self.used_database is a Db() object. Otherwise it is a NoDb() object."""
+
+		self.used_database.verify()
+
 	def import_db(self, import_file_path_param, import_file_format_param):
 		"""
 		Description
@@ -340,17 +381,35 @@ class App:
 
 		self.used_database.dbinfo()
 
-	def stats(self):
+	def stats(self, recount_flag = False, autocommit_parameter = False, storage_flag = False, scans_flag = False):
 		"""
 		Description
 		-----------
 		Implementetion of the 'stats' command.
 		If a database is used then it prints information about this database. Otherwise it prints a warning message.
-		If we use a database when the function ends, self.used_database is a Db() object. Otherwise it is a NoDb() object."""
+		If we use a database when the function ends, self.used_database is a Db() object. Otherwise it is a NoDb() object.
 
-		self.used_database.stats()	
+		Parameters
+		-----------
+		recount_flag: boolean, optional
+			Default: False
+			If True, the statistics are recomputed from the data instead of being read from the STATISTICS table, which is rebuilt.
+
+		autocommit_parameter: boolean, optional
+			Default: False
+			If True, the rebuilt STATISTICS table is commited. Supposed to be set to True only for the standalone stats command.
 
-	def scan(self, scan_targets_parameter, hash_functions_parameter, download_location_parameter = None, jobs_parameter = 1, autocommit_parameter = False, recursion_flag_parameter = True):
+		storage_flag: boolean, optional
+			Default: False
+			If True, the storage taken by text values that are repeated on many rows is printed too.
+
+		scans_flag: boolean, optional
+			Default: False
+			If True, the performance of each measured scan is printed too."""
+
+		self.used_database.stats(recount_flag, autocommit_parameter, storage_flag, scans_flag)	
+
+	def scan(self, scan_targets_parameter, hash_functions_parameter, download_location_parameter = None, jobs_parameter = 1, autocommit_parameter = False, recursion_flag_parameter = True, target_filter_parameter = None, checkpoint_files_parameter = None, checkpoint_seconds_parameter = None, resume_scan_id_parameter = None, verbose_flag = False, estimate_flag = False, quick_flag = False):
 		"""
 		Description
 		-----------
@@ -381,6 +440,34 @@ class App:
 			If this parameter is True, then we recursively scan the contents of all the directories.
 			Otherwise we do not scan the directories (we skip them).
 
+		target_filter_parameter: TargetFilter, optional
+			Default value: None (every local file is selected)
+			The include/exclude patterns, size limits and symlink policy according to which the local files are selected.
+
+		checkpoint_files_parameter: int, optional
+			Default value: None
+			If given, the scan is committed after every checkpoint_files_parameter files (only when autocommit_parameter is True).
+
+		checkpoint_seconds_parameter: int, optional
+			Default value: None
+			If given, the scan is committed every checkpoint_seconds_parameter seconds (only when autocommit_parameter is True).
+
+		resume_scan_id_parameter: int, optional
+			Default value: None
+			The id of an interrupted scan that will be continued. The local files that were already recorded for it are skipped.
+
+		verbose_flag: boolean, optional
+			Default value: False
+			If True, a message is printed for each scanned file. Otherwise only the progress of the scan is reported, at a fixed rate.
+
+		estimate_flag: boolean, optional
+			Default value: False
+			If True, nothing is scanned and the duration of the scan is predicted instead.
+
+		quick_flag: boolean, optional
+			Default value: False
+			If True, only the sampled hash functions are calculated and the SWHID is skipped, so only a few samples of each file are read (triage scan).
+
 		autocommit_parameter: boolean, optional
 			Default: False
 			In case this flag is set to True, the changes will be commited to the before the function ends.
@@ -401,9 +488,9 @@ class App:
 		if jobs_parameter != self.max_threads:
 			self.threads(jobs_parameter)
 
-		self.used_database.scan(scan_targets_parameter, hash_functions_parameter, download_location_parameter, autocommit_parameter, recursion_flag_parameter)
+		self.used_database.scan(scan_targets_parameter, hash_functions_parameter, download_location_parameter, autocommit_parameter, recursion_flag_parameter, target_filter_parameter, self.max_threads, checkpoint_files_parameter, checkpoint_seconds_parameter, resume_scan_id_parameter, verbose_flag, estimate_flag, quick_flag)
 
-	def search(self, hash_parameter, filename_parameter, output_path_parameter = sys.stdout):
+	def search(self, hash_parameter, filename_parameter, output_path_parameter = sys.stdout, hash_file_parameter = None, hash_function_parameter = None):
 		"""
 		Description
 		-----------
@@ -423,11 +510,24 @@ class App:
 			Default: sys.stdout
 			This is a path to a file, where the output will be printed/saved.
 			Supported file formats: TXT, CSV, TSV, JSON, YAML, XML
+
+		hash_file_parameter: string, optional
+			Default: None
+			Path to a file that contains one hash value per line ('-' for the standard input).
+			When set, the hash values of the file (and of hash_parameter) are searched in batches, which scales to very large lists of hash values.
+
+		hash_function_parameter: list of string, optional
+			Default: None
+			If given, only the hashes of these hash functions are searched and returned.
 		"""
 		
-		self.used_database.search(hash_parameter, filename_parameter, output_path_parameter)
+		if hash_file_parameter is None:
+			self.used_database.search(hash_parameter, filename_parameter, output_path_parameter, hash_function_parameter)
+		else:
+			hash_values = chain(hash_parameter or [], read_hash_file(hash_file_parameter))
+			self.used_database.batch_search(hash_values, filename_parameter, output_path_parameter, hash_function_parameter)
 
-	def sql_query(self, sql_query_string_parameter, output_path_parameter = sys.stdout, autocommit_parameter = False):
+	def sql_query(self, sql_query_string_parameter, output_path_parameter = sys.stdout, autocommit_parameter = False, explain_flag = False):
 		"""
 		Description
 		-----------
@@ -455,9 +555,88 @@ class App:
 			If you set this parameter ro True when you execute a sql command from the REPL, it is possible that changes made before the execution
 			of the SQL query will be commited too.
 
+		explain_flag: boolean, optional
+			Default: False
+			If True, the query is not executed and the query plan of each statement is printed instead.
+		"""
+
+		self.used_database.sql_query(sql_query_string_parameter, output_path_parameter, autocommit_parameter, explain_flag)
+
+	def hash_index(self, hash_functions_parameter, drop_flag = False, autocommit_parameter = False):
+		"""
+		Description
+		-----------
+		Implementetion of the 'hash-index' command.
+		If a database is used then it creates (or drops) the per-function indexes of the given hash functions. Otherwise it prints a warning message.
+
+		Parameters
+		-----------
+		hash_functions_parameter: list of strings
+			The names of the hash functions
+
+		drop_flag: boolean, optional
+			Default: False
+			If True, the indexes are dropped instead of created.
+
+		autocommit_parameter: boolean, optional
+			Default: False
+			If True, the changes are commited. Supposed to be set to True only for the standalone hash-index command."""
+
+		self.used_database.index_hash_functions(hash_functions_parameter, drop_flag, autocommit_parameter)
+
+	def calibrate(self, hash_functions_parameter = None, seconds_parameter = CALIBRATION_SECONDS, autocommit_parameter = False):
+		"""
+		Description
+		-----------
+		Implementetion of the 'calibrate' command.
+		If a database is used then it measures the throughput of the given hash functions on this host and stores it in the database. Otherwise it prints a warning message.
+
+		Parameters
+		-----------
+		hash_functions_parameter: list of strings, optional
+			Default: None (every available hash function is measured)
+			The names of the hash functions
+
+		seconds_parameter: float, optional
+			Default: CALIBRATION_SECONDS
+			The duration of the measurement of each hash function
+
+		autocommit_parameter: boolean, optional
+			Default: False
+			If True, the changes are commited. Supposed to be set to True only for the standalone calibrate command."""
+
+		self.used_database.calibrate(hash_functions_parameter, seconds_parameter, autocommit_parameter)
+
+	def backfill(self, hash_functions_parameter, scope_parameter = 'all', jobs_parameter = 1, verbose_flag = False, autocommit_parameter = False):
 		"""
+		Description
+		-----------
+		Implementetion of the 'backfill' command.
+		If a database is used then it calculates the hash values of the given hash functions that the scanned files miss, reading only the files that miss them
+		and are still unchanged. Otherwise it prints a warning message.
+
+		Parameters
+		-----------
+		hash_functions_parameter: list of strings
+			The names of the hash functions
+
+		scope_parameter: string, optional
+			Default: 'all'
+			'all', a scan id or an origin (hostname or URL). Only the files of the scope are backfilled.
+
+		jobs_parameter: int, optional
+			Default: 1
+			The number of threads that read files at the same time
+
+		verbose_flag: boolean, optional
+			Default: False
+			If True, a message is printed for each skipped file.
+
+		autocommit_parameter: boolean, optional
+			Default: False
+			If True, the changes are commited. Supposed to be set to True only for the standalone backfill command."""
 
-		self.used_database.sql_query(sql_query_string_parameter, output_path_parameter, autocommit_parameter)
+		self.used_database.backfill(hash_functions_parameter, scope_parameter, jobs_parameter, verbose_flag, autocommit_parameter)
 
 	def hash_functions(self, details_flag = False):
 		"""
@@ -492,7 +671,7 @@ class App:
 
 		self.used_database.hash_is_available(hash_function_parameter)
 
-	def search_duplicates(self, files_list, output_path_parameter = sys.stdout):
+	def search_duplicates(self, files_list, output_path_parameter = sys.stdout, hash_function_parameter = 'swhid', jobs_parameter = 1, prefilter_parameter = None):
 		"""
 		Description
 		-----------
@@ -503,17 +682,30 @@ class App:
 		Parameters
 		-----------
 		files_list: list of strings
-			A list of strings. The strings should be paths to files whose content we want to search for.
+			A list of strings. The strings should be paths to files or directories whose content we want to search for.
 
 		output_path_parameter: string
 			Default: sys.stdout
 			This is a path to a file, where the output will be printed/saved.
 			Supported file formats: TXT, CSV, TSV, JSON, YAML, XML		
+
+		hash_function_parameter: string, optional
+			Default: 'swhid'
+			The hash function used to find duplicates. Each file is read once and hashed only with this function.
+
+		jobs_parameter: int, optional
+			Default: 1
+			The number of threads that hash files at the same time.
+
+		prefilter_parameter: string, optional
+			Default: None
+			A hash function (e.g. quicksig) with which the files are hashed first. Only the files whose hash value is found in the database
+			are hashed with hash_function_parameter.
 		"""		
 
-		self.used_database.search_duplicates(files_list, output_path_parameter)
+		self.used_database.search_duplicates(files_list, output_path_parameter, hash_function_parameter, jobs_parameter, prefilter_parameter)
 
-	def compare(self, fuzzy_func, ids_to_compare):
+	def compare(self, fuzzy_func, ids_to_compare, verbose_flag = False):
 		"""
 		Description
 		-----------
@@ -527,6 +719,10 @@ class App:
 
 		ids_to_compare - list of ints
 			List of ids of Hash records (primary keys of the HASH table) 
+
+		verbose_flag - boolean, optional
+			Default value: False
+			If True, a message is printed before each comparsion.
 		"""
 		
-		self.used_database.compare(fuzzy_func, ids_to_compare)
\ No newline at end of file
+		self.used_database.compare(fuzzy_func, ids_to_compare, verbose_flag)
\ No newline at end of file
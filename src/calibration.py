@@ -0,0 +1,126 @@
+from os import urandom, cpu_count
+from time import perf_counter
+from hash_registry import get_hash_function
+
+#The scanner is imported by the functions that hash data, so that the parser can read the defaults below without loading it
+
+#Seconds during which each hash function is measured by the calibrate command
+CALIBRATION_SECONDS = 1.0
+
+#Seconds during which a hash function that was not calibrated on this host is measured by 'scan --estimate'
+QUICK_CALIBRATION_SECONDS = 0.2
+
+MB = 1024 * 1024
+
+def measure_throughput(hash_function_name, seconds_parameter = CALIBRATION_SECONDS, block_size = None):
+	"""
+	Description
+	-----------
+	Measures how fast a hash function hashes data on this host, on a single thread.
+	The same block of random data is fed to a HashObject repeatedly, the way the scan feeds it the blocks of a file, until the given time has passed.
+
+	Parameters
+	-----------
+	hash_function_name - string
+		The name of a hash function supported by HashObject (including 'swhid')
+
+	seconds_parameter - float, optional
+		Default: CALIBRATION_SECONDS
+		The minimum duration of the measurement
+
+	block_size - int, optional
+		Default: None (READ_BUFFER_SIZE of the scanner)
+		The size of the block that is fed to the hash object each time
+
+	Results
+	-----------
+	Returns the throughput of the hash function in MB (2^20 bytes) per second.
+
+	Raises
+	-----------
+	Raises an Exception if the hash function is not supported (e.g. the library that implements it is not installed)
+	"""
+
+	from scan import HashObject, READ_BUFFER_SIZE
+	if block_size is None:
+		block_size = READ_BUFFER_SIZE
+	data = urandom(block_size)
+
+	#The first block is not measured, so that loading the library and allocating the state of the hash object are not counted
+	hash_object = HashObject(hash_function_name, 0)
+	hash_object.update(data)
+
+	bytes_hashed = 0
+	start = perf_counter()
+	while True:
+		hash_object.update(data)
+		bytes_hashed += block_size
+		elapsed = perf_counter() - start
+		if elapsed >= seconds_parameter:
+			break
+	hash_object.get_hash()
+	elapsed = perf_counter() - start
+
+	return bytes_hashed / MB / elapsed
+
+def estimate_scan_seconds(file_count, total_bytes, largest_file_size, throughputs, jobs_parameter = 1, read_seconds_per_byte = 0.0, write_seconds_per_file = 0.0):
+	"""
+	Description
+	-----------
+	Predicts the wall time of a scan. The files are read and hashed by the threads of the scan while a single thread writes them to the database,
+	so the scan takes as long as the slowest of the two stages:
+		-read and hash: each file is read once and fed to every hash function by one thread, so a file costs read_seconds_per_byte plus the
+		 time each hash function needs for one byte. The threads share the files, but they can not run on more CPUs than the host has,
+		 the hash functions that do not release the GIL (see hash_registry.py) hash one block at a time whatever the number of threads,
+		 and the scan can not finish before the largest file is hashed by its thread.
+		-write: write_seconds_per_file for each file (inserting its rows and looking its SWHID up in the SoftwareHeritage archive)
+
+	Parameters
+	-----------
+	file_count - int
+		The number of files that will be scanned
+
+	total_bytes - int
+		The sum of the sizes of the files
+
+	largest_file_size - int
+		The size of the largest file in bytes
+
+	throughputs - dictionary
+		Maps the names of the hash functions that will be calculated (including 'swhid') to their throughput in MB per second
+
+	jobs_parameter - int, optional
+		Default: 1
+		The number of threads that read and hash files
+
+	read_seconds_per_byte - float, optional
+		Default: 0.0 (reading is not counted)
+		The time needed to read one byte, e.g. as measured by previous scans
+
+	write_seconds_per_file - float, optional
+		Default: 0.0 (writing is not counted)
+		The time needed to write one file to the database, e.g. as measured by previous scans
+
+	Results
+	-----------
+	Returns a dictionary with the estimated seconds of each stage ('hash', 'write') and of the whole scan ('total').
+	"""
+
+	parallel_seconds_per_byte = read_seconds_per_byte
+	serial_seconds_per_byte = 0.0
+	for hash_function_name, mb_per_second in throughputs.items():
+		if get_hash_function(hash_function_name).releases_gil:
+			parallel_seconds_per_byte += 1 / (mb_per_second * MB)
+		else:
+			serial_seconds_per_byte += 1 / (mb_per_second * MB)
+	parallel_threads = max(1, min(jobs_parameter, cpu_count() or 1))
+
+	hash_seconds = max(total_bytes * (parallel_seconds_per_byte / parallel_threads + serial_seconds_per_byte), largest_file_size * (parallel_seconds_per_byte + serial_seconds_per_byte))
+	write_seconds = file_count * write_seconds_per_file
+
+	return {'hash': hash_seconds, 'write': write_seconds, 'total': max(hash_seconds, write_seconds)}
+
+def format_duration(seconds_parameter):
+	#Formats a duration as H:MM:SS, e.g. 0:02:05
+	seconds = int(round(seconds_parameter))
+	return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
@@ -1,8 +1,8 @@
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import create_engine, MetaData, inspect, text
 from os.path import split, splitext, abspath, isdir, isfile, basename
 from os import remove
 
-from initialize_database import initialize_db
+from initialize_database import initialize_db, register_hash_functions
 from table_classes import *
 
 def create(database_path_parameter, overwrite_flag = False):
@@ -137,6 +137,7 @@ def create_database(database_path_parameter):
 			#Try to create the tables and to initialize them
 			Base.metadata.create_all(engine)
 			initialize_db(engine, database_path_parameter)
+			write_schema_fingerprint(engine)
 		except Exception as e:
 			#Delete the created database if you the creation of the hashesDB database fails
 			delete_file(database_path_parameter)
@@ -147,7 +148,9 @@ def is_hashesdb_database(database_path_parameter):
 	"""
 	Description
 	-----------
-	Compares the schema of a database with the expected schema of a hashesDB database, in order to find out if a database is a hashesDB database.
+	Finds out if a database is a hashesDB database.
+	Databases created by hashesdb carry a fingerprint in their SQLite header (application_id and user_version), which is checked first.
+	Only if the fingerprint is missing (databases created by older versions of hashesdb), the schema of the database is compared with the expected schema of a hashesDB database.
 
 	Parameters
 	-----------
@@ -173,26 +176,315 @@ def is_hashesdb_database(database_path_parameter):
 	engine_url = "sqlite:///" + database_path
 	engine = create_engine(engine_url, echo = False)
 
+	try:
+		application_id, user_version = read_schema_fingerprint(engine)
+
+		#Cheap check: the fingerprint is written when a hashesDB database is created or upgraded
+		if application_id == HASHESDB_APPLICATION_ID:
+			if user_version > HASHESDB_SCHEMA_VERSION:
+				print(f"Error: {database_path} was created by a newer version of hashesdb (schema version {user_version}).")
+				return False
+			return True
+
+		#Fallback: compare the whole schema
+		return has_hashesdb_schema(engine)
+	finally:
+		engine.dispose()
+
+def has_hashesdb_schema(engine):
+	"""
+	Description
+	-----------
+	Compares the schema of a database with the expected schema of a hashesDB database, by reflecting the whole schema of the database.
+	Databases created before schema version 7 (LOOKUP_TABLES_VERSION) store their files and hashes in the FILE and the HASH tables instead of views,
+	so they are compared with the schema of that time (LEGACY_TABLES).
+
+	Parameters
+	-----------
+	engine - SQLAlchemy engine object
+		An engine connected to the database whose schema we want to compare with the hashesDB schema.
+
+	Results
+	-----------
+	Returns True if a database has a hashesDB schema. Otherwise it returns False."""
+
 	#Create a metadata object and load the schema of the .db file
 	engine_metadata = MetaData()
 	engine_metadata.reflect(bind = engine)
 
-	#Get a list of SQLAlchemy Table objects sorted in order of foreign key dependency for the schema of the .db file
-	database_tables = engine_metadata.sorted_tables
-	#Get a list of SQLAlchemy Table objects sorted in order of foreign key dependency for the hashesDB schema (from table_classes.py)
-	schema_tables	= Base.metadata.sorted_tables
+	#Map the names of the tables of the .db file to SQLAlchemy Table objects
+	database_tables = {t.name: t for t in engine_metadata.sorted_tables}
 
-	#If the schema of the .db file has more or less tables than the hashesDB schema, then the .db file is not a hashesDB database
-	if len(database_tables) != len(schema_tables):
-		return False
+	if 'FILE' in database_tables:
+		schema_tables = [LEGACY_TABLES.get(t.name, t) for t in Base.metadata.sorted_tables if t.info.get('since_version', 0) < LOOKUP_TABLES_VERSION]
+		schema_tables += [LEGACY_TABLES['FILE'], LEGACY_TABLES['HASH']]
+	else:
+		#The views are part of the schema too
+		if not set(VIEW_NAMES) <= set(inspect(engine).get_view_names()):
+			return False
+		schema_tables = Base.metadata.sorted_tables
+
+	#Compare each table of the hashesDB schema (from table_classes.py) with the table of the .db file that has the same name
+	for schema_table in schema_tables:
+		db_table = database_tables.pop(schema_table.name, None)
+
+		if db_table is None:
+			#Tables that were added to the schema later may be missing. They are created when the database is upgraded.
+			if schema_table.info.get('since_version'):
+				continue
+			return False
 
-	#Compare each table 
-	#Given that both database_tables and schema_tables are sorted using the same methodology,
-	#the first Table object of the database_schema list has to be the equivelant with the first Table object of the schema_table list
-	for db_table, schema_table in zip(database_tables, schema_tables):
 		#If we find two Table objects that are not equivelant, then the schema of the .db file does not follow the hashesDB schema
 		#For the .compare method: check the documentation page of the SQLAlchemy Table object  
 		if not db_table.compare(schema_table):
 			return False
 
-	return True
\ No newline at end of file
+	#If the .db file has more tables than the hashesDB schema, then the .db file is not a hashesDB database
+	return len(database_tables) == 0
+
+def read_schema_fingerprint(engine):
+	"""
+	Description
+	-----------
+	Reads the fingerprint of a database from its SQLite header.
+
+	Parameters
+	-----------
+	engine - SQLAlchemy engine object
+		An engine connected to the database whose fingerprint we want to read.
+
+	Results
+	-----------
+	Returns a tuple (application_id, user_version). Both are 0 for databases that were not created or upgraded by hashesdb."""
+
+	with engine.connect() as conn:
+		application_id = conn.exec_driver_sql("PRAGMA application_id").scalar()
+		user_version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+	return application_id, user_version
+
+def write_schema_fingerprint(engine):
+	"""
+	Description
+	-----------
+	Writes the fingerprint of a hashesDB database (application_id and current schema version) to its SQLite header.
+
+	Parameters
+	-----------
+	engine - SQLAlchemy engine object
+		An engine connected to the database that will be fingerprinted."""
+
+	with engine.begin() as conn:
+		conn.exec_driver_sql(f"PRAGMA application_id = {HASHESDB_APPLICATION_ID}")
+		conn.exec_driver_sql(f"PRAGMA user_version = {HASHESDB_SCHEMA_VERSION}")
+
+def upgrade_database(engine):
+	"""
+	Description
+	-----------
+	Brings a hashesDB database up to the current schema version and writes its fingerprint.
+	This is done once for databases created by older versions of hashesdb, so that the next time they are used only the fingerprint is checked.
+
+	Parameters
+	-----------
+	engine - SQLAlchemy engine object
+		An engine connected to a hashesDB database.
+
+	Raises
+	-----------
+	Raises a RuntimeError if the files of a database created before schema version 7 can not be moved to the lookup tables (see migrate_to_lookup_tables).
+	The database is left unchanged in this case."""
+
+	#The files and the hashes of databases created before schema version 7 are moved to the tables that reference the lookup tables
+	if 'FILE' in inspect(engine).get_table_names():
+		migrate_to_lookup_tables(engine)
+
+	#Create the tables and the indexes that were added to the schema after the database was created
+	Base.metadata.create_all(engine)
+	for table in Base.metadata.sorted_tables:
+		for index in table.indexes:
+			index.create(bind = engine, checkfirst = True)
+
+	#The STATISTICS table is maintained by triggers from now on, so it has to start from the current counts
+	with engine.begin() as conn:
+		rebuild_statistics(conn)
+
+	write_schema_fingerprint(engine)
+
+def migrate_to_lookup_tables(engine):
+	"""
+	Description
+	-----------
+	Migrates a database created before schema version 7 (LOOKUP_TABLES_VERSION): the rows of its FILE and HASH tables are moved to the FILE_RECORD and the HASH_RECORD tables,
+	which store the hash function names, the origins, the extensions and the directories of the files as integer ids of the HASH_FUNCTION, ORIGIN, EXTENSION and DIRECTORY tables.
+	The FILE and the HASH tables are then replaced by views with the same columns, the hash-indexes of the hash functions are created again on HASH_RECORD
+	and the file is vacuumed, so that it shrinks. The ids of the files and the hashes do not change.
+	The whole migration is a single transaction: if it fails, the database is left as it was.
+
+	Parameters
+	-----------
+	engine - SQLAlchemy engine object
+		An engine connected to a hashesDB database whose FILE and HASH are tables.
+
+	Raises
+	-----------
+	Raises a RuntimeError if the path of a file does not end with the name of the file, since its directory could not be stored."""
+
+	with engine.begin() as conn:
+		#pysqlite starts the transactions of SQLAlchemy at the first change of data, so the changes of the schema that precede it have to be in an explicit transaction
+		conn.exec_driver_sql("BEGIN")
+
+		inconsistent_file_id = conn.exec_driver_sql("SELECT id FROM FILE WHERE file_path IS NOT NULL AND (file_name IS NULL OR substr(file_path, length(file_path) - length(file_name) + 1) IS NOT file_name) LIMIT 1").scalar()
+		if inconsistent_file_id is not None:
+			raise RuntimeError(f"Error: the file_path of the FILE record {inconsistent_file_id} does not end with its file_name. Correct it with an SQLite client and upgrade the database again.")
+
+		#The hash functions whose hash-index exists (see Db.index_hash_functions), to create it again on HASH_RECORD
+		indexed_functions = [name[len(HASH_FUNCTION_INDEX_PREFIX):] for name in conn.exec_driver_sql(f"SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'HASH' AND name LIKE '{HASH_FUNCTION_INDEX_PREFIX}%'").scalars()]
+
+		#HASH_FUNCTION gets an integer primary key, so it is created again. With legacy_alter_table, renaming it does not change the foreign keys that refer to it.
+		conn.exec_driver_sql("PRAGMA legacy_alter_table = ON")
+		conn.exec_driver_sql("ALTER TABLE HASH_FUNCTION RENAME TO LEGACY_HASH_FUNCTION")
+		conn.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+		for schema_table in Base.metadata.sorted_tables:
+			schema_table.create(conn, checkfirst = True)
+
+		#The hash functions keep their order. Hash values of hash functions that were missing from HASH_FUNCTION keep their names too.
+		conn.exec_driver_sql("INSERT INTO HASH_FUNCTION (hash_function_name, hash_function_fuzzy_flag, hash_function_size) SELECT hash_function_name, hash_function_fuzzy_flag, hash_function_size FROM LEGACY_HASH_FUNCTION WHERE hash_function_name IS NOT NULL ORDER BY rowid")
+		conn.exec_driver_sql("INSERT OR IGNORE INTO HASH_FUNCTION (hash_function_name) SELECT hash_function_name FROM HASH WHERE hash_function_name IS NOT NULL GROUP BY hash_function_name ORDER BY min(hash_id)")
+
+		#The ids of the values of the lookup tables follow the order in which the values were first scanned
+		directory_path = "substr(file_path, 1, length(file_path) - length(file_name))"
+		conn.exec_driver_sql(f"INSERT INTO DIRECTORY (directory_path) SELECT {directory_path} FROM FILE WHERE file_path IS NOT NULL GROUP BY {directory_path} ORDER BY min(id)")
+		conn.exec_driver_sql("INSERT INTO EXTENSION (extension_name) SELECT file_extension FROM FILE WHERE file_extension IS NOT NULL GROUP BY file_extension ORDER BY min(id)")
+		conn.exec_driver_sql("INSERT INTO ORIGIN (origin_name) SELECT origin FROM FILE WHERE origin IS NOT NULL GROUP BY origin ORDER BY min(id)")
+
+		conn.exec_driver_sql(f"""INSERT INTO FILE_RECORD (id, scan_id, file_name, extension_id, directory_id, file_size, date_created, date_modified, date_retrieved, swh_known, updated, origin_id)
+			SELECT FILE.id, FILE.scan_id, FILE.file_name, EXTENSION.extension_id, DIRECTORY.directory_id, FILE.file_size, FILE.date_created, FILE.date_modified, FILE.date_retrieved, FILE.swh_known, FILE.updated, ORIGIN.origin_id
+			FROM FILE LEFT JOIN DIRECTORY ON DIRECTORY.directory_path = {directory_path} LEFT JOIN EXTENSION ON EXTENSION.extension_name = FILE.file_extension LEFT JOIN ORIGIN ON ORIGIN.origin_name = FILE.origin
+			ORDER BY FILE.id""")
+		conn.exec_driver_sql("""INSERT INTO HASH_RECORD (hash_id, hash_value, hash_function_id, file_id)
+			SELECT HASH.hash_id, HASH.hash_value, HASH_FUNCTION.hash_function_id, HASH.file_id FROM HASH LEFT JOIN HASH_FUNCTION ON HASH_FUNCTION.hash_function_name = HASH.hash_function_name
+			ORDER BY HASH.hash_id""")
+
+		#Dropping the tables drops their indexes and triggers too
+		for legacy_table_name in ['HASH', 'FILE', 'LEGACY_HASH_FUNCTION']:
+			conn.exec_driver_sql(f"DROP TABLE {legacy_table_name}")
+		create_views(conn)
+
+		for hash_function_name, hash_function_id in conn.exec_driver_sql("SELECT hash_function_name, hash_function_id FROM HASH_FUNCTION"):
+			if hash_function_name in indexed_functions:
+				conn.exec_driver_sql(hash_function_index_statement(hash_function_name, hash_function_id))
+
+	#The pages of the dropped tables are reused only after the file is vacuumed
+	with engine.connect() as conn:
+		conn.exec_driver_sql("VACUUM")
+
+def schema_is_current(engine):
+	"""
+	Description
+	-----------
+	Checks, without changing the database, whether a hashesDB database has the fingerprint of the current schema version.
+
+	Parameters
+	-----------
+	engine - SQLAlchemy engine object
+		An engine connected to a hashesDB database.
+
+	Results
+	-----------
+	Returns True if the database uses the current schema version, False if it has to be upgraded with the 'upgrade' command."""
+
+	return read_schema_fingerprint(engine) == (HASHESDB_APPLICATION_ID, HASHESDB_SCHEMA_VERSION)
+
+def upgrade(database_path_parameter):
+	"""
+	Description
+	-----------
+	Implements the 'upgrade' command: brings a hashesDB database created by an older version of hashesdb up to the current schema version
+	and adds to it the hash functions that became available after it was created (see register_hash_functions).
+	This is the only command that migrates a database. The other commands refuse to use a database that has not been upgraded, so reading
+	a database never changes its file.
+
+	Parameters
+	-----------
+	database_path_parameter: string
+		A path(relative or absolute) to an existing hashesDB database (.db file).
+
+	Results
+	-----------
+	Returns True if the database uses the current schema version when the function ends, False otherwise."""
+
+	database_path = abspath(database_path_parameter)
+	if not isfile(database_path):
+		print(f"Error: Database {database_path} does not exist.")
+		return False
+	if not is_hashesdb_database(database_path):
+		print(f"Error: {database_path} is not a hashesDB database.")
+		return False
+
+	engine = create_engine("sqlite:///" + database_path, echo = False)
+	try:
+		application_id, user_version = read_schema_fingerprint(engine)
+		if schema_is_current(engine):
+			print(f"{database_path} already uses schema version {HASHESDB_SCHEMA_VERSION}.")
+		else:
+			upgrade_database(engine)
+			print(f"Upgraded {database_path} from schema version {user_version if application_id == HASHESDB_APPLICATION_ID else 0} to {HASHESDB_SCHEMA_VERSION}.")
+
+		registered_names = register_hash_functions(engine)
+		if registered_names:
+			print(f"New hash functions available: {', '.join(registered_names)}")
+	except Exception as e:
+		print("Error: an error occured while upgrading the database. In more detail:")
+		print(e)
+		return False
+	finally:
+		engine.dispose()
+
+	return True
+
+def compute_statistics(connection):
+	"""
+	Description
+	-----------
+	Counts the files and the hashes of a hashesDB database, with one pass over the FILE_RECORD table and one pass over the HASH_RECORD table.
+
+	Parameters
+	-----------
+	connection - SQLAlchemy connection or session object
+		A connection to the database whose statistics we want to compute.
+
+	Results
+	-----------
+	Returns a dictionary that maps the names of the statistics (as stored in the STATISTICS table) to their values."""
+
+	files_count, swh_known_count = connection.execute(text("SELECT count(*), total(swh_known IS 1) FROM FILE_RECORD")).one()
+	statistics = {'files': files_count, 'swh_known_files': int(swh_known_count), 'hashes': 0}
+
+	#The hashes are counted per id, which uses no lookup of HASH_FUNCTION for each hash
+	hash_counts = text("SELECT hash_function_name, hash_count FROM (SELECT hash_function_id, count(*) AS hash_count FROM HASH_RECORD GROUP BY hash_function_id) LEFT JOIN HASH_FUNCTION USING (hash_function_id)")
+	for hash_function_name, hash_count in connection.execute(hash_counts):
+		statistics['hashes'] += hash_count
+		statistics['hashes:' + (hash_function_name or '')] = hash_count
+
+	return statistics
+
+def rebuild_statistics(connection):
+	"""
+	Description
+	-----------
+	Recomputes the content of the STATISTICS table, which is normally kept up to date by triggers.
+
+	Parameters
+	-----------
+	connection - SQLAlchemy connection or session object
+		A connection to the database whose STATISTICS table will be rebuilt.
+
+	Results
+	-----------
+	Returns the dictionary of statistics that was stored."""
+
+	statistics = compute_statistics(connection)
+	connection.execute(Statistic.__table__.delete())
+	connection.execute(Statistic.__table__.insert(), [{'statistic_name': name, 'statistic_value': value} for name, value in statistics.items()])
+	return statistics
@@ -1,28 +1,58 @@
-from sqlalchemy import create_engine, inspect, text
+from sqlalchemy import create_engine, inspect, text, event, select, insert, table, column, literal, func, type_coerce, bindparam, Boolean, Integer
 from sqlalchemy.orm import sessionmaker, load_only
+from sqlalchemy.pool import StaticPool
 from datetime import datetime
-from prettytable import PrettyTable
+from time import perf_counter
 from os import mkdir, listdir
 from os.path import abspath, isdir, join, split, exists, getsize
 from difflib import SequenceMatcher
 import sys
-import sqlparse
 from initialize_database import initialize_db_from_session
+from create import read_schema_fingerprint, schema_is_current, has_hashesdb_schema, rebuild_statistics
 from table_classes import *
-from scan import scanner, compute_hashes, comparsion
+from scan import scanner, comparsion, compute_file_digests, iterate_files, walk_local_targets, map_bounded, rehash_unchanged_file, insert_swhid_value, Checkpointer, ScanMetrics, insert_scan_metrics
+from hash_registry import get_hash_function
+from calibration import measure_throughput, estimate_scan_seconds, format_duration, CALIBRATION_SECONDS, QUICK_CALIBRATION_SECONDS, MB
+from progress import ProgressReporter
+from instrumentation import query_plan_lines
 from socket import gethostname
 from shutil import rmtree
-from output import output
+from output import output, ChainedResults
 from importing import populate_table
-from itertools import combinations
+from itertools import combinations, islice
+
+#prettytable and sqlparse are imported inside the methods that use them (stats, hash_functions and sql_query), so that the other commands start faster
 
 Session = sessionmaker()
 
+#SQLite limits the number of bound parameters of a statement (999 in SQLite versions before 3.32)
+SQLITE_MAX_VARIABLES = 999
+
+#Name of the temporary table used by batch_search() and number of hash values inserted into it with each statement
+BATCH_SEARCH_TABLE = 'BATCH_SEARCH_HASH'
+BATCH_SEARCH_CHUNK_SIZE = 10000
+
+#Temporary table of the files that miss hash values, filled once by the 'backfill' command and then read in pages of BACKFILL_PAGE_SIZE files
+BACKFILL_TABLE = 'BACKFILL_MISSING_HASH'
+BACKFILL_PAGE_SIZE = 1000
+
+#Hash function calculated by 'scan --quick' when no hash function is given
+QUICK_SCAN_HASH_FUNCTION = 'quicksig'
+
+#Text columns whose values are repeated on many rows and are stored once in a lookup table,
+#as (description, view name, SQL expression of the value, lookup table name, text column of the lookup table)
+REPEATED_TEXT_COLUMNS = [
+	('HASH.hash_function_name', 'HASH', 'hash_function_name', 'HASH_FUNCTION', 'hash_function_name'),
+	('FILE.origin', 'FILE', 'origin', 'ORIGIN', 'origin_name'),
+	('FILE.file_extension', 'FILE', 'file_extension', 'EXTENSION', 'extension_name'),
+	('FILE.file_path (directory part)', 'FILE', 'substr(file_path, 1, length(file_path) - length(file_name))', 'DIRECTORY', 'directory_path'),
+]
+
 class Db:
 	"""Db object is a object that represents a database we are currently using. It provides an interface to the App class, from which the App class can make changes to the database."""
 
 
-	def __init__(self, used_database_path_param):
+	def __init__(self, used_database_path_param, persistent_connection_flag = False):
 		"""
 		Description
 		-----------
@@ -36,6 +66,12 @@ class Db:
 		-----------
 		used_database_path_param: string
 			A path(relative or absolute) that specifies where the database we intend to use is located. This has to be a path to a .db file.
+
+		persistent_connection_flag: boolean, optional
+			Default: False
+			By default, SQLAlchemy opens a new SQLite connection for each transaction and closes it at commit, so the SQLite page cache is lost.
+			If this flag is True, the connection is kept open for the lifetime of the Db() object and uses a larger page cache.
+			The hashesdb server sets this flag, since it keeps the same database open for many commands.
 		
 		Raises
 		-----------
@@ -47,20 +83,44 @@ class Db:
 
 		#Create an engine and configure a session
 		engine_url = "sqlite:///" + self.database_path
-		engine = create_engine(engine_url, echo = False)
+		if persistent_connection_flag:
+			#A single connection is kept open for the whole life of the engine. The server executes one command at a time,
+			#so the connection may safely be released by a thread other than the one that opened it.
+			engine = create_engine(engine_url, echo = False, poolclass = StaticPool, connect_args = {'check_same_thread': False})
+			event.listen(engine, "connect", warm_connection)
+		else:
+			engine = create_engine(engine_url, echo = False)
 		Session.configure(bind=engine)
+		self.engine = engine
+
+		#Only the fingerprint is checked: databases created by older versions of hashesdb are migrated by the 'upgrade' command,
+		#never implicitly, so that a command that only reads the database does not change its file
+		if not schema_is_current(engine):
+			engine.dispose()
+			raise RuntimeError(f"Error: {self.database_path} was created by an older version of hashesdb. Upgrade it first with: hashesdb upgrade -d {self.database_path}")
 
 		#Try begin a session
 		try:
-			self.insp = inspect(engine)
 			self.db_session = Session()
 			self.db_session.begin()
-			self.available_functions = {i[0] for i in self.db_session.query(HashFunction.hash_function_name).all()} #available hash functions 
+			self.load_hash_functions()
 		except Exception as e:
 			raise e
 		else:
 			print(f"Database currently used: {self.get_database_path()}")
 
+	def load_hash_functions(self):
+		"""
+		Description
+		-----------
+		Reads the HASH_FUNCTION table again, after it was initialized or imported.
+		In more detail:
+			-self.hash_function_ids is a dictionary: it maps the names of the available hash functions to the ids by which HASH_RECORD refers to them
+			-self.available_functions is a set: the names of the available hash functions"""
+
+		self.hash_function_ids = dict(self.db_session.query(HashFunction.hash_function_name, HashFunction.hash_function_id).all())
+		self.available_functions = set(self.hash_function_ids)
+
 	def __del__(self):
 		"""
 		Description
@@ -71,6 +131,10 @@ class Db:
 		-----------
 		Raises an exception if we fail to close a session."""
 
+		#The initializer may have failed before the session began (e.g. because the database has to be upgraded)
+		if not hasattr(self, 'db_session'):
+			return
+
 		try:
 			self.db_session.rollback()
 			self.db_session.close()
@@ -85,6 +149,27 @@ class Db:
 
 		return self.database_path
 
+	def get_table_names(self):
+		"""
+		Description
+		-----------
+		Returns the names of the tables of the database currently used, through the SQLAlchemy engine Inspector.
+		The Inspector is created only when this method is called, since most commands do not need it."""
+
+		return inspect(self.engine).get_table_names()
+
+	def exported_names(self):
+		"""
+		Description
+		-----------
+		Returns the names of the tables and the views whose rows are exported and imported, in the order in which they are imported:
+		the tables that are neither derived nor stored through a view, and then the FILE and the HASH views.
+		The rows of FILE_RECORD, HASH_RECORD and their lookup tables are exported through the views, so the files and the hashes are exported
+		with the columns of the FILE and the HASH tables of the databases created before schema version 7."""
+
+		hidden_table_names = derived_table_names() | view_table_names()
+		return [t for t in self.get_table_names() if t not in hidden_table_names] + VIEW_NAMES
+
 	def has_unsaved_changes(self):
 		"""
 		Description
@@ -164,6 +249,7 @@ class Db:
 
 		if initialize_flag:
 			initialize_db_from_session(self.db_session, self.get_database_path())
+		self.load_hash_functions()
 
 		return True
 
@@ -184,8 +270,50 @@ class Db:
 			print(f"Date modified: {dbinfo_result.db_date_modified}")
 			print(f"Database version: {dbinfo_result.db_version}")
 			print(f"Last scan #id: {dbinfo_result.db_last_scan_id}")
+
+			#Performance of the last scan, if it was measured (scans performed by older versions of hashesdb were not)
+			try:
+				last_scan_metrics = read_scan_metrics(self.db_session, [dbinfo_result.db_last_scan_id]).get(dbinfo_result.db_last_scan_id)
+			except Exception:
+				self.db_session.rollback()
+				last_scan_metrics = None
+			if last_scan_metrics:
+				files_count, bytes_count, seconds = last_scan_metrics.get('files', 0), last_scan_metrics.get('bytes', 0), last_scan_metrics.get('seconds', 0)
+				print(f"Last scan: {int(files_count)} files, {bytes_count / (1024 * 1024):.2f} MiB in {seconds:.2f} seconds ({rate(files_count, seconds)} files/s, {rate(bytes_count / (1024 * 1024), seconds)} MB/s), {int(last_scan_metrics.get('errors', 0))} errors")
+				stages = sorted(((name[len('seconds:'):], value) for name, value in last_scan_metrics.items() if name.startswith('seconds:')), key = lambda stage: -stage[1])
+				print("Last scan time per stage: " + ", ".join(f"{stage} {value:.2f}s" for stage, value in stages))
 			print("")
 
+	def verify(self):
+		"""
+		Description
+		-----------
+		Compares the whole schema of the database with the expected schema of a hashesDB database and prints the result.
+		When a database is used, only its fingerprint is checked. This command performs the full (slower) check on demand.
+
+		Results
+		-----------
+		Returns True if the database has a hashesDB schema. Otherwise it returns False."""
+
+		try:
+			application_id, user_version = read_schema_fingerprint(self.engine)
+			schema_flag = has_hashesdb_schema(self.engine)
+		except Exception as e:
+			print("Error: a problem occured while trying to verify the schema of this database. In more detail:")
+			print(e)
+			return False
+
+		print(f"Schema version: {user_version}")
+		if application_id != HASHESDB_APPLICATION_ID:
+			print("Warning: this database does not carry a hashesDB fingerprint.")
+
+		if schema_flag:
+			print(f"Database {self.get_database_path()} has a valid hashesDB schema.")
+		else:
+			print(f"Error: the schema of database {self.get_database_path()} does not match the hashesDB schema.")
+
+		return schema_flag
+
 	def import_db(self, import_file_path_param, import_file_format_param):
 		"""
 		Description
@@ -220,13 +348,19 @@ class Db:
 			return False
 
 		#Get the names of the tables through the SQLAlchemy engine Inspector
-		tablenames_list = self.insp.get_table_names()
+		#Derived tables are not imported: their content is computed from the other tables by triggers while the data are imported
+		#The files and the hashes are imported through the FILE and the HASH views, after the hash functions they refer to
+		tablenames_list = self.exported_names()
 
 		#Check that the files required to complete the import exist inside the specified folder
+		#Tables that were added to the schema later are skipped if their file is missing, since older versions of hashesdb did not export them
 		files_in_folder = listdir(import_path)
-		for t in tablenames_list:
+		for t in list(tablenames_list):
 			table_filename = t + format_extension
 			if not table_filename in files_in_folder:
+				if t in Base.metadata.tables and Base.metadata.tables[t].info.get('since_version'):
+					tablenames_list.remove(t)
+					continue
 				print(f"Error: No file named {table_filename} found in {import_path}.")
 				print("Import failed")
 				return False
@@ -263,12 +397,55 @@ class Db:
 		print(f"Imported data from {import_file_path_param} to database {self.get_database_path()} successfully.")
 
 		self.db_session.commit()
+		self.load_hash_functions()
 
-	def stats(self):
+	def stats(self, recount_flag = False, autocommit_flag = False, storage_flag = False, scans_flag = False):
 		"""
 		Description
 		-----------
-		Prints statistics about this particular database.."""
+		Prints statistics about this particular database.
+		The counts are read from the STATISTICS table, which is kept up to date by triggers, so this does not scan the FILE_RECORD and the HASH_RECORD tables.
+
+		Parameters
+		-----------
+		recount_flag: boolean, optional
+			Default: False
+			If True, the statistics are recomputed from the FILE_RECORD and the HASH_RECORD tables (one pass over each table) and the STATISTICS table is rebuilt.
+
+		autocommit_flag: boolean, optional
+			Default: False
+			If True, the rebuilt STATISTICS table is commited before the function ends. Used when the stats subcommand is executed from the terminal.
+
+		storage_flag: boolean, optional
+			Default: False
+			If True, it also prints how many bytes the text values that are repeated on many rows of the FILE and the HASH views would take if they were stored on every row,
+			and an estimate of the bytes they take in the lookup tables, where each distinct value is stored once and referenced by an integer id.
+			Unlike the other statistics, this reads the whole FILE and HASH views.
+
+		scans_flag: boolean, optional
+			Default: False
+			If True, it also prints the performance of each scan that was measured (files, bytes, errors, duration, throughput and slowest stage),
+			as recorded in the SCAN_METRICS table."""
+
+		from prettytable import PrettyTable
+
+		try:
+			if recount_flag:
+				statistics = rebuild_statistics(self.db_session)
+			else:
+				statistics = {row.statistic_name: row.statistic_value for row in self.db_session.query(Statistic)}
+		except Exception as e:
+			self.db_session.rollback()
+			print("Error: a problem occured while trying to retrive the statistics of this database. In more detail:")
+			print(e)
+			return False
+
+		if recount_flag:
+			if autocommit_flag:
+				self.db_session.commit()
+				self.unsaved_changes_flag = False
+			else:
+				self.unsaved_changes_flag = True
 
 		print(f"Statistics of database {self.database_path}")
 
@@ -280,18 +457,16 @@ class Db:
 		stats_table.add_row([f"Memory size", f"{getsize(self.database_path)} bytes"])
 
 		#Get total number of hashes
-		hashes_query = self.db_session.query(Hash)
-		hashes_count = hashes_query.count()
+		hashes_count = statistics.get('hashes', 0)
 		stats_table.add_row(["Total number of hashes", f"{hashes_count} hashes"])
 
 		#Get total number of files
-		files_query = self.db_session.query(File)
-		files_count = files_query.count()
+		files_count = statistics.get('files', 0)
 		stats_table.add_row(["Total number of files", f"{files_count} files"])
 
 		#Get percentage of SoftwareHeritage-known files
 		# (no of known files/no of total files)*100 -> round so only two decimals remain -> convert to str -> concat a % symbol
-		swh_known_percentage = str(round((files_query.filter(File.swh_known.is_(False)).count()/files_count)*100, 2)) + "%"
+		swh_known_percentage = str(percentage(statistics.get('swh_known_files', 0), files_count)) + "%"
 		stats_table.add_row(["Percentage of SoftwareHeritage known files", swh_known_percentage])
 	
 		#Align PrettyTable that displays the statistics regarding the database and print it
@@ -303,10 +478,10 @@ class Db:
 		hash_table = PrettyTable()
 		hash_table.field_names = ["Hash Function", "Number of hashes", "Percentage of total hashes"]
 
-		#For each hash function, count the hashes that were produced from it and calculate the percentage of the total hashes
+		#For each hash function, get the number of hashes that were produced from it and calculate the percentage of the total hashes
 		for func_name in self.available_functions:
-			func_count = hashes_query.filter(Hash.hash_function_name == func_name).count()
-			func_percent = str(round((func_count/hashes_count)*100, 2)) + "%"
+			func_count = statistics.get('hashes:' + func_name, 0)
+			func_percent = str(percentage(func_count, hashes_count)) + "%"
 			hash_table.add_row([func_name, func_count, func_percent])
 
 		#Align PrettyTable that displays the statistics regarding the use of hash functions and print it
@@ -316,6 +491,50 @@ class Db:
 		hash_table.sortby = "Hash Function"
 		print(hash_table)
 
+		if storage_flag:
+			try:
+				repeated_text = compute_repeated_text(self.db_session)
+			except Exception as e:
+				self.db_session.rollback()
+				print("Error: a problem occured while trying to measure the storage of this database. In more detail:")
+				print(e)
+				return False
+
+			#Initialize PrettyTable that will display the storage taken by repeated text values
+			storage_table = PrettyTable()
+			storage_table.field_names = ["Column", "Values", "Distinct values", "Bytes if stored on every row", "Bytes interned (estimate)"]
+			for column_description, values_count, distinct_count, inline_bytes, interned_bytes in repeated_text:
+				storage_table.add_row([column_description, values_count, distinct_count, inline_bytes, interned_bytes])
+			storage_table.align["Column"] = "l"
+			print(storage_table)
+
+		if scans_flag:
+			try:
+				scans_metrics = read_scan_metrics(self.db_session)
+				scans = {row.scan_id: row for row in self.db_session.query(Scan).filter(Scan.scan_id.in_(list(scans_metrics)))}
+			except Exception as e:
+				self.db_session.rollback()
+				print("Error: a problem occured while trying to retrive the metrics of the scans of this database. In more detail:")
+				print(e)
+				return False
+
+			#Initialize PrettyTable that will display the performance of each scan
+			scans_table = PrettyTable()
+			scans_table.field_names = ["Scan", "Hostname", "Date", "Files", "Bytes", "Errors", "Seconds", "Files/s", "MB/s", "Slowest stage"]
+			for scan_id, scan_metrics in sorted(scans_metrics.items()):
+				scan_row = scans.get(scan_id)
+				seconds = scan_metrics.get('seconds', 0)
+				stages = [(name[len('seconds:'):], value) for name, value in scan_metrics.items() if name.startswith('seconds:')]
+				slowest_stage = max(stages, key = lambda stage: stage[1]) if stages else None
+				scans_table.add_row([scan_id, scan_row.scan_hostname if scan_row else None, scan_row.scan_date if scan_row else None,
+					int(scan_metrics.get('files', 0)), int(scan_metrics.get('bytes', 0)), int(scan_metrics.get('errors', 0)), round(seconds, 2),
+					rate(scan_metrics.get('files', 0), seconds), rate(scan_metrics.get('bytes', 0) / (1024 * 1024), seconds),
+					f"{slowest_stage[0]} ({percentage(slowest_stage[1], seconds)}%)" if slowest_stage else None])
+			scans_table.align = "r"
+			print(scans_table)
+
+		return True
+
 	def export(self, export_folder_path_param, export_file_format_param, overwrite_flag = False):
 		"""
 		Description
@@ -377,11 +596,11 @@ class Db:
 			return False
 
 		#Get the names of the tables through the SQLAlchemy engine Inspector
-		table_names_list = self.insp.get_table_names()
+		table_names_list = self.exported_names()
 
 		#For each table, select all the records and export them to an new file (that has the specified format)
+		#Derived tables are not exported, since they are computed from the other tables. The files and the hashes are exported through the FILE and the HASH views.
 		for table_name in table_names_list:
-
 			#Write and execute the SELECT query
 			select_query_string = f"SELECT * FROM {table_name}"
 			select_query = text(select_query_string)
@@ -416,7 +635,7 @@ class Db:
 
 		return True
 
-	def scan(self, scan_targets_parameter, hash_functions_parameter, download_location_parameter, autocommit_flag = False, recursion_flag_parameter = True):
+	def scan(self, scan_targets_parameter, hash_functions_parameter, download_location_parameter, autocommit_flag = False, recursion_flag_parameter = True, target_filter_parameter = None, jobs_parameter = 1, checkpoint_files_parameter = None, checkpoint_seconds_parameter = None, resume_scan_id_parameter = None, verbose_flag = False, estimate_flag = False, quick_flag = False):
 		"""
 		Description
 		-----------
@@ -442,6 +661,41 @@ class Db:
 			If this parameter is True, then we recursively scan the contents of all the directories.
 			Otherwise we do not scan the directories (we skip them).
 
+		target_filter_parameter: TargetFilter, optional
+			Default value: None (every local file is selected)
+			The include/exclude patterns, size limits and symlink policy according to which the local files are selected.
+
+		jobs_parameter: int, optional
+			Default value: 1
+			The number of threads that read and hash files at the same time.
+
+		checkpoint_files_parameter: int, optional
+			Default value: None
+			If given, the scan is committed after every checkpoint_files_parameter files, so that it can be resumed if it is interrupted.
+
+		checkpoint_seconds_parameter: int, optional
+			Default value: None
+			If given, the scan is committed every checkpoint_seconds_parameter seconds, so that it can be resumed if it is interrupted.
+			Checkpoints are made only when autocommit_flag is True.
+
+		resume_scan_id_parameter: int, optional
+			Default value: None
+			The id of an interrupted scan (whose return code is still 'Currently Scanning'). If given, that scan is continued
+			instead of starting a new one, and the local files that were already recorded for it are skipped.
+
+		verbose_flag: boolean, optional
+			Default value: False
+			If True, a message is printed for each scanned file. Otherwise only the progress of the scan is reported, at a fixed rate.
+
+		estimate_flag: boolean, optional
+			Default value: False
+			If True, nothing is scanned. The local targets are walked and the duration of the scan is predicted instead (see estimate_scan).
+
+		quick_flag: boolean, optional
+			Default value: False
+			If True, the scan is a triage scan: only the sampled hash functions among the given ones are calculated (quicksig if none is given)
+			and the SWHID is not calculated, so only a few samples of each file are read. The files can be completed later with the 'backfill' command.
+
 		autocommit_parameter: boolean, optional
 			Default: False
 			In case this flag is set to True, the changes will be commited to the before the function ends.
@@ -458,7 +712,23 @@ class Db:
 			return False
 		
 		valid_hash_functions_list = self.valid_hash_functions(hash_functions_parameter)
+
+		if quick_flag:
+			valid_hash_functions_list = self.quick_hash_functions(hash_functions_parameter, valid_hash_functions_list)
+			if not valid_hash_functions_list:
+				return False
+
+		if estimate_flag:
+			return self.estimate_scan(scan_targets_parameter, valid_hash_functions_list, recursion_flag_parameter, target_filter_parameter, jobs_parameter, quick_flag)
 		
+		#Checkpoints commit the scan, so they are made only when the scan is executed as a standalone command
+		checkpointer = None
+		if checkpoint_files_parameter or checkpoint_seconds_parameter:
+			if autocommit_flag:
+				checkpointer = Checkpointer(self.db_session, checkpoint_files_parameter, checkpoint_seconds_parameter)
+			else:
+				print("Warning: checkpoints are made only when scan is executed from the terminal. Use the 'save' command to commit this scan.")
+
 		#Retrive id of last scan from db_info
 		try:
 			db_info_row = self.db_session.query(DbInformation).one()
@@ -467,30 +737,63 @@ class Db:
 			print("Error: a problem occured while trying to start scanning this database. In more detail:")
 			print(e)
 			return False
+
+		if resume_scan_id_parameter is not None:
+			#A scan that was interrupted keeps the 'Currently Scanning' return code, since the return code is set when the scan finishes
+			resumed_scan_row = self.db_session.query(Scan).get(resume_scan_id_parameter)
+			if resumed_scan_row is None or resumed_scan_row.scan_return_code != 2:
+				print(f"Error: there is no interrupted scan with id {resume_scan_id_parameter} in this database.")
+				return False
+			new_scan_id = resume_scan_id_parameter
 		else:
 			#ID of new scan = ID of last scan + 1
 			new_scan_id = last_scan_id + 1
 
-		#Info that will be stored for the scan
-		new_scan_datetime = datetime.now()
-		new_scan_hostname = gethostname()
-		new_scan_code = 2 #Scan code for scans that are currently performed
+			#Info that will be stored for the scan
+			new_scan_datetime = datetime.now()
+			new_scan_hostname = gethostname()
+			new_scan_code = 2 #Scan code for scans that are currently performed
+
+			#Try to add the scan to the SCAN table
+			try:
+				self.db_session.add(Scan(scan_id = new_scan_id,scan_hostname = new_scan_hostname, scan_date = new_scan_datetime, scan_return_code = new_scan_code))
+				db_info_row.db_last_scan_id = new_scan_id
+				#The scan inserts its rows with SQL statements, so the new Scan must reach the database first
+				self.db_session.flush()
+			except Exception as e:
+				print("Error: a problem occured while trying to start scanning this database. In more detail:")
+				print(e)
+				return False
+
+		#The Scan is committed before its first file, so that it can be resumed even if no other checkpoint is made
+		if checkpointer is not None:
+			checkpointer.checkpoint()
 
-		#Try to add the scan to the SCAN table and perform the scan
+		#Perform the scan
+		progress = ProgressReporter(verbose_flag)
+		metrics = ScanMetrics()
+		scan_start = perf_counter()
 		try:
-			self.db_session.add(Scan(scan_id = new_scan_id,scan_hostname = new_scan_hostname, scan_date = new_scan_datetime, scan_return_code = new_scan_code))
-		except Exception as e:
-			print("Error: a problem occured while trying to start scanning this database. In more detail:")
-			print(e)
+			new_scan_result = scanner(self.db_session, scan_targets_parameter, valid_hash_functions_list, download_location_parameter, new_scan_id, recursion_flag_parameter, target_filter_parameter, jobs_parameter, checkpointer, resume_scan_id_parameter is not None, progress, metrics, not quick_flag)
+		except KeyboardInterrupt:
+			if checkpointer is None:
+				raise
+			#Discard the file that was being written, the files up to the last checkpoint are kept
+			self.db_session.rollback()
+			progress.message(f"The scan was interrupted. You can resume it with: scan --resume {new_scan_id}")
 			return False
-		else:
-			new_scan_result = scanner(self.db_session, scan_targets_parameter, valid_hash_functions_list, download_location_parameter, new_scan_id, recursion_flag_parameter)
-			
-			db_info_row.db_last_scan_id = new_scan_id
-			db_info_row.db_date_modified = datetime.now()
-			new_scan_row = self.db_session.query(Scan).get(new_scan_id)
-			new_scan_row.scan_return_code = new_scan_result
-			self.db_session.flush()
+		finally:
+			progress.finish()
+
+		#Record the performance of the scan
+		scan_counters = progress.counters()
+		scan_counters['seconds'] = perf_counter() - scan_start
+		insert_scan_metrics(self.db_session, new_scan_id, scan_counters, metrics)
+
+		db_info_row.db_date_modified = datetime.now()
+		new_scan_row = self.db_session.query(Scan).get(new_scan_id)
+		new_scan_row.scan_return_code = new_scan_result
+		self.db_session.flush()
 
 		if autocommit_flag:
 			self.db_session.commit()
@@ -498,13 +801,150 @@ class Db:
 		else:
 			self.unsaved_changes_flag = True
 
-	def search(self, hash_parameter, filename_parameter, output_path_parameter = sys.stdout):
+	def quick_hash_functions(self, hash_functions_parameter, valid_hash_functions_list):
 		"""
 		Description
 		-----------
-		Constructs a SQLAlchemy Query object by querying the 'File' table and appling filters.
-		Converts the Query object to a string containing a SQL query and executes the aforementioned query.
-		Outputs the results.
+		Selects the hash functions of a quick (triage) scan: the sampled hash functions, which read only a few samples of each file.
+		The other requested hash functions (and SWHID) are not calculated, which is reported together with the command that adds them later.
+
+		Parameters
+		-----------
+		hash_functions_parameter: list of strings
+			The hash functions given to the scan command (None if no hash function was given)
+
+		valid_hash_functions_list: list of strings
+			The available hash functions among them, as returned by valid_hash_functions()
+
+		Results
+		-----------
+		Returns the list of the sampled hash functions that will be calculated. It is empty (and an error is printed) if there is none.
+		"""
+
+		if not hash_functions_parameter:
+			valid_hash_functions_list = [QUICK_SCAN_HASH_FUNCTION] if QUICK_SCAN_HASH_FUNCTION in self.available_functions else []
+
+		sampled_functions = [hash_func for hash_func in valid_hash_functions_list if get_hash_function(hash_func).sampler is not None]
+		skipped_functions = ['swhid'] + [hash_func for hash_func in valid_hash_functions_list if hash_func not in sampled_functions]
+
+		if not sampled_functions:
+			print("Error: scan --quick calculates only sampled hash functions (e.g. quicksig), but none of the given hash functions is sampled.")
+			return []
+
+		print(f"Quick scan: {', '.join(skipped_functions)} will not be calculated. You can add them later with: backfill -c {' '.join(skipped_functions)}")
+		return sampled_functions
+
+	def estimate_scan(self, scan_targets_parameter, hash_functions_parameter, recursion_flag_parameter = True, target_filter_parameter = None, jobs_parameter = 1, quick_flag = False):
+		"""
+		Description
+		-----------
+		Implementetion of 'scan --estimate'. Walks the local scan targets without reading them and predicts the duration of their scan on this host:
+			-reading and hashing the files, from the throughput of each hash function stored by the 'calibrate' command and the reading speed of the previous scans
+			-writing the files to the database and looking their SWHIDs up, from the time the previous scans on this host spent per file (SCAN_METRICS table)
+		Hash functions that were not calibrated on this host are measured briefly on the spot. Remote targets are not included in the estimate.
+
+		Parameters
+		-----------
+		scan_targets_parameter: a list of lists of scan targets(strings)
+			List 1: a list of local scan targets (files and directories)
+			List 2: a list of Github repos
+			List 3: a list of Gitlab project ids
+
+		hash_functions_parameter: list of hash function names(strings)
+			The hash functions that the scan will calculate, apart from SWHID which is always calculated
+
+		recursion_flag_parameter: boolean, optional
+			Default value: True
+			If this parameter is True, then the contents of all the directories are walked recursively.
+
+		target_filter_parameter: TargetFilter, optional
+			Default value: None (every local file is selected)
+			The criteria according to which the local files are selected.
+
+		jobs_parameter: int, optional
+			Default value: 1
+			The number of threads that the scan will use to read and hash files.
+
+		quick_flag: boolean, optional
+			Default value: False
+			If True, the estimate is for a quick scan, which reads only samples of each file and does not calculate or look up SWHIDs.
+
+		Results
+		-----------
+		Returns a dictionary with the estimated seconds of each stage ('hash', 'write') and of the whole scan ('total').
+		"""
+
+		hostname = gethostname()
+
+		#Walk the local targets, as the scan would
+		file_count = 0
+		total_bytes = 0
+		largest_file_size = 0
+		walk_start = perf_counter()
+		for target in walk_local_targets(scan_targets_parameter[0] or [], hostname, recursion_flag_parameter, target_filter_parameter):
+			file_count += 1
+			if target.stat_result is not None:
+				total_bytes += target.stat_result.st_size
+				largest_file_size = max(largest_file_size, target.stat_result.st_size)
+		walk_seconds = perf_counter() - walk_start
+
+		#Throughput of each hash function on this host. Sampled hash functions read a few fixed samples of each file, so their time is not counted.
+		#A quick scan calculates only sampled hash functions, so it reads (almost) nothing but the directories
+		hash_function_names = ([] if quick_flag else ['swhid']) + [hash_func for hash_func in hash_functions_parameter if hash_func != 'swhid' and get_hash_function(hash_func).sampler is None]
+		throughputs = {}
+		for row in self.db_session.query(HashFunctionThroughput).filter(HashFunctionThroughput.hostname == hostname, HashFunctionThroughput.hash_function_name.in_(hash_function_names)):
+			throughputs[row.hash_function_name] = row.mb_per_second
+
+		uncalibrated_functions = [hash_func for hash_func in hash_function_names if hash_func not in throughputs]
+		for hash_func in uncalibrated_functions:
+			try:
+				throughputs[hash_func] = measure_throughput(hash_func, QUICK_CALIBRATION_SECONDS)
+			except Exception as e:
+				print(f"Error: hash function {hash_func} could not be measured, it is not included in the estimate. In more detail:")
+				print(e)
+
+		#Reading and writing speed of the previous scans on this host
+		read_seconds = write_seconds = history_files = history_bytes = 0
+		history_scans_count = 0
+		host_scan_ids = [row.scan_id for row in self.db_session.query(Scan.scan_id).filter(Scan.scan_hostname == hostname)]
+		for scan_metrics in read_scan_metrics(self.db_session, host_scan_ids).values():
+			if not scan_metrics.get('files'):
+				continue
+			history_scans_count += 1
+			history_files += scan_metrics['files']
+			history_bytes += scan_metrics.get('bytes', 0)
+			read_seconds += scan_metrics.get('seconds:read', 0)
+			write_seconds += scan_metrics.get('seconds:write', 0) + (0 if quick_flag else scan_metrics.get('seconds:swh_lookup', 0))
+
+		read_seconds_per_byte = read_seconds / history_bytes if history_bytes and not quick_flag else 0.0
+		write_seconds_per_file = write_seconds / history_files if history_files else 0.0
+
+		estimate = estimate_scan_seconds(file_count, total_bytes, largest_file_size, throughputs, jobs_parameter, read_seconds_per_byte, write_seconds_per_file)
+
+		#Print the estimate
+		print(f"Estimate for {file_count} files ({total_bytes / MB:.1f} MiB, largest file {largest_file_size / MB:.1f} MiB) with {jobs_parameter} jobs:")
+		print(f"\tWalk: {format_duration(walk_seconds)} (measured while estimating)")
+		throughputs_text = ', '.join(f"{hash_func} {throughputs[hash_func]:.1f} MB/s{'*' if hash_func in uncalibrated_functions else ''}" for hash_func in hash_function_names if hash_func in throughputs)
+		print(f"\tRead and hash: {format_duration(estimate['hash'])} ({throughputs_text})")
+		if history_scans_count:
+			print(f"\tWrite and SWH lookup: {format_duration(estimate['write'])} ({write_seconds_per_file * 1000:.1f} ms per file, measured by {history_scans_count} previous scans on this host)")
+		else:
+			print("\tWrite and SWH lookup: not estimated (no previous scan on this host was measured), the estimate includes hashing only")
+		print(f"Estimated duration: {format_duration(estimate['total'])}")
+
+		if uncalibrated_functions:
+			print(f"* not calibrated on this host, measured now for {QUICK_CALIBRATION_SECONDS} seconds. Use the 'calibrate' command to store a more accurate measurement.")
+		if scan_targets_parameter[1] or scan_targets_parameter[2]:
+			print("Remote targets (Github and Gitlab repositories) are not included in the estimate, since their files are known only after they are downloaded.")
+
+		return estimate
+
+	def search(self, hash_parameter, filename_parameter, output_path_parameter = sys.stdout, hash_function_parameter = None):
+		"""
+		Description
+		-----------
+		Constructs a SQLAlchemy select() statement that joins the 'File' and the 'Hash' tables and applies the search criteria as filters.
+		Executes the statement with bound parameters and streams the results to the output.
 
 		Parameters
 		-----------
@@ -518,25 +958,33 @@ class Db:
 			Default: sys.stdout
 			This is a path to a file, where the output will be printed/saved.
 			Supported file formats: TXT, CSV, TSV, JSON, YAML, XML
-		"""
-
-		#If you have two search criteria use two filters. If you have one search criterion, use only that. If you do not have search criteria, do not use filters.
-		if hash_parameter and filename_parameter:
-			search_query = self.db_session.query(File).outerjoin(Hash).filter(Hash.hash_value.in_(hash_parameter), File.file_name.in_(filename_parameter)).add_columns(Hash.hash_value, Hash.hash_function_name)
-		elif hash_parameter:
-			search_query = self.db_session.query(File).outerjoin(Hash).filter(Hash.hash_value.in_(hash_parameter)).add_columns(Hash.hash_value, Hash.hash_function_name)
-		elif filename_parameter:
-			search_query = self.db_session.query(File).outerjoin(Hash).filter(File.file_name.in_(filename_parameter)).add_columns(Hash.hash_value, Hash.hash_function_name)
-		else:
-			search_query = self.db_session.query(File).outerjoin(Hash).add_columns(Hash.hash_value, Hash.hash_function_name)
 
-		#search_query_text is a SQL query (string).To understand the following line, read the docs here:
-		#https://docs.sqlalchemy.org/en/14/faq/sqlexpressions.html#how-do-i-render-sql-expressions-as-strings-possibly-with-bound-parameters-inlined
-		search_query_text = str(search_query.statement.compile(compile_kwargs={"literal_binds": True}))
+		hash_function_parameter: list of string, optional
+			Default: None
+			If given, only the hashes of these hash functions are searched and returned
+		"""
 
-		#Try to execute the equivelant sql query
+		search_statement = hash_function_filter(file_hash_select(File.__table__.outerjoin(Hash.__table__, Hash.file_id == File.id)), hash_function_parameter, self.hash_function_ids)
+
+		#The search criteria are passed as expanding bound parameters, so the statement is compiled once and cached.
+		#Long lists of criteria are split in chunks that respect the SQLite limit on the number of variables of a statement.
+		#If you have two search criteria use both of them. If you have one search criterion, use only that. If you do not have search criteria, do not use filters.
+		hash_chunks = split_in_chunks(hash_parameter, SQLITE_MAX_VARIABLES // 2) if hash_parameter else [None]
+		filename_chunks = split_in_chunks(filename_parameter, SQLITE_MAX_VARIABLES // 2) if filename_parameter else [None]
+
+		def execute_chunks():
+			for hash_chunk in hash_chunks:
+				for filename_chunk in filename_chunks:
+					chunk_statement = search_statement
+					if hash_chunk is not None:
+						chunk_statement = chunk_statement.where(Hash.hash_value.in_(hash_chunk))
+					if filename_chunk is not None:
+						chunk_statement = chunk_statement.where(File.file_name.in_(filename_chunk))
+					yield self.db_session.execute(chunk_statement)
+
+		#Try to execute the query. The results of the chunks are streamed to output() one after the other.
 		try:
-			search_results = self.db_session.execute(search_query_text)
+			output(ChainedResults(execute_chunks()), output_path_parameter)
 		except Exception as e:
 			#If the query can't be executed, cancel the execution and print an error message
 			#We use rollback to avoid database disconnection
@@ -544,16 +992,115 @@ class Db:
 			print("Error: an error occurred while searching the database. In more detail:")
 			print(e)
 		else:
-			output(search_results, output_path_parameter)
-			if output_path_parameter == sys.stdout:
+			if not isinstance(output_path_parameter, str):
 				print("Note: if the results do not fit in your screen, use the --output argument to print them in a new file")
-		
-	def sql_query(self, sql_query_string_parameter, output_path_parameter = sys.stdout, autocommit_flag = False):
+
+	def batch_search(self, hash_values_parameter, filename_parameter = None, output_path_parameter = sys.stdout, hash_function_parameter = None):
+		"""
+		Description
+		-----------
+		Searches the database for a (possibly very large) collection of hash values, for example a list of IOC hashes.
+		The hash values are loaded in chunks into a temporary table, which is then joined with the 'HASH' and the 'FILE' tables in a single query.
+		Outputs the results.
+
+		Parameters
+		-----------
+		hash_values_parameter: iterable of string
+			The hash values which will be used as search criteria. It can be any iterable, for example a generator returned by read_hash_file().
+
+		filename_parameter: list of string, optional
+			This is a list of filenames which will be used as additional search criteria
+
+		output_path_parameter: string
+			Default: sys.stdout
+			This is a path to a file, where the output will be printed/saved.
+			Supported file formats: TXT, CSV, TSV, JSON, YAML, XML
+
+		hash_function_parameter: list of string, optional
+			Default: None
+			If given, only the hashes of these hash functions are searched and returned
+
+		Results
+		-----------
+		Returns True if the search was completed, False otherwise.
+		"""
+
+		#The temporary table lives in the connection of the session, so the search also sees changes that are not saved yet
+		connection = self.db_session.connection()
+		lookup_table = table(BATCH_SEARCH_TABLE, column('hash_value'))
+
+		try:
+			self.load_batch_search_table(connection, hash_values_parameter)
+
+			search_statement = file_hash_select(File.__table__.join(Hash.__table__, Hash.file_id == File.id).join(lookup_table, lookup_table.c.hash_value == Hash.hash_value))
+			if filename_parameter:
+				search_statement = search_statement.where(File.file_name.in_(filename_parameter))
+			search_statement = hash_function_filter(search_statement, hash_function_parameter, self.hash_function_ids)
+
+			search_results = connection.execute(search_statement)
+			output(search_results, output_path_parameter)
+		except Exception as e:
+			print("Error: an error occurred while searching the database. In more detail:")
+			print(e)
+			return False
+		finally:
+			self.drop_batch_search_table(connection)
+
+		if not isinstance(output_path_parameter, str):
+			print("Note: if the results do not fit in your screen, use the --output argument to print them in a new file")
+		return True
+
+	def load_batch_search_table(self, connection_parameter, hash_values_parameter):
+		"""
+		Description
+		-----------
+		Creates the temporary table used by batch searches and inserts the given hash values in it, in chunks.
+
+		Parameters
+		-----------
+		connection_parameter: SQLAlchemy connection object
+			The connection of the session. Temporary tables are only visible to the connection that created them.
+
+		hash_values_parameter: iterable of string
+			The hash values. They are consumed one chunk at a time, so the whole collection never has to be held in memory.
+
+		Results
+		-----------
+		Returns the number of hash values that were read."""
+
+		connection_parameter.exec_driver_sql(f"CREATE TEMP TABLE IF NOT EXISTS {BATCH_SEARCH_TABLE} (hash_value TEXT PRIMARY KEY)")
+		connection_parameter.exec_driver_sql(f"DELETE FROM {BATCH_SEARCH_TABLE}")
+
+		insert_statement = f"INSERT OR IGNORE INTO {BATCH_SEARCH_TABLE} (hash_value) VALUES (?)"
+		values_count = 0
+		chunk = []
+		for hash_value in hash_values_parameter:
+			chunk.append((hash_value,))
+			values_count += 1
+			if len(chunk) == BATCH_SEARCH_CHUNK_SIZE:
+				connection_parameter.exec_driver_sql(insert_statement, chunk)
+				chunk = []
+		if chunk:
+			connection_parameter.exec_driver_sql(insert_statement, chunk)
+
+		return values_count
+
+	def drop_batch_search_table(self, connection_parameter):
+		self.drop_temporary_table(connection_parameter, BATCH_SEARCH_TABLE)
+
+	def drop_temporary_table(self, connection_parameter, table_name):
+		#Drop the temporary table without touching the rest of the transaction (unsaved changes are kept)
+		try:
+			connection_parameter.exec_driver_sql(f"DROP TABLE IF EXISTS {table_name}")
+		except Exception:
+			pass
+
+	def sql_query(self, sql_query_string_parameter, output_path_parameter = sys.stdout, autocommit_flag = False, explain_flag = False):
 		"""
 		Description
 		-----------
 		Checks that the SQL query is either a SELECT or a DELETE query.
-		Executes the SQL statement.
+		Executes the SQL statement, or prints the query plan of each statement if explain_flag is True.
 		
 		Parameters
 		-----------
@@ -574,8 +1121,15 @@ class Db:
 			IMPORTANT NOTE: this flag is supposed to be set to True only when this method is called in order to execute a standalone command.
 			If you set this parameter ro True when you execute a sql command from the REPL, it is possible that changes made before the execution
 			of the SQL query will be commited too.			
+
+		explain_flag: boolean, optional
+			Default: False
+			If True, the query is not executed. Instead, the plan that SQLite chose for each statement (EXPLAIN QUERY PLAN) is printed,
+			which shows the tables that are read with a full scan (SCAN) and the indexes that are used (SEARCH ... USING INDEX).
 		"""
 
+		import sqlparse
+
 		#This flag is True if the SQL query is a 'SELECT' query and False if it is a 'DELETE' query
 		select_query_flag = True
 
@@ -591,6 +1145,9 @@ class Db:
 					#Not 'SELECT' but 'DELETE', so set flag to false
 					select_query_flag = False
 
+		if explain_flag:
+			return self.explain_query_plan(statements)
+
 		#Convert the string to a SQLAlchemyORM TextClause in order to execute it
 		sql_text = text(sql_query_string_parameter)  
 
@@ -613,51 +1170,430 @@ class Db:
 			else:
 				self.unsaved_changes_flag = True
 
-	def hash_functions(self, details_flag = False):
+	def explain_query_plan(self, statements_parameter):
 		"""
 		Description
 		-----------
-		Prints the HASH_FUNCTION table, which contains information about the available hash functions.
-		The function gets all the rows of the HASH_FUNCTION table and 
+		Prints the query plan of each of the given statements, as a tree like the one the sqlite3 shell prints. The statements are not executed.
 
 		Parameters
 		-----------
-		details_flag: boolean, optional
-			Default value: False
-			If this parameter is True, then we print the whole HASJ_FUNCTION table of the specified database (function name, hash value size, fuzzy flag).
-			Otherwise we only print the names of the available hash functions.
+		statements_parameter: list of sqlparse statements
+			The statements of the query, as returned by sqlparse.parse()
 		"""
 
-		#Try to obtain data from the HASH_FUNCTION table
-		try:
-			hash_function_fetch = self.db_session.query(HashFunction).all()
-		except Exception as e:
-			print("Error: a problem occured while trying to retrive information about this database. In more detail:")
-			print(e)
-		else:
-			print("Available hash functions:")
-			#If you successfully obtain info about the hash function name, print them
-			#If the details_flag is True, then print all the info you obtained from the HASH_FUNCTION table. Otherwise, print the names only.
-			if details_flag:
-				#Define a PrettyTable and set the headers
-				hash_function_results_table = PrettyTable()
-				hash_function_results_table.field_names = ["Hash function name", "Hash Value size(bits)", "Fuzzy Hash Function"]
+		for statement in statements_parameter:
+			statement_string = str(statement).strip().rstrip(';')
+			if not statement_string:
+				continue
 
-				#Add a row to the PrettyTable for each hash function
-				for row in hash_function_fetch:
-					hash_function_results_table.add_row([row.hash_function_name,row.hash_function_size,row.hash_function_fuzzy_flag])
-		
-				#Print the PrettyTable
-				print(hash_function_results_table)
-			else:
-				#Print the names of the hash functions
-				print(*[row.hash_function_name for row in hash_function_fetch], sep = ', ')
+			#The statement is passed to the driver as it is, like the statements of the sql command are passed to SQLite as they are
+			try:
+				plan_rows = self.db_session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement_string}").fetchall()
+			except Exception as e:
+				self.db_session.rollback()
+				print("Error: an error occurred while explaining the SQL query. In more detail:")
+				print(e)
+				return False
 
-	def hash_is_available(self, hash_function_parameter):
+			print(statement_string)
+			for line in query_plan_lines(plan_rows):
+				print(line)
+
+	def index_hash_functions(self, hash_functions_parameter, drop_flag = False, autocommit_flag = False):
 		"""
 		Description
 		-----------
-		Checks if the given hash function is included in the HASH_FUNCTION table.
+		Creates a partial index on the HASH_RECORD table for each of the given hash functions (or drops it, if drop_flag is True).
+		Each index contains only the hash values of one hash function and the ids of their files, so a search that is restricted to that hash function
+		(search --function) looks the hash values up in an index whose size depends only on the number of hashes of this function, instead of the index
+		of all the hash values. The index is not covering: the matching HASH_RECORD rows are still read (SEARCH HASH_RECORD USING INDEX in sql --explain).
+
+		Parameters
+		-----------
+		hash_functions_parameter: list of string
+			The names of the hash functions
+
+		drop_flag: boolean, optional
+			Default: False
+			If True, the indexes of the given hash functions are dropped instead of created
+
+		autocommit_flag: boolean, optional
+			Default: False
+			If True, the changes are commited before the function ends. Used when the hash-index subcommand is executed from the terminal.
+
+		Results
+		-----------
+		Returns True if all the indexes were created (or dropped), False otherwise.
+		"""
+
+		all_done = True
+		for func_name in hash_functions_parameter:
+			#The name of the hash function becomes part of the statement, so only the names of the HASH_FUNCTION table are accepted
+			if func_name not in self.available_functions or not func_name.isidentifier():
+				print(f"Error: {func_name} is not an available hash function.")
+				all_done = False
+				continue
+
+			index_name = HASH_FUNCTION_INDEX_PREFIX + func_name
+			try:
+				if drop_flag:
+					self.db_session.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+				else:
+					self.db_session.execute(text(hash_function_index_statement(func_name, self.hash_function_ids[func_name])))
+			except Exception as e:
+				self.db_session.rollback()
+				print(f"Error: a problem occured while trying to {'drop' if drop_flag else 'create'} the index of {func_name}. In more detail:")
+				print(e)
+				return False
+			else:
+				print(f"{'Dropped' if drop_flag else 'Created'} the index of hash function {func_name}.")
+
+		if autocommit_flag:
+			self.db_session.commit()
+			self.unsaved_changes_flag = False
+		else:
+			self.unsaved_changes_flag = True
+
+		return all_done
+
+	def indexed_hash_functions(self):
+		"""
+		Description
+		-----------
+		Returns the set of the names of the hash functions that have an index created by index_hash_functions()."""
+
+		index_names = self.db_session.execute(text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table_name"), {'table_name': Hash.__tablename__}).scalars()
+		return {name[len(HASH_FUNCTION_INDEX_PREFIX):] for name in index_names if name.startswith(HASH_FUNCTION_INDEX_PREFIX)}
+
+	def hash_functions(self, details_flag = False):
+		"""
+		Description
+		-----------
+		Prints the HASH_FUNCTION table, which contains information about the available hash functions.
+		The function gets all the rows of the HASH_FUNCTION table and 
+
+		Parameters
+		-----------
+		details_flag: boolean, optional
+			Default value: False
+			If this parameter is True, then we print the whole HASJ_FUNCTION table of the specified database (function name, hash value size, fuzzy flag)
+			and whether each hash function has an index created by the 'hash-index' command.
+			Otherwise we only print the names of the available hash functions.
+		"""
+
+		#Try to obtain data from the HASH_FUNCTION table
+		try:
+			hash_function_fetch = self.db_session.query(HashFunction).all()
+		except Exception as e:
+			print("Error: a problem occured while trying to retrive information about this database. In more detail:")
+			print(e)
+		else:
+			print("Available hash functions:")
+			#If you successfully obtain info about the hash function name, print them
+			#If the details_flag is True, then print all the info you obtained from the HASH_FUNCTION table. Otherwise, print the names only.
+			if details_flag:
+				from prettytable import PrettyTable
+
+				#Define a PrettyTable and set the headers
+				hash_function_results_table = PrettyTable()
+				hash_function_results_table.field_names = ["Hash function name", "Hash Value size(bits)", "Fuzzy Hash Function", "Indexed", "MB/s on this host"]
+
+				#Add a row to the PrettyTable for each hash function
+				indexed_functions = self.indexed_hash_functions()
+				throughputs = self.calibrated_throughputs()
+				for row in hash_function_fetch:
+					throughput = round(throughputs[row.hash_function_name], 1) if row.hash_function_name in throughputs else '-'
+					hash_function_results_table.add_row([row.hash_function_name,row.hash_function_size,row.hash_function_fuzzy_flag,row.hash_function_name in indexed_functions,throughput])
+		
+				#Print the PrettyTable
+				print(hash_function_results_table)
+			else:
+				#Print the names of the hash functions
+				print(*[row.hash_function_name for row in hash_function_fetch], sep = ', ')
+
+	def calibrate(self, hash_functions_parameter = None, seconds_parameter = CALIBRATION_SECONDS, autocommit_flag = False):
+		"""
+		Description
+		-----------
+		Implementetion of the 'calibrate' command.
+		Measures the throughput of hash functions on this host and stores it in the HASH_FUNCTION_THROUGHPUT table, where 'scan --estimate'
+		and 'hash-functions --details' find it. A previous measurement of the same hash function on the same host is replaced.
+
+		Parameters
+		-----------
+		hash_functions_parameter: list of strings, optional
+			Default: None (every hash function of the HASH_FUNCTION table, including SWHID, is measured)
+			The names of the hash functions that will be measured. Sampled hash functions (e.g. quicksig) read a fixed number of bytes of each file
+			whatever its size, so they are not measured.
+
+		seconds_parameter: float, optional
+			Default: CALIBRATION_SECONDS
+			The duration of the measurement of each hash function
+
+		autocommit_flag: boolean, optional
+			Default: False
+			If True, the changes are commited. Supposed to be set to True only for the standalone calibrate command.
+
+		Results
+		-----------
+		Returns a dictionary that maps the names of the measured hash functions to their throughput in MB per second, or False if nothing could be measured.
+		"""
+
+		if hash_functions_parameter:
+			hash_function_names = []
+			for hash_func in dict.fromkeys(hash_functions_parameter):
+				if hash_func not in self.available_functions:
+					print(f"Error: {hash_func} is not an available hash function.")
+				elif get_hash_function(hash_func).sampler is not None:
+					print(f"{hash_func} reads a fixed number of bytes of each file, so its throughput is not measured.")
+				else:
+					hash_function_names.append(hash_func)
+		else:
+			hash_function_names = [hash_func for hash_func in sorted(self.available_functions) if get_hash_function(hash_func).sampler is None]
+
+		hostname = gethostname()
+		throughputs = {}
+		for hash_func in hash_function_names:
+			print(f"Calibrating {hash_func}...")
+			try:
+				throughputs[hash_func] = measure_throughput(hash_func, seconds_parameter)
+			except Exception as e:
+				print(f"Error: hash function {hash_func} could not be measured. In more detail:")
+				print(e)
+				continue
+			self.db_session.merge(HashFunctionThroughput(hash_function_name = hash_func, hostname = hostname, mb_per_second = throughputs[hash_func], calibration_date = datetime.now()))
+
+		if not throughputs:
+			return False
+
+		from prettytable import PrettyTable
+
+		calibration_table = PrettyTable()
+		calibration_table.field_names = ["Hash function name", f"MB/s on {hostname}"]
+		calibration_table.align = 'r'
+		for hash_func, mb_per_second in sorted(throughputs.items(), key = lambda item: -item[1]):
+			calibration_table.add_row([hash_func, round(mb_per_second, 1)])
+		print(calibration_table)
+
+		self.db_session.flush()
+		if autocommit_flag:
+			self.db_session.commit()
+			self.unsaved_changes_flag = False
+		else:
+			self.unsaved_changes_flag = True
+
+		return throughputs
+
+	def backfill(self, hash_functions_parameter, scope_parameter = 'all', jobs_parameter = 1, verbose_flag = False, autocommit_flag = False):
+		"""
+		Description
+		-----------
+		Implementetion of the 'backfill' command.
+		Calculates the hash values that the files of the database miss, for hash functions that were not calculated when the files were scanned,
+		without scanning them again: no FILE record is added and the hash values the files already have are not calculated again.
+		The current FILE records (updated = True) of the scope that miss a hash value of one of the hash functions are found with one query per hash function
+		and stored in a temporary table. Each of these files is read once, using up to jobs_parameter threads, if it is still present and unchanged
+		(same size and modification date as when it was scanned), and only its missing HASH records are inserted.
+		Files scanned on another host are skipped, since their paths refer to the file system of that host.
+
+		Parameters
+		-----------
+		hash_functions_parameter: list of strings
+			The names of the hash functions whose hash values will be calculated (including 'swhid')
+
+		scope_parameter: string, optional
+			Default: 'all'
+			The files that are backfilled: 'all' for every file of the database, a scan id for the files of that scan,
+			or an origin (a hostname or a URL) for the files of that origin
+
+		jobs_parameter: int, optional
+			Default: 1
+			The number of threads that read files at the same time
+
+		verbose_flag: boolean, optional
+			Default: False
+			If True, a message is printed for each skipped file. Otherwise only the progress and a summary are printed.
+
+		autocommit_flag: boolean, optional
+			Default: False
+			If True, the changes are commited. Supposed to be set to True only for the standalone backfill command.
+
+		Results
+		-----------
+		Returns a dictionary with the number of files that missed hash values ('files'), that were hashed ('hashed'), that were skipped ('missing', 'changed',
+		'other_host'), that could not be read ('errors') and the number of HASH records that were inserted ('hashes'), or False if the backfill failed.
+		"""
+
+		hash_function_names = []
+		for hash_func in dict.fromkeys(hash_functions_parameter or []):
+			if hash_func in self.available_functions:
+				hash_function_names.append(hash_func)
+			else:
+				print(f"Error: {hash_func} is not an available hash function.")
+		if not hash_function_names:
+			print("You should specify some available hash functions to be calculated. Use the 'hash-functions' command to see the available hash functions.")
+			return False
+
+		#The scope is a scan id, an origin or every file
+		scope_filter = File.updated == True
+		if scope_parameter is not None and scope_parameter != 'all':
+			if str(scope_parameter).isdigit():
+				scope_filter = scope_filter & (File.scan_id == int(scope_parameter))
+			else:
+				scope_filter = scope_filter & File.origin_id.in_(select(Origin.origin_id).where(Origin.origin_name == scope_parameter))
+
+		connection = self.db_session.connection()
+		backfill_table = table(BACKFILL_TABLE, column('file_id'), column('hash_function_name'))
+		counts = {'files': 0, 'hashed': 0, 'missing': 0, 'changed': 0, 'other_host': 0, 'errors': 0, 'hashes': 0}
+
+		try:
+			connection.exec_driver_sql(f"CREATE TEMP TABLE IF NOT EXISTS {BACKFILL_TABLE} (file_id INTEGER, hash_function_name TEXT, PRIMARY KEY (file_id, hash_function_name))")
+			connection.exec_driver_sql(f"DELETE FROM {BACKFILL_TABLE}")
+
+			#A single pass over the HASH_RECORD table per hash function (it uses the hash-index of the hash function, if there is one)
+			for hash_func in hash_function_names:
+				files_with_hash = hash_function_filter(select(Hash.file_id), [hash_func], self.hash_function_ids).where(Hash.file_id.is_not(None))
+				files_without_hash = select(File.id, literal(hash_func)).where(scope_filter, File.id.not_in(files_with_hash))
+				connection.execute(insert(backfill_table).from_select(['file_id', 'hash_function_name'], files_without_hash))
+
+			counts['files'] = connection.execute(select(func.count(backfill_table.c.file_id.distinct()))).scalar()
+			progress = ProgressReporter(verbose_flag, counts['files'])
+			try:
+				self.backfill_files(connection, backfill_table, jobs_parameter, progress, counts)
+			finally:
+				progress.finish()
+		except Exception as e:
+			self.db_session.rollback()
+			print("Error: an error occurred while backfilling the database. In more detail:")
+			print(e)
+			return False
+		finally:
+			self.drop_temporary_table(connection, BACKFILL_TABLE)
+
+		print(f"Backfill of {', '.join(hash_function_names)} (scope: {scope_parameter}): {counts['files']} files missed hash values")
+		print(f"\t{counts['hashed']} files were hashed and {counts['hashes']} hash values were inserted")
+		print(f"\t{counts['missing']} files were skipped because they do not exist any more")
+		print(f"\t{counts['changed']} files were skipped because they changed since they were scanned")
+		print(f"\t{counts['other_host']} files were skipped because they were scanned on another host")
+		print(f"\t{counts['errors']} files could not be read")
+
+		if counts['hashes']:
+			self.db_session.query(DbInformation).one().db_date_modified = datetime.now()
+			self.db_session.flush()
+			if autocommit_flag:
+				self.db_session.commit()
+				self.unsaved_changes_flag = False
+			else:
+				self.unsaved_changes_flag = True
+
+		return counts
+
+	def backfill_files(self, connection_parameter, backfill_table, jobs_parameter, progress, counts):
+		"""
+		Description
+		-----------
+		Reads the files of the temporary table of the backfill page by page (in the order of their ids), hashes them in parallel and inserts their missing HASH records.
+		The counters of counts are updated.
+
+		Parameters
+		-----------
+		connection_parameter: SQLAlchemy connection object
+			The connection of the session, which has the temporary table
+
+		backfill_table: SQLAlchemy TableClause
+			The temporary table (file_id, hash_function_name)
+
+		jobs_parameter: int
+			The number of threads that read files at the same time
+
+		progress: ProgressReporter
+			The reporter that is notified after each file
+
+		counts: dictionary
+			The counters of Db.backfill
+		"""
+
+		hostname = gethostname()
+		file_columns = {c.name: c for c in file_view_columns()}
+		last_file_id = None
+
+		while True:
+			page_ids = select(backfill_table.c.file_id).distinct().order_by(backfill_table.c.file_id).limit(BACKFILL_PAGE_SIZE)
+			if last_file_id is not None:
+				page_ids = page_ids.where(backfill_table.c.file_id > last_file_id)
+			page_ids = connection_parameter.execute(page_ids).scalars().all()
+			if not page_ids:
+				return
+			last_file_id = page_ids[-1]
+
+			#The missing hash functions of each file of the page
+			page_statement = select(File.id, file_columns['file_path'], File.file_size, File.date_modified, file_columns['origin'], backfill_table.c.hash_function_name).select_from(file_view_join(File.__table__.join(backfill_table, backfill_table.c.file_id == File.id))).where(backfill_table.c.file_id.between(page_ids[0], page_ids[-1])).order_by(File.id)
+			page_files = {}
+			for file_id, file_path, file_size, date_modified, origin, hash_func in connection_parameter.execute(page_statement):
+				page_files.setdefault(file_id, (file_path, file_size, date_modified, origin, []))[4].append(hash_func)
+
+			#Local files have the hostname of their host as origin. Remote files have the URL they were downloaded from and are rehashed if their copy is still present.
+			tasks = []
+			for file_id, (file_path, file_size, date_modified, origin, hash_function_names) in page_files.items():
+				if origin != hostname and not str(origin).startswith(('http://', 'https://')):
+					counts['other_host'] += 1
+					progress.detail(f"Skipping {file_path}: it was scanned on {origin}")
+					progress.file_done()
+				else:
+					tasks.append((file_id, file_path, file_size, date_modified, hash_function_names))
+
+			def rehash(task):
+				file_id, file_path, file_size, date_modified, hash_function_names = task
+				try:
+					return task, rehash_unchanged_file(file_path, file_size, date_modified, hash_function_names), None
+				except Exception as e:
+					return task, None, e
+
+			hash_rows = []
+			for (file_id, file_path, file_size, date_modified, hash_function_names), result, error in map_bounded(rehash, tasks, jobs_parameter):
+				if error is not None:
+					counts['errors'] += 1
+					progress.error(f"Error: something went wrong while reading file {file_path}. In more detail:", error)
+					progress.file_done()
+					continue
+
+				hash_values, hash_errors, skip_reason = result
+				if skip_reason is not None:
+					counts[skip_reason] += 1
+					progress.detail(f"Skipping {file_path}: it {'does not exist any more' if skip_reason == 'missing' else 'changed since it was scanned'}")
+					progress.file_done()
+					continue
+
+				counts['hashed'] += 1
+				for hash_func in hash_function_names:
+					if hash_func in hash_errors:
+						progress.error(f"Error: something went wrong while calculating {hash_func} hash for file {file_path}. In more detail:", hash_errors[hash_func])
+					elif hash_func == 'swhid':
+						insert_swhid_value(self.db_session, hash_values[hash_func], file_id)
+						counts['hashes'] += 1
+					else:
+						hash_rows.append({'hash_value': hash_values[hash_func], 'hash_function_id': self.hash_function_ids[hash_func], 'file_id': file_id})
+				progress.file_done(file_size)
+
+			if hash_rows:
+				connection_parameter.execute(insert(Hash.__table__), hash_rows)
+				counts['hashes'] += len(hash_rows)
+
+	def calibrated_throughputs(self):
+		"""
+		Description
+		-----------
+		Returns a dictionary that maps the names of the hash functions that were calibrated on this host to their throughput in MB per second."""
+
+		throughput_rows = self.db_session.query(HashFunctionThroughput).filter(HashFunctionThroughput.hostname == gethostname())
+		return {row.hash_function_name: row.mb_per_second for row in throughput_rows}
+
+	def hash_is_available(self, hash_function_parameter):
+		"""
+		Description
+		-----------
+		Checks if the given hash function is included in the HASH_FUNCTION table.
 		If there in no available hash function with this name, then it prints alternatives with similar name.
 
 		Parameters
@@ -734,61 +1670,102 @@ class Db:
 		#Remove duplicate hash function names
 		return list(set(valid_func_list))
 
-	def search_duplicates(self, files_list, output_path_parameter = sys.stdout):
+	def search_duplicates(self, files_list, output_path_parameter = sys.stdout, hash_function_parameter = 'swhid', jobs_parameter = 1, prefilter_parameter = None):
 		"""
 		Description
 		-----------
 		Implementetion of the 'search_duplicates' command.
-		If a database is used then it prints information about this database. Otherwise it prints a warning message.
-		If we use a database when the function ends, self.used_database is a Db() object. Otherwise it is a NoDb() object.
+		Each given file (and each file inside the given directories, recursively) is read once and hashed with a single hash function.
+		The hash values are loaded in chunks into a temporary table and the files of the database that have the same hash value are found with one indexed join.
+		Outputs all the hash values of the files that were found.
+
+		With a prefilter, each file is first hashed with the prefilter hash function (typically quicksig, which reads only a few samples of the file)
+		and only the files whose prefilter hash value is found in the database are read whole and hashed with the hash function of the search.
+		The duplicates are still confirmed by the hash function of the search, so the prefilter only saves the reading of files that are certainly new.
 
 		Parameters
 		-----------
 		files_list: list of strings
-			A list of strings. The strings should be paths to files whose content we want to search for.
+			A list of strings. The strings should be paths to files or directories whose content we want to search for.
 
 		output_path_parameter: string
 			Default: sys.stdout
 			This is a path to a file, where the output will be printed/saved.
 			Supported file formats: TXT, CSV, TSV, JSON, YAML, XML	
+
+		hash_function_parameter: string, optional
+			Default: 'swhid'
+			The hash function used to find duplicates. The SWHID is computed for every file that is scanned, so by default every file of the database can be found.
+
+		jobs_parameter: int, optional
+			Default: 1
+			The number of threads that hash files at the same time.
+
+		prefilter_parameter: string, optional
+			Default: None (every file is hashed with the hash function of the search)
+			The hash function used as a prefilter. Only the files of the database that have a hash value of the prefilter hash function can be found.
+
+		Results
+		-----------
+		Returns True if the search was completed, False otherwise.
 		"""		
 
-		#All the hashes we will look for
-		hashes_of_all_files = []
+		for hash_func in [hash_function_parameter, prefilter_parameter]:
+			if hash_func is not None and not hash_func in self.available_functions:
+				print(f"Error: {hash_func} is not an available hash function in this database.")
+				return False
+
+		def candidate_files():
+			#Hash the files with the prefilter hash function and yield the files whose prefilter hash value is in the database, one chunk of files at a time
+			prefilter_digests = compute_file_digests(iterate_files(files_list), prefilter_parameter, jobs_parameter)
+			while True:
+				digests_chunk = list(islice(prefilter_digests, SQLITE_MAX_VARIABLES))
+				if not digests_chunk:
+					return
+				chunk_hash_values = list({hash_value for file_path, hash_value, error in digests_chunk if error is None})
+				known_hash_values = set(connection.execute(select(Hash.hash_value).where(Hash.hash_function_id == self.hash_function_ids[prefilter_parameter], Hash.hash_value.in_(chunk_hash_values))).scalars())
+				for file_path, hash_value, error in digests_chunk:
+					if error is not None:
+						print(f"Opening file {file_path} failed. This file will be excluded from the search. In more detail:")
+						print(error)
+					elif hash_value in known_hash_values:
+						yield file_path
+
+		def hash_values():
+			#Compute the hash value of each file. Files that can not be read are excluded from the search.
+			files = candidate_files() if prefilter_parameter is not None else iterate_files(files_list)
+			for file_path, hash_value, error in compute_file_digests(files, hash_function_parameter, jobs_parameter):
+				if error is not None:
+					print(f"Opening file {file_path} failed. This file will be excluded from the search. In more detail:")
+					print(error)
+				else:
+					yield hash_value
 
-		#For each file whose content you want to search for:
-		for p in files_list:
+		connection = self.db_session.connection()
+		lookup_table = table(BATCH_SEARCH_TABLE, column('hash_value'))
 
-			#Convert relative paths to absolute paths
-			absolute_file_path = abspath(p)
+		try:
+			if self.load_batch_search_table(connection, hash_values()) == 0:
+				return False
 
-			#If no sich file exists, print an error message
-			if not exists(absolute_file_path):
-				print(f"Error: No such file: {absolute_file_path}")
-				continue
-			#If the file is a directory, print an error message
-			elif isdir(absolute_file_path):
-				print(f"Error: {absolute_file_path} is a directory.")
-				continue
+			#The files of the database whose hash value (computed with the given hash function) is one of the hash values of the temporary table
+			matched_files = select(Hash.file_id).join(lookup_table, lookup_table.c.hash_value == Hash.hash_value).where(Hash.hash_function_id == self.hash_function_ids[hash_function_parameter])
 
-			#Compute all the possible hashes for the file whose content we are searching for
-			try:
-				hashes_of_file = compute_hashes(absolute_file_path, self.available_functions)
-			except Exception as e:
-				print("Opening file {absolute_file_path} failed. This file will be excluded from the search. In more detail:")
-				print(e)
-			else:
-				#Add the hash values you previously computed to the hashes we are going to search for
-				hashes_of_all_files.extend(hashes_of_file)
-			
-		#Remove duplicated hash values
-		hashes_to_search = list(set(hashes_of_all_files))
+			search_statement = file_hash_select(File.__table__.join(Hash.__table__, Hash.file_id == File.id)).where(File.id.in_(matched_files)).order_by(File.id, Hash.hash_id)
+			search_results = connection.execute(search_statement)
+			output(search_results, output_path_parameter)
+		except Exception as e:
+			print("Error: an error occurred while searching the database. In more detail:")
+			print(e)
+			return False
+		finally:
+			self.drop_batch_search_table(connection)
 
-		if hashes_to_search:
-			#Search for the hash values using the search command
-			self.search(hashes_to_search, [], output_path_parameter)
+		if not isinstance(output_path_parameter, str):
+			print("Note: if the results do not fit in your screen, use the --output argument to print them in a new file")
+		return True
 
-	def compare(self, fuzzy_func, ids_to_compare):
+	def compare(self, fuzzy_func, ids_to_compare, verbose_flag = False):
 		"""
 		Description
 		-----------
@@ -802,7 +1779,11 @@ class Db:
 			The name of the fuzzy hash function we will use for the comparsion
 
 		ids_to_compare - list of ints
-			List of ids of Hash records (primary keys of the HASH table) 
+			List of ids of Hash records (primary keys of the HASH_RECORD table) 
+
+		verbose_flag - boolean, optional
+			Default value: False
+			If True, a message is printed before each comparsion. Otherwise only the results are printed.
 		"""		
 
 		#Check that the hash function is available and is actually a fuzzy hash function
@@ -816,7 +1797,7 @@ class Db:
 		else:
 			#If the hash function is NOT a fuzzy hash function, print an error message
 			try:
-				is_fuzzy_flag = self.db_session.query(HashFunction).get(fuzzy_func).hash_function_fuzzy_flag
+				is_fuzzy_flag = self.db_session.query(HashFunction).filter(HashFunction.hash_function_name == fuzzy_func).one().hash_function_fuzzy_flag
 			except Exception as e:
 				print(f"Error: Something went wrong while trying to find '{fuzzy_func}' in the HASH_FUNCTION table. In more detail:")
 				print(e)
@@ -839,7 +1820,7 @@ class Db:
 				continue
 
 			#Print error message if a hash produced from a different hash function is given
-			if h.hash_function_name != fuzzy_func:
+			if h.hash_function_id != self.hash_function_ids[fuzzy_func]:
 				print(f"Error: Hash record with id {h_id} was not produced from '{fuzzy_func}' hash function. hashesdb will skip this hash value.")
 				continue
 
@@ -854,7 +1835,8 @@ class Db:
 
 			#Compare all hashes pairwise and add the result to the comparsion_result list
 			for (a,b) in combinations(hashes_for_comparsion, 2):
-				print(f"[{fuzzy_func}] Comparing hash #{a.hash_id} with hash #{b.hash_id}...")
+				if verbose_flag:
+					print(f"[{fuzzy_func}] Comparing hash #{a.hash_id} with hash #{b.hash_id}...")
 				comparsion_results.append((a.hash_id,b.hash_id,comparsion(fuzzy_func,a.hash_value,b.hash_value)))
 
 			#Print all the comparsion results
@@ -933,6 +1915,14 @@ class NoDb:
 
 		self.display_unused_warning()
 
+	def verify(self):
+		"""
+		Description
+		-----------
+		This method refer to commands that can only be applied when a database is used, so they print a relative warning message."""
+
+		self.display_unused_warning()
+
 	def import_db(self, import_file_path_param, import_file_format_param):
 		"""
 		Description
@@ -941,7 +1931,7 @@ class NoDb:
 
 		self.display_unused_warning()
     
-	def stats(self):
+	def stats(self, recount_flag = False, autocommit_flag = False, storage_flag = False, scans_flag = False):
 		"""
 		Description
 		-----------
@@ -957,7 +1947,23 @@ class NoDb:
 
 		self.display_unused_warning()
 
-	def scan(self, scan_targets_parameter, hash_functions_parameter, download_location_parameter, autocommit_flag = False, recursion_flag_parameter = True):
+	def scan(self, scan_targets_parameter, hash_functions_parameter, download_location_parameter, autocommit_flag = False, recursion_flag_parameter = True, target_filter_parameter = None, jobs_parameter = 1, checkpoint_files_parameter = None, checkpoint_seconds_parameter = None, resume_scan_id_parameter = None, verbose_flag = False, estimate_flag = False, quick_flag = False):
+		"""
+		Description
+		-----------
+		This method refer to commands that can only be applied when a database is used, so they print a relative warning message."""
+
+		self.display_unused_warning()
+
+	def search(self, hash_parameter, filename_parameter, output_path_parameter = sys.stdout, hash_function_parameter = None):
+		"""
+		Description
+		-----------
+		This method refer to commands that can only be applied when a database is used, so they print a relative warning message."""
+
+		self.display_unused_warning()
+
+	def batch_search(self, hash_values_parameter, filename_parameter = None, output_path_parameter = sys.stdout, hash_function_parameter = None):
 		"""
 		Description
 		-----------
@@ -965,7 +1971,7 @@ class NoDb:
 
 		self.display_unused_warning()
 
-	def search(self, hash_parameter, filename_parameter, output_path_parameter = sys.stdout):
+	def sql_query(self, sql_query_string_parameter, output_path_parameter = sys.stdout, autocommit_flag = False, explain_flag = False):
 		"""
 		Description
 		-----------
@@ -973,7 +1979,7 @@ class NoDb:
 
 		self.display_unused_warning()
 
-	def sql_query(self, sql_query_string_parameter, output_path_parameter = sys.stdout):
+	def index_hash_functions(self, hash_functions_parameter, drop_flag = False, autocommit_flag = False):
 		"""
 		Description
 		-----------
@@ -989,6 +1995,22 @@ class NoDb:
 
 		self.display_unused_warning()
 
+	def calibrate(self, hash_functions_parameter = None, seconds_parameter = CALIBRATION_SECONDS, autocommit_flag = False):
+		"""
+		Description
+		-----------
+		This method refer to commands that can only be applied when a database is used, so they print a relative warning message."""
+
+		self.display_unused_warning()
+
+	def backfill(self, hash_functions_parameter, scope_parameter = 'all', jobs_parameter = 1, verbose_flag = False, autocommit_flag = False):
+		"""
+		Description
+		-----------
+		This method refer to commands that can only be applied when a database is used, so they print a relative warning message."""
+
+		self.display_unused_warning()
+
 	def hash_is_available(self, hash_function_parameter):
 		"""
 		Description
@@ -997,7 +2019,7 @@ class NoDb:
 
 		self.display_unused_warning()
 
-	def search_duplicates(self, files_list, output_path_parameter = sys.stdout):
+	def search_duplicates(self, files_list, output_path_parameter = sys.stdout, hash_function_parameter = 'swhid', jobs_parameter = 1, prefilter_parameter = None):
 		"""
 		Description
 		-----------
@@ -1005,7 +2027,7 @@ class NoDb:
 
 		self.display_unused_warning()
     
-	def compare(self, fuzzy_func, ids_to_compare):
+	def compare(self, fuzzy_func, ids_to_compare, verbose_flag = False):
 		"""
 		Description
 		-----------
@@ -1013,6 +2035,191 @@ class NoDb:
 
 		self.display_unused_warning()
 
+def stored_columns(columns_parameter):
+	"""
+	Description
+	-----------
+	Returns the given columns, ready to be used in a select() statement.
+	Boolean columns are returned as they are stored (0 or 1), so that the results look the same as the results of the sql command.
+
+	Parameters
+	-----------
+	columns_parameter: list of SQLAlchemy columns
+		The columns we want to select, for example file_view_columns()."""
+
+	return [type_coerce(c, Integer).label(c.name) if isinstance(c.type, Boolean) else c for c in columns_parameter]
+
+def file_hash_select(file_hash_join):
+	"""
+	Description
+	-----------
+	Returns a select() statement of the columns of the FILE view followed by the hash_value and the hash_function_name of a hash, which are the columns of the search results.
+	The lookup tables are joined to the given join, so the statement still filters and sorts the FILE_RECORD and HASH_RECORD tables and uses their indexes.
+
+	Parameters
+	-----------
+	file_hash_join: SQLAlchemy Join object
+		A join of the FILE_RECORD and the HASH_RECORD tables (and possibly other tables)"""
+
+	return select(*stored_columns(file_view_columns()), Hash.hash_value, HashFunction.hash_function_name).select_from(hash_view_join(file_view_join(file_hash_join)))
+
+def compute_repeated_text(connection):
+	"""
+	Description
+	-----------
+	Measures the text values of REPEATED_TEXT_COLUMNS, which would be stored again on every row without their lookup tables.
+	An interned value is stored once in its lookup table and every row stores a small integer id instead.
+
+	Parameters
+	-----------
+	connection: SQLAlchemy connection or session object
+		A connection to a hashesDB database
+
+	Results
+	-----------
+	Returns a list of tuples (column description, number of values, number of distinct values, bytes if stored on every row, estimated bytes interned), one for each column."""
+
+	repeated_text = []
+	for column_description, view_name, value_expression, lookup_table_name, lookup_column_name in REPEATED_TEXT_COLUMNS:
+		values_count, inline_bytes = connection.execute(text(f"SELECT COUNT({value_expression}), COALESCE(SUM(LENGTH(CAST({value_expression} AS BLOB))), 0) FROM {view_name}")).one()
+		distinct_count = connection.execute(text(f"SELECT COUNT(DISTINCT {value_expression}) FROM {view_name}")).scalar()
+		lookup_count, lookup_bytes = connection.execute(text(f"SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST({lookup_column_name} AS BLOB))), 0) FROM {lookup_table_name}")).one()
+
+		#SQLite stores an integer in 1, 2, 3 or 4 bytes, depending on its size
+		id_bytes = next(size for size, limit in [(1, 127), (2, 32767), (3, 8388607), (4, None)] if limit is None or lookup_count <= limit)
+		repeated_text.append((column_description, values_count, distinct_count, inline_bytes, lookup_bytes + (values_count + lookup_count) * id_bytes))
+
+	return repeated_text
+
+def rate(amount_parameter, seconds_parameter):
+	#Returns amount/seconds rounded to two decimals (0 if seconds is 0)
+	if not seconds_parameter:
+		return 0.0
+	return round(amount_parameter/seconds_parameter, 2)
+
+def read_scan_metrics(session_parameter, scan_ids_parameter = None):
+	"""
+	Description
+	-----------
+	Reads the SCAN_METRICS table.
+
+	Parameters
+	-----------
+	session_parameter - SQLAlchemy session object
+		An active session from which we read the database
+
+	scan_ids_parameter - list of ints, optional
+		Default: None (the metrics of every scan are read)
+		The ids of the scans whose metrics are read
+
+	Results
+	-----------
+	Returns a dictionary that maps the ids of the scans to dictionaries that map the names of the metrics to their values.
+	Scans that were not measured are not included."""
+
+	query = session_parameter.query(ScanMetric)
+	if scan_ids_parameter is not None:
+		query = query.filter(ScanMetric.scan_id.in_(scan_ids_parameter))
+
+	scans_metrics = {}
+	for row in query:
+		scans_metrics.setdefault(row.scan_id, {})[row.metric_name] = row.metric_value
+	return scans_metrics
+
+def percentage(part_parameter, total_parameter):
+	#Returns part/total as a percentage rounded to two decimals (0 if total is 0)
+	if not total_parameter:
+		return 0.0
+	return round((part_parameter/total_parameter)*100, 2)
+
+def split_in_chunks(values_parameter, chunk_size_parameter):
+	"""
+	Description
+	-----------
+	Removes duplicate values from a list and splits it in chunks.
+
+	Parameters
+	-----------
+	values_parameter: list
+		The values that will be split.
+
+	chunk_size_parameter: int
+		The maximum number of values in each chunk.
+
+	Results
+	-----------
+	Returns a list of lists."""
+
+	unique_values = list(dict.fromkeys(values_parameter))
+	return [unique_values[i:i + chunk_size_parameter] for i in range(0, len(unique_values), chunk_size_parameter)]
+
+def hash_function_filter(statement, hash_function_parameter, hash_function_ids):
+	"""
+	Description
+	-----------
+	Restricts a search statement to the hashes of the given hash functions.
+	A single hash function id is rendered as a literal, so that SQLite can use the partial index of this hash function (see Db.index_hash_functions).
+
+	Parameters
+	-----------
+	statement: SQLAlchemy select() statement
+		A statement that selects from the HASH_RECORD table
+
+	hash_function_parameter: list of string or None
+		The names of the hash functions. If it is empty or None, the statement is returned unchanged.
+
+	hash_function_ids: dictionary
+		The id of each hash function of the HASH_FUNCTION table, by name (see Db.load_hash_functions). Unknown names match no hashes."""
+
+	if not hash_function_parameter:
+		return statement
+	elif len(hash_function_parameter) == 1:
+		return statement.where(Hash.hash_function_id == bindparam('hash_function_id', hash_function_ids.get(hash_function_parameter[0], -1), literal_execute = True))
+	else:
+		return statement.where(Hash.hash_function_id.in_([hash_function_ids.get(name, -1) for name in hash_function_parameter]))
+
+def read_hash_file(hash_file_path_parameter):
+	"""
+	Description
+	-----------
+	Generator that reads hash values from a file, one hash value per line, without loading the whole file in memory.
+	Empty lines and lines starting with '#' are skipped. Only the first word of each line is used,
+	so the output of tools like sha256sum ("<hash>  <filename>") can be used as it is.
+
+	Parameters
+	-----------
+	hash_file_path_parameter: string
+		Path to the file that contains the hash values. If it is '-', the hash values are read from the standard input.
+
+	Results
+	-----------
+	Yields the hash values (strings)."""
+
+	if hash_file_path_parameter == '-':
+		hash_file = sys.stdin
+	else:
+		hash_file = open(hash_file_path_parameter, 'r')
+
+	try:
+		for line in hash_file:
+			words = line.split()
+			if words and not words[0].startswith('#'):
+				yield words[0]
+	finally:
+		if hash_file is not sys.stdin:
+			hash_file.close()
+
+def warm_connection(dbapi_connection, connection_record):
+	"""
+	Description
+	-----------
+	Listener of the 'connect' event of persistent engines. Enlarges the SQLite page cache of each new connection (64MB),
+	so that the pages of the tables and the indexes stay in memory between commands."""
+
+	cursor = dbapi_connection.cursor()
+	cursor.execute("PRAGMA cache_size = -65536")
+	cursor.close()
+
 def database_is_used(database_object):
 	"""
 	Description
@@ -0,0 +1,127 @@
+import os
+from time import time
+
+#The digests of a file are cached in its user extended attributes (Linux), one attribute per hash function: XATTR_PREFIX + <hash function name>.
+#The value of an attribute is '<XATTR_FORMAT> <size> <mtime in ns> <inode> <hash value>', so a cached hash value is used only while the file
+#has the same size, modification time and inode as when the hash value was calculated. Any hashesdb database that scans the file can use it.
+XATTR_PREFIX = 'user.hashesdb.'
+XATTR_FORMAT = 'v1'
+
+#Files modified less than this many seconds before their hash values are calculated are not cached: a change in the same tick of a coarse clock
+#would keep the same modification time, so the cached hash value would outlive the content it describes
+XATTR_MIN_AGE_SECONDS = 2.0
+
+#The cache is opt-in (see the --xattr-cache option). It is enabled for the duration of a command.
+cache_enabled = False
+
+def xattr_supported():
+	#Extended attributes are supported by os only on Linux
+	return hasattr(os, 'getxattr') and hasattr(os, 'setxattr')
+
+def enable_digest_cache(enabled_flag = True):
+	"""
+	Description
+	-----------
+	Turns the digest cache on or off for the whole process.
+
+	Parameters
+	-----------
+	enabled_flag - boolean, optional
+		Default: True
+		True to consult and fill the cache, False to ignore it
+
+	Results
+	-----------
+	Returns False if the cache was requested but extended attributes are not supported on this platform, True otherwise.
+	"""
+
+	global cache_enabled
+	if enabled_flag and not xattr_supported():
+		print("Warning: extended attributes are not supported on this platform, the digest cache is not used.")
+		cache_enabled = False
+		return False
+	cache_enabled = enabled_flag
+	return True
+
+def validity_guard(file_stat):
+	#The part of the value of an attribute that must match the file for the cached hash value to be used
+	return f"{XATTR_FORMAT} {file_stat.st_size} {file_stat.st_mtime_ns} {file_stat.st_ino}"
+
+def read_cached_digests(file_descriptor, file_stat, hash_function_names):
+	"""
+	Description
+	-----------
+	Returns the cached hash values of an open file that are still valid.
+
+	Parameters
+	-----------
+	file_descriptor - int
+		The descriptor of the open file
+
+	file_stat - os.stat_result
+		The result of fstat() for the file
+
+	hash_function_names - list of strings
+		The names of the hash functions whose hash values are needed
+
+	Results
+	-----------
+	Returns a dictionary that maps the names of the hash functions that had a valid cached hash value to that hash value.
+	Missing, stale and unreadable attributes are ignored.
+	"""
+
+	guard = validity_guard(file_stat) + ' '
+	cached_digests = {}
+	for hash_function_name in hash_function_names:
+		try:
+			value = os.getxattr(file_descriptor, XATTR_PREFIX + hash_function_name).decode()
+		except (OSError, UnicodeDecodeError):
+			continue
+		if value.startswith(guard):
+			cached_digests[hash_function_name] = value[len(guard):]
+	return cached_digests
+
+def write_cached_digests(file_path, file_stat, hash_values):
+	"""
+	Description
+	-----------
+	Stores hash values in the extended attributes of a file, if the file is unchanged since file_stat was taken and old enough to be cached.
+	Writing is best effort: files that are read-only for this user, file systems without user extended attributes and full attribute space
+	leave the file uncached.
+
+	Parameters
+	-----------
+	file_path - string
+		Path to the file
+
+	file_stat - os.stat_result
+		The result of fstat() for the file before its hash values were calculated
+
+	hash_values - dictionary
+		Maps the names of the hash functions to the hash values
+
+	Results
+	-----------
+	Returns the number of hash values that were stored.
+	"""
+
+	if time() - file_stat.st_mtime < XATTR_MIN_AGE_SECONDS:
+		return 0
+
+	try:
+		current_stat = os.stat(file_path)
+	except OSError:
+		return 0
+	guard = validity_guard(file_stat)
+	if validity_guard(current_stat) != guard:
+		return 0
+
+	stored_count = 0
+	for hash_function_name, hash_value in hash_values.items():
+		try:
+			os.setxattr(file_path, XATTR_PREFIX + hash_function_name, f"{guard} {hash_value}".encode())
+		except OSError:
+			#The same error would occur for the rest of the hash values (permissions, unsupported file system), except for lack of space
+			break
+		stored_count += 1
+	return stored_count
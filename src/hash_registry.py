@@ -0,0 +1,212 @@
+import hashlib
+from importlib.util import find_spec
+
+#The libraries of the hash functions that are not implemented by hashlib are imported by the constructors of the hash functions,
+#so that commands that never hash a file do not pay for them at startup. Whether a library is installed is checked without importing it.
+
+class HashFunctionSpec:
+	"""
+	This class describes a hash function supported by hashesdb:
+		-name: the name of the hash function, as stored in the hash_function_name column of the HASH_FUNCTION table
+		-constructor: a function that receives the size of the data that will be hashed (in bytes) and returns a new hash object,
+		 which has an update() method
+		-finalizer: a function that receives a hash object and returns the hash value as a string
+		-size: the size of the hash value in bits (None if it is not fixed)
+		-fuzzy_flag: True for fuzzy hash functions, whose hash values are compared for similarity instead of equality
+		-releases_gil: True if the hash object releases the GIL while it hashes large blocks, so that several threads hash files in parallel.
+		 The hash objects of every function are independent of each other, so they may be used by different threads at the same time in any case.
+		-accepts_buffers: True if the update() method of the hash object accepts any bytes-like object (e.g. a memoryview of a buffer).
+		 Otherwise the blocks are copied to bytes before they are hashed.
+		-module: the name of the optional library that implements the hash function (None if it is always available, e.g. because it is in requirements.txt).
+		 A hash function with an optional library is registered in a database only if the library is installed.
+		-sampler: for hash functions that read only parts of a file (None for the rest), a function that receives an open file and its size
+		 and returns the hash value as a string. These hash functions are calculated from the file directly, instead of being fed its whole content,
+		 so they have no hash objects (their constructor raises a ValueError).
+	"""
+
+	__slots__ = ('name', 'constructor', 'finalizer', 'size', 'fuzzy_flag', 'releases_gil', 'accepts_buffers', 'module', 'sampler')
+
+	def __init__(self, name, constructor, finalizer = None, size = None, fuzzy_flag = False, releases_gil = True, accepts_buffers = True, module = None, sampler = None):
+		self.name = name
+		self.constructor = constructor
+		self.finalizer = finalizer if finalizer is not None else hexdigest
+		self.size = size
+		self.fuzzy_flag = fuzzy_flag
+		self.releases_gil = releases_gil
+		self.accepts_buffers = accepts_buffers
+		self.module = module
+		self.sampler = sampler
+
+	def is_installed(self):
+		#Returns True if the library that implements the hash function can be imported
+		return self.module is None or find_spec(self.module) is not None
+
+
+#Registered hash functions (name -> HashFunctionSpec), in the order in which they were registered
+HASH_FUNCTIONS = {}
+
+def register_hash_function(spec):
+	"""
+	Description
+	-----------
+	Adds a hash function to the registry. Databases that do not have it in their HASH_FUNCTION table get it the next time they are used,
+	if its library is installed (see Db.__init__).
+
+	Parameters
+	-----------
+	spec - HashFunctionSpec
+		The description of the hash function. A hash function that was already registered with the same name is replaced.
+	"""
+
+	HASH_FUNCTIONS[spec.name] = spec
+
+def get_hash_function(hash_function_name):
+	"""
+	Description
+	-----------
+	Returns the HashFunctionSpec of a hash function.
+	Hash functions of hashlib that are not registered (e.g. the algorithms that only OpenSSL provides) are described on the fly.
+
+	Parameters
+	-----------
+	hash_function_name - string
+		The name of the hash function
+
+	Raises
+	-----------
+	Raises a ValueError if hashesdb does not support the hash function
+	"""
+
+	spec = HASH_FUNCTIONS.get(hash_function_name)
+	if spec is None:
+		if hash_function_name not in hashlib.algorithms_available:
+			raise ValueError(f"unsupported hash function: {hash_function_name}")
+		spec = hashlib_spec(hash_function_name)
+	return spec
+
+def installed_hash_functions():
+	#Returns the HashFunctionSpecs of the registered hash functions whose libraries are installed
+	return [spec for spec in HASH_FUNCTIONS.values() if spec.is_installed()]
+
+def hexdigest(hash_object):
+	return hash_object.hexdigest()
+
+def hashlib_spec(hash_function_name, size = None):
+	#hashlib releases the GIL while it hashes blocks larger than 2047 bytes
+	return HashFunctionSpec(hash_function_name, lambda file_size: hashlib.new(hash_function_name), size = size)
+
+
+"""Constructors and finalizers of the hash functions that are not plain hashlib hash functions"""
+
+def new_swhid(file_size):
+	#The SWHID of a file is the SHA1 of a git blob: a header that contains the size of the file, followed by the content of the file
+	return hashlib.sha1(b"blob %d\0" % file_size)
+
+def swhid_digest(hash_object):
+	return 'swh:1:cnt:' + hash_object.hexdigest()
+
+def new_xxhash(algorithm_name):
+	#Returns the constructor of an xxhash algorithm (xxh32, xxh64, xxh3_64 or xxh3_128)
+	def constructor(file_size):
+		import xxhash
+		return getattr(xxhash, algorithm_name)()
+	return constructor
+
+def new_tlsh(file_size):
+	import tlsh
+	return tlsh.Tlsh()
+
+def tlsh_digest(hash_object):
+	hash_object.final()
+	return hash_object.hexdigest()
+
+def new_ssdeep(file_size):
+	import warnings
+	#cffi is a requirement of thoth-ssdeep. It throws a DeprecationWarning
+	with warnings.catch_warnings():
+		warnings.filterwarnings("ignore",category=DeprecationWarning)
+		import ssdeep
+		return ssdeep.Hash()
+
+def ssdeep_digest(hash_object):
+	return hash_object.digest(elimseq=False)
+
+class Crc32cObject:
+	"""
+	This class gives the crc32c function of the crc32c library the interface of a hashlib hash object.
+	The CRC is 32 bits long, so it is only suitable for telling files apart quickly, not for identifying them.
+	"""
+
+	__slots__ = ('crc_function', 'value')
+
+	def __init__(self, file_size = None):
+		import crc32c
+		#Older versions of the library name the function crc32
+		self.crc_function = getattr(crc32c, 'crc32c', None) or crc32c.crc32
+		self.value = 0
+
+	def update(self, data):
+		self.value = self.crc_function(data, self.value)
+
+	def hexdigest(self):
+		return format(self.value, '08x')
+
+def new_blake3(file_size):
+	import blake3
+	#BLAKE3 is a tree hash, so the library hashes the chunks of large blocks on several threads (max_threads is not supported by old versions)
+	auto_threads = getattr(blake3.blake3, 'AUTO', None)
+	if auto_threads is None:
+		return blake3.blake3()
+	return blake3.blake3(max_threads = auto_threads)
+
+def new_sha256_tree(file_size):
+	#The layout of the tree is declared in tree_hash.py
+	from tree_hash import TreeHashObject
+	return TreeHashObject(file_size)
+
+def new_sampled(hash_function_name):
+	#Returns the constructor of a hash function that samples files, which can not hash a stream of data
+	def constructor(file_size):
+		raise ValueError(f"{hash_function_name} samples parts of a file, so it can only be calculated for files")
+	return constructor
+
+def quicksig_sampler(file_parameter, file_size):
+	#The layout of the samples is declared in quick_signature.py
+	from quick_signature import quick_signature
+	return quick_signature(file_parameter, file_size)
+
+
+"""The hash functions supported by hashesdb"""
+
+#hashlib guarantees these hash functions on every platform. The SHAKE hash functions are used with a fixed size.
+#Attention: SHAKE hashes can have variable size. Our tool works with the maximum size (128 bits and 256 bits respectively)
+HASHLIB_SIZES = {'md5': 128, 'sha1': 160, 'sha224': 224, 'sha256': 256, 'sha384': 384, 'sha512': 512,
+				'sha3_224': 224, 'sha3_256': 256, 'sha3_384': 384, 'sha3_512': 512,
+				'blake2s': 256, 'blake2b': 512, 'shake_128': 128, 'shake_256': 256}
+
+for hashlib_name in sorted(hashlib.algorithms_guaranteed):
+	register_hash_function(hashlib_spec(hashlib_name, HASHLIB_SIZES[hashlib_name]))
+
+HASH_FUNCTIONS['shake_128'].finalizer = lambda hash_object: hash_object.hexdigest(128)
+HASH_FUNCTIONS['shake_256'].finalizer = lambda hash_object: hash_object.hexdigest(256)
+
+register_hash_function(HashFunctionSpec('xxh32', new_xxhash('xxh32'), size = 32))
+register_hash_function(HashFunctionSpec('xxh64', new_xxhash('xxh64'), size = 64))
+register_hash_function(HashFunctionSpec('xxh3_64', new_xxhash('xxh3_64'), size = 64))
+register_hash_function(HashFunctionSpec('xxh3_128', new_xxhash('xxh3_128'), size = 128))
+
+#Optional libraries (pip install crc32c blake3)
+register_hash_function(HashFunctionSpec('crc32c', Crc32cObject, size = 32, module = 'crc32c'))
+register_hash_function(HashFunctionSpec('blake3', new_blake3, size = 256, module = 'blake3'))
+
+#A SHA-256 Merkle tree whose leaves are hashed in parallel, so that hashing a single large file scales with the number of CPUs
+register_hash_function(HashFunctionSpec('sha256_tree', new_sha256_tree, size = 256))
+
+#A signature of the size and of a few fixed samples of a file, for telling quickly whether a large file is probably a known one
+register_hash_function(HashFunctionSpec('quicksig', new_sampled('quicksig'), size = 128, sampler = quicksig_sampler))
+
+#The fuzzy hashing libraries only accept bytes
+register_hash_function(HashFunctionSpec('ssdeep', new_ssdeep, ssdeep_digest, fuzzy_flag = True, releases_gil = False, accepts_buffers = False))
+register_hash_function(HashFunctionSpec('tlsh', new_tlsh, tlsh_digest, fuzzy_flag = True, releases_gil = False, accepts_buffers = False))
+
+register_hash_function(HashFunctionSpec('swhid', new_swhid, swhid_digest))
@@ -1,8 +1,7 @@
-from sqlalchemy import text
 import csv
 import json
-import yaml
-import xml.etree.ElementTree as ET
+
+#yaml and xml.etree are imported inside the functions that use them, so that they are only loaded when data are imported from their format
 
 def populate_table(session_parameter, file_path_parameter, table_name_parameter, extension_parameter):
 	"""
@@ -69,9 +68,9 @@ def populate_csv(session_parameter, file_path_parameter, table_name_parameter):
 
 	with open(file_path_parameter, 'r', newline='') as f:
 		csv_reader = csv.reader(f)
-		next(csv_reader) #Skip first line
+		column_names = next(csv_reader) #The first line holds the names of the columns
 		for row in csv_reader:
-			insert_values(session_parameter, table_name_parameter, str(tuple(row)))
+			insert_values(session_parameter, table_name_parameter, str(tuple(row)), column_names)
 
 def populate_tsv(session_parameter, file_path_parameter, table_name_parameter):
 	"""
@@ -93,9 +92,9 @@ def populate_tsv(session_parameter, file_path_parameter, table_name_parameter):
 
 	with open(file_path_parameter, 'r', newline='') as f:
 		csv_reader = csv.reader(f, dialect = 'excel-tab')
-		next(csv_reader) #Skip first line
+		column_names = next(csv_reader) #The first line holds the names of the columns
 		for row in csv_reader:
-			insert_values(session_parameter, table_name_parameter, str(tuple(row)))
+			insert_values(session_parameter, table_name_parameter, str(tuple(row)), column_names)
 
 def populate_json(session_parameter, file_path_parameter, table_name_parameter):
 	"""
@@ -118,7 +117,7 @@ def populate_json(session_parameter, file_path_parameter, table_name_parameter):
 	with open(file_path_parameter, 'r', newline='') as f:
 		json_rows = json.load(f)	
 		for row in json_rows:
-			insert_values(session_parameter, table_name_parameter, dicttotuple(row))
+			insert_values(session_parameter, table_name_parameter, dicttotuple(row), row.keys())
 
 def populate_yaml(session_parameter, file_path_parameter, table_name_parameter):
 	"""
@@ -138,10 +137,12 @@ def populate_yaml(session_parameter, file_path_parameter, table_name_parameter):
 		Name of the table that will be populated	
 	"""
 
+	import yaml
+
 	with open(file_path_parameter, 'r', newline='') as f:
 		yaml_rows = yaml.safe_load(f)	
 		for row in yaml_rows:
-			insert_values(session_parameter, table_name_parameter, dicttotuple(row))
+			insert_values(session_parameter, table_name_parameter, dicttotuple(row), row.keys())
 
 def populate_xml(session_parameter, file_path_parameter, table_name_parameter):
 	"""
@@ -161,6 +162,8 @@ def populate_xml(session_parameter, file_path_parameter, table_name_parameter):
 		Name of the table that will be populated	
 	"""
 
+	import xml.etree.ElementTree as ET
+
 	tree_root = ET.parse(file_path_parameter).getroot()
 
 	#Construct xml_rows (list of dicts)
@@ -172,9 +175,9 @@ def populate_xml(session_parameter, file_path_parameter, table_name_parameter):
 		xml_rows.append(new_row)
 
 	for row in xml_rows:
-		insert_values(session_parameter, table_name_parameter, dicttotuple(row))
+		insert_values(session_parameter, table_name_parameter, dicttotuple(row), row.keys())
 
-def insert_values(session_parameter, table_name_parameter, values_tuple):
+def insert_values(session_parameter, table_name_parameter, values_tuple, column_names = None):
 	"""
 	Description
 	-----------
@@ -190,16 +193,25 @@ def insert_values(session_parameter, table_name_parameter, values_tuple):
 
 	values_tuple - tuple
 		A tuple with the values that will be inserted into the table. The values must be in the correct order (nth value-nth column)	
+
+	column_names - iterable of strings, optional
+		Default value: None (the values are given for all the columns of the table, in the order of the table)
+		The names of the columns of the values, as written in the imported file.
+		They let files exported by older versions of hashesdb be imported into tables that have more columns now (e.g. HASH_FUNCTION.hash_function_id).
 	"""
 
 	insert_query_string = f"INSERT INTO {table_name_parameter} VALUES "
+	if column_names is not None:
+		quoted_names = ', '.join('"' + name.replace('"', '""') + '"' for name in column_names)
+		insert_query_string = f"INSERT INTO {table_name_parameter} ({quoted_names}) VALUES "
 	insert_query_values = values_tuple
-	insert_query = text(insert_query_string + insert_query_values)
+	insert_query = insert_query_string + insert_query_values
 
-	#Documentation of session.execute(): https://docs.sqlalchemy.org/en/14/orm/session_api.html#sqlalchemy.orm.Session.execute
+	#The query is passed to the driver as it is, since text() would treat the ':<word>' parts of the values (e.g. in ssdeep hashes) as bind parameters
+	#Documentation of exec_driver_sql(): https://docs.sqlalchemy.org/en/14/core/connections.html#sqlalchemy.engine.Connection.exec_driver_sql
 	try:
 		#Try to execute the given query
-		session_parameter.execute(insert_query)
+		session_parameter.connection().exec_driver_sql(insert_query)
 	except Exception as e:
 		#If the query can't be executed, cancel the execution and print an error message
 		session_parameter.rollback()
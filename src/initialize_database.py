@@ -1,7 +1,8 @@
 from sqlalchemy.orm import sessionmaker
 from os.path import splitext,basename
 from datetime import datetime
-from hashlib import algorithms_guaranteed
+from sqlalchemy import select, insert
+from hash_registry import installed_hash_functions
 
 from table_classes import *
 
@@ -96,51 +97,44 @@ def initialize_hash_function(session):
 	Description
 	-----------
 	The HASH_FUNCTION table will be initialized.
-	It will contain all the hash functions of the built-in hashlib python module and the ssdeep fuzzy hash.
+	It will contain the hash functions of the registry of hash_registry.py: the hash functions of the built-in hashlib python module, the xxhashes,
+	the sha256_tree tree hash, the quicksig sampled signature, the ssdeep and tlsh fuzzy hashes, SWHID and the hash functions of the optional libraries (crc32c, blake3) that are installed.
 	The SHAKE hash functions will have fixed-size. We do not support the calculation of SHAKE hashes with parameterized size.
 
 	Parameters
 	-----------
 	session - SQLAlchemy session object"""
 
-	### PYTHON BUILT-IN HASHES + XXHASHES ###
-
-	#A dictionary containing the size(bits) of the hash functions of the built-in hashlib python module
-	#Attention: SHAKE hashes can have variable size. Our tool works with the maximum size (128 bits and 256 bits respectively)
-	hash_size = {'sha1': 160,
-				'sha384': 384,
-				'md5': 128, 
-				'sha224': 224, 
-				'blake2s': 256, 
-				'sha3_384': 384, 
-				'sha3_256': 256, 
-				'sha3_224': 224, 
-				'sha3_512': 512, 
-				'sha256': 256, 
-				'blake2b': 512, 
-				'sha512': 512, 
-				'shake_128': 128, 
-				'shake_256': 256,
-				'xxh32' : 32,
-    			'xxh64': 64
-				}
-
-	#algorithms_guaranteed is imported from the built-in hashlib python module
-	for hash_name in algorithms_guaranteed:
-		#Produce a row for this hash
-		session.add(HashFunction(hash_function_name = hash_name, hash_function_fuzzy_flag = False, hash_function_size = hash_size[hash_name]))
-
-	### XXHASHES HASHES ###
-	session.add(HashFunction(hash_function_name = 'xxh32', hash_function_fuzzy_flag = False, hash_function_size = hash_size['xxh32']))
-	session.add(HashFunction(hash_function_name = 'xxh64', hash_function_fuzzy_flag = False, hash_function_size = hash_size['xxh64']))
-
-	### FUZZY HASHES ###
-	#Create and add a row for fuzzy functions with NULL size, since ssdeep and tlsh do not have a fixed size.
-	session.add(HashFunction(hash_function_name = 'ssdeep', hash_function_fuzzy_flag = True, hash_function_size = None))
-	session.add(HashFunction(hash_function_name = 'tlsh', hash_function_fuzzy_flag = True, hash_function_size = None))
-
-	### SWHID ###
-	session.add(HashFunction(hash_function_name = 'swhid', hash_function_fuzzy_flag = False, hash_function_size = None))
+	session.add_all([HashFunction(**hash_function_row(spec)) for spec in installed_hash_functions()])
 
 	#Initialize HASH_FUNCTION table by commiting the added hashes
-	session.commit()
\ No newline at end of file
+	session.commit()
+
+def register_hash_functions(engine):
+	"""
+	Description
+	-----------
+	Adds to the HASH_FUNCTION table of a database the hash functions of the registry that it does not have yet,
+	i.e. the hash functions that were added to hashesdb, or whose optional library was installed, after the database was created.
+
+	Parameters
+	-----------
+	engine - SQLAlchemy engine object
+		An engine connected to a hashesDB database.
+
+	Results
+	-----------
+	Returns the list of the names of the hash functions that were added."""
+
+	hash_function_table = HashFunction.__table__
+	with engine.begin() as conn:
+		registered_names = set(conn.execute(select(hash_function_table.c.hash_function_name)).scalars())
+		missing_specs = [spec for spec in installed_hash_functions() if spec.name not in registered_names]
+		if missing_specs:
+			conn.execute(insert(hash_function_table), [hash_function_row(spec) for spec in missing_specs])
+
+	return [spec.name for spec in missing_specs]
+
+def hash_function_row(spec):
+	#Returns the values of the columns of the HASH_FUNCTION row of a hash function, given its HashFunctionSpec
+	return {'hash_function_name': spec.name, 'hash_function_fuzzy_flag': spec.fuzzy_flag, 'hash_function_size': spec.size}
@@ -0,0 +1,133 @@
+import sys
+import json
+from datetime import datetime
+from time import perf_counter
+
+#SQLAlchemy is imported by start() and stop(), so that the parser can read the default threshold without loading the database layer
+
+#Default threshold of the slow-query log, in milliseconds
+SLOW_QUERY_THRESHOLD_MS = 100
+
+#Maximum length of the statement and of the parameters written to the slow-query log (batch inserts can have very long parameter lists)
+SLOW_QUERY_MAX_TEXT_LENGTH = 2000
+
+class SlowQueryLog:
+	"""
+	This class times every SQL statement executed by any SQLAlchemy engine of the process while it is started, through the
+	'before_cursor_execute' and 'after_cursor_execute' engine events, and writes the statements that take longer than a threshold to a log.
+	Each entry of the log is a JSON line with the date, the duration, the row count, the statement and its parameters.
+
+	The duration is the time spent in cursor.execute(). For SELECT statements, SQLite computes the rows while they are fetched,
+	so the duration covers finding the first row only (enough to tell an index lookup from a full scan). The row count is the number of
+	rows changed by INSERT/UPDATE/DELETE statements and None for SELECT statements.
+	"""
+
+	def __init__(self, log_path_parameter = None, threshold_ms = SLOW_QUERY_THRESHOLD_MS, summary_stream = None):
+		"""
+		Description
+		-----------
+		Initializes a SlowQueryLog. The statements are not timed until start() is called.
+
+		Parameters
+		-----------
+		log_path_parameter - string, optional
+			Default: None (the entries are written to stderr)
+			Path to the log file. The entries are appended to it, so the file can collect the slow statements of several commands. '-' means stderr.
+
+		threshold_ms - float, optional
+			Default: SLOW_QUERY_THRESHOLD_MS
+			Statements that take at least this many milliseconds are logged. 0 logs every statement.
+
+		summary_stream - file object, optional
+			Default: sys.stderr
+			The stream to which stop() prints a summary.
+		"""
+
+		self.log_path = log_path_parameter
+		self.threshold = threshold_ms / 1000
+		self.summary_stream = summary_stream if summary_stream is not None else sys.stderr
+		self.log_file = None
+		self.statements_count = 0
+		self.slow_count = 0
+		self.total_seconds = 0.0
+
+	def start(self):
+		if self.log_path and self.log_path != '-':
+			self.log_file = open(self.log_path, 'a')
+		from sqlalchemy import event
+		from sqlalchemy.engine import Engine
+		event.listen(Engine, 'before_cursor_execute', self.before_cursor_execute)
+		event.listen(Engine, 'after_cursor_execute', self.after_cursor_execute)
+
+	def stop(self):
+		from sqlalchemy import event
+		from sqlalchemy.engine import Engine
+		event.remove(Engine, 'before_cursor_execute', self.before_cursor_execute)
+		event.remove(Engine, 'after_cursor_execute', self.after_cursor_execute)
+		if self.log_file is not None:
+			self.log_file.close()
+			self.log_file = None
+
+		log_name = self.log_path if self.log_path and self.log_path != '-' else 'stderr'
+		print(f"{self.statements_count} SQL statements in {self.total_seconds * 1000:.1f} ms, {self.slow_count} slower than {self.threshold * 1000:g} ms (logged to {log_name})", file = self.summary_stream)
+
+	def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+		#The start times are kept in a stack, since a statement may be executed while another one is executed on the same connection (e.g. by a trigger listener)
+		conn.info.setdefault('slow_query_log_start', []).append(perf_counter())
+
+	def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+		start_times = conn.info.get('slow_query_log_start')
+		if not start_times:
+			return
+		elapsed = perf_counter() - start_times.pop()
+
+		self.statements_count += 1
+		self.total_seconds += elapsed
+		if elapsed < self.threshold:
+			return
+
+		self.slow_count += 1
+		row_count = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else None
+		entry = {
+			'date': datetime.now().isoformat(' '),
+			'duration_ms': round(elapsed * 1000, 3),
+			'rows': row_count,
+			'executemany': executemany,
+			'statement': ' '.join(statement.split())[:SLOW_QUERY_MAX_TEXT_LENGTH],
+			'parameters': repr(parameters)[:SLOW_QUERY_MAX_TEXT_LENGTH],
+		}
+		log_file = self.log_file if self.log_file is not None else sys.stderr
+		log_file.write(json.dumps(entry) + '\n')
+		log_file.flush()
+
+def query_plan_lines(plan_rows):
+	"""
+	Description
+	-----------
+	Formats the rows returned by EXPLAIN QUERY PLAN as a tree, the way the sqlite3 shell prints them.
+
+	Parameters
+	-----------
+	plan_rows - list of tuples
+		The rows (id, parent, notused, detail) returned by an EXPLAIN QUERY PLAN statement
+
+	Results
+	-----------
+	Returns a list of strings, for example ['QUERY PLAN', '|--SEARCH HASH_RECORD USING INDEX ix_hash_record_hash_value (hash_value=?)', '`--SEARCH FILE_RECORD USING INTEGER PRIMARY KEY (rowid=?)']
+	"""
+
+	children = {}
+	for node_id, parent_id, notused, detail in plan_rows:
+		children.setdefault(parent_id, []).append((node_id, detail))
+
+	lines = ['QUERY PLAN']
+
+	def add_children(parent_id, prefix):
+		nodes = children.get(parent_id, [])
+		for i, (node_id, detail) in enumerate(nodes):
+			last_flag = i == len(nodes) - 1
+			lines.append(prefix + ('`--' if last_flag else '|--') + detail)
+			add_children(node_id, prefix + ('   ' if last_flag else '|  '))
+
+	add_children(0, '')
+	return lines
@@ -1,11 +1,9 @@
 from os.path import split, splitext, abspath, isdir
-from prettytable import PrettyTable
 import sys
 import csv
 import json
-import yaml
-from dicttoxml import dicttoxml
-from xml.dom.minidom import parseString
+
+#prettytable, yaml and dicttoxml are imported inside the functions that use them, so that they are only loaded when results are printed in their format
 
 
 def output(results, output_path_parameter = sys.stdout):
@@ -31,7 +29,8 @@ def output(results, output_path_parameter = sys.stdout):
 	"""
 
 	#Check if we want to print the result at the standard output
-	if output_path_parameter == sys.stdout:
+	#Any stream is treated as the standard output, since sys.stdout may have been replaced after the default value was bound (e.g. by the hashesdb server, which captures the output of each command)
+	if not isinstance(output_path_parameter, str):
 		output_stdout(results)
 	#Otherwise:
 	else:
@@ -67,6 +66,35 @@ def output(results, output_path_parameter = sys.stdout):
 
 	return True
 
+class ChainedResults:
+	"""
+	Presents the results of several executions of the same statement (for example a query that was split in chunks) as a single result.
+	It provides the part of the interface of the sqlalchemy.engine.Result object that is used by the output functions: keys() and iteration.
+	"""
+
+	def __init__(self, results_iterable):
+		"""
+		Description
+		-----------
+		ChainedResults class initializer
+
+		Parameters
+		-----------
+		results_iterable: iterable of sqlalchemy.engine.Result objects
+			The results that will be chained. All of them must have the same columns. The first result is retrieved immediately,
+			the others are retrieved only when the rows of the previous ones have been consumed."""
+
+		self.results = iter(results_iterable)
+		self.first_result = next(self.results)
+
+	def keys(self):
+		return self.first_result.keys()
+
+	def __iter__(self):
+		yield from self.first_result
+		for result in self.results:
+			yield from result
+
 def results_to_dict(results):
 	"""
 	Description
@@ -105,6 +133,8 @@ def output_stdout(results):
 		Supported file formats: TXT,CSV, JSON, YAML, XML
 	"""	
 
+	from prettytable import PrettyTable
+
 	#Define a PrettyTable and set the headers to be equal to the names of the columns
 	results_table = PrettyTable()
 	results_table.field_names = results.keys()
@@ -132,6 +162,8 @@ def output_txt(results, txt_file_path):
 		string: a path (relative or absolute) to a new .txt file where the results will be printed
 	"""	
 
+	from prettytable import PrettyTable
+
 	#Define a PrettyTable and set the headers to be equal to the names of the columns
 	results_table = PrettyTable()
 	results_table.field_names = results.keys()
@@ -228,6 +260,8 @@ def output_yaml(results, yaml_file_path):
 		string: a path (relative or absolute) to a new .yaml file where the results will be printed
 	"""	
 
+	import yaml
+
 	with open(yaml_file_path, 'w', newline='') as f:
 		yaml.dump(results_to_dict(results),f,sort_keys=False)	
 
@@ -248,6 +282,9 @@ def output_xml(results, xml_file_path):
 		string: a path (relative or absolute) to a new .xml file where the results will be printed
 	"""	
 
+	from dicttoxml import dicttoxml
+	from xml.dom.minidom import parseString
+
 	with open(xml_file_path, 'w', newline='') as f:
 		xml_string = parseString(dicttoxml(results_to_dict(results)))
 		f.write(xml_string.toprettyxml())
\ No newline at end of file
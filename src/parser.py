@@ -1,8 +1,12 @@
 import argparse
 import sys
 from os import getcwd
+from os.path import abspath
 from shlex import split
-from app import *
+from profiling import run_profiled, default_profile_path
+from instrumentation import SlowQueryLog, SLOW_QUERY_THRESHOLD_MS
+from digest_cache import enable_digest_cache
+from calibration import CALIBRATION_SECONDS
 
 class ParserTemplate:
 
@@ -11,8 +15,20 @@ class ParserTemplate:
 	def __init__(self):
 		#general parser
 		self.parser = argparse.ArgumentParser(prog = "hashesdb", description = "Manage database that contains hash values.")
-		self.subparsers = self.parser.add_subparsers(description = "To print detailed help about a specific subcommand, use the -h option. For example: hashesdb search -h", help = "subcommand description")
+		self.subparsers = self.parser.add_subparsers(dest = 'subcommand', description = "To print detailed help about a specific subcommand, use the -h option. For example: hashesdb search -h", help = "subcommand description")
 		self.parser.add_argument('-v','--version', action = 'version', version = '%(prog)s 1.0', help = "print the program's version")
+		self.parser.add_argument('--profile', nargs = '?', const = '', metavar = "PSTATS_PATH", help = "run the subcommand under a profiler, write the profile to PSTATS_PATH and print the functions that took the most time. default path: hashesdb-<subcommand>.prof")
+		self.parser.add_argument('--profile-memory', action = 'store_true', help = "flag: when profiling, also trace the memory allocations and print the call sites that allocated the most memory (slow)")
+		self.parser.add_argument('--profile-top', type = int, default = 20, metavar = "N", help = "number of functions printed in the summary of the profile. default: 20")
+		self.parser.add_argument('--slow-query-log', metavar = "LOG_PATH", help = "time every SQL statement of the subcommand and append the slow ones to LOG_PATH as JSON lines ('-' for stderr)")
+		self.parser.add_argument('--xattr-cache', action = 'store_true', help = "flag: use the hash values cached in the extended attributes (user.hashesdb.*) of unchanged files instead of reading them, and cache the hash values that are calculated (Linux only)")
+		self.parser.add_argument('--slow-query-ms', type = float, default = SLOW_QUERY_THRESHOLD_MS, metavar = "MS", help = f"statements that take at least MS milliseconds are written to the slow-query log. default: {SLOW_QUERY_THRESHOLD_MS}")
+
+		#Profiling settings that apply to every command (set with the 'profile' command of the REPL). None if commands are not profiled by default.
+		self.profile_settings = None
+
+		#If True, invalid arguments end the process with the exit status of argparse (standalone commands). The REPL keeps reading commands instead.
+		self.exit_on_usage_error = False
 
 		#about subcommand parser
 		about_help_msg = "print information about the program"
@@ -28,6 +44,12 @@ class ParserTemplate:
 		self.parser_create.add_argument('-d', '--database', '--db', required = True, metavar = "DATABASE_PATH", action = "store", help = "path to the new hashesdb database (.db file)")
 		self.parser_create.add_argument('--overwrite', action='store_true', help = "flag: allows the tool to overwrite other databases when it creates a new hashesdb database")			
 
+		#upgrade subcommand parser
+		upgrade_help_msg = "upgrade a hashesdb database created by an older version of hashesdb to the current schema version"
+		upgrade_descr_msg = upgrade_help_msg + ". the other subcommands refuse to use a database that has not been upgraded."
+		self.parser_upgrade = self.subparsers.add_parser('upgrade', help= upgrade_help_msg, description = upgrade_descr_msg)
+		self.parser_upgrade.add_argument('-d', '--database', '--db', required = True, metavar = "DATABASE_PATH", action = "store", help = "path to the hashesdb database (.db file) that will be upgraded")
+
 		#import subcommand parser
 		import_help_msg = "populates hashesdb database with data imported from a folder"
 		self.parser_import = self.subparsers.add_parser('import', help= import_help_msg, description = import_help_msg)
@@ -57,6 +79,17 @@ class ParserTemplate:
 		self.parser_scan.add_argument('-dw', '--download-location', action = "store", metavar = "DOWNLOAD_LOCATION", default = getcwd(), help = "path to location where remote targets will be downloaded to. default: current working directory")
 		self.parser_scan.add_argument('-j', '--jobs', action = "store", default = 1, type = int, metavar = "THREADS_NUMBER", help = "number of threads to be used. default: 1")
 		self.parser_scan.add_argument('-r', '--recursive', action = "store_true", help = "allows recursive scanning of the contents of directories")
+		self.parser_scan.add_argument('--include', nargs='+', action = "store", metavar = "PATTERN", help = "scan only the files whose name or path matches one of these glob patterns")
+		self.parser_scan.add_argument('--exclude', nargs='+', action = "store", metavar = "PATTERN", help = "skip the files and directories whose name or path matches one of these glob patterns")
+		self.parser_scan.add_argument('--min-size', action = "store", type = int, metavar = "BYTES", help = "skip the files that are smaller than BYTES")
+		self.parser_scan.add_argument('--max-size', action = "store", type = int, metavar = "BYTES", help = "skip the files that are larger than BYTES")
+		self.parser_scan.add_argument('--symlinks', action = "store", choices = ['skip', 'files', 'follow'], default = 'files', help = "how symbolic links inside directories are treated: skip them, scan only links to files or also follow links to directories. default: files")
+		self.parser_scan.add_argument('--checkpoint-files', action = "store", type = int, metavar = "N", help = "commit the scan after every N files, so that it can be resumed if it is interrupted")
+		self.parser_scan.add_argument('--checkpoint-seconds', action = "store", type = int, metavar = "SECONDS", help = "commit the scan every SECONDS seconds, so that it can be resumed if it is interrupted")
+		self.parser_scan.add_argument('--resume', action = "store", type = int, metavar = "SCAN_ID", help = "continue an interrupted scan, skipping the local files that it already recorded")
+		self.parser_scan.add_argument('-v', '--verbose', action = "store_true", help = "print a message for each scanned file. by default only the progress of the scan is reported")
+		self.parser_scan.add_argument('--estimate', action = "store_true", help = "flag: do not scan, walk the local targets and predict the duration of the scan from the calibrated hash functions and the previous scans")
+		self.parser_scan.add_argument('--quick', action = "store_true", help = "flag: triage scan. only sampled hash functions (default: quicksig) are calculated and the SWHID is skipped, so only a few samples of each file are read. the other hash values can be added later with 'backfill'")
 
 		#search subcommand parser
 		search_help_msg = "search for files based on hash value and filename. output results in specified format"
@@ -64,6 +97,8 @@ class ParserTemplate:
 		self.parser_search = self.subparsers.add_parser('search', help= search_help_msg, description = search_descr_msg)
 		self.parser_search.add_argument('--hash', nargs='*', action='store', metavar = "HASH_VALUE", help = "search criterion: hash value")
 		self.parser_search.add_argument('--filename', nargs='*', action='store', metavar = "FILENAME", help = "search criterion: filename")
+		self.parser_search.add_argument('--hash-file', '--from-file', action='store', metavar = "HASH_FILE_PATH", help = "search criterion: file with one hash value per line ('-' for stdin). suitable for very large lists of hash values")
+		self.parser_search.add_argument('-f', '--function', nargs='+', action='store', metavar = "HASH_FUNCTION_NAME", help = "search only the hashes of these hash functions. a single function uses its hash-index, if it has one")
 		self.parser_search.add_argument('-o','--output', default= sys.stdout, action='store', metavar = "OUTPUT_PATH", help = "path to output file, default: stdout (Supported file formats: TXT, CSV, TSV, JSON, YAML, XML)")
 
 		#sql subcommand parser
@@ -71,14 +106,22 @@ class ParserTemplate:
 		self.parser_sql = self.subparsers.add_parser('sql', help= sql_help_msg, description= sql_help_msg)
 		self.parser_sql.add_argument('-q','--query', required = True, metavar = 'SQL_QUERY_STRING', action = "store", help = 'an SQL query. The query must be encapsulated inside double quotation marks ("SELECT ...")')
 		self.parser_sql.add_argument('-o','--output', default= sys.stdout, action='store', metavar = "OUTPUT_PATH", help = "path to output file, default: stdout (Supported file formats: TXT, CSV, TSV, JSON, YAML, XML)")
+		self.parser_sql.add_argument('--explain', action = 'store_true', help = "flag: do not execute the query, print the query plan of each statement instead (EXPLAIN QUERY PLAN)")
 
 		#dbinfo subcommand parser
 		dbinfo_help_msg = "print information regarding the specified database"
 		self.parser_dbinfo = self.subparsers.add_parser('dbinfo', help= dbinfo_help_msg, description = dbinfo_help_msg)
 
+		#verify subcommand parser
+		verify_help_msg = "compare the whole schema of the specified database with the hashesdb schema"
+		self.parser_verify = self.subparsers.add_parser('verify', help= verify_help_msg, description = verify_help_msg)
+
 		#stats subcommand parser
 		stats_help_msg = "print statistics regarding the specified database"
 		self.parser_stats = self.subparsers.add_parser('stats', help= stats_help_msg, description = stats_help_msg)
+		self.parser_stats.add_argument('--recount', action='store_true', help = "flag: recomputes the statistics from the data of the database instead of reading the maintained counts")
+		self.parser_stats.add_argument('--storage', action='store_true', help = "flag: also prints the bytes taken by repeated text values (reads the whole FILE and HASH tables)")
+		self.parser_stats.add_argument('--scans', action='store_true', help = "flag: also prints the performance of each scan (files, bytes, errors, duration, throughput and slowest stage)")
 
 		#hash-functions subcommand parser
 		hash_functions_msg = "print the hash functions available in the specified database"
@@ -90,10 +133,34 @@ class ParserTemplate:
 		self.parser_hash_is_available = self.subparsers.add_parser('hash-is-available', help= hash_is_available_help_msg, description = hash_is_available_help_msg)
 		self.parser_hash_is_available.add_argument('-func','--hash_function_name', metavar = "HASH_FUNCTION_NAME", action = "store", required = True, help = "the name of a hash function")
 
+		#hash-index subcommand parser
+		hash_index_help_msg = "create (or drop) an index that contains only the hashes of a hash function, used by searches restricted to that function"
+		self.parser_hash_index = self.subparsers.add_parser('hash-index', help= hash_index_help_msg, description = hash_index_help_msg)
+		self.parser_hash_index.add_argument('-f', '--function', nargs='+', action = "store", metavar = "HASH_FUNCTION_NAME", required = True, help = "the names of the hash functions")
+		self.parser_hash_index.add_argument('--drop', action = 'store_true', help = "flag: drops the indexes instead of creating them")
+
+		#calibrate subcommand parser
+		calibrate_help_msg = "measure the throughput of the hash functions on this host, so that 'scan --estimate' can predict the duration of a scan"
+		self.parser_calibrate = self.subparsers.add_parser('calibrate', help= calibrate_help_msg, description = calibrate_help_msg)
+		self.parser_calibrate.add_argument('-f', '--function', nargs='+', action = "store", metavar = "HASH_FUNCTION_NAME", help = "the names of the hash functions that will be measured. default: every available hash function")
+		self.parser_calibrate.add_argument('--seconds', action = "store", type = float, default = CALIBRATION_SECONDS, metavar = "SECONDS", help = f"duration of the measurement of each hash function. default: {CALIBRATION_SECONDS}")
+
+		#backfill subcommand parser
+		backfill_help_msg = "calculate the hash values that the scanned files miss, for hash functions that were not calculated when they were scanned"
+		backfill_descr_msg = backfill_help_msg + ". only the files that are still present and unchanged are read, and no file is scanned again."
+		self.parser_backfill = self.subparsers.add_parser('backfill', help= backfill_help_msg, description = backfill_descr_msg)
+		self.parser_backfill.add_argument('-c', '--calculate', nargs='+', action = "store", metavar = "HASH_FUNCTION_NAME", required = True, help = "hash functions whose missing hash values will be calculated")
+		self.parser_backfill.add_argument('--scope', action = "store", default = 'all', metavar = "SCAN_ID|ORIGIN|all", help = "the files that are backfilled: the files of a scan, the files of an origin (hostname or URL) or all the files. default: all")
+		self.parser_backfill.add_argument('-j', '--jobs', action = "store", default = 1, type = int, metavar = "THREADS_NUMBER", help = "number of threads to be used. default: 1")
+		self.parser_backfill.add_argument('-v', '--verbose', action = "store_true", help = "print a message for each skipped file")
+
 		#search-duplicates subcommand parser
 		search_duplicates_help_msg = "search for duplicates of a file inside a specified hashesdb database"
 		self.parser_search_duplicates = self.subparsers.add_parser('search-duplicates', help= search_duplicates_help_msg, description = search_duplicates_help_msg)
-		self.parser_search_duplicates.add_argument('-f', '--files', nargs='+', action = "store", metavar = "FILE_PATH", required = True, help = "paths of files to look for in the specified database")
+		self.parser_search_duplicates.add_argument('-f', '--files', nargs='+', action = "store", metavar = "FILE_PATH", required = True, help = "paths of files to look for in the specified database. directories are searched recursively")
+		self.parser_search_duplicates.add_argument('--digest', action = "store", default = 'swhid', metavar = "HASH_FUNCTION_NAME", help = "hash function used to find duplicates. each file is hashed only with this function. default: swhid")
+		self.parser_search_duplicates.add_argument('--prefilter', action = "store", metavar = "HASH_FUNCTION_NAME", help = "hash function (e.g. quicksig) used to select the files that are hashed with --digest: only the files whose prefilter hash value is in the database are read whole")
+		self.parser_search_duplicates.add_argument('-j', '--jobs', action = "store", default = 1, type = int, metavar = "THREADS_NUMBER", help = "number of threads to be used. default: 1")
 		self.parser_search_duplicates.add_argument('-o','--output', default= sys.stdout, action='store', metavar = "OUTPUT_PATH", help = "path to output file, default: stdout (Supported file formats: TXT, CSV, TSV, JSON, YAML, XML)")
 
 		#compare subcommand parser
@@ -101,6 +168,7 @@ class ParserTemplate:
 		self.parser_compare = self.subparsers.add_parser('compare', help= compare_help_msg, description = compare_help_msg)
 		self.parser_compare.add_argument('-fuzzy', metavar = 'FUZZY_HASH_FUNCTION_NAME', required = True, action = "store", help = "fuzzy hash function which will be used for the similarity comparsion")
 		self.parser_compare.add_argument('-ids', '--hash-ids', nargs='+', type = int, action = "store", metavar = "HASH_ID", required = True, help = "hash ids that will be compared with each other. must be products of the same fuzzy hash function")
+		self.parser_compare.add_argument('-v', '--verbose', action = "store_true", help = "print a message before each comparsion")
 
 		#reset subcommand parser
 		reset_help_msg = "resets database by deleting all of its content"
@@ -111,15 +179,58 @@ class ParserTemplate:
 		try:
 			args = self.parser.parse_args(arg_list)
 		except SystemExit as e:
-		#if the arguments are wrong, then don't exit 
+		#if the arguments are wrong, then don't exit (unless the command is a standalone command, see exit_on_usage_error)
+			if self.exit_on_usage_error:
+				raise
 			print()
 		else:
 			try:
-				args.func(args)
+				self.execute(args, arg_list)
 			except Exception as e:
 				print("Error: something went wrong during the execution of the command. In more detail:")
 				print(e)
 
+	def execute(self, args, arg_list = None):
+		#call the function that executes the subcommand
+		self.dispatch(args)
+
+	def dispatch(self, args):
+		#The digest cache is used only by the subcommand that was given the --xattr-cache option
+		if not getattr(args, 'xattr_cache', False):
+			self.dispatch_timed(args)
+			return
+
+		enable_digest_cache()
+		try:
+			self.dispatch_timed(args)
+		finally:
+			enable_digest_cache(False)
+
+	def dispatch_timed(self, args):
+		#Time the SQL statements of the subcommand if the --slow-query-log option was given
+		if getattr(args, 'slow_query_log', None) is None:
+			self.dispatch_profiled(args)
+			return
+
+		slow_query_log = SlowQueryLog(args.slow_query_log, args.slow_query_ms)
+		slow_query_log.start()
+		try:
+			self.dispatch_profiled(args)
+		finally:
+			slow_query_log.stop()
+
+	def dispatch_profiled(self, args):
+		#Call the function that executes the subcommand, under the profiler if the --profile option was given or profiling is on in the REPL
+		if getattr(args, 'profile', None) is not None:
+			profile_path, memory_flag, top_count = args.profile, args.profile_memory, args.profile_top
+		elif self.profile_settings is not None and args.subcommand != 'profile':
+			profile_path, memory_flag, top_count = self.profile_settings
+		else:
+			args.func(args)
+			return
+
+		run_profiled(args.func, [args], profile_path or default_profile_path(args.subcommand), memory_flag, top_count)
+
 
 class TerminalParser(ParserTemplate):
 
@@ -129,6 +240,9 @@ class TerminalParser(ParserTemplate):
 	def __init__(self):
 
 		super(TerminalParser, self).__init__()
+
+		#A standalone command (or a command forwarded to the server) fails with the exit status of argparse if its arguments are invalid
+		self.exit_on_usage_error = True
 		
 		##Terminal-only subcommands
 
@@ -138,17 +252,28 @@ class TerminalParser(ParserTemplate):
 		self.parser_sql.add_argument('-d', '--database', '--db', required = True, metavar = "DATABASE_PATH", action = "store", help = "path to a hashesdb database (.db file)")
 		self.parser_dbinfo.add_argument('-d', '--database', '--db', required = True, metavar = "DATABASE_PATH", action = "store", help = "path to a hashesdb database (.db file)")
 		self.parser_stats.add_argument('-d', '--database', '--db', required = True, metavar = "DATABASE_PATH", action = "store", help = "path to a hashesdb database (.db file)")
+		self.parser_verify.add_argument('-d', '--database', '--db', required = True, metavar = "DATABASE_PATH", action = "store", help = "path to a hashesdb database (.db file)")
 		self.parser_hash_functions.add_argument('-d', '--database', '--db', required = True, metavar = "DATABASE_PATH", action = "store", help = "path to a hashesdb database (.db file)")
 		self.parser_hash_is_available.add_argument('-d', '--database', '--db', required = True, metavar = "DATABASE_PATH", action = "store", help = "path to a hashesdb database (.db file)")
+		self.parser_hash_index.add_argument('-d', '--database', '--db', required = True, metavar = "DATABASE_PATH", action = "store", help = "path to a hashesdb database (.db file)")
+		self.parser_calibrate.add_argument('-d', '--database', '--db', required = True, metavar = "DATABASE_PATH", action = "store", help = "path to a hashesdb database (.db file)")
+		self.parser_backfill.add_argument('-d', '--database', '--db', required = True, metavar = "DATABASE_PATH", action = "store", help = "path to a hashesdb database (.db file)")
 		self.parser_search_duplicates.add_argument('-d', '--database', '--db', required = True, metavar = "DATABASE_PATH", action = "store", help = "path to a hashesdb database (.db file)")
 		self.parser_compare.add_argument('-d', '--database', '--db', required = True, metavar = "DATABASE_PATH", action = "store", help = "path to a hashesdb database (.db file)")
 		self.parser_reset.add_argument('-d', '--database', '--db', required = True, metavar = "DATABASE_PATH", action = "store", help = "path to a hashesdb database (.db file)")
 
+		#serve subcommand parser
+		serve_help_msg = "keep a database open and execute the commands of other hashesdb processes that use it (through a local unix socket)"
+		self.parser_serve = self.subparsers.add_parser('serve', help= serve_help_msg, description = serve_help_msg)
+		self.parser_serve.add_argument('-d', '--database', '--db', required = True, metavar = "DATABASE_PATH", action = "store", help = "path to the hashesdb database (.db file) that will be served")
+		self.parser_serve.add_argument('--stop', action = 'store_true', help = "flag: stops the server that serves the specified database")
+
 		#set defaults to TerminalParser methods
 		self.parser.set_defaults(func=self.subcommand_repl)
 		self.parser_about.set_defaults(func=self.subcommand_about)
 		self.parser_schema.set_defaults(func=self.subcommand_schema)
 		self.parser_create.set_defaults(func=self.subcommand_create)
+		self.parser_upgrade.set_defaults(func=self.subcommand_upgrade)
 		self.parser_import.set_defaults(func=self.subcommand_import)
 		self.parser_export.set_defaults(func=self.subcommand_export)
 		self.parser_use.set_defaults(func=self.subcommand_use)
@@ -157,11 +282,29 @@ class TerminalParser(ParserTemplate):
 		self.parser_sql.set_defaults(func=self.subcommand_sql)
 		self.parser_dbinfo.set_defaults(func=self.subcommand_dbinfo)
 		self.parser_stats.set_defaults(func=self.subcommand_stats)
+		self.parser_verify.set_defaults(func=self.subcommand_verify)
 		self.parser_hash_functions.set_defaults(func=self.subcommand_hash_functions)
 		self.parser_hash_is_available.set_defaults(func=self.subcommand_hash_is_available)
+		self.parser_hash_index.set_defaults(func=self.subcommand_hash_index)
+		self.parser_calibrate.set_defaults(func=self.subcommand_calibrate)
+		self.parser_backfill.set_defaults(func=self.subcommand_backfill)
 		self.parser_search_duplicates.set_defaults(func=self.subcommand_search_duplicates)
 		self.parser_compare.set_defaults(func=self.subcommand_compare)
 		self.parser_reset.set_defaults(func=self.subcommand_reset)
+		self.parser_serve.set_defaults(func=self.subcommand_serve)
+
+	def execute(self, args, arg_list = None):
+		#If a hashesdb server serves the database, forward the command to it instead of opening the database in this process
+		if is_forwardable(args):
+			from server import forward_command
+			forwarded_status = forward_command(args.database, sys.argv[1:] if arg_list is None else arg_list)
+			if forwarded_status is not None:
+				#The exit status of the command executed by the server becomes the exit status of this process
+				if forwarded_status:
+					sys.exit(forwarded_status)
+				return
+
+		self.dispatch(args)
 
 	def subcommand_repl(self,args):
 		#Open a REPL with no used database
@@ -169,19 +312,22 @@ class TerminalParser(ParserTemplate):
 		repl.read()
 
 	def subcommand_about(self,args):
-		App().about()
+		new_app().about()
 
 	def subcommand_schema(self,args):
-		App().schema()
+		new_app().schema()
 
 	def subcommand_create(self,args):
-		App().create(args.database, args.overwrite)
+		new_app().create(args.database, args.overwrite)
+
+	def subcommand_upgrade(self,args):
+		new_app().upgrade(args.database)
 
 	def subcommand_import(self,args):
-		App(args.database).import_db(args.folder, args.extension)
+		new_app(args.database).import_db(args.folder, args.extension)
 
 	def subcommand_export(self,args):
-		App(args.database).export_db(args.folder, args.extension, args.overwrite)
+		new_app(args.database).export_db(args.folder, args.extension, args.overwrite)
 
 	def subcommand_use(self,args):
 		#Open a REPL and begin using the specified database
@@ -190,34 +336,134 @@ class TerminalParser(ParserTemplate):
 
 	def subcommand_scan(self,args):
 		scan_targets = [args.targets, args.github, args.gitlab]
-		App(args.database).scan(scan_targets, args.calculate, args.download_location, args.jobs, True, args.recursive)
+		new_app(args.database).scan(scan_targets, args.calculate, args.download_location, args.jobs, True, args.recursive, get_target_filter(args), args.checkpoint_files, args.checkpoint_seconds, args.resume, args.verbose, args.estimate, args.quick)
 
 	def subcommand_search(self,args):
-		App(args.database).search(args.hash, args.filename, args.output)
+		new_app(args.database).search(args.hash, args.filename, args.output, args.hash_file, args.function)
 
 	def subcommand_sql(self,args):
-		App(args.database).sql_query(args.query, args.output, True)
+		new_app(args.database).sql_query(args.query, args.output, True, args.explain)
 
 	def subcommand_dbinfo(self,args):
-		App(args.database).dbinfo()
+		new_app(args.database).dbinfo()
 
 	def subcommand_stats(self,args):
-		App(args.database).stats()
+		new_app(args.database).stats(args.recount, True, args.storage, args.scans)
+
+	def subcommand_verify(self,args):
+		new_app(args.database).verify()
 
 	def subcommand_hash_functions(self,args):
-		App(args.database).hash_functions(args.details)
+		new_app(args.database).hash_functions(args.details)
 
 	def subcommand_hash_is_available(self,args):
-		App(args.database).hash_is_available(args.hash_function_name)
+		new_app(args.database).hash_is_available(args.hash_function_name)
+
+	def subcommand_hash_index(self,args):
+		new_app(args.database).hash_index(args.function, args.drop, True)
+
+	def subcommand_calibrate(self,args):
+		new_app(args.database).calibrate(args.function, args.seconds, True)
+
+	def subcommand_backfill(self,args):
+		new_app(args.database).backfill(args.calculate, args.scope, args.jobs, args.verbose, True)
 
 	def subcommand_search_duplicates(self,args):
-		App(args.database).search_duplicates(args.files, args.output)
+		new_app(args.database).search_duplicates(args.files, args.output, args.digest, args.jobs, args.prefilter)
 
 	def subcommand_compare(self,args):
-		App(args.database).compare(args.fuzzy, args.hash_ids)
+		new_app(args.database).compare(args.fuzzy, args.hash_ids, args.verbose)
 
 	def subcommand_reset(self,args):
-		App(args.database).reset()
+		new_app(args.database).reset()
+
+	def subcommand_serve(self,args):
+		from server import HashesdbServer, stop_server
+		if args.stop:
+			stop_server(args.database)
+		else:
+			HashesdbServer(args.database).serve()
+
+
+class ServerParser(TerminalParser):
+
+	'''This class inherits the parser of the TerminalParser class, so that the hashesdb server accepts exactly the same commands as the terminal.
+	Instead of opening the database for each command, it applies the commands to an App() object that keeps the served database open.'''
+
+	def __init__(self, app_parameter):
+
+		super(ServerParser, self).__init__()
+
+		#The App() object that uses the served database
+		self.app = app_parameter
+
+		##set defaults to ServerParser methods
+		self.parser_export.set_defaults(func=self.server_export)
+		self.parser_scan.set_defaults(func=self.server_scan)
+		self.parser_search.set_defaults(func=self.server_search)
+		self.parser_sql.set_defaults(func=self.server_sql)
+		self.parser_dbinfo.set_defaults(func=self.server_dbinfo)
+		self.parser_stats.set_defaults(func=self.server_stats)
+		self.parser_verify.set_defaults(func=self.server_verify)
+		self.parser_hash_functions.set_defaults(func=self.server_hash_functions)
+		self.parser_hash_is_available.set_defaults(func=self.server_hash_is_available)
+		self.parser_hash_index.set_defaults(func=self.server_hash_index)
+		self.parser_calibrate.set_defaults(func=self.server_calibrate)
+		self.parser_backfill.set_defaults(func=self.server_backfill)
+		self.parser_search_duplicates.set_defaults(func=self.server_search_duplicates)
+		self.parser_compare.set_defaults(func=self.server_compare)
+
+	def execute(self, args, arg_list = None):
+		#Commands are never forwarded by the server itself
+		if not is_forwardable(args):
+			print("Error: this command is not supported by the hashesdb server.")
+		elif abspath(args.database) != self.app.used_database.get_database_path():
+			print(f"Error: the hashesdb server serves {self.app.used_database.get_database_path()}, not {abspath(args.database)}.")
+		else:
+			self.dispatch(args)
+
+	def server_export(self,args):
+		self.app.export_db(args.folder, args.extension, args.overwrite)
+
+	def server_scan(self,args):
+		scan_targets = [args.targets, args.github, args.gitlab]
+		self.app.scan(scan_targets, args.calculate, args.download_location, args.jobs, True, args.recursive, get_target_filter(args), args.checkpoint_files, args.checkpoint_seconds, args.resume, args.verbose, args.estimate, args.quick)
+
+	def server_search(self,args):
+		self.app.search(args.hash, args.filename, args.output, args.hash_file, args.function)
+
+	def server_sql(self,args):
+		self.app.sql_query(args.query, args.output, True, args.explain)
+
+	def server_dbinfo(self,args):
+		self.app.dbinfo()
+
+	def server_stats(self,args):
+		self.app.stats(args.recount, True, args.storage, args.scans)
+
+	def server_verify(self,args):
+		self.app.verify()
+
+	def server_hash_functions(self,args):
+		self.app.hash_functions(args.details)
+
+	def server_hash_is_available(self,args):
+		self.app.hash_is_available(args.hash_function_name)
+
+	def server_hash_index(self,args):
+		self.app.hash_index(args.function, args.drop, True)
+
+	def server_calibrate(self,args):
+		self.app.calibrate(args.function, args.seconds, True)
+
+	def server_backfill(self,args):
+		self.app.backfill(args.calculate, args.scope, args.jobs, args.verbose, True)
+
+	def server_search_duplicates(self,args):
+		self.app.search_duplicates(args.files, args.output, args.digest, args.jobs, args.prefilter)
+
+	def server_compare(self,args):
+		self.app.compare(args.fuzzy, args.hash_ids, args.verbose)
 		
 		
 class ReplParser(ParserTemplate):
@@ -231,9 +477,9 @@ class ReplParser(ParserTemplate):
 
 		##define an App object where the given commands will be applied.
 		if database_to_use_parameter == None:
-			self.app = App()
+			self.app = new_app()
 		else:
-			self.app = App()
+			self.app = new_app()
 			self.app.use(database_to_use_parameter)
 
 		##REPL-only subcommands
@@ -262,10 +508,19 @@ class ReplParser(ParserTemplate):
 		rollback_help_msg = "rolls back any changes to the database since the last call to 'save'"
 		self.parser_rollback = self.subparsers.add_parser('rollback', help= rollback_help_msg, description = rollback_help_msg)
 
+		#profile subcommand parser
+		profile_help_msg = "turns profiling of the following commands on or off"
+		self.parser_profile = self.subparsers.add_parser('profile', help= profile_help_msg, description = profile_help_msg)
+		self.parser_profile.add_argument('state', choices = ['on', 'off'], help = "on: each following command is run under a profiler. off: stop profiling")
+		self.parser_profile.add_argument('-o', '--output', metavar = "PSTATS_PATH", action = "store", help = "path to which the profile of each command is written. default: hashesdb-<subcommand>.prof")
+		self.parser_profile.add_argument('--memory', action = 'store_true', help = "flag: also trace the memory allocations (slow)")
+		self.parser_profile.add_argument('--top', type = int, default = 20, metavar = "N", help = "number of functions printed in the summary of each profile. default: 20")
+
 		##set defaults to ReplParser methods
 		self.parser_about.set_defaults(func=self.repl_about)
 		self.parser_schema.set_defaults(func=self.repl_schema)
 		self.parser_create.set_defaults(func=self.repl_create)
+		self.parser_upgrade.set_defaults(func=self.repl_upgrade)
 		self.parser_import.set_defaults(func=self.repl_import)
 		self.parser_export.set_defaults(func=self.repl_export)
 		self.parser_use.set_defaults(func=self.repl_use)
@@ -274,8 +529,12 @@ class ReplParser(ParserTemplate):
 		self.parser_sql.set_defaults(func=self.repl_sql)
 		self.parser_dbinfo.set_defaults(func=self.repl_dbinfo)
 		self.parser_stats.set_defaults(func=self.repl_stats)
+		self.parser_verify.set_defaults(func=self.repl_verify)
 		self.parser_hash_functions.set_defaults(func=self.repl_hash_functions)
 		self.parser_hash_is_available.set_defaults(func=self.repl_hash_is_available)
+		self.parser_hash_index.set_defaults(func=self.repl_hash_index)
+		self.parser_calibrate.set_defaults(func=self.repl_calibrate)
+		self.parser_backfill.set_defaults(func=self.repl_backfill)
 		self.parser_search_duplicates.set_defaults(func=self.repl_search_duplicates)
 		self.parser_compare.set_defaults(func=self.repl_compare)
 
@@ -285,6 +544,7 @@ class ReplParser(ParserTemplate):
 		self.parser_status.set_defaults(func=self.repl_status)
 		self.parser_save.set_defaults(func=self.repl_save)
 		self.parser_rollback.set_defaults(func=self.repl_rollback)
+		self.parser_profile.set_defaults(func=self.repl_profile)
 		self.parser_reset.set_defaults(func=self.repl_reset)
 
 	def read(self):
@@ -308,6 +568,9 @@ class ReplParser(ParserTemplate):
 	def repl_create(self,args):
 		self.app.create(args.database, args.overwrite)
 
+	def repl_upgrade(self,args):
+		self.app.upgrade(args.database)
+
 	def repl_import(self,args):
 		self.app.import_db(args.folder, args.extension)
 
@@ -318,20 +581,23 @@ class ReplParser(ParserTemplate):
 		self.app.use(args.database)
 
 	def repl_scan(self,args):
-		scan_targets = [args.targets, args.github, args.gitlab, args.bitbucket]
-		self.app.scan(scan_targets, args.calculate, args.download_location, args.jobs, False, args.recursive)
+		scan_targets = [args.targets, args.github, args.gitlab]
+		self.app.scan(scan_targets, args.calculate, args.download_location, args.jobs, False, args.recursive, get_target_filter(args), args.checkpoint_files, args.checkpoint_seconds, args.resume, args.verbose, args.estimate, args.quick)
 
 	def repl_search(self,args):
-		self.app.search(args.hash, args.filename, args.output)
+		self.app.search(args.hash, args.filename, args.output, args.hash_file, args.function)
 
 	def repl_sql(self,args):
-		self.app.sql_query(args.query, args.output, False)
+		self.app.sql_query(args.query, args.output, False, args.explain)
 
 	def repl_dbinfo(self,args):
 		self.app.dbinfo()
 
 	def repl_stats(self,args):
-		self.app.stats()
+		self.app.stats(args.recount, False, args.storage, args.scans)
+
+	def repl_verify(self,args):
+		self.app.verify()
 
 	def repl_hash_functions(self,args):
 		self.app.hash_functions(args.details)
@@ -339,11 +605,20 @@ class ReplParser(ParserTemplate):
 	def repl_hash_is_available(self,args):
 		self.app.hash_is_available(args.hash_function_name)
 
+	def repl_hash_index(self,args):
+		self.app.hash_index(args.function, args.drop, False)
+
+	def repl_calibrate(self,args):
+		self.app.calibrate(args.function, args.seconds, False)
+
+	def repl_backfill(self,args):
+		self.app.backfill(args.calculate, args.scope, args.jobs, args.verbose, False)
+
 	def repl_search_duplicates(self,args):
-		self.app.search_duplicates(args.files, args.output)
+		self.app.search_duplicates(args.files, args.output, args.digest, args.jobs, args.prefilter)
 
 	def repl_compare(self,args):
-		self.app.compare(args.fuzzy, args.hash_ids)
+		self.app.compare(args.fuzzy, args.hash_ids, args.verbose)
 
 
 	def repl_exit(self,args):
@@ -367,5 +642,40 @@ class ReplParser(ParserTemplate):
 	def repl_reset(self,args):
 		self.app.reset()
 
+	def repl_profile(self,args):
+		if args.state == 'on':
+			self.profile_settings = (args.output, args.memory, args.top)
+			print(f"Profiling is on. The profile of each command will be written to {args.output or default_profile_path('<subcommand>')}.")
+		else:
+			self.profile_settings = None
+			print("Profiling is off.")
+
+#Subcommands that may be executed by a hashesdb server on behalf of the terminal. The other subcommands either do not use a database
+#(about, schema, create), migrate it (upgrade), replace it (import) or interact with the user (use, reset).
+FORWARDABLE_SUBCOMMANDS = ['export', 'scan', 'search', 'sql', 'dbinfo', 'stats', 'verify', 'hash-functions', 'hash-is-available', 'hash-index', 'calibrate', 'backfill', 'search-duplicates', 'compare']
+
+def is_forwardable(args):
+	#Profiled commands and commands whose SQL statements are timed are executed locally, so that the profile and the slow-query log describe their execution
+	if getattr(args, 'profile', None) is not None or getattr(args, 'slow_query_log', None) is not None:
+		return False
+	#Scans of remote targets are never forwarded, since they may prompt the user for a personal access token
+	if getattr(args, 'subcommand', None) == 'scan' and (args.github or args.gitlab):
+		return False
+	#The server cannot read the standard input of the client
+	if getattr(args, 'subcommand', None) == 'search' and args.hash_file == '-':
+		return False
+	return getattr(args, 'subcommand', None) in FORWARDABLE_SUBCOMMANDS
+
+def new_app(database_path_parameter = None):
+	#The app module imports the database layer (SQLAlchemy, the scanner), so it is imported only when a command is executed by this process.
+	#A command that is forwarded to a hashesdb server is parsed and sent without it.
+	from app import App
+	return App(database_path_parameter)
+
+def get_target_filter(args):
+	#Construct the TargetFilter that selects the local files of a scan according to the arguments of the scan subcommand
+	from scan import TargetFilter
+	return TargetFilter(args.include, args.exclude, args.min_size, args.max_size, args.symlinks)
+
 if __name__ == '__main__':
 	TerminalParser().parse()
@@ -0,0 +1,129 @@
+import sys
+import threading
+
+#The profiling modules are imported inside the functions that use them, so that commands that are not profiled do not pay for them at startup
+
+#Seconds between two checks of the traced memory while looking for the peak of the allocations
+MEMORY_SAMPLING_INTERVAL = 0.25
+
+def default_profile_path(subcommand_parameter):
+	#Name of the pstats file of a subcommand, when no path is given
+	return f"hashesdb-{subcommand_parameter}.prof"
+
+def run_profiled(function, args_list, profile_path_parameter, memory_flag = False, top_count = 20, stream = None):
+	"""
+	Description
+	-----------
+	Calls a function under cProfile, writes the collected statistics to a pstats file and prints a summary of the functions that took the most time.
+	Optionally, it also traces the memory allocations with tracemalloc and prints the peak of the traced memory and the call sites that allocated
+	the most memory around that peak.
+
+	Parameters
+	-----------
+	function - callable
+		The function that will be profiled (e.g. the function that executes a subcommand)
+
+	args_list - list
+		The positional arguments of the function
+
+	profile_path_parameter - string
+		Path to the pstats file that will be written. It can be read with 'python -m pstats <path>' or with any pstats viewer.
+
+	memory_flag - boolean, optional
+		Default: False
+		If True, the memory allocations are traced too. Tracing slows the function down considerably.
+
+	top_count - int, optional
+		Default: 20
+		The number of functions (and call sites) included in the summary
+
+	stream - file object, optional
+		Default: sys.stderr
+		The stream to which the summary is printed. The summary is not printed to stdout, so that it does not mix with the output of the function.
+
+	Results
+	-----------
+	Returns the result of the function. Exceptions raised by the function are propagated after the profile is written.
+	"""
+
+	import cProfile
+	import pstats
+
+	if stream is None:
+		stream = sys.stderr
+
+	memory_sampler = MemorySampler() if memory_flag else None
+	profiler = cProfile.Profile()
+
+	try:
+		return profiler.runcall(function, *args_list)
+	finally:
+		if memory_sampler is not None:
+			memory_sampler.stop()
+
+		try:
+			profiler.dump_stats(profile_path_parameter)
+		except Exception as e:
+			print(f"Error: the profile could not be written to {profile_path_parameter}. In more detail:", file = stream)
+			print(e, file = stream)
+		else:
+			print(f"\nProfile written to {profile_path_parameter} (read it with: python -m pstats {profile_path_parameter})", file = stream)
+
+		print(f"Top {top_count} functions by cumulative time:", file = stream)
+		pstats.Stats(profiler, stream = stream).strip_dirs().sort_stats('cumulative').print_stats(top_count)
+
+		if memory_sampler is not None:
+			memory_sampler.print_summary(top_count, stream)
+
+
+class MemorySampler:
+	"""
+	This class traces the memory allocations with tracemalloc from the moment it is created until stop() is called.
+	A background thread checks the traced memory periodically and takes a snapshot each time it grows beyond every previous check,
+	so that the call sites are reported as they were around the peak of the allocations and not only at the end, when most memory has been freed.
+	"""
+
+	def __init__(self, interval = MEMORY_SAMPLING_INTERVAL):
+		import tracemalloc
+
+		self.tracemalloc = tracemalloc
+		self.interval = interval
+		self.peak_snapshot = None
+		self.peak_snapshot_size = 0
+		self.peak_size = 0
+		self.stopped = threading.Event()
+
+		tracemalloc.start()
+		self.thread = threading.Thread(target = self.sample, daemon = True)
+		self.thread.start()
+
+	def sample(self):
+		while not self.stopped.wait(self.interval):
+			self.take_snapshot_if_larger()
+
+	def take_snapshot_if_larger(self):
+		current_size = self.tracemalloc.get_traced_memory()[0]
+		if current_size > self.peak_snapshot_size:
+			self.peak_snapshot = self.tracemalloc.take_snapshot()
+			self.peak_snapshot_size = current_size
+
+	def stop(self):
+		self.stopped.set()
+		self.thread.join()
+		self.take_snapshot_if_larger()
+		self.peak_size = self.tracemalloc.get_traced_memory()[1]
+		self.tracemalloc.stop()
+
+	def print_summary(self, top_count, stream):
+		print(f"Peak traced memory: {self.peak_size / (1024 * 1024):.2f} MiB", file = stream)
+		if self.peak_snapshot is None:
+			return
+
+		#The snapshot does not include the allocations of the profiling modules themselves
+		snapshot = self.peak_snapshot.filter_traces([
+			self.tracemalloc.Filter(False, self.tracemalloc.__file__),
+			self.tracemalloc.Filter(False, __file__),
+		])
+		print(f"Top {top_count} call sites by allocated memory (snapshot of {self.peak_snapshot_size / (1024 * 1024):.2f} MiB, sampled near the peak):", file = stream)
+		for statistic in snapshot.statistics('lineno')[:top_count]:
+			print(f"\t{statistic}", file = stream)
@@ -0,0 +1,137 @@
+import sys
+import json
+from time import monotonic
+
+#Seconds between two renderings of the status line on a terminal
+TTY_REFRESH_INTERVAL = 0.25
+
+#Seconds between two JSON progress lines when the output is not a terminal (e.g. a log file or a pipe)
+JSON_REFRESH_INTERVAL = 10.0
+
+class ProgressReporter:
+	"""
+	This class reports the progress of a long operation (e.g. a scan) without printing a line for each file.
+	It aggregates counters (files, bytes, errors) and renders them at a fixed rate: as a status line that is rewritten in place
+	when the output is a terminal, or as a JSON line when it is not. The per-file messages are printed only in verbose mode.
+	"""
+
+	__slots__ = ('stream', 'verbose', 'total_files', 'tty', 'refresh_interval', 'files', 'bytes', 'errors', 'start_time', 'last_render_time', 'status_length')
+
+	def __init__(self, verbose = False, total_files = None, stream = None):
+		"""
+		Description
+		-----------
+		Initializes a ProgressReporter.
+
+		Parameters
+		-----------
+		verbose - boolean, optional
+			If True, the per-file messages given to detail() are printed.
+
+		total_files - int, optional
+			The number of files of the operation, if it is known in advance. It is used to estimate the remaining time.
+
+		stream - file object, optional
+			Default: sys.stdout (at the time the reporter is created)
+			The stream to which the progress is written.
+		"""
+
+		self.stream = stream if stream is not None else sys.stdout
+		self.verbose = verbose
+		self.total_files = total_files
+
+		try:
+			self.tty = self.stream.isatty()
+		except Exception:
+			self.tty = False
+		self.refresh_interval = TTY_REFRESH_INTERVAL if self.tty else JSON_REFRESH_INTERVAL
+
+		self.files = 0
+		self.bytes = 0
+		self.errors = 0
+		self.start_time = monotonic()
+		self.last_render_time = self.start_time
+		self.status_length = 0
+
+	def file_done(self, size = 0):
+		#Called after each file. The clock is read for every file, but the progress is rendered only when refresh_interval has passed.
+		self.files += 1
+		self.bytes += size
+		now = monotonic()
+		if now - self.last_render_time >= self.refresh_interval:
+			self.render(now)
+
+	def message(self, *lines):
+		#Prints the lines without breaking the status line: the status line is cleared and it is rendered again at the next refresh
+		self.clear_status()
+		for line in lines:
+			print(line, file = self.stream)
+
+	def error(self, *lines):
+		self.errors += 1
+		self.message(*lines)
+
+	def detail(self, *lines):
+		if self.verbose:
+			self.message(*lines)
+
+	def counters(self, now = None):
+		"""
+		Description
+		-----------
+		Returns a dictionary with the counters and the rates of the operation.
+		eta_seconds is None when the total number of files is not known.
+		"""
+
+		if now is None:
+			now = monotonic()
+		elapsed = now - self.start_time
+
+		files_per_second = self.files / elapsed if elapsed > 0 else 0.0
+		eta = None
+		if self.total_files is not None and files_per_second > 0:
+			eta = max(0, self.total_files - self.files) / files_per_second
+
+		return {
+			'files': self.files,
+			'total_files': self.total_files,
+			'bytes': self.bytes,
+			'errors': self.errors,
+			'elapsed_seconds': round(elapsed, 1),
+			'files_per_second': round(files_per_second, 1),
+			'mb_per_second': round(self.bytes / (1024 * 1024) / elapsed, 2) if elapsed > 0 else 0.0,
+			'eta_seconds': round(eta, 1) if eta is not None else None,
+		}
+
+	def render(self, now = None, final = False):
+		counters = self.counters(now)
+		if self.tty:
+			status = status_line(counters)
+			#The previous status line is overwritten, padding with spaces if it was longer
+			self.stream.write('\r' + status.ljust(self.status_length) + ('\n' if final else ''))
+			self.status_length = 0 if final else len(status)
+		else:
+			counters['done'] = final
+			print(json.dumps({'progress': counters}), file = self.stream)
+		self.stream.flush()
+		self.last_render_time = monotonic()
+
+	def clear_status(self):
+		if self.status_length:
+			self.stream.write('\r' + ' ' * self.status_length + '\r')
+			self.status_length = 0
+
+	def finish(self):
+		#Renders the final counters once, so that every operation ends with a summary
+		self.render(final = True)
+
+def status_line(counters):
+	#Formats the counters as a single line, e.g. "1200 files, 35.2 MiB, 0 errors | 812.4 files/s, 23.80 MB/s | ETA 0:00:12"
+	line = f"{counters['files']}"
+	if counters['total_files'] is not None:
+		line += f"/{counters['total_files']}"
+	line += f" files, {counters['bytes'] / (1024 * 1024):.1f} MiB, {counters['errors']} errors | {counters['files_per_second']} files/s, {counters['mb_per_second']:.2f} MB/s"
+	if counters['eta_seconds'] is not None:
+		eta = int(counters['eta_seconds'])
+		line += f" | ETA {eta // 3600}:{eta % 3600 // 60:02d}:{eta % 60:02d}"
+	return line
@@ -0,0 +1,86 @@
+import hashlib
+import os
+
+#Layout of the quicksig hash function. Changing any of the following changes every quicksig hash value.
+#The hash value is the BLAKE2b (QUICKSIG_DIGEST_SIZE bytes) of the size of the file (8 bytes, little-endian) followed by QUICKSIG_SAMPLES samples
+#of QUICKSIG_SAMPLE_SIZE bytes: the first bytes of the file, the last bytes of the file and samples at evenly spaced offsets between them.
+#Files of at most QUICKSIG_SAMPLES * QUICKSIG_SAMPLE_SIZE bytes are sampled whole, i.e. the size is followed by the whole content of the file.
+QUICKSIG_SAMPLES = 16
+QUICKSIG_SAMPLE_SIZE = 64 * 1024
+QUICKSIG_DIGEST_SIZE = 16
+
+def sample_offsets(file_size):
+	"""
+	Description
+	-----------
+	Returns the offsets of the samples of a file, in the order in which they are hashed.
+	The first sample is the head of the file and the last sample is its tail. A file that is sampled whole has a single sample at offset 0.
+
+	Parameters
+	-----------
+	file_size - int
+		The size of the file in bytes
+	"""
+
+	if file_size <= QUICKSIG_SAMPLES * QUICKSIG_SAMPLE_SIZE:
+		return [0]
+
+	last_offset = file_size - QUICKSIG_SAMPLE_SIZE
+	return [last_offset * i // (QUICKSIG_SAMPLES - 1) for i in range(QUICKSIG_SAMPLES)]
+
+def quick_signature(file_parameter, file_size):
+	"""
+	Description
+	-----------
+	Calculates the quicksig hash value of an open file, reading only its samples (at most QUICKSIG_SAMPLES * QUICKSIG_SAMPLE_SIZE bytes).
+	Two files with different quicksig hash values are certainly different. Two files with the same quicksig hash value have the same size and
+	the same samples, so they are probably the same file, but this should be confirmed with a hash function that reads the whole file.
+
+	Parameters
+	-----------
+	file_parameter: file object
+		A file opened in binary mode. Its position is not changed.
+
+	file_size: int
+		The size of the file in bytes
+
+	Results
+	-----------
+	Returns the hash value as a hex string.
+
+	Raises
+	-----------
+	Raises an OSError if the file can not be read or is shorter than file_size (e.g. because it was truncated while it was sampled)
+	"""
+
+	signature = hashlib.blake2b(file_size.to_bytes(8, 'little'), digest_size = QUICKSIG_DIGEST_SIZE)
+
+	sample_size = QUICKSIG_SAMPLE_SIZE if file_size > QUICKSIG_SAMPLES * QUICKSIG_SAMPLE_SIZE else file_size
+	for offset in sample_offsets(file_size):
+		signature.update(read_at(file_parameter, offset, sample_size))
+
+	return signature.hexdigest()
+
+def read_at(file_parameter, offset, size):
+	#Positioned reads do not move the position of the file, so the file can still be read sequentially afterwards (os.pread is not available on Windows)
+	#A read may return fewer bytes than requested (e.g. on network file systems or after a signal), so the reads are repeated until the sample is complete.
+	#Only a read that returns nothing means that the file ended before the sample.
+	chunks = []
+	read_size = 0
+	position = None if hasattr(os, 'pread') else file_parameter.tell()
+	try:
+		while read_size < size:
+			if position is None:
+				data = os.pread(file_parameter.fileno(), size - read_size, offset + read_size)
+			else:
+				file_parameter.seek(offset + read_size)
+				data = file_parameter.read(size - read_size)
+			if not data:
+				raise OSError(f"the file is shorter than {offset + size} bytes, it changed while it was sampled")
+			chunks.append(data)
+			read_size += len(data)
+	finally:
+		if position is not None:
+			file_parameter.seek(position)
+
+	return b''.join(chunks)
@@ -1,28 +1,52 @@
-import hashlib
-import xxhash
 from datetime import datetime
-from os import mkdir, listdir, walk, stat
-from os.path import isdir, isfile, join, exists, abspath, basename, splitext, getsize
+from os import mkdir, scandir, stat, fstat, cpu_count
+from os.path import isfile, join, exists, abspath, basename, splitext
+from stat import S_ISDIR, S_ISREG
+from fnmatch import fnmatch
 from base64 import b64decode
-from github import Github
-import gitlab
 from socket import gethostname
 from table_classes import *
-import ssdeep
-import tlsh
-from swh.model.cli import pid_of_file
-import requests
-import warnings
-#Note: swh.model requires to run 'pip install dulwich' manually. Do not forget to inculde 'dulwich' in the requirements.txt
+from sqlalchemy import insert, update, select, bindparam
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from time import monotonic, perf_counter
+from progress import ProgressReporter
+from hash_registry import get_hash_function
+import digest_cache
+import threading
+
+#I/O strategy of read_file_into: files up to SMALL_FILE_SIZE bytes are read with a single read, files of at least MMAP_FILE_SIZE bytes
+#are memory-mapped (and fed to the hash objects MMAP_BLOCK_SIZE bytes at a time) and the rest are read into a buffer of READ_BUFFER_SIZE bytes.
+#READ_BUFFER_SIZE may be tuned (each thread allocates one buffer of this size).
+SMALL_FILE_SIZE = 64 * 1024
+MMAP_FILE_SIZE = 16 * 1024 * 1024
+MMAP_BLOCK_SIZE = 8 * 1024 * 1024
+READ_BUFFER_SIZE = 1024 * 1024
+
+#Per-thread read buffers used by read_file_into
+read_buffers = threading.local()
+
+#Memory-mapped files that are hashed by several hash functions feed each block to the hash functions in parallel, on the threads of a shared pool,
+#so that a single large file is not limited by the speed of its slowest hash function times the number of hash functions. With 1 thread, the blocks are fed in turn.
+PARALLEL_FEED_THREADS = cpu_count() or 1
+feed_pool = None
+feed_pool_lock = threading.Lock()
+
+#The SWHID of a file is computed with hashlib (see HashObject), in the same pass as the other hash values of the file.
+
+#The libraries that implement the remote scanners (github, gitlab, requests) are slow to import. They are imported inside the functions that use them,
+#so that commands that never scan a file (dbinfo, search, sql etc) do not pay for them at startup. The same holds for the libraries of the hash functions (see hash_registry.py).
 
 class HashObject:
 	"""
 	This class is an abstraction of the hash objects the built-in hahslib library provides.
 	We use this class in order to provide a common interface for all the hash functions supported by hashesdb,
 	since some python libraries that implement fuzzy hash functions use different names for equivelant methods.
+	The hash functions and the way their hash objects are created and finalized are declared in the registry of hash_registry.py.
 	"""
 
-	def __init__(self,hash_func_name):
+	__slots__ = ('hash_func', 'spec', 'obj')
+
+	def __init__(self, hash_func_name, file_size = None):
 		"""
 		Description
 		-----------
@@ -33,22 +57,18 @@ class HashObject:
 		-----------
 		hash_func_name - string
 			The name of the hash function from which the hash will be produced.
+
+		file_size - int, optional
+			The size of the data that will be hashed, in bytes. Required only by 'swhid'.
+
+		Raises
+		-----------
+		Raises an Exception if the hash function is not supported or the library that implements it is not installed
 		"""
 		
 		self.hash_func = hash_func_name
-		if self.hash_func == 'tlsh':
-			self.obj = tlsh.Tlsh()
-		elif self.hash_func == 'ssdeep':
-			#cffi is a requirement of thoth-ssdeep. It throws a DeprecationWarning
-			with warnings.catch_warnings():
-				warnings.filterwarnings("ignore",category=DeprecationWarning)
-				self.obj = ssdeep.Hash()
-		elif self.hash_func == 'xxh32':
-			self.obj = xxhash.xxh32()
-		elif self.hash_func == 'xxh64':
-			self.obj = xxhash.xxh64()
-		else:
-			self.obj = hashlib.new(name = self.hash_func)
+		self.spec = get_hash_function(hash_func_name)
+		self.obj = self.spec.constructor(file_size)
 
 	def get_hash(self):
 		"""
@@ -57,17 +77,7 @@ class HashObject:
 		Returns the hex digest of the hash through the use of the appropriate method of the library that implements the given hash function.
 		"""
 
-		if self.hash_func == 'tlsh':
-			self.obj.final()
-			return self.obj.hexdigest()
-		elif self.hash_func == 'ssdeep':
-			return self.obj.digest(elimseq=False)
-		elif self.hash_func == 'shake_128':
-			return self.obj.hexdigest(128)
-		elif self.hash_func == 'shake_256':
-			return self.obj.hexdigest(256)
-		else:
-			return self.obj.hexdigest()
+		return self.spec.finalizer(self.obj)
 		
 	def update(self,data):
 		"""
@@ -75,8 +85,11 @@ class HashObject:
 		-----------
 		Equivelant to the hash.update() method of the object.
 		https://docs.python.org/3/library/hashlib.html#hashlib.hash.update
+		The data can be any bytes-like object (for example a memoryview of a buffer).
 		"""
 		
+		if not self.spec.accepts_buffers and not isinstance(data, bytes):
+			data = bytes(data)
 		self.obj.update(data)
 
 
@@ -88,17 +101,169 @@ class ScanTarget:
 		-origin: this variable specifies where the file was found.
 			If the file was downloaded from a remote location, a URL from which the raw file can be retrived is saved. 
 			Otherwise, if the file was a local target, the hostname of the machine is saved.
+		-date_retrieved: the date and time at which the target was located
+		-stat_result: the result of stat() for the file, if it was already fetched while the target was located (otherwise None)
 	"""
 
-	def __init__(self, path, origin, date_retrieved):
+	__slots__ = ('full_path', 'origin', 'date_retrieved', 'stat_result')
+
+	def __init__(self, path, origin, date_retrieved, stat_result = None):
 		self.full_path = path
 		self.origin = origin
 		self.date_retrieved = date_retrieved
+		self.stat_result = stat_result
 	
 	def __str__(self):	
 		return f"ScanTarget({self.full_path},{self.origin},{self.date_retrieved})"
 
 
+class ScannedFile:
+	"""
+	This class stores the outcome of reading a ScanTarget, until it is written to the database:
+		-target: the ScanTarget that was read
+		-hash_values: a dictionary that maps the names of the hash functions to the calculated hash values
+		-hash_errors: a dictionary that maps the names of the hash functions whose calculation failed to the errors that occured
+		-read_error: the error that occured if the file could not be read at all (otherwise None)
+		-timings: a dictionary that maps the stages of the scan to the seconds spent on this file (see ScanMetrics)
+	"""
+
+	__slots__ = ('target', 'hash_values', 'hash_errors', 'read_error', 'timings')
+
+	def __init__(self, target, hash_values, hash_errors, read_error = None, timings = None):
+		self.target = target
+		self.hash_values = hash_values
+		self.hash_errors = hash_errors
+		self.read_error = read_error
+		self.timings = timings if timings is not None else {}
+
+
+class ScanMetrics:
+	"""
+	This class collects the time spent in each stage of a scan, so that it can be stored in the SCAN_METRICS table when the scan finishes.
+	Stages: 'walk', 'download', 'read', 'digest:<hash function name>', 'swh_lookup' and 'write'.
+	The times of the files are measured by the threads that read them and added up by the thread that writes them, so no lock is needed.
+	"""
+
+	__slots__ = ('stage_seconds',)
+
+	def __init__(self):
+		self.stage_seconds = {}
+
+	def add(self, stage, seconds):
+		self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+
+	def add_timings(self, timings):
+		for stage, seconds in timings.items():
+			self.add(stage, seconds)
+
+	def timed_iteration(self, stage, items):
+		#Generator that yields the items and adds the time spent waiting for each of them (e.g. walking a directory tree) to the stage
+		items = iter(items)
+		while True:
+			start = perf_counter()
+			try:
+				item = next(items)
+			except StopIteration:
+				return
+			finally:
+				self.add(stage, perf_counter() - start)
+			yield item
+
+
+class TimedHashObject:
+	"""
+	This class wraps a HashObject and adds the time spent in its update() and get_hash() methods to the 'digest:<hash function name>' entry of a dictionary.
+	"""
+
+	__slots__ = ('hash_object', 'timings', 'stage')
+
+	def __init__(self, hash_object, timings):
+		self.hash_object = hash_object
+		self.timings = timings
+		self.stage = 'digest:' + hash_object.hash_func
+		timings.setdefault(self.stage, 0.0)
+
+	def update(self, data):
+		start = perf_counter()
+		self.hash_object.update(data)
+		self.timings[self.stage] += perf_counter() - start
+
+	def get_hash(self):
+		start = perf_counter()
+		try:
+			return self.hash_object.get_hash()
+		finally:
+			self.timings[self.stage] += perf_counter() - start
+
+
+class Checkpointer:
+	"""
+	This class commits the changes of a long scan periodically, so that an interrupted scan keeps the files it already scanned and can be resumed.
+	A checkpoint is made after every 'files_interval' files or 'seconds_interval' seconds, whichever comes first. Checkpoints are made only between files,
+	so every committed file has all of its hashes.
+	"""
+
+	__slots__ = ('db_session', 'files_interval', 'seconds_interval', 'files_since_checkpoint', 'last_checkpoint_time')
+
+	def __init__(self, db_session, files_interval = None, seconds_interval = None):
+		self.db_session = db_session
+		self.files_interval = files_interval
+		self.seconds_interval = seconds_interval
+		self.files_since_checkpoint = 0
+		self.last_checkpoint_time = monotonic()
+
+	def file_done(self):
+		#Called by the writer after each file. Makes a checkpoint if one of the intervals has passed.
+		self.files_since_checkpoint += 1
+		if self.files_interval and self.files_since_checkpoint >= self.files_interval:
+			self.checkpoint()
+		elif self.seconds_interval and monotonic() - self.last_checkpoint_time >= self.seconds_interval:
+			self.checkpoint()
+
+	def checkpoint(self):
+		self.db_session.commit()
+		self.files_since_checkpoint = 0
+		self.last_checkpoint_time = monotonic()
+
+
+#The lookup tables whose ids are stored in the FILE_RECORD and the HASH_RECORD tables, with the names of their (id column, value column)
+LOOKUP_COLUMNS = {
+	Directory: ('directory_id', 'directory_path'),
+	Extension: ('extension_id', 'extension_name'),
+	Origin: ('origin_id', 'origin_name'),
+	HashFunction: ('hash_function_id', 'hash_function_name'),
+}
+
+class LookupIds:
+	"""
+	This class finds the ids of the values of the lookup tables (DIRECTORY, EXTENSION, ORIGIN and HASH_FUNCTION), which the FILE_RECORD and the HASH_RECORD tables store instead of the values.
+	The ids are cached, since the files of a scan share a few directories, extensions and origins, so most files need no lookup query.
+	The values it adds to a lookup table are cached as well, so it must not be used after a rollback of the session.
+	"""
+
+	__slots__ = ('db_session', 'ids')
+
+	def __init__(self, db_session):
+		self.db_session = db_session
+		self.ids = {}
+
+	def get_id(self, lookup_class, value, add_flag = True):
+		#Returns the id of the value. A value that is not in the lookup table yet is added to it if add_flag is True, otherwise None is returned.
+		if value is None:
+			return None
+		key = (lookup_class, value)
+		if key not in self.ids:
+			id_name, value_name = LOOKUP_COLUMNS[lookup_class]
+			lookup_table = lookup_class.__table__
+			value_id = self.db_session.execute(select(lookup_table.c[id_name]).where(lookup_table.c[value_name] == value)).scalar()
+			if value_id is None:
+				if not add_flag:
+					return None
+				value_id = self.db_session.execute(insert(lookup_table).values({value_name: value})).inserted_primary_key[0]
+			self.ids[key] = value_id
+		return self.ids[key]
+
+
 class RemoteScanner:
 	"""
 	This is an abstract class that allows scanning of remote files.
@@ -106,7 +271,7 @@ class RemoteScanner:
 	These methods use API calls and should be implemented independently by each class that inherits this class.
 	"""
 
-	def __init__(self, arg):
+	def __init__(self, arg, progress = None):
 		"""
 		Description
 		-----------
@@ -116,6 +281,10 @@ class RemoteScanner:
 		-----------
 		arg - dictionary
 			A dictionary that contains information about the platform in which the targets are stored.
+
+		progress - ProgressReporter, optional
+			Default value: None (every message is printed)
+			The ProgressReporter of the scan. The messages about each downloaded file are printed only in verbose mode.
 		"""
 
 		#Read the arg
@@ -137,6 +306,7 @@ class RemoteScanner:
 		self.token = token
 		self.term = arg['term']
 		self.dir_type = arg['dir_type']
+		self.progress = progress if progress is not None else ProgressReporter(verbose = True)
 
 	def download_targets(self, target_list, download_location_parameter, recursion_flag_parameter):
 		"""
@@ -206,21 +376,19 @@ class RemoteScanner:
 		try:
 			repo = self.get_repo(repo_parameter)
 		except Exception as e:
-			print(f"Error: Downloading {self.term} {repo_parameter} failed. In more detail:")
-			print(e)
+			self.progress.error(f"Error: Downloading {self.term} {repo_parameter} failed. In more detail:", e)
 			return []
 
 		repo_name = self.get_repo_name(repo)
 		repo_folder = self.name_of_repo_folder(repo_name, download_location_parameter)
-		print(f"Downloading {repo_name}")
+		self.progress.message(f"Downloading {repo_name}")
 
 		#Attempt to create a folder at the download destination, where the repo's contents will be saved
 		try:
 			mkdir(repo_folder)
 		except Exception as e:
 			#If you fail to create a folder, print an error message and return an empty list
-			print(f"Error: something went wrong while creating the folder {repo_folder}. In more detail:")
-			print(e)
+			self.progress.error(f"Error: something went wrong while creating the folder {repo_folder}. In more detail:", e)
 			return []
 		else:
 			#The list of ScanTargets that will be filled with ScanTarget objects to be scanned
@@ -233,10 +401,9 @@ class RemoteScanner:
 					#Create a folder with the branch's name and save
 					mkdir(branch_folder_path)
 				except Exception as e:
-					print(f"Error: something went wrong while creating the folder {branch_folder_path}. In more detail:")
-					print(e)
+					self.progress.error(f"Error: something went wrong while creating the folder {branch_folder_path}. In more detail:", e)
 				else:
-					print(f"Downloading branch {branch_name}")
+					self.progress.message(f"Downloading branch {branch_name}")
 					ref = self.get_branch_ref(branch) #get something that identifies the branch you want to download
 					#Download the contents of the branch's root directory (recursively or not) and add the returned ScanTargets to the list that will be returned at the end
 					new_scan_targets = self.download_remote_directory(repo, ref, "", branch_folder_path, recursion_flag_parameter)
@@ -301,7 +468,7 @@ class RemoteScanner:
 			else:
 				#If the file is a single file, get its contents and write them inside a new file inside the equivelant folder
 				try:
-					print(f"Downloading {join(path,content_name)}...")
+					self.progress.detail(f"Downloading {join(path,content_name)}...")
 					#path of new file = download destination + path inside repo + name of the file
 					new_file_path = join(download_destination,path,content_name)
 
@@ -315,8 +482,7 @@ class RemoteScanner:
 					#Add the returned ScanTargets to the list that will be returned at the end
 					scan_target_objects_list.extend([ScanTarget(new_file_path, self.get_file_url(file_content, repo), datetime.now())])
 				except Exception as e:
-					print(f"Error:downloading {content_path} failed. In more detail:")
-					print(e)
+					self.progress.error(f"Error:downloading {content_path} failed. In more detail:", e)
 
 		return scan_target_objects_list
 
@@ -362,7 +528,9 @@ class GithubScanner(RemoteScanner):
 	PyGithub documentation: https://pygithub.readthedocs.io/en/latest/introduction.html
 	"""
 
-	def __init__(self):
+	def __init__(self, progress = None):
+		from github import Github
+
 		github_parameters = {
 		"platform": "Github",
 		"token_txt": "github-token.txt",
@@ -371,7 +539,7 @@ class GithubScanner(RemoteScanner):
 		"token-term": "personal access token"
 		}
 
-		super(GithubScanner, self).__init__(github_parameters) #RemoteScanner.__init__()
+		super(GithubScanner, self).__init__(github_parameters, progress) #RemoteScanner.__init__()
 		self.g = Github(self.token)
 
 	def get_repo(self, repo_parameter):
@@ -418,7 +586,9 @@ class GitlabScanner(RemoteScanner):
 	python-gitlab documentation: https://python-gitlab.readthedocs.io/en/stable/
 	"""
 
-	def __init__(self):
+	def __init__(self, progress = None):
+		import gitlab
+
 		gitlab_parameters = {
 		"platform": "Gitlab",
 		"token_txt": "gitlab-token.txt",
@@ -427,7 +597,7 @@ class GitlabScanner(RemoteScanner):
 		"token-term": "personal access token"
 		}
 
-		super(GitlabScanner, self).__init__(gitlab_parameters) #RemoteScanner.__init__()
+		super(GitlabScanner, self).__init__(gitlab_parameters, progress) #RemoteScanner.__init__()
 		self.g = gitlab.Gitlab('https://gitlab.com/',private_token = self.token)
 
 	def get_repo(self, project_parameter):
@@ -468,11 +638,51 @@ class GitlabScanner(RemoteScanner):
 		return project_object.files.get(file_path = path_param, ref = ref_param)
 
 
-def format_local_targets(target_list, hostname_parameter, recursion_flag_parameter):
+class TargetFilter:
+	"""
+	This class stores the criteria according to which the files found inside the scanned directories are selected.
+	These criteria are the following:
+		-include_patterns: if given, only files whose name or path matches at least one of these glob patterns are selected
+		-exclude_patterns: files and directories whose name or path matches at least one of these glob patterns are skipped
+		-min_size, max_size: if given, only files whose size (in bytes) is within these limits are selected
+		-symlink_policy: what to do with symbolic links found inside directories
+			'skip': symbolic links are skipped
+			'files': symbolic links to files are scanned, but symbolic links to directories are not followed (default)
+			'follow': symbolic links to files are scanned and symbolic links to directories are followed
+	"""
+
+	__slots__ = ('include_patterns', 'exclude_patterns', 'min_size', 'max_size', 'symlink_policy')
+
+	def __init__(self, include_patterns = None, exclude_patterns = None, min_size = None, max_size = None, symlink_policy = 'files'):
+		self.include_patterns = include_patterns or []
+		self.exclude_patterns = exclude_patterns or []
+		self.min_size = min_size
+		self.max_size = max_size
+		self.symlink_policy = symlink_policy
+
+	def excludes(self, name, path):
+		#Returns True if the file or directory matches one of the exclude patterns
+		return any(fnmatch(name, pattern) or fnmatch(path, pattern) for pattern in self.exclude_patterns)
+
+	def selects(self, name, path, file_stat):
+		#Returns True if the file satisfies all the criteria
+		if self.excludes(name, path):
+			return False
+		if self.include_patterns and not any(fnmatch(name, pattern) or fnmatch(path, pattern) for pattern in self.include_patterns):
+			return False
+		if self.min_size is not None and file_stat.st_size < self.min_size:
+			return False
+		if self.max_size is not None and file_stat.st_size > self.max_size:
+			return False
+		return True
+
+
+def walk_local_targets(target_list, hostname_parameter, recursion_flag_parameter, target_filter_parameter = None):
 	"""
 	Description
 	-----------
-	Receives a list of local targets as input and produces a list of equivelant ScanTarget objects as output. 
+	Generator that receives a list of local targets as input and yields the equivelant ScanTarget objects one at a time, as the directories are walked.
+	Directories are read with os.scandir, so the stat result of every file is fetched only once and it is stored inside its ScanTarget.
 
 	Parameters
 	-----------
@@ -482,48 +692,79 @@ def format_local_targets(target_list, hostname_parameter, recursion_flag_paramet
 	hostname_parameter - string
 		The hostname of the machine were the local targets are located.
 
-	recursion_flag_parameter: boolean, optional
-		Default value: True
+	recursion_flag_parameter: boolean
 		If this parameter is True, then we recursively scan the contents of all the directories.
-		Otherwise we do not scan the directories (we skip them).
+		Otherwise we scan only the files immediatly inside the directories.
 
-	Returns
+	target_filter_parameter: TargetFilter, optional
+		Default value: None (every file is selected and symbolic links to directories are not followed)
+		The criteria according to which files are selected. Files given explicitly in target_list are selected regardless of the symlink policy.
+
+	Yields
 	-----------
-	scan_target_objects_list - list of ScanTargets
-		A list of ScanTargets. Each ScanTarget corresponds to a local target given as input to the scan command.
+	ScanTarget objects. Each ScanTarget corresponds to a local file. The path of every ScanTarget is an absolute path.
 	"""
 
-	#All the local ScanTargets will have the hostname_parameter as origin. The path of all ScanTargets will be absolute paths 
-
-	#The list of ScanTargets that will be returned
-	scan_target_objects_list = []
+	target_filter = target_filter_parameter if target_filter_parameter is not None else TargetFilter()
 
-	#For each target in the target list:
 	for target in target_list:
-		#If the target does not exist, print an erroor message
-		if not exists(target):
+		target_path = abspath(target)
+		try:
+			target_stat = stat(target_path)
+		except OSError:
 			print(f"Error: No such file or directory: {target}")
-		#If the target is a file, construct the equivelant ScanTarget and append it to the list that will be returned
-		elif isfile(target):
-			scan_target_objects_list.append(ScanTarget(abspath(target),hostname_parameter,datetime.now()))
-		#Else,if the file is a directory AND we want to scan it recursively, then scan all the files inside it(using os.walk)
-		elif recursion_flag_parameter:
-			for root, dirs, files in walk(abspath(target)):
-				for file in files:
-					target_path = join(root, file)
-					#Construct the equivelant ScanTarget and append it to the list that will be returned
-					scan_target_objects_list.append(ScanTarget(target_path,hostname_parameter,datetime.now()))
-		#Else,if the file is a directory AND we do NOT want to scan it recursively, then scan only the files immediatly inside it(using os.listdir)
-		else:
-			for file in listdir(target):
-				target_path = abspath(join(target, file))
-				if isfile(target_path):
-					#Construct the equivelant ScanTarget and append it to the list that will be returned
-					scan_target_objects_list.append(ScanTarget(target_path,hostname_parameter,datetime.now()))
+			continue
+
+		if S_ISDIR(target_stat.st_mode):
+			yield from walk_directory(target_path, target_stat, hostname_parameter, recursion_flag_parameter, target_filter)
+		elif target_filter.selects(basename(target_path), target_path, target_stat):
+			yield ScanTarget(target_path, hostname_parameter, datetime.now(), target_stat)
+
+def walk_directory(directory_path, directory_stat, hostname_parameter, recursion_flag_parameter, target_filter):
+	#Walk the directory tree top-down with an explicit stack of directories, so that only one directory is open at a time
+	follow_links = target_filter.symlink_policy == 'follow'
+	#Directories already visited, so that symbolic links can not lead to an endless walk
+	visited_directories = {(directory_stat.st_dev, directory_stat.st_ino)}
+	pending_directories = [directory_path]
+
+	while pending_directories:
+		current_directory = pending_directories.pop()
+		subdirectories = []
+
+		try:
+			with scandir(current_directory) as entries:
+				for entry in entries:
+					try:
+						is_link = entry.is_symlink()
+						if is_link and target_filter.symlink_policy == 'skip':
+							continue
+
+						if entry.is_dir():
+							if not recursion_flag_parameter or (is_link and not follow_links) or target_filter.excludes(entry.name, entry.path):
+								continue
+							entry_stat = entry.stat()
+							if (entry_stat.st_dev, entry_stat.st_ino) not in visited_directories:
+								visited_directories.add((entry_stat.st_dev, entry_stat.st_ino))
+								subdirectories.append(entry.path)
+							continue
+
+						entry_stat = entry.stat()
+					except OSError:
+						#A broken symbolic link: yield it without a stat result, so that the failure is reported when it is scanned
+						if not target_filter.excludes(entry.name, entry.path):
+							yield ScanTarget(entry.path, hostname_parameter, datetime.now())
+						continue
+
+					if S_ISREG(entry_stat.st_mode) and target_filter.selects(entry.name, entry.path, entry_stat):
+						yield ScanTarget(entry.path, hostname_parameter, datetime.now(), entry_stat)
+		except OSError as e:
+			print(f"Error: could not read the contents of directory {current_directory}. In more detail:")
+			print(e)
 
-	return scan_target_objects_list
+		#Subdirectories are pushed in reverse order, so that they are walked in the order in which they were found
+		pending_directories.extend(reversed(subdirectories))
 
-def scanner(db_session_param, scan_targets_parameter, hash_functions_parameter, download_location_parameter, scan_id_parameter, recursion_flag_parameter = True):
+def scanner(db_session_param, scan_targets_parameter, hash_functions_parameter, download_location_parameter, scan_id_parameter, recursion_flag_parameter = True, target_filter_parameter = None, jobs_parameter = 1, checkpointer_parameter = None, resume_flag_parameter = False, progress_parameter = None, metrics_parameter = None, swhid_flag_parameter = True):
 	"""
 	Description
 	-----------
@@ -554,6 +795,34 @@ def scanner(db_session_param, scan_targets_parameter, hash_functions_parameter,
 		If this parameter is True, then we recursively scan the contents of all the directories.
 		Otherwise we do not scan the directories (we skip them).
 
+	target_filter_parameter: TargetFilter, optional
+		Default value: None (every local file is selected)
+		The criteria according to which the local files are selected.
+
+	jobs_parameter: int, optional
+		Default value: 1
+		The number of threads that read and hash files at the same time.
+
+	checkpointer_parameter: Checkpointer, optional
+		Default value: None (no checkpoints are made)
+		The Checkpointer that commits the scan periodically.
+
+	resume_flag_parameter: boolean, optional
+		Default value: False
+		If this parameter is True, the scan with id scan_id_parameter is resumed: the local files that were already recorded for it are skipped.
+
+	progress_parameter: ProgressReporter, optional
+		Default value: None (a ProgressReporter that is not verbose is used)
+		The ProgressReporter that reports the progress of the scan. The caller is responsible for calling its finish() method.
+
+	metrics_parameter: ScanMetrics, optional
+		Default value: None (the stages of the scan are not timed)
+		The ScanMetrics to which the time spent in each stage of the scan is added.
+
+	swhid_flag_parameter: boolean, optional
+		Default value: True
+		If False, the SWHID of the files is not calculated (scan --quick).
+
 	Returns
 	-----------
 	scan_result - int
@@ -562,38 +831,55 @@ def scanner(db_session_param, scan_targets_parameter, hash_functions_parameter,
 
 	scan_result = 0
 
+	if progress_parameter is None:
+		progress_parameter = ProgressReporter()
+
 	#In the following lines, we reset the scan_code variable using the max() function, since we want to return the most important error(= greater error code)
 
 	#Scan local targets.
 	if scan_targets_parameter[0]:
-		local_targets = format_local_targets(scan_targets_parameter[0], gethostname(), recursion_flag_parameter) #List of ScanTargets
-		scan_result = max(scan_result, scan_local(db_session_param, local_targets, hash_functions_parameter, scan_id_parameter)) 
+		local_targets = walk_local_targets(scan_targets_parameter[0], gethostname(), recursion_flag_parameter, target_filter_parameter) #Generator of ScanTargets
+		if resume_flag_parameter:
+			local_targets = skip_scanned_targets(db_session_param, local_targets, scan_id_parameter)
+		scan_result = max(scan_result, scan_local(db_session_param, local_targets, hash_functions_parameter, scan_id_parameter, jobs_parameter, checkpointer_parameter, progress_parameter, metrics_parameter, swhid_flag_parameter))
 
 	#Download Github targets locally and scan them.
 	if scan_targets_parameter[1]:
-		github_targets = GithubScanner().download_targets(scan_targets_parameter[1], download_location_parameter, recursion_flag_parameter) #List of ScanTargets
-		scan_result = max(scan_result, scan_local(db_session_param, github_targets, hash_functions_parameter, scan_id_parameter))
+		download_start = perf_counter()
+		github_targets = GithubScanner(progress_parameter).download_targets(scan_targets_parameter[1], download_location_parameter, recursion_flag_parameter) #List of ScanTargets
+		if metrics_parameter is not None:
+			metrics_parameter.add('download', perf_counter() - download_start)
+		#The number of downloaded files is known, so the remaining time of the scan can be estimated
+		progress_parameter.total_files = progress_parameter.files + len(github_targets)
+		scan_result = max(scan_result, scan_local(db_session_param, github_targets, hash_functions_parameter, scan_id_parameter, jobs_parameter, checkpointer_parameter, progress_parameter, metrics_parameter, swhid_flag_parameter))
 
 	#Download Gitlab targets locally and scan them.
 	if scan_targets_parameter[2]:
-		gitlab_targets = GitlabScanner().download_targets(scan_targets_parameter[2], download_location_parameter, recursion_flag_parameter) #List of ScanTargets
-		scan_result = max(scan_result, scan_local(db_session_param, gitlab_targets, hash_functions_parameter, scan_id_parameter))
+		download_start = perf_counter()
+		gitlab_targets = GitlabScanner(progress_parameter).download_targets(scan_targets_parameter[2], download_location_parameter, recursion_flag_parameter) #List of ScanTargets
+		if metrics_parameter is not None:
+			metrics_parameter.add('download', perf_counter() - download_start)
+		progress_parameter.total_files = progress_parameter.files + len(gitlab_targets)
+		scan_result = max(scan_result, scan_local(db_session_param, gitlab_targets, hash_functions_parameter, scan_id_parameter, jobs_parameter, checkpointer_parameter, progress_parameter, metrics_parameter, swhid_flag_parameter))
 
 	return scan_result
 
-def scan_local(db_session_param, scan_target_objects_list, hash_functions_parameter, scan_id_parameter):
+def scan_local(db_session_param, scan_target_objects_list, hash_functions_parameter, scan_id_parameter, jobs_parameter = 1, checkpointer_parameter = None, progress_parameter = None, metrics_parameter = None, swhid_flag_parameter = True):
 	"""
 	Description
 	-----------
 	Scan local targets: Insert File records for each of them and then calculate 
+	The files are read and hashed by up to jobs_parameter threads, while this function writes the results to the database one file at a time.
+	Only compact ScannedFile records travel from the readers to the writer, and the rows are inserted with SQL statements instead of ORM objects,
+	so the session does not hold an object for each file and hash of the scan.
 
 	Parameters
 	-----------
 	db_session_param - SQLAlchemy session object
 		An active session from which we apply changes to the database
 
-	scan_target_objects_list - list of ScanTargets
-		A list of ScanTarget objects that will be scanned
+	scan_target_objects_list - iterable of ScanTargets
+		The ScanTarget objects that will be scanned. It can be a generator, in which case the targets are scanned as soon as they are found.
 
 	hash_functions_parameter - list of strings
 		A list of hash function names. For each hash function in the list, the hash value of the file will be calculated and inserted into the database.
@@ -601,6 +887,27 @@ def scan_local(db_session_param, scan_target_objects_list, hash_functions_parame
 	scan_id_parameter - int
 		The unique id of the scan during which we scan this particular file (primary key of SCAN table)
 
+	jobs_parameter: int, optional
+		Default value: 1
+		The number of threads that read and hash files at the same time.
+
+	checkpointer_parameter: Checkpointer, optional
+		Default value: None (no checkpoints are made)
+		The Checkpointer that is notified after each file, so that the scan is committed periodically.
+
+	progress_parameter: ProgressReporter, optional
+		Default value: None (a ProgressReporter that is not verbose is used and finished when the scan ends)
+		The ProgressReporter that is notified after each file. The files are reported one by one only in verbose mode.
+
+	metrics_parameter: ScanMetrics, optional
+		Default value: None (the stages of the scan are not timed)
+		The ScanMetrics to which the time spent finding, reading, hashing and writing each file is added.
+
+	swhid_flag_parameter: boolean, optional
+		Default value: True
+		If False, the SWHID of the files is not calculated and they are not looked up in the SoftwareHeritage archive (scan --quick).
+		When only sampled hash functions are given too, the files are not read whole.
+
 	Returns
 	-----------
 	scan_code_of_scan - int
@@ -611,39 +918,67 @@ def scan_local(db_session_param, scan_target_objects_list, hash_functions_parame
 	all_files_scanned = True
 	all_hashes_calculated = True
 
-	for t in scan_target_objects_list:
-		#For every ScanTarget object, insert a File record to the FILE table
+	#Read each file once and calculate the SWHID (unless it is skipped) and the hashes of all the given hash functions
+	hash_function_names = (['swhid'] if swhid_flag_parameter else []) + [hash_func for hash_func in (hash_functions_parameter or []) if hash_func != 'swhid']
+
+	progress = progress_parameter if progress_parameter is not None else ProgressReporter()
+
+	timings_flag = metrics_parameter is not None
+	if timings_flag:
+		scan_target_objects_list = metrics_parameter.timed_iteration('walk', scan_target_objects_list)
+
+	#The ids of the directories, extensions, origins and hash functions of the scan are looked up once
+	lookup_ids = LookupIds(db_session_param)
+
+	for scanned_file in hash_scan_targets(scan_target_objects_list, hash_function_names, jobs_parameter, timings_flag):
+		t = scanned_file.target
+		write_start = perf_counter()
+		#For every ScanTarget object, insert a File record to the FILE_RECORD table
 		try:
-			new_file_id = insert_file(db_session_param, t, scan_id_parameter)
+			new_file_id = insert_file(db_session_param, t, scan_id_parameter, lookup_ids)
 		except Exception as e:
 			#If the insertion of the File fails, then change the relative flag
 			all_files_scanned = False
-			print(f"Error: something went wrong while scanning file {t.full_path}. In more detail:")
-			print(e)
-		else:
-			#If the insertion of the File is successful
-			print(f"Calculating hashes for {t.full_path}...")
+			progress.error(f"Error: something went wrong while scanning file {t.full_path}. In more detail:", e)
+			continue
+
+		#If the insertion of the File is successful
+		progress.detail(f"Calculating hashes for {t.full_path}...")
+
+		if scanned_file.read_error is not None:
+			all_hashes_calculated = False
+			progress.error(f"Error: something went wrong while reading file {t.full_path}. In more detail:", scanned_file.read_error)
+			progress.file_done()
+			if checkpointer_parameter is not None:
+				checkpointer_parameter.file_done()
+			continue
 
-			#Calculate the SWHID and insert it into the database
+		#Insert the hash values into the database (SWHID first)
+		for hash_func in hash_function_names:
 			try:
-				insert_swhid(db_session_param, t.full_path, new_file_id)
+				if hash_func in scanned_file.hash_errors:
+					raise scanned_file.hash_errors[hash_func]
+				elif hash_func == 'swhid':
+					insert_swhid_value(db_session_param, scanned_file.hash_values[hash_func], new_file_id, scanned_file.timings, lookup_ids)
+				else:
+					insert_hash_value(db_session_param, scanned_file.hash_values[hash_func], hash_func, new_file_id, lookup_ids)
 			except Exception as e:
+				#If the calculation or the insertion of the Hash fails, then change the relative flag
 				all_hashes_calculated = False
-				print(f"Error: something went wrong while calculating swhid hash for file {t.full_path}. In more detail:")
-				print(e)		
+				progress.error(f"Error: something went wrong while calculating {hash_func} hash for file {t.full_path}. In more detail:", e)
 
-			#Calculate the rest of the hashes using the hash functions given as input
-			if hash_functions_parameter:
-				#For every hash function, calculate the hash value of the file and insert it into the database
-				for hash_func in hash_functions_parameter:
-					try:
-						insert_hash(db_session_param, t.full_path, hash_func, new_file_id)
-					except Exception as e:
-						#If the insertion of the Hash fails, then change the relative flag
-						all_hashes_calculated = False
-						print(f"Error: something went wrong while calculating {hash_func} hash for file {t.full_path}. In more detail:")
-						print(e)
+		if timings_flag:
+			#The time spent querying the SoftwareHeritage archive is not part of the time spent writing
+			scanned_file.timings['write'] = perf_counter() - write_start - scanned_file.timings.get('swh_lookup', 0.0)
+			metrics_parameter.add_timings(scanned_file.timings)
+
+		#insert_file has fetched the stat result of the target
+		progress.file_done(t.stat_result.st_size)
+		if checkpointer_parameter is not None:
+			checkpointer_parameter.file_done()
 
+	if progress_parameter is None:
+		progress.finish()
 
 	#Return the scan code according to the flags
 	if not all_files_scanned:
@@ -655,11 +990,81 @@ def scan_local(db_session_param, scan_target_objects_list, hash_functions_parame
 
 	return scan_code_of_scan	
 
-def insert_file(db_session_param, target_object, scan_id_parameter):
+def skip_scanned_targets(db_session_param, scan_targets, scan_id_parameter):
+	"""
+	Description
+	-----------
+	Generator that yields the given ScanTargets, except those that were already recorded in the FILE_RECORD table during the given scan.
+	It is used to resume an interrupted scan.
+
+	Parameters
+	-----------
+	db_session_param - SQLAlchemy session object
+		An active session from which we read the database
+
+	scan_targets: iterable of ScanTargets
+		The targets of the scan
+
+	scan_id_parameter - int
+		The unique id of the scan that is resumed (primary key of SCAN table)
+	"""
+
+	#Each lookup uses the ix_file_record_directory_name_origin index. A target whose directory or origin is not in the lookup tables was not scanned.
+	file_table = File.__table__
+	lookup_ids = LookupIds(db_session_param)
+	query = select(file_table.c.id).where(file_table.c.directory_id == bindparam('directory_id'), file_table.c.file_name == bindparam('file_name'), file_table.c.origin_id == bindparam('origin_id'), file_table.c.scan_id == scan_id_parameter).limit(1)
+
+	for t in scan_targets:
+		directory_path, file_name = split_file_path(t.full_path)
+		directory_id = lookup_ids.get_id(Directory, directory_path, False)
+		origin_id = lookup_ids.get_id(Origin, t.origin, False)
+		if directory_id is None or origin_id is None or db_session_param.execute(query, {'directory_id': directory_id, 'file_name': file_name, 'origin_id': origin_id}).first() is None:
+			yield t
+
+def hash_scan_targets(scan_targets, hash_function_names, jobs = 1, timings_flag = False):
+	"""
+	Description
+	-----------
+	Generator that reads each of the given ScanTargets once and yields a ScannedFile record with its hash values, using up to 'jobs' threads.
+	The records are yielded in the order of the targets.
+
+	Parameters
+	-----------
+	scan_targets: iterable of ScanTargets
+		The targets that will be read
+
+	hash_function_names: list of strings
+		The names of the hash functions (including 'swhid')
+
+	jobs: int, optional
+		Default: 1
+		The number of threads that read files at the same time
+
+	timings_flag: boolean, optional
+		Default: False
+		If True, the time spent reading each file and calculating each of its hash values is stored in the timings of its ScannedFile record
+	"""
+
+	def read_target(target):
+		timings = {} if timings_flag else None
+		try:
+			hash_values, hash_errors = compute_file_hashes(target.full_path, hash_function_names, timings)
+		except Exception as e:
+			return ScannedFile(target, {}, {}, e, timings)
+		return ScannedFile(target, hash_values, hash_errors, None, timings)
+
+	return map_bounded(read_target, scan_targets, jobs)
+
+def split_file_path(file_path):
+	#Returns the directory part of a file path (with its trailing separator) and the file name, as they are stored in the DIRECTORY and the FILE_RECORD tables
+	file_name = basename(file_path)
+	return file_path[:len(file_path) - len(file_name)], file_name
+
+def insert_file(db_session_param, target_object, scan_id_parameter, lookup_ids = None):
 	"""
 	Description
 	-----------
-	Insert a new FILE record in the database
+	Insert a new FILE_RECORD record in the database
 
 	Parameters
 	-----------
@@ -672,6 +1077,10 @@ def insert_file(db_session_param, target_object, scan_id_parameter):
 	scan_id_parameter - int
 		The unique id of the scan during which we scan this particular file (primary key of SCAN table)
 
+	lookup_ids - LookupIds, optional
+		Default value: None (the ids are looked up without a cache)
+		The LookupIds that finds the ids of the directory, the extension and the origin of the file
+
 	Returns
 	-----------
 	f.id - int
@@ -685,38 +1094,38 @@ def insert_file(db_session_param, target_object, scan_id_parameter):
 
 	#obtain all the necessary file information for the FILE record and store them inside a dictionary
 	#the id of the FILE record will be given automatically by SQLAlchemy when we try to add the File object to the database
-	file_stat = stat(target_object.full_path)
+	#The stat result is fetched only if it was not already fetched while the target was located. It is kept for the progress report of the scan.
+	if target_object.stat_result is None:
+		target_object.stat_result = stat(target_object.full_path)
+	file_stat = target_object.stat_result
+	if lookup_ids is None:
+		lookup_ids = LookupIds(db_session_param)
+	directory_path, file_name = split_file_path(target_object.full_path)
+	directory_id = lookup_ids.get_id(Directory, directory_path)
+	origin_id = lookup_ids.get_id(Origin, target_object.origin)
 	file_info = {
 		"scan_id": scan_id_parameter,
-		"file_path": target_object.full_path,
-		"file_name": basename(target_object.full_path),
-		"file_extension": splitext(target_object.full_path)[1],
-		"file_size": getsize(target_object.full_path),
+		"file_name": file_name,
+		"extension_id": lookup_ids.get_id(Extension, splitext(target_object.full_path)[1]),
+		"directory_id": directory_id,
+		"file_size": file_stat.st_size,
 		"date_created": datetime.fromtimestamp(file_stat.st_ctime),
 		"date_modified": datetime.fromtimestamp(file_stat.st_mtime),
 		"date_retrieved": target_object.date_retrieved,
 		"swh_known": None,
 		"updated": True,
-		"origin": target_object.origin,
+		"origin_id": origin_id,
 	}
 	
-	#Construct file object
-	f = File(**file_info)
+	file_table = File.__table__
 
 	#Check for others with the exact same attributes (saved in the same location and came from the same origin) and mark them as 'NOT UPDATED'
-	possible_duplicates_fetch = db_session_param.query(File).filter(File.file_path == target_object.full_path, File.origin == target_object.origin, File.updated.is_(True))
-	if bool(possible_duplicates_fetch.first()):
-		for possible_duplicates in possible_duplicates_fetch.all():
-			possible_duplicates.updated = False
+	#The ix_file_record_directory_name_origin index keeps this lookup fast however many files the database contains
+	db_session_param.execute(update(file_table).where(file_table.c.directory_id == directory_id, file_table.c.file_name == file_name, file_table.c.origin_id == origin_id, file_table.c.updated.is_(True)).values(updated = False))
 
-	#Insert File in the database and return the id it got
-	try:
-		db_session_param.add(f)
-	except Exception as e:
-		raise e
-	else:
-		db_session_param.flush()
-		return f.id
+	#Insert File in the database and return the id it got. No ORM object is constructed, so the session does not keep the file in memory.
+	result = db_session_param.execute(insert(file_table).values(**file_info))
+	return result.inserted_primary_key[0]
 
 def insert_hash(db_session_param, target_object_path, hash_func_name, file_id_parameter):
 	"""
@@ -736,7 +1145,7 @@ def insert_hash(db_session_param, target_object_path, hash_func_name, file_id_pa
 		The name of the hash function which will be used to calculate the hash value
 
 	file_id_parameter - int
-		The unique id of the file for which we calculate the SWHID (primary key of FILE table)
+		The unique id of the file for which we calculate the SWHID (primary key of FILE_RECORD table)
 
 	Raises
 	-----------
@@ -745,34 +1154,49 @@ def insert_hash(db_session_param, target_object_path, hash_func_name, file_id_pa
 		-if the insertion of the hash into the database fails
 	"""
 
-	#Block size (the hash calculation is done one memory block at a time, in order to be able to calculate hashes of files that exceed the size of the memory)
-	chunk_size = 4096
+	#Calculate the hash value
+	hash_value = compute_file_digest(target_object_path, hash_func_name)
 
-	#Construct a HashObject 
-	hash_object = HashObject(hash_func_name)
+	#Insert it in the database
+	insert_hash_value(db_session_param, hash_value, hash_func_name, file_id_parameter)
 
-	#Construct hash value using the interface provided by the HashObject class		
-	try:
-		f = open(target_object_path, 'rb') #rb = open in binary format
-	except Exception as e:
-		raise e
-	else:
-		for block in iter(lambda: f.read(chunk_size), b""):
-			hash_object.update(block)
+def insert_hash_value(db_session_param, hash_value_parameter, hash_func_name, file_id_parameter, lookup_ids = None):
+	"""
+	Description
+	-----------
+	Insert a hash value that has already been calculated into the database
+
+	Parameters
+	-----------
+	db_session_param - SQLAlchemy session object
+		An active session from which we apply changes to the database
+
+	hash_value_parameter - string
+		The hash value
+
+	hash_func_name - string
+		The name of the hash function that produced the hash value
+
+	file_id_parameter - int
+		The unique id of the file for which the hash value was calculated (primary key of FILE_RECORD table)
+
+	lookup_ids - LookupIds, optional
+		Default value: None (the id of the hash function is looked up without a cache)
+		The LookupIds that finds the id of the hash function
 
-		#Close the file
-		f.close()
+	Raises
+	-----------
+	Raises an Exception if the hash function is not in the HASH_FUNCTION table or if the insertion of the hash into the database fails
+	"""
 
-	#Construct Hash object
-	h = Hash(hash_value = hash_object.get_hash(), hash_function_name = hash_func_name, file_id = file_id_parameter)
+	if lookup_ids is None:
+		lookup_ids = LookupIds(db_session_param)
+	hash_function_id = lookup_ids.get_id(HashFunction, hash_func_name, False)
+	if hash_function_id is None:
+		raise ValueError(f"{hash_func_name} is not a hash function of the HASH_FUNCTION table")
 
 	#Insert Hash in the database
-	try:
-		db_session_param.add(h)
-	except Exception as e:
-		raise e
-	else:
-		db_session_param.flush()
+	db_session_param.execute(insert(Hash.__table__).values(hash_value = hash_value_parameter, hash_function_id = hash_function_id, file_id = file_id_parameter))
 
 def insert_swhid(db_session_param, target_object_path, file_id_parameter):
 	"""
@@ -789,7 +1213,7 @@ def insert_swhid(db_session_param, target_object_path, file_id_parameter):
 		Path to the file for which we calculate the SWHID
 
 	file_id_parameter - int
-		The unique id of the file for which we calculate the SWHID (primary key of FILE table)
+		The unique id of the file for which we calculate the SWHID (primary key of FILE_RECORD table)
 
 	Raises
 	-----------
@@ -799,26 +1223,86 @@ def insert_swhid(db_session_param, target_object_path, file_id_parameter):
 	"""
 
 	#Calculate SWHID
-	try:
-		swh_identifier = pid_of_file(target_object_path) #function imported from swh.model.cli
-	except Exception as e:
-		raise e
-		return False
+	swh_identifier = compute_file_digest(target_object_path, 'swhid')
+
+	insert_swhid_value(db_session_param, swh_identifier, file_id_parameter)
+
+def insert_swhid_value(db_session_param, swh_identifier, file_id_parameter, timings = None, lookup_ids = None):
+	"""
+	Description
+	-----------
+	Insert a SWHID that has already been calculated into the database and update the 'swh-known' column of the file
+
+	Parameters
+	-----------
+	db_session_param - SQLAlchemy session object
+		An active session from which we apply changes to the database
+
+	swh_identifier - string
+		The SWHID of the file
+
+	file_id_parameter - int
+		The unique id of the file (primary key of FILE_RECORD table)
+
+	timings - dictionary, optional
+		If given, the time spent querying the SoftwareHeritage archive is added to its 'swh_lookup' entry
+
+	lookup_ids - LookupIds, optional
+		Default value: None (the id of the swhid hash function is looked up without a cache)
+		The LookupIds that finds the id of the swhid hash function
+
+	Raises
+	-----------
+	Raises an Exception if the insertion of the SHWID Hash object into the database fails
+	"""
 
 	#Insert SWHID in the database
+	insert_hash_value(db_session_param, swh_identifier, 'swhid', file_id_parameter, lookup_ids)
+
+	#Update the 'swh_known' column of the file, after searching for it in the SoftwareHeritage archive usine resolve_swhid
+	lookup_start = perf_counter()
 	try:
-		#construct hash object and try to add it
-		h = Hash(hash_value = swh_identifier, hash_function_name = 'swhid', file_id = file_id_parameter)
-		db_session_param.add(h)
-	except Exception as e:
-		#if you fail, raise an Exception
-		raise e
-		return False
-	else:
-		#Update the 'swh_known' column of the file, after searching for it in the SoftwareHeritage archive usine resolve_swhid
-		x = db_session_param.query(File).get(file_id_parameter)
-		x.swh_known = resolve_swhid(swh_identifier)
-		db_session_param.flush()
+		swh_known = resolve_swhid(swh_identifier)
+	finally:
+		if timings is not None:
+			timings['swh_lookup'] = timings.get('swh_lookup', 0.0) + perf_counter() - lookup_start
+
+	file_table = File.__table__
+	db_session_param.execute(update(file_table).where(file_table.c.id == file_id_parameter).values(swh_known = swh_known))
+
+def insert_scan_metrics(db_session_param, scan_id_parameter, counters, metrics):
+	"""
+	Description
+	-----------
+	Stores the measurements of a scan in the SCAN_METRICS table. If the scan already has measurements (it was resumed), the new values are added to them.
+
+	Parameters
+	-----------
+	db_session_param - SQLAlchemy session object
+		An active session from which we apply changes to the database
+
+	scan_id_parameter - int
+		The unique id of the scan that was measured (primary key of SCAN table)
+
+	counters - dictionary
+		The counters of the ProgressReporter of the scan ('files', 'bytes', 'errors') and its wall time in seconds ('seconds')
+
+	metrics - ScanMetrics
+		The time spent in each stage of the scan
+
+	Raises
+	-----------
+	Raises an Exception if the insertion of the measurements into the database fails
+	"""
+
+	rows = [{'scan_id': scan_id_parameter, 'metric_name': name, 'metric_value': counters[name]} for name in ['files', 'bytes', 'errors', 'seconds']]
+	rows += [{'scan_id': scan_id_parameter, 'metric_name': 'seconds:' + stage, 'metric_value': seconds} for stage, seconds in sorted(metrics.stage_seconds.items())]
+
+	metrics_table = ScanMetric.__table__
+	insert_statement = sqlite_insert(metrics_table).values(rows)
+	db_session_param.execute(insert_statement.on_conflict_do_update(
+		index_elements = [metrics_table.c.scan_id, metrics_table.c.metric_name],
+		set_ = {'metric_value': metrics_table.c.metric_value + insert_statement.excluded.metric_value}))
 
 def resolve_swhid(swhid_hash):
 	"""
@@ -828,8 +1312,8 @@ def resolve_swhid(swhid_hash):
 
 	Parameters
 	-----------
-	swhid_hash - swh.model.identifiers.CoreSWHID
-		The output of a call to pid_of_file. Contains the SWHID hash.
+	swhid_hash - string
+		The SWHID of a file (for example the output of compute_file_digest(file_path, 'swhid')).
 
 	Results
 	-----------
@@ -839,6 +1323,8 @@ def resolve_swhid(swhid_hash):
 		-None, if something went wrong
 	"""
 
+	import requests
+
 	#SoftwareHeritage API documentation:
 	#https://docs.softwareheritage.org/devel/apidoc/swh.web.api.views.identifiers.html#swh.web.api.views.identifiers.api_resolve_swhid
 	api_url = 'https://archive.softwareheritage.org/api/1/resolve/' + swhid_hash + '/'
@@ -853,11 +1339,219 @@ def resolve_swhid(swhid_hash):
 	else:
 		return None
 
+def read_file_into(file_parameter, file_size, hash_objects):
+	"""
+	Description
+	-----------
+	Feeds the content of an open file to one or more hash objects, reading the file only once.
+	The I/O strategy depends on the size of the file:
+		-small files (up to SMALL_FILE_SIZE bytes) are read with a single read
+		-large files (at least MMAP_FILE_SIZE bytes) are memory-mapped and fed to the hash objects without copies.
+		 Each block is fed to the hash objects in parallel (see PARALLEL_FEED_THREADS) and every hash object still receives the blocks in order.
+		-the rest are read into a reusable buffer of READ_BUFFER_SIZE bytes
+
+	Parameters
+	-----------
+	file_parameter: file object
+		A file opened in binary mode
+
+	file_size: int
+		The size of the file in bytes
+
+	hash_objects: list of HashObject objects
+		The hash objects that will be updated with the content of the file
+	"""
+
+	if file_size <= SMALL_FILE_SIZE:
+		data = file_parameter.read()
+		for hash_object in hash_objects:
+			hash_object.update(data)
+
+	elif file_size >= MMAP_FILE_SIZE:
+		import mmap
+		pool = get_feed_pool() if len(hash_objects) > 1 and PARALLEL_FEED_THREADS > 1 else None
+		with mmap.mmap(file_parameter.fileno(), 0, access = mmap.ACCESS_READ) as mapped_file, memoryview(mapped_file) as view:
+			for offset in range(0, len(view), MMAP_BLOCK_SIZE):
+				with view[offset:offset + MMAP_BLOCK_SIZE] as block:
+					if pool is None:
+						for hash_object in hash_objects:
+							hash_object.update(block)
+					else:
+						#The calling thread updates the first hash object. The block is released only after every hash object has been updated with it.
+						futures = [pool.submit(hash_object.update, block) for hash_object in hash_objects[1:]]
+						try:
+							hash_objects[0].update(block)
+						finally:
+							for future in futures:
+								future.exception()
+						for future in futures:
+							future.result()
+
+	else:
+		buffer = get_read_buffer()
+		with memoryview(buffer) as view:
+			while True:
+				bytes_read = file_parameter.readinto(buffer)
+				if not bytes_read:
+					break
+				with view[:bytes_read] as block:
+					for hash_object in hash_objects:
+						hash_object.update(block)
+
+def get_feed_pool():
+	#The pool is created the first time a large file is hashed, so that commands that never hash one do not start its threads
+	global feed_pool
+	with feed_pool_lock:
+		if feed_pool is None:
+			from concurrent.futures import ThreadPoolExecutor
+			feed_pool = ThreadPoolExecutor(PARALLEL_FEED_THREADS, thread_name_prefix = 'hash-feed')
+		return feed_pool
+
+def get_read_buffer():
+	#Each thread reuses its own buffer, so that a new buffer is not allocated for every file
+	buffer = getattr(read_buffers, 'buffer', None)
+	if buffer is None or len(buffer) != READ_BUFFER_SIZE:
+		buffer = bytearray(READ_BUFFER_SIZE)
+		read_buffers.buffer = buffer
+	return buffer
+
+def compute_file_hashes(file_path, hash_function_names, timings = None):
+	"""
+	Description
+	-----------
+	Computes the hash values of a file with several hash functions at once, reading the file only once.
+	If the digest cache is enabled (see digest_cache.py), the hash values cached in the extended attributes of the file are used instead of being
+	calculated, the file is read only if some hash value is not cached, and the hash values that are calculated are cached.
+
+	Parameters
+	-----------
+	file_path: string
+		Path to the file for which we calculate the hash values
+
+	hash_function_names: list of strings
+		The names of the hash functions (including 'swhid')
+
+	timings: dictionary, optional
+		A new dictionary. If given, the seconds spent calculating each hash value are stored in its 'digest:<hash function name>' entries
+		and the rest of the time (opening and reading the file) in its 'read' entry. The digests of sampled hash functions include reading their samples.
+		Memory-mapped files are read while they are hashed, so most of their reading time counts towards the digests.
+		Their hash values are calculated in parallel, so the digests of a memory-mapped file may add up to more than the time spent on it.
+
+	Returns
+	-----------
+	A tuple (hash_values, errors) of two dictionaries that map the names of the hash functions to the hash values and to the errors that occured respectively.
+	Each hash function appears in exactly one of the two dictionaries.
+
+	Raises
+	-----------
+	Raises an Exception if opening or reading the file fails
+	"""
+
+	hash_values = {}
+	errors = {}
+	start = perf_counter() if timings is not None else None
+
+	with open(file_path, 'rb') as f:
+		file_stat = fstat(f.fileno())
+		file_size = file_stat.st_size
+
+		#With the digest cache, the hash values cached in the extended attributes of an unchanged file are not calculated again
+		cached_values = digest_cache.read_cached_digests(f.fileno(), file_stat, hash_function_names) if digest_cache.cache_enabled else {}
+		hash_values.update(cached_values)
+
+		#Construct a HashObject for each hash function. Sampled hash functions (e.g. quicksig) read their samples right away instead.
+		hash_objects = {}
+		for func in hash_function_names:
+			if func in cached_values:
+				continue
+			try:
+				sampler = get_hash_function(func).sampler
+				if sampler is not None:
+					sample_start = perf_counter()
+					hash_values[func] = sampler(f, file_size)
+					if timings is not None:
+						timings['digest:' + func] = perf_counter() - sample_start
+					continue
+				hash_objects[func] = HashObject(func, file_size)
+				if timings is not None:
+					hash_objects[func] = TimedHashObject(hash_objects[func], timings)
+			except Exception as e:
+				errors[func] = e
+
+		#The file is read whole only if a hash function needs its whole content
+		if hash_objects:
+			read_file_into(f, file_size, list(hash_objects.values()))
+
+	for func, hash_object in hash_objects.items():
+		try:
+			hash_values[func] = hash_object.get_hash()
+		except Exception as e:
+			errors[func] = e
+
+	if digest_cache.cache_enabled and len(hash_values) > len(cached_values):
+		digest_cache.write_cached_digests(file_path, file_stat, {func: hash_value for func, hash_value in hash_values.items() if func not in cached_values})
+
+	if timings is not None:
+		timings['read'] = max(0.0, perf_counter() - start - sum(timings.get('digest:' + func, 0.0) for func in hash_function_names))
+
+	return hash_values, errors
+
+def rehash_unchanged_file(file_path, file_size, date_modified, hash_function_names):
+	"""
+	Description
+	-----------
+	Computes the hash values of a file that was scanned before, if it is still present and unchanged since it was scanned.
+	A file is unchanged if its size and its modification date are the ones recorded in its FILE record, both before and after it is read.
+
+	Parameters
+	-----------
+	file_path: string
+		Path to the file (the file_path column of its FILE record)
+
+	file_size: int
+		The size of the file when it was scanned (the file_size column)
+
+	date_modified: datetime
+		The modification date of the file when it was scanned (the date_modified column)
+
+	hash_function_names: list of strings
+		The names of the hash functions (including 'swhid')
+
+	Returns
+	-----------
+	A tuple (hash_values, errors, skip_reason). skip_reason is None if the file was hashed, 'missing' if it does not exist any more and 'changed'
+	if it was modified since it was scanned. The dictionaries are empty if the file was skipped (see compute_file_hashes).
+
+	Raises
+	-----------
+	Raises an Exception if opening or reading the file fails
+	"""
+
+	try:
+		file_stat = stat(file_path)
+	except FileNotFoundError:
+		return {}, {}, 'missing'
+	if not S_ISREG(file_stat.st_mode):
+		return {}, {}, 'missing'
+	if not is_unchanged(file_stat, file_size, date_modified):
+		return {}, {}, 'changed'
+
+	hash_values, errors = compute_file_hashes(file_path, hash_function_names)
+
+	#A file that was modified while it was read would get hash values of neither version
+	if not is_unchanged(stat(file_path), file_size, date_modified):
+		return {}, {}, 'changed'
+	return hash_values, errors, None
+
+def is_unchanged(file_stat, file_size, date_modified):
+	#The modification date is stored the way insert_file stores it
+	return file_stat.st_size == file_size and datetime.fromtimestamp(file_stat.st_mtime) == date_modified
+
 def compute_hashes(file_path, hashes_to_compute):
 	"""
 	Description
 	-----------
-	Compute all the hashes that are produced from the given hash functionsm for the given
+	Compute all the hashes that are produced from the given hash functions for the given file. The SWHID is always computed.
 
 	Parameters
 	-----------
@@ -870,59 +1564,141 @@ def compute_hashes(file_path, hashes_to_compute):
 	Returns
 	-----------
 	computed_hashes: list of strings
-		List of hash values that correspond to the outputs of the hash functions in hashes_to_compute when they are given the file located at file_path as input
+		List of hash values that correspond to the outputs of the hash functions in hashes_to_compute when they are given the file located at file_path as input.
+		The SWHID is the last hash value of the list.
 
 	Raises
 	-----------
 	Raises an Exception if opening the file fails
-	"""		
+	"""
+
+	#SWHID is computed last
+	hash_function_names = [func for func in hashes_to_compute if func != 'swhid'] + ['swhid']
+	hash_values, errors = compute_file_hashes(file_path, hash_function_names)
 
 	computed_hashes = []
+	for func in hash_function_names:
+		if func in errors:
+			print(f"Error: Calculation of {func} hash of {file_path} failed. This hash will be excluded from the search. In more detail:")
+			print(errors[func])
+		else:
+			computed_hashes.append(hash_values[func])
 
-	#Block size (the hash calculation is done one memory block at a time, in order to be able to calculate hashes of files that exceed the size of the memory)
-	chunk_size = 4096
+	return computed_hashes
 
-	#For each given hash function, calculate the hash value an add it to the result
-	for func in hashes_to_compute:
+def compute_file_digest(file_path, hash_function_name):
+	"""
+	Description
+	-----------
+	Computes the hash value of a file with a single hash function, reading the file only once.
 
-		#Skip SWHID, since it is computed independently
-		if func == 'swhid':
-			continue
+	Parameters
+	-----------
+	file_path: string
+		Path to the file for which we calculate the hash value
 
-		#Construct a HashObject 
-		hash_object = HashObject(func)
+	hash_function_name: string
+		The name of the hash function (including 'swhid')
 
-		#Open the file whose hashes you want to compute	
-		try:
-			f = open(file_path, 'rb') #rb = open in binary format
-		except Exception as e:
-			#If you fail to open the file, raise an error
-			raise e
-		else:
-			#Calculate the hash
-			for block in iter(lambda: f.read(chunk_size), b""):
-				hash_object.update(block)
+	Returns
+	-----------
+	The hash value (string)
+
+	Raises
+	-----------
+	Raises an Exception if opening or reading the file or calculating the hash value fails
+	"""
+
+	hash_values, errors = compute_file_hashes(file_path, [hash_function_name])
+	if hash_function_name in errors:
+		raise errors[hash_function_name]
+	return hash_values[hash_function_name]
+
+def iterate_files(paths_list):
+	"""
+	Description
+	-----------
+	Generator that yields the absolute paths of the given files and of the files inside the given directories (recursively).
+	Paths that do not exist are reported and skipped.
+
+	Parameters
+	-----------
+	paths_list: list of strings
+		Paths (relative or absolute) to files and directories."""
+
+	for t in walk_local_targets(paths_list, None, True):
+		yield t.full_path
+
+def compute_file_digests(file_paths, hash_function_name, jobs = 1):
+	"""
+	Description
+	-----------
+	Generator that computes the hash value of many files with a single hash function, using up to 'jobs' threads.
+	Only a bounded number of files is hashed ahead of the consumer, so the memory used does not depend on the number of files.
+
+	Parameters
+	-----------
+	file_paths: iterable of strings
+		Paths to the files, for example the output of iterate_files()
+
+	hash_function_name: string
+		The name of the hash function
+
+	jobs: int, optional
+		Default: 1
+		The number of threads that hash files at the same time
 
-			#Close the file
-			f.close()
+	Returns
+	-----------
+	Yields tuples (file_path, hash_value, exception). If hashing a file fails, hash_value is None and exception is the error that occured.
+	"""
 
-		#Add the hash value to the result
+	def digest_or_error(file_path):
 		try:
-			computed_hashes.append(hash_object.get_hash())
+			return file_path, compute_file_digest(file_path, hash_function_name), None
 		except Exception as e:
-			print("Error: Calculation of {func} hash of {file_path} failed. This hash will be excluded from the search. In more detail:")
-			print(e)
+			return file_path, None, e
 
-	#Compute SWHID
-	try:
-		swh_identifier = pid_of_file(file_path) #function imported from swh.model.cli
-	except Exception as e:
-		print("Error: Calculation of SWHID hash of {file_path} failed. This hash will be excluded from the search. In more detail:")
-		print(e)
-	else:
-		computed_hashes.append(swh_identifier)
+	return map_bounded(digest_or_error, file_paths, jobs)
 
-	return computed_hashes
+def map_bounded(function, items, jobs = 1):
+	"""
+	Description
+	-----------
+	Generator that yields function(item) for each item, in the order of the items, using up to 'jobs' threads.
+	Only a bounded number of items is processed ahead of the consumer, so the memory used does not depend on the number of items.
+
+	Parameters
+	-----------
+	function: callable
+		A function that receives one item. It should not raise exceptions.
+
+	items: iterable
+		The items, for example the output of a generator
+
+	jobs: int, optional
+		Default: 1
+		The number of threads that call the function at the same time
+	"""
+
+	if jobs <= 1:
+		for item in items:
+			yield function(item)
+		return
+
+	from concurrent.futures import ThreadPoolExecutor
+	from collections import deque
+	from itertools import islice
+
+	#The hash functions release the GIL while they process large blocks, so threads hash files in parallel
+	items = iter(items)
+	with ThreadPoolExecutor(max_workers = jobs) as executor:
+		pending = deque(executor.submit(function, item) for item in islice(items, jobs * 4))
+		while pending:
+			result = pending.popleft().result()
+			for item in islice(items, 1):
+				pending.append(executor.submit(function, item))
+			yield result
 
 def comparsion(fuzzy_func, h1, h2):
 	"""
@@ -946,6 +1722,8 @@ def comparsion(fuzzy_func, h1, h2):
 	Returns the result of the fuzzy hashing comparsion
 	"""		
 	if fuzzy_func == 'tlsh':
+		import tlsh
 		return tlsh.diff(h1, h2)
 	elif fuzzy_func == 'ssdeep':
+		import ssdeep
 		return ssdeep.compare(h1, h2)
\ No newline at end of file
@@ -0,0 +1,476 @@
+import json
+import socket
+import sys
+from os import getuid, chdir, getcwd, umask, remove, environ, lstat, mkdir
+from os.path import abspath, join, exists, lexists, dirname
+from stat import S_ISDIR, S_ISSOCK
+from hashlib import sha1
+from tempfile import gettempdir
+from io import TextIOBase
+from contextlib import redirect_stdout, redirect_stderr
+from time import monotonic
+
+#The maximum time (in seconds) that a client waits for a server to accept its connection
+CONNECT_TIMEOUT = 1.0
+
+#The server executes one command at a time and sends {"ready": true} when it starts reading the request of a client.
+#A client that does not get it within BUSY_TIMEOUT seconds reports that the server is busy, without sending its command.
+#The server waits at most REQUEST_TIMEOUT seconds for the request, so a client that never sends it does not block the server.
+BUSY_TIMEOUT = 2.0
+REQUEST_TIMEOUT = 5.0
+
+#The output of a forwarded command is sent to the client while the command runs, in messages of at most OUTPUT_CHUNK_SIZE characters.
+#Output that is shorter is sent once it is OUTPUT_FLUSH_SECONDS old, so that progress reports reach the client in time.
+OUTPUT_CHUNK_SIZE = 64 * 1024
+OUTPUT_FLUSH_SECONDS = 0.2
+
+#Exit status of a forwarded command that failed with an unexpected error, or whose server stopped before it finished
+FAILED_STATUS = 1
+
+def get_socket_path(database_path_parameter):
+	"""
+	Description
+	-----------
+	Returns the path of the unix socket used by the hashesdb server that serves the given database.
+	The path depends on the user and on the absolute path of the database, so each database has at most one server.
+	The socket is placed in the private socket folder of the user (see get_socket_folder).
+
+	Parameters
+	-----------
+	database_path_parameter: string
+		Relative or absolute path to a hashesdb database."""
+
+	database_digest = sha1(abspath(database_path_parameter).encode()).hexdigest()[:16]
+	return join(get_socket_folder(), f"{database_digest}.sock")
+
+def get_socket_folder():
+	#The folder of the sockets of the current user, in XDG_RUNTIME_DIR or else in the shared temporary folder.
+	#Its name is predictable, so it is trusted only if it passes is_private_folder: then no other user can place a socket in it.
+	return join(environ.get('XDG_RUNTIME_DIR', gettempdir()), f"hashesdb-{getuid()}")
+
+def is_private_folder(folder_path_parameter):
+	#True if the path is a folder (not a symbolic link) owned by the current user that no other user can access
+	try:
+		folder_stat = lstat(folder_path_parameter)
+	except OSError:
+		return False
+	return S_ISDIR(folder_stat.st_mode) and folder_stat.st_uid == getuid() and not folder_stat.st_mode & 0o077
+
+def is_own_socket(socket_path_parameter):
+	#True if the path is a unix socket created by the current user in a private socket folder, so a client may send commands to it
+	if not is_private_folder(dirname(socket_path_parameter)):
+		return False
+	try:
+		socket_stat = lstat(socket_path_parameter)
+	except OSError:
+		return False
+	return S_ISSOCK(socket_stat.st_mode) and socket_stat.st_uid == getuid()
+
+def connect_to_server(socket_path_parameter):
+	"""
+	Description
+	-----------
+	Connects to a hashesdb server and waits until the server is ready to read a request.
+
+	Parameters
+	-----------
+	socket_path_parameter: string
+		The path of the socket of the server.
+
+	Results
+	-----------
+	Returns the connected socket, without a timeout.
+
+	Raises
+	-----------
+	Raises an OSError if the socket is not trusted (see is_own_socket) or no server listens on it, and a TimeoutError (an OSError too)
+	if the server is busy with another command for more than BUSY_TIMEOUT seconds."""
+
+	if not is_own_socket(socket_path_parameter):
+		raise PermissionError(f"{socket_path_parameter} is not a socket of a hashesdb server of this user")
+
+	client_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		client_socket.settimeout(CONNECT_TIMEOUT)
+		client_socket.connect(socket_path_parameter)
+		#The kernel accepts the connection even while the server executes another command, so the client waits for the server itself
+		client_socket.settimeout(BUSY_TIMEOUT)
+		ready_message = b''
+		while not ready_message.endswith(b'\n'):
+			chunk = client_socket.recv(1)
+			if not chunk:
+				raise ConnectionResetError("the hashesdb server closed the connection")
+			ready_message += chunk
+		client_socket.settimeout(None)
+	except BaseException:
+		client_socket.close()
+		raise
+	return client_socket
+
+def is_listening(socket_path_parameter):
+	#True if a server accepts connections on the socket, even if it is busy with another command. A socket left behind by a server that crashed refuses them.
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client_socket:
+		client_socket.settimeout(CONNECT_TIMEOUT)
+		try:
+			client_socket.connect(socket_path_parameter)
+		except OSError:
+			return False
+	return True
+
+def send_request(socket_path_parameter, request_parameter):
+	#Send a json request to the server and return its decoded response. Raises OSError if the server is unreachable, busy or its socket is not trusted.
+	with connect_to_server(socket_path_parameter) as client_socket:
+		client_socket.settimeout(BUSY_TIMEOUT)
+		client_socket.sendall(json.dumps(request_parameter).encode() + b'\n')
+
+		response = b''
+		while not response.endswith(b'\n'):
+			chunk = client_socket.recv(65536)
+			if not chunk:
+				break
+			response += chunk
+
+	return json.loads(response)
+
+def forward_command(database_path_parameter, arg_list_parameter, output_stream = None, error_stream = None):
+	"""
+	Description
+	-----------
+	Forwards a terminal command to the hashesdb server that serves the given database.
+	The output of the command is written to the given streams while the server executes it.
+	The server replies with a stream of json lines: {"output": text} and {"error": text} while the command runs and {"status": exit status} at the end.
+
+	Parameters
+	-----------
+	database_path_parameter: string
+		Relative or absolute path to the database that the command uses.
+
+	arg_list_parameter: list of strings
+		The command line arguments of the command.
+
+	output_stream: file object, optional
+		Default: sys.stdout
+		The stream to which the standard output of the command is written.
+
+	error_stream: file object, optional
+		Default: sys.stderr
+		The stream to which the standard error of the command (e.g. argparse usage errors) is written.
+
+	Results
+	-----------
+	Returns the exit status of the command: 0 if it succeeded, non-zero if the server rejected its arguments, failed to execute it
+	or was busy with another command for more than BUSY_TIMEOUT seconds (in which case the command is not executed).
+	Returns None if no server serves the database, in which case the caller should execute the command itself.
+	A socket that is not owned by the current user, or that is not in its private socket folder, is ignored, so that commands are never sent to another user."""
+
+	output_stream = output_stream if output_stream is not None else sys.stdout
+	error_stream = error_stream if error_stream is not None else sys.stderr
+
+	socket_path = get_socket_path(database_path_parameter)
+	if not is_own_socket(socket_path):
+		return None
+
+	try:
+		client_socket = connect_to_server(socket_path)
+	except socket.timeout:
+		#The command has not been sent, so the server will not execute it
+		print(f"Error: the hashesdb server of this database is busy with another command. Try again when it finishes, or stop the server with: hashesdb serve --stop -d {database_path_parameter}", file = error_stream)
+		return FAILED_STATUS
+	except OSError:
+		#The server is not running (stale socket file), so the command has not been executed
+		return None
+
+	with client_socket:
+		try:
+			client_socket.sendall(json.dumps({"argv": list(arg_list_parameter), "cwd": getcwd()}).encode() + b'\n')
+		except OSError:
+			#The server closed the connection before it read the command, so the command has not been executed
+			return None
+
+		#From now on the server may have started the command, so it must not be executed again by the caller
+		try:
+			with client_socket.makefile('rb') as response_file:
+				for response_line in response_file:
+					message = json.loads(response_line)
+					if "output" in message:
+						output_stream.write(message["output"])
+						output_stream.flush()
+					elif "error" in message:
+						error_stream.write(message["error"])
+						error_stream.flush()
+					elif "status" in message:
+						return message["status"]
+		except (OSError, ValueError) as e:
+			print(f"Error: the connection with the hashesdb server was lost. In more detail:\n{e}", file = error_stream)
+			return FAILED_STATUS
+
+	print("Error: the hashesdb server stopped before the command finished.", file = error_stream)
+	return FAILED_STATUS
+
+def stop_server(database_path_parameter):
+	"""
+	Description
+	-----------
+	Stops the hashesdb server that serves the given database.
+
+	Parameters
+	-----------
+	database_path_parameter: string
+		Relative or absolute path to the served database.
+
+	Results
+	-----------
+	Returns True if the server was stopped, False otherwise."""
+
+	try:
+		send_request(get_socket_path(database_path_parameter), {"shutdown": True})
+	except socket.timeout:
+		print("Error: the hashesdb server is busy with another command. It can be stopped when the command finishes.")
+		return False
+	except (OSError, ValueError):
+		print("Error: no hashesdb server serves this database.")
+		return False
+
+	print("The hashesdb server was stopped.")
+	return True
+
+
+class HashesdbServer:
+	"""
+	This class keeps a hashesdb database open and executes the terminal commands that other hashesdb processes forward to it.
+	Requests are served one at a time, so the database is never written by two commands at once.
+	"""
+
+	def __init__(self, database_path_parameter):
+		"""
+		Description
+		-----------
+		HashesdbServer class initializer
+
+		Parameters
+		-----------
+		database_path_parameter: string
+			Relative or absolute path to the hashesdb database that will be served."""
+
+		self.database_path = abspath(database_path_parameter)
+		self.socket_path = get_socket_path(self.database_path)
+		self.server_socket = None
+
+	def bind(self):
+		"""
+		Description
+		-----------
+		Creates the unix socket of the server in the private socket folder of the user, which is created with mode 0700 if it does not exist.
+		A socket file left behind by a server that crashed is replaced.
+
+		Results
+		-----------
+		Returns True if the socket was created, False if another server already serves the database or if the socket folder is not private."""
+
+		socket_folder = dirname(self.socket_path)
+		try:
+			mkdir(socket_folder, 0o700)
+		except FileExistsError:
+			pass
+		if not is_private_folder(socket_folder):
+			print(f"Error: {socket_folder} must be a folder that only belongs to the current user (mode 0700). Remove it or set XDG_RUNTIME_DIR.")
+			return False
+
+		#Only a socket of this user counts as a running server. Since the folder is private, any other file in its place was left by this user and can be removed.
+		if lexists(self.socket_path):
+			if is_own_socket(self.socket_path) and is_listening(self.socket_path):
+				print(f"Error: a hashesdb server already serves {self.database_path}")
+				return False
+			remove(self.socket_path)
+
+		self.server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		#Only the user that started the server may send commands to it. The socket file is created with these permissions,
+		#so that there is no moment at which other users can connect to it (as there would be with a chmod after bind)
+		previous_umask = umask(0o177)
+		try:
+			self.server_socket.bind(self.socket_path)
+		finally:
+			umask(previous_umask)
+		self.server_socket.listen()
+		return True
+
+	def serve(self):
+		"""
+		Description
+		-----------
+		Opens the database and serves requests until a shutdown request is received.
+
+		Results
+		-----------
+		Returns False if the server could not start, True when it stops."""
+
+		#Imported here so that the client side of this module stays lightweight
+		from app import App
+		from parser import ServerParser
+
+		app = App(self.database_path, persistent_connection_flag = True)
+		if app.used_database.get_database_path() != self.database_path:
+			print("Error: the hashesdb server could not open the database.")
+			return False
+
+		if not self.bind():
+			return False
+
+		server_parser = ServerParser(app)
+		print(f"hashesdb server: serving {self.database_path} on {self.socket_path}")
+
+		try:
+			running = True
+			while running:
+				connection, _ = self.server_socket.accept()
+				with connection:
+					running = self.handle_connection(connection, server_parser)
+		except KeyboardInterrupt:
+			pass
+		finally:
+			self.server_socket.close()
+			if exists(self.socket_path):
+				remove(self.socket_path)
+			#Release the database now, instead of whenever the parser (which refers to itself) is garbage collected
+			del server_parser.app
+
+		return True
+
+	def handle_connection(self, connection_parameter, server_parser_parameter):
+		#Read one request, execute it while its output is streamed back and send its exit status. Returns False if the server must stop.
+		#A client that gave up waiting (see BUSY_TIMEOUT) or that does not send its request within REQUEST_TIMEOUT seconds is dropped.
+		request = b''
+		try:
+			send_message(connection_parameter, {"ready": True})
+			connection_parameter.settimeout(REQUEST_TIMEOUT)
+			while not request.endswith(b'\n'):
+				chunk = connection_parameter.recv(65536)
+				if not chunk:
+					break
+				request += chunk
+			connection_parameter.settimeout(None)
+			request = json.loads(request)
+		except (OSError, ValueError):
+			return True
+
+		if request.get("shutdown"):
+			send_message(connection_parameter, {"status": 0})
+			return False
+
+		status = 0
+		if "argv" in request:
+			status = self.execute_request(request["argv"], request.get("cwd"), connection_parameter, server_parser_parameter)
+
+		try:
+			send_message(connection_parameter, {"status": status})
+		except OSError:
+			#The client disconnected before the command finished
+			pass
+		return True
+
+	def execute_request(self, arg_list_parameter, cwd_parameter, connection_parameter, server_parser_parameter):
+		"""
+		Description
+		-----------
+		Executes a forwarded command and streams its standard output and standard error to the client while it runs.
+
+		Parameters
+		-----------
+		arg_list_parameter: list of strings
+			The command line arguments of the command.
+
+		cwd_parameter: string
+			The working directory of the client. The command is executed from it, so that relative paths keep their meaning.
+
+		connection_parameter: socket object
+			The connection with the client.
+
+		server_parser_parameter: ServerParser object
+			The parser that executes the command.
+
+		Results
+		-----------
+		Returns the exit status of the command: the status of argparse for invalid arguments (and for -h), FAILED_STATUS for unexpected errors, 0 otherwise."""
+
+		server_cwd = getcwd()
+		output_writer = MessageWriter(connection_parameter, "output")
+		error_writer = MessageWriter(connection_parameter, "error")
+		status = 0
+
+		try:
+			if cwd_parameter:
+				chdir(cwd_parameter)
+				server_parser_parameter.parser_scan.set_defaults(download_location = cwd_parameter)
+
+			with redirect_stdout(output_writer), redirect_stderr(error_writer):
+				server_parser_parameter.parse(arg_list_parameter)
+		except SystemExit as e:
+			#argparse exits after it prints a usage error (status 2) or the help message (status 0)
+			if isinstance(e.code, int) or e.code is None:
+				status = e.code or 0
+			else:
+				error_writer.write(f"{e.code}\n")
+				status = FAILED_STATUS
+		except Exception as e:
+			error_writer.write(f"Error: the hashesdb server could not execute the command. In more detail:\n{e}\n")
+			status = FAILED_STATUS
+		finally:
+			chdir(server_cwd)
+			output_writer.flush()
+			error_writer.flush()
+
+		return status
+
+
+class MessageWriter(TextIOBase):
+	"""
+	This class is a text stream that sends what is written to it to the client of a forwarded command, as json lines {<kind>: text}.
+	The text is collected and sent in chunks (see OUTPUT_CHUNK_SIZE and OUTPUT_FLUSH_SECONDS), so that a command that prints many short lines
+	does not send a message per line, while the client still sees the output as it is produced.
+	If the client disconnects, the rest of the output is discarded and the command runs to the end.
+	"""
+
+	def __init__(self, connection_parameter, kind_parameter):
+		self.connection = connection_parameter
+		self.kind = kind_parameter
+		self.pending = []
+		self.pending_size = 0
+		self.pending_since = None
+		self.disconnected = False
+
+	def writable(self):
+		return True
+
+	def write(self, text):
+		if not text or self.disconnected:
+			return len(text)
+
+		if self.pending_since is None:
+			self.pending_since = monotonic()
+		self.pending.append(text)
+		self.pending_size += len(text)
+
+		if self.pending_size >= OUTPUT_CHUNK_SIZE or monotonic() - self.pending_since >= OUTPUT_FLUSH_SECONDS:
+			self.flush()
+		return len(text)
+
+	def flush(self):
+		if not self.pending:
+			return
+
+		text = ''.join(self.pending)
+		self.pending = []
+		self.pending_size = 0
+		self.pending_since = None
+		if self.disconnected:
+			return
+
+		try:
+			for offset in range(0, len(text), OUTPUT_CHUNK_SIZE):
+				send_message(self.connection, {self.kind: text[offset:offset + OUTPUT_CHUNK_SIZE]})
+		except OSError:
+			self.disconnected = True
+
+def send_message(connection_parameter, message_parameter):
+	#Send a json line to a client. Raises OSError if the client disconnected.
+	connection_parameter.sendall(json.dumps(message_parameter).encode() + b'\n')
@@ -1,9 +1,25 @@
-from sqlalchemy import Column, BigInteger, Integer, Boolean, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, BigInteger, Integer, Float, Boolean, String, Text, DateTime, ForeignKey, Index, MetaData, Table, select, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
 Base = declarative_base()
 
+#SQLite header fields that identify a hashesDB database without reflecting its schema (PRAGMA application_id and PRAGMA user_version).
+#HASHESDB_SCHEMA_VERSION increases each time we make a change to the schema.
+#Tables that were added after the first version of the schema declare the version that introduced them in their info dictionary ('since_version'),
+#so that databases created earlier are still recognised (the missing tables are created when the database is upgraded).
+#Tables whose content is computed from other tables are marked as 'derived': they are not exported or imported.
+#Tables whose rows are exported and imported through one of the views of VIEW_NAMES name that view in their info dictionary ('view').
+HASHESDB_APPLICATION_ID = 0x48444221
+HASHESDB_SCHEMA_VERSION = 7
+
+#Schema version that moved the files and the hashes from the FILE and the HASH tables to FILE_RECORD and HASH_RECORD, whose repeated text values
+#(hash function names, origins, extensions and directories) are stored once in lookup tables and referenced by integer ids
+LOOKUP_TABLES_VERSION = 7
+
+#Prefix of the names of the partial indexes created by the 'hash-index' command (one index per hash function)
+HASH_FUNCTION_INDEX_PREFIX = 'ix_hash_function_'
+
 """The following classes declare the tables of a database"""
 
 class DbInformation(Base):
@@ -32,41 +48,254 @@ class Scan(Base):
 
    scan_code = relationship("ScanCode", back_populates="scans")
    files = relationship("File", back_populates="scan")
+   metrics = relationship("ScanMetric", back_populates="scan")
+
+
+class ScanMetric(Base):
+   __tablename__ = 'SCAN_METRICS'
+   __table_args__ = {'info': {'since_version': 5}}
+   scan_id = Column(Integer, ForeignKey('SCAN.scan_id'), primary_key = True)
+   metric_name = Column(String, primary_key = True)
+   metric_value = Column(Float)
+
+   scan = relationship("Scan", back_populates="metrics")
+
+
+class Directory(Base):
+   __tablename__ = 'DIRECTORY'
+   __table_args__ = {'info': {'since_version': 7, 'view': 'FILE'}}
+   directory_id = Column(Integer, primary_key = True)
+   directory_path = Column(String, unique = True, nullable = False)
+
+   files = relationship("File", back_populates="directory")
+
+
+class Extension(Base):
+   __tablename__ = 'EXTENSION'
+   __table_args__ = {'info': {'since_version': 7, 'view': 'FILE'}}
+   extension_id = Column(Integer, primary_key = True)
+   extension_name = Column(String, unique = True, nullable = False)
+
+   files = relationship("File", back_populates="extension")
+
+
+class Origin(Base):
+   __tablename__ = 'ORIGIN'
+   __table_args__ = {'info': {'since_version': 7, 'view': 'FILE'}}
+   origin_id = Column(Integer, primary_key = True)
+   origin_name = Column(String, unique = True, nullable = False)
+
+   files = relationship("File", back_populates="origin")
 
 
 class File(Base):
-   __tablename__ = 'FILE'
+   __tablename__ = 'FILE_RECORD'
+   __table_args__ = (Index('ix_file_record_directory_name_origin', 'directory_id', 'file_name', 'origin_id'), {'info': {'since_version': 7, 'view': 'FILE'}})
    id = Column(Integer, primary_key = True)
    scan_id = Column(Integer, ForeignKey('SCAN.scan_id'))
    file_name = Column(String)
-   file_extension = Column(String)
-   file_path = Column(String)
+   extension_id = Column(Integer, ForeignKey('EXTENSION.extension_id'))
+   directory_id = Column(Integer, ForeignKey('DIRECTORY.directory_id'))
    file_size = Column(BigInteger)
    date_created = Column(DateTime)
    date_modified = Column(DateTime)
    date_retrieved = Column(DateTime)
    swh_known = Column(Boolean)
    updated = Column(Boolean)
-   origin = Column(String)
+   origin_id = Column(Integer, ForeignKey('ORIGIN.origin_id'))
 
    scan = relationship("Scan", back_populates="files")
    hashes = relationship("Hash", back_populates="files")
+   directory = relationship("Directory", back_populates="files")
+   extension = relationship("Extension", back_populates="files")
+   origin = relationship("Origin", back_populates="files")
 
 
 class Hash(Base):
-   __tablename__ = 'HASH'
+   __tablename__ = 'HASH_RECORD'
+   __table_args__ = (Index('ix_hash_record_hash_value', 'hash_value'), {'info': {'since_version': 7, 'view': 'HASH'}})
    hash_id = Column(Integer, primary_key = True)
    hash_value = Column(String)
-   hash_function_name = Column(String, ForeignKey('HASH_FUNCTION.hash_function_name'))
-   file_id = Column(Integer, ForeignKey('FILE.id'))
+   hash_function_id = Column(Integer, ForeignKey('HASH_FUNCTION.hash_function_id'))
+   file_id = Column(Integer, ForeignKey('FILE_RECORD.id'))
 
    hash_function = relationship("HashFunction", back_populates="hashes")
    files = relationship("File", back_populates="hashes")
 
 class HashFunction(Base):
    __tablename__ = 'HASH_FUNCTION'
-   hash_function_name = Column(String, primary_key = True)
+   hash_function_id = Column(Integer, primary_key = True)
+   hash_function_name = Column(String, unique = True, nullable = False)
    hash_function_fuzzy_flag = Column(Boolean)
    hash_function_size = Column(Integer)
 
-   hashes = relationship("Hash", back_populates="hash_function")
\ No newline at end of file
+   hashes = relationship("Hash", back_populates="hash_function")
+   throughputs = relationship("HashFunctionThroughput", back_populates="hash_function")
+
+
+class HashFunctionThroughput(Base):
+   __tablename__ = 'HASH_FUNCTION_THROUGHPUT'
+   __table_args__ = {'info': {'since_version': 6}}
+   hash_function_name = Column(String, ForeignKey('HASH_FUNCTION.hash_function_name'), primary_key = True)
+   hostname = Column(String, primary_key = True)
+   mb_per_second = Column(Float)
+   calibration_date = Column(DateTime)
+
+   hash_function = relationship("HashFunction", back_populates="throughputs")
+
+
+class Statistic(Base):
+   __tablename__ = 'STATISTICS'
+   __table_args__ = {'info': {'since_version': 3, 'derived': True}}
+   statistic_name = Column(String, primary_key = True)
+   statistic_value = Column(BigInteger)
+
+
+"""The STATISTICS table is kept up to date by the following triggers, so that the counts change in the same transaction as the data they count.
+The triggers are created after all the tables, since they refer to the FILE_RECORD, the HASH_RECORD and the HASH_FUNCTION tables.
+Statistic names: 'files', 'swh_known_files', 'hashes' and 'hashes:<hash function name>'"""
+
+#Name of the statistic of the hash function of a HASH_RECORD row ({row} is NEW or OLD)
+HASH_STATISTIC_NAME = "'hashes:' || ifnull((SELECT hash_function_name FROM HASH_FUNCTION WHERE hash_function_id = {row}.hash_function_id), '')"
+
+STATISTICS_TRIGGERS = [
+   """CREATE TRIGGER IF NOT EXISTS statistics_file_insert AFTER INSERT ON FILE_RECORD BEGIN
+      INSERT OR IGNORE INTO STATISTICS VALUES ('files', 0), ('swh_known_files', 0);
+      UPDATE STATISTICS SET statistic_value = statistic_value + 1 WHERE statistic_name = 'files';
+      UPDATE STATISTICS SET statistic_value = statistic_value + (NEW.swh_known IS 1) WHERE statistic_name = 'swh_known_files';
+   END""",
+   """CREATE TRIGGER IF NOT EXISTS statistics_file_delete AFTER DELETE ON FILE_RECORD BEGIN
+      UPDATE STATISTICS SET statistic_value = statistic_value - 1 WHERE statistic_name = 'files';
+      UPDATE STATISTICS SET statistic_value = statistic_value - (OLD.swh_known IS 1) WHERE statistic_name = 'swh_known_files';
+   END""",
+   """CREATE TRIGGER IF NOT EXISTS statistics_file_update AFTER UPDATE OF swh_known ON FILE_RECORD BEGIN
+      UPDATE STATISTICS SET statistic_value = statistic_value + (NEW.swh_known IS 1) - (OLD.swh_known IS 1) WHERE statistic_name = 'swh_known_files';
+   END""",
+   f"""CREATE TRIGGER IF NOT EXISTS statistics_hash_insert AFTER INSERT ON HASH_RECORD BEGIN
+      INSERT OR IGNORE INTO STATISTICS VALUES ('hashes', 0), ({HASH_STATISTIC_NAME.format(row = 'NEW')}, 0);
+      UPDATE STATISTICS SET statistic_value = statistic_value + 1 WHERE statistic_name IN ('hashes', {HASH_STATISTIC_NAME.format(row = 'NEW')});
+   END""",
+   f"""CREATE TRIGGER IF NOT EXISTS statistics_hash_delete AFTER DELETE ON HASH_RECORD BEGIN
+      UPDATE STATISTICS SET statistic_value = statistic_value - 1 WHERE statistic_name IN ('hashes', {HASH_STATISTIC_NAME.format(row = 'OLD')});
+   END""",
+   f"""CREATE TRIGGER IF NOT EXISTS statistics_hash_update AFTER UPDATE OF hash_function_id ON HASH_RECORD BEGIN
+      INSERT OR IGNORE INTO STATISTICS VALUES ({HASH_STATISTIC_NAME.format(row = 'NEW')}, 0);
+      UPDATE STATISTICS SET statistic_value = statistic_value - 1 WHERE statistic_name = {HASH_STATISTIC_NAME.format(row = 'OLD')};
+      UPDATE STATISTICS SET statistic_value = statistic_value + 1 WHERE statistic_name = {HASH_STATISTIC_NAME.format(row = 'NEW')};
+   END""",
+]
+
+
+"""The FILE and the HASH views show the files and the hashes with the columns (names and order) of the FILE and the HASH tables of the databases
+created before schema version 7, so that the sql, export and import commands and the queries written for older versions keep working.
+The path of a file is the path of its directory followed by its name. Rows can also be inserted, updated and deleted through the views:
+the following triggers add the new values to the lookup tables and change the FILE_RECORD and the HASH_RECORD tables.
+The commands of hashesdb select from FILE_RECORD and HASH_RECORD joined with the lookup tables (see file_view_columns and hash_view_columns),
+so that SQLite uses the indexes of these tables."""
+
+VIEW_NAMES = ['FILE', 'HASH']
+
+#The path of the directory of a FILE row ({row} is NEW or OLD): its file_path without its file_name
+DIRECTORY_PATH = "substr({row}.file_path, 1, length({row}.file_path) - length({row}.file_name))"
+
+#Statements of the insert and the update triggers of the views that reject the rows that can not be stored and add the new values to the lookup tables
+FILE_VIEW_CHECKS = f"""SELECT RAISE(ABORT, 'the file_path of a file must end with its file_name') WHERE NEW.file_path IS NOT NULL AND (NEW.file_name IS NULL OR substr(NEW.file_path, length(NEW.file_path) - length(NEW.file_name) + 1) IS NOT NEW.file_name);
+      INSERT OR IGNORE INTO DIRECTORY (directory_path) SELECT {DIRECTORY_PATH.format(row = 'NEW')} WHERE NEW.file_path IS NOT NULL;
+      INSERT OR IGNORE INTO EXTENSION (extension_name) SELECT NEW.file_extension WHERE NEW.file_extension IS NOT NULL;
+      INSERT OR IGNORE INTO ORIGIN (origin_name) SELECT NEW.origin WHERE NEW.origin IS NOT NULL;"""
+HASH_VIEW_CHECKS = """SELECT RAISE(ABORT, 'the hash_function_name of a hash must be the name of a hash function of the HASH_FUNCTION table') WHERE NEW.hash_function_name IS NOT NULL AND NOT EXISTS (SELECT 1 FROM HASH_FUNCTION WHERE hash_function_name = NEW.hash_function_name);"""
+
+#The ids of the values of a NEW row of a view
+EXTENSION_ID = "(SELECT extension_id FROM EXTENSION WHERE extension_name = NEW.file_extension)"
+DIRECTORY_ID = f"(SELECT directory_id FROM DIRECTORY WHERE directory_path = {DIRECTORY_PATH.format(row = 'NEW')})"
+ORIGIN_ID = "(SELECT origin_id FROM ORIGIN WHERE origin_name = NEW.origin)"
+HASH_FUNCTION_ID = "(SELECT hash_function_id FROM HASH_FUNCTION WHERE hash_function_name = NEW.hash_function_name)"
+
+VIEW_TRIGGERS = [
+   f"""CREATE TRIGGER IF NOT EXISTS file_view_insert INSTEAD OF INSERT ON FILE BEGIN
+      {FILE_VIEW_CHECKS}
+      INSERT INTO FILE_RECORD (id, scan_id, file_name, extension_id, directory_id, file_size, date_created, date_modified, date_retrieved, swh_known, updated, origin_id)
+      VALUES (NEW.id, NEW.scan_id, NEW.file_name, {EXTENSION_ID}, {DIRECTORY_ID}, NEW.file_size, NEW.date_created, NEW.date_modified, NEW.date_retrieved, NEW.swh_known, NEW.updated, {ORIGIN_ID});
+   END""",
+   f"""CREATE TRIGGER IF NOT EXISTS file_view_update INSTEAD OF UPDATE ON FILE BEGIN
+      {FILE_VIEW_CHECKS}
+      UPDATE FILE_RECORD SET id = NEW.id, scan_id = NEW.scan_id, file_name = NEW.file_name, extension_id = {EXTENSION_ID}, directory_id = {DIRECTORY_ID}, file_size = NEW.file_size,
+         date_created = NEW.date_created, date_modified = NEW.date_modified, date_retrieved = NEW.date_retrieved, swh_known = NEW.swh_known, updated = NEW.updated, origin_id = {ORIGIN_ID}
+      WHERE id = OLD.id;
+   END""",
+   """CREATE TRIGGER IF NOT EXISTS file_view_delete INSTEAD OF DELETE ON FILE BEGIN
+      DELETE FROM FILE_RECORD WHERE id = OLD.id;
+   END""",
+   f"""CREATE TRIGGER IF NOT EXISTS hash_view_insert INSTEAD OF INSERT ON HASH BEGIN
+      {HASH_VIEW_CHECKS}
+      INSERT INTO HASH_RECORD (hash_id, hash_value, hash_function_id, file_id) VALUES (NEW.hash_id, NEW.hash_value, {HASH_FUNCTION_ID}, NEW.file_id);
+   END""",
+   f"""CREATE TRIGGER IF NOT EXISTS hash_view_update INSTEAD OF UPDATE ON HASH BEGIN
+      {HASH_VIEW_CHECKS}
+      UPDATE HASH_RECORD SET hash_id = NEW.hash_id, hash_value = NEW.hash_value, hash_function_id = {HASH_FUNCTION_ID}, file_id = NEW.file_id WHERE hash_id = OLD.hash_id;
+   END""",
+   """CREATE TRIGGER IF NOT EXISTS hash_view_delete INSTEAD OF DELETE ON HASH BEGIN
+      DELETE FROM HASH_RECORD WHERE hash_id = OLD.hash_id;
+   END""",
+]
+
+def file_view_columns():
+   """Returns the columns of the FILE view, as expressions over FILE_RECORD and the lookup tables of file_view_join()"""
+   file_table = File.__table__
+   return [file_table.c.id, file_table.c.scan_id, file_table.c.file_name, Extension.__table__.c.extension_name.label('file_extension'),
+      (Directory.__table__.c.directory_path + file_table.c.file_name).label('file_path'), file_table.c.file_size, file_table.c.date_created,
+      file_table.c.date_modified, file_table.c.date_retrieved, file_table.c.swh_known, file_table.c.updated, Origin.__table__.c.origin_name.label('origin')]
+
+def file_view_join(join_parameter = None):
+   """Returns the given join of FILE_RECORD (FILE_RECORD alone by default) outer-joined with the DIRECTORY, the EXTENSION and the ORIGIN tables, which file_view_columns() need"""
+   file_join = File.__table__ if join_parameter is None else join_parameter
+   return file_join.outerjoin(Directory.__table__, File.directory_id == Directory.directory_id) \
+      .outerjoin(Extension.__table__, File.extension_id == Extension.extension_id).outerjoin(Origin.__table__, File.origin_id == Origin.origin_id)
+
+def hash_view_columns():
+   """Returns the columns of the HASH view, as expressions over HASH_RECORD and HASH_FUNCTION (see hash_view_join)"""
+   hash_table = Hash.__table__
+   return [hash_table.c.hash_id, hash_table.c.hash_value, HashFunction.__table__.c.hash_function_name, hash_table.c.file_id]
+
+def hash_view_join(join_parameter = None):
+   """Returns the given join of HASH_RECORD (HASH_RECORD alone by default) outer-joined with HASH_FUNCTION, which hash_view_columns() need"""
+   hash_join = Hash.__table__ if join_parameter is None else join_parameter
+   return hash_join.outerjoin(HashFunction.__table__, Hash.hash_function_id == HashFunction.hash_function_id)
+
+def create_views(connection):
+   """Creates the views, their triggers and the triggers of the STATISTICS table, once all the tables exist"""
+   from sqlalchemy.dialects import sqlite
+
+   views = {'FILE': select(*file_view_columns()).select_from(file_view_join()), 'HASH': select(*hash_view_columns()).select_from(hash_view_join())}
+   for view_name, view_select in views.items():
+      connection.exec_driver_sql(f"CREATE VIEW IF NOT EXISTS {view_name} AS {view_select.compile(dialect = sqlite.dialect(), compile_kwargs = {'literal_binds': True})}")
+   for trigger in VIEW_TRIGGERS + STATISTICS_TRIGGERS:
+      connection.exec_driver_sql(trigger)
+
+event.listen(Base.metadata, 'after_create', lambda target, connection, **kw: create_views(connection))
+
+
+"""The FILE, HASH and HASH_FUNCTION tables as they were stored before schema version 7 (LOOKUP_TABLES_VERSION).
+They describe the databases created by older versions of hashesdb, which are recognised by comparing the names and the types of their columns (see has_hashesdb_schema)."""
+
+legacy_metadata = MetaData()
+LEGACY_TABLES = {legacy_table.name: legacy_table for legacy_table in [
+   Table('FILE', legacy_metadata, Column('id', Integer, primary_key = True), Column('scan_id', Integer), Column('file_name', String), Column('file_extension', String),
+      Column('file_path', String), Column('file_size', BigInteger), Column('date_created', DateTime), Column('date_modified', DateTime), Column('date_retrieved', DateTime),
+      Column('swh_known', Boolean), Column('updated', Boolean), Column('origin', String)),
+   Table('HASH', legacy_metadata, Column('hash_id', Integer, primary_key = True), Column('hash_value', String), Column('hash_function_name', String), Column('file_id', Integer)),
+   Table('HASH_FUNCTION', legacy_metadata, Column('hash_function_name', String, primary_key = True), Column('hash_function_fuzzy_flag', Boolean), Column('hash_function_size', Integer)),
+]}
+
+
+def derived_table_names():
+   """Returns the names of the tables whose content is computed from other tables"""
+   return {t.name for t in Base.metadata.sorted_tables if t.info.get('derived')}
+
+def view_table_names():
+   """Returns the names of the tables whose rows are exported and imported through one of the views of VIEW_NAMES"""
+   return {t.name for t in Base.metadata.sorted_tables if t.info.get('view')}
+
+def hash_function_index_statement(hash_function_name, hash_function_id):
+   """Returns the statement that creates the partial index of the hash values of a hash function (see Db.index_hash_functions)"""
+   return f"CREATE INDEX IF NOT EXISTS {HASH_FUNCTION_INDEX_PREFIX}{hash_function_name} ON {Hash.__tablename__} (hash_value, file_id) WHERE hash_function_id = {int(hash_function_id)}"
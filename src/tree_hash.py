@@ -0,0 +1,94 @@
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count
+
+#Layout of the sha256_tree hash function. Changing any of the following changes every sha256_tree hash value.
+#The data is split into chunks of TREE_CHUNK_SIZE bytes (the last chunk may be shorter). Each chunk is a leaf of the tree, whose digest is
+#the SHA-256 of LEAF_PREFIX followed by the chunk. The hash value is the SHA-256 of ROOT_PREFIX followed by the digests of the leaves, in order.
+#Data of 0 bytes has no leaves, so its hash value is the SHA-256 of ROOT_PREFIX.
+TREE_CHUNK_SIZE = 4 * 1024 * 1024
+LEAF_PREFIX = b'\x00'
+ROOT_PREFIX = b'\x01'
+
+#Number of threads that hash the leaves (shared by all the files that are hashed at the same time). With 1 thread, the leaves are hashed by the caller.
+TREE_HASH_THREADS = cpu_count() or 1
+
+#Maximum number of leaves of a file that wait to be hashed, per thread (each leaf is a copy of TREE_CHUNK_SIZE bytes)
+MAX_PENDING_LEAVES_PER_THREAD = 2
+
+tree_hash_pool = None
+tree_hash_pool_lock = threading.Lock()
+
+def get_tree_hash_pool():
+	#The pool is created the first time a tree hash uses it, so that commands that never hash a large file do not start its threads
+	global tree_hash_pool
+	with tree_hash_pool_lock:
+		if tree_hash_pool is None:
+			tree_hash_pool = ThreadPoolExecutor(TREE_HASH_THREADS, thread_name_prefix = 'tree-hash')
+		return tree_hash_pool
+
+def hash_leaf(chunk):
+	leaf_hash = hashlib.sha256(LEAF_PREFIX)
+	leaf_hash.update(chunk)
+	return leaf_hash.digest()
+
+class TreeHashObject:
+	"""
+	This class calculates sha256_tree hash values with the interface of a hashlib hash object.
+	The leaves of the tree are independent of each other, so they are hashed by the threads of a shared pool while the caller reads the next chunks.
+	A single large file is therefore hashed by as many threads as the host has CPUs (hashlib releases the GIL while it hashes).
+	The leaves are copied before they are handed to the pool, so the caller may reuse or release the blocks it passes to update().
+	"""
+
+	__slots__ = ('partial_chunk', 'pending_leaves', 'root_hash', 'pool', 'max_pending_leaves')
+
+	def __init__(self, file_size = None):
+		self.partial_chunk = bytearray()
+		self.pending_leaves = deque()
+		self.root_hash = hashlib.sha256(ROOT_PREFIX)
+		self.pool = get_tree_hash_pool() if TREE_HASH_THREADS > 1 else None
+		self.max_pending_leaves = TREE_HASH_THREADS * MAX_PENDING_LEAVES_PER_THREAD
+
+	def update(self, data):
+		with memoryview(data) as view, view.cast('B') as byte_view:
+			offset = 0
+
+			#Complete the chunk that the previous blocks started
+			if self.partial_chunk:
+				offset = min(TREE_CHUNK_SIZE - len(self.partial_chunk), len(byte_view))
+				self.partial_chunk += byte_view[:offset]
+				if len(self.partial_chunk) == TREE_CHUNK_SIZE:
+					self.add_leaf(bytes(self.partial_chunk))
+					self.partial_chunk = bytearray()
+
+			#Whole chunks are hashed without being collected in the partial chunk first
+			while len(byte_view) - offset >= TREE_CHUNK_SIZE:
+				self.add_leaf(bytes(byte_view[offset:offset + TREE_CHUNK_SIZE]))
+				offset += TREE_CHUNK_SIZE
+
+			if offset < len(byte_view):
+				self.partial_chunk += byte_view[offset:]
+
+	def add_leaf(self, chunk):
+		if self.pool is None:
+			self.root_hash.update(hash_leaf(chunk))
+			return
+
+		self.pending_leaves.append(self.pool.submit(hash_leaf, chunk))
+		#The digests are added to the root in the order of the leaves, as soon as the oldest leaves are hashed
+		while len(self.pending_leaves) > self.max_pending_leaves:
+			self.root_hash.update(self.pending_leaves.popleft().result())
+
+	def digest(self):
+		#The last chunk is hashed by the caller, since the caller would only wait for it
+		while self.pending_leaves:
+			self.root_hash.update(self.pending_leaves.popleft().result())
+		if self.partial_chunk:
+			self.root_hash.update(hash_leaf(self.partial_chunk))
+			self.partial_chunk = bytearray()
+		return self.root_hash.copy().digest()
+
+	def hexdigest(self):
+		return self.digest().hex()
@@ -0,0 +1,107 @@
+import sys
+import io
+sys.path.append('../../src')
+import scan
+from create import create
+from db import *
+import hashlib
+import unittest
+import tempfile
+from os import mkdir, remove, urandom
+from os.path import join
+
+class TestBackfill(unittest.TestCase):
+
+	def setUp(self):
+		#Suppress stdout:
+		self.io_stream = io.StringIO()
+		sys.stdout = self.io_stream
+
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.db_path = join(self.tmp_dir.name, 'backfill.db')
+		create(self.db_path)
+		self.db = Db(self.db_path)
+
+		#The SWHIDs are not looked up in the SoftwareHeritage archive
+		self.original_resolve_swhid = scan.resolve_swhid
+		scan.resolve_swhid = lambda swhid_hash: None
+
+		self.scan_directory = join(self.tmp_dir.name, 'files')
+		mkdir(self.scan_directory)
+		self.files = {}
+		for i in range(4):
+			file_path = join(self.scan_directory, f"file{i}")
+			self.files[file_path] = urandom(1000 * (i + 1))
+			with open(file_path, 'wb') as f:
+				f.write(self.files[file_path])
+		self.db.scan([[self.scan_directory], None, None], ['md5'], self.tmp_dir.name)
+
+	def tearDown(self):
+		scan.resolve_swhid = self.original_resolve_swhid
+		del self.db
+		self.tmp_dir.cleanup()
+
+		#Release stdout
+		sys.stdout = sys.__stdout__
+		self.io_stream.close()
+
+	def hash_values(self, hash_function_name):
+		#Maps the paths of the files to their hash values of the given hash function
+		rows = self.db.db_session.execute(text("SELECT file_path, hash_value FROM FILE JOIN HASH ON HASH.file_id = FILE.id WHERE hash_function_name = :name"), {'name': hash_function_name})
+		return dict(rows.all())
+
+	def test_backfill(self):
+		counts = self.db.backfill(['sha1'], 'all', 2)
+		self.assertEqual(counts['files'], 4)
+		self.assertEqual(counts['hashed'], 4)
+		self.assertEqual(counts['hashes'], 4)
+		self.assertEqual(self.hash_values('sha1'), {file_path: hashlib.sha1(data).hexdigest() for file_path, data in self.files.items()})
+
+		#No FILE record is added and the other hash values are not calculated again
+		self.assertEqual(self.db.db_session.query(File).count(), 4)
+		self.assertEqual(len(self.hash_values('md5')), 4)
+
+	def test_backfill_twice(self):
+		#Only the missing hash values are inserted
+		self.db.backfill(['sha1'])
+		counts = self.db.backfill(['sha1', 'md5'])
+		self.assertEqual(counts['files'], 0)
+		self.assertEqual(counts['hashes'], 0)
+		self.assertEqual(len(self.hash_values('sha1')), 4)
+		self.assertEqual(len(self.hash_values('md5')), 4)
+
+	def test_backfill_missing_and_changed_files(self):
+		file_paths = sorted(self.files)
+		remove(file_paths[0])
+		with open(file_paths[1], 'ab') as f:
+			f.write(b'changed')
+
+		counts = self.db.backfill(['sha1', 'tlsh'])
+		self.assertEqual(counts['missing'], 1)
+		self.assertEqual(counts['changed'], 1)
+		self.assertEqual(counts['hashed'], 2)
+		self.assertEqual(counts['hashes'], 4)
+		self.assertEqual(sorted(self.hash_values('sha1')), file_paths[2:])
+
+	def test_backfill_scope(self):
+		self.assertEqual(self.db.backfill(['sha1'], 'other-host')['files'], 0)
+		self.assertEqual(self.db.backfill(['sha1'], '2')['files'], 0)
+		self.assertEqual(self.db.backfill(['sha1'], '1')['hashes'], 4)
+
+	def test_backfill_other_host(self):
+		self.db.db_session.execute(text("UPDATE FILE SET origin = 'other-host'"))
+		counts = self.db.backfill(['sha1'])
+		self.assertEqual(counts['other_host'], 4)
+		self.assertEqual(counts['hashes'], 0)
+
+	def test_backfill_statistics(self):
+		#The STATISTICS table counts the inserted hash values
+		self.db.backfill(['sha1'])
+		statistics = dict(self.db.db_session.query(Statistic.statistic_name, Statistic.statistic_value).all())
+		self.assertEqual(statistics['hashes:sha1'], 4)
+
+	def test_backfill_unavailable_hash_function(self):
+		self.assertFalse(self.db.backfill(['not_a_function']))
+
+if __name__ == '__main__':
+	unittest.main()
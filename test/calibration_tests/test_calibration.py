@@ -0,0 +1,100 @@
+import sys
+import io
+sys.path.append('../../src')
+from calibration import *
+import calibration
+from create import create
+from db import *
+import unittest
+import tempfile
+from os import mkdir
+from os.path import join
+
+class TestCalibration(unittest.TestCase):
+
+	def setUp(self):
+		#Suppress stdout:
+		self.io_stream = io.StringIO()
+		sys.stdout = self.io_stream
+
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.db_path = join(self.tmp_dir.name, 'calibration.db')
+		create(self.db_path)
+		self.db = Db(self.db_path)
+
+	def tearDown(self):
+		del self.db
+		self.tmp_dir.cleanup()
+
+		#Release stdout
+		sys.stdout = sys.__stdout__
+		self.io_stream.close()
+
+	def test_measure_throughput(self):
+		self.assertGreater(measure_throughput('md5', 0.05), 0)
+		self.assertGreater(measure_throughput('swhid', 0.05), 0)
+
+	def test_measure_throughput_unsupported(self):
+		with self.assertRaises(Exception):
+			measure_throughput('not_a_hash_function', 0.05)
+
+	def test_estimate_scan_seconds(self):
+		#100 files of 1 MB: md5 and swhid at 100 MB/s each take 2 seconds, writing takes 0.05 seconds per file
+		estimate = estimate_scan_seconds(100, 100 * MB, MB, {'md5': 100, 'swhid': 100}, 1, 0, 0.05)
+		self.assertAlmostEqual(estimate['hash'], 2.0)
+		self.assertAlmostEqual(estimate['write'], 5.0)
+		self.assertAlmostEqual(estimate['total'], 5.0)
+
+		#A single large file is hashed by a single thread
+		estimate = estimate_scan_seconds(1, 100 * MB, 100 * MB, {'swhid': 100}, 4)
+		self.assertAlmostEqual(estimate['total'], 1.0)
+
+	def test_estimate_scan_seconds_gil(self):
+		#On 4 CPUs, 4 threads share the time of the hash functions that release the GIL, but not the time of the fuzzy hash functions
+		original_cpu_count = calibration.cpu_count
+		calibration.cpu_count = lambda: 4
+		try:
+			estimate = estimate_scan_seconds(100, 100 * MB, MB, {'swhid': 100, 'tlsh': 100}, 4)
+		finally:
+			calibration.cpu_count = original_cpu_count
+		self.assertAlmostEqual(estimate['hash'], 0.25 + 1.0)
+
+	def test_format_duration(self):
+		self.assertEqual(format_duration(3725.4), "1:02:05")
+
+	def test_calibrate(self):
+		throughputs = self.db.calibrate(['md5', 'swhid', 'not_a_hash_function'], 0.05, True)
+		self.assertEqual(set(throughputs), {'md5', 'swhid'})
+		self.assertEqual(set(self.db.calibrated_throughputs()), {'md5', 'swhid'})
+
+		#A new calibration replaces the previous one
+		self.db.calibrate(['md5'], 0.05, True)
+		self.assertEqual(self.db.db_session.query(HashFunctionThroughput).count(), 2)
+
+	def test_scan_estimate(self):
+		scan_directory = join(self.tmp_dir.name, 'targets')
+		mkdir(scan_directory)
+		for i in range(3):
+			with open(join(scan_directory, f"file{i}.txt"), 'wb') as f:
+				f.write(b'x' * 1000)
+
+		self.db.calibrate(['swhid'], 0.05, True)
+		estimate = self.db.scan([[scan_directory], None, None], ['md5'], self.tmp_dir.name, estimate_flag = True)
+		self.assertIn('total', estimate)
+		self.assertIn("Estimate for 3 files", self.io_stream.getvalue())
+		#md5 was not calibrated, so it is measured on the spot
+		self.assertIn("md5", self.io_stream.getvalue())
+		self.assertIn("not calibrated on this host", self.io_stream.getvalue())
+
+		#Nothing is scanned
+		self.assertEqual(self.db.db_session.query(Scan).count(), 0)
+
+	def test_calibrate_no_db(self):
+		self.assertIsNone(NoDb().calibrate(['md5']))
+
+
+def main():
+	unittest.main()
+
+if __name__ == '__main__':
+	main()
@@ -5,6 +5,7 @@ from create import *
 import unittest
 from os.path import abspath, exists
 from os import remove
+from shutil import copyfile
 
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
@@ -228,6 +229,186 @@ class TestIsHashesDbDatabaseFunction(unittest.TestCase):
 	def test_is_hashesdb_database_file_does_not_exist(self):
 		self.assertFalse(is_hashesdb_database('mytest2.db'))		
 
+class TestSchemaFingerprintFunction(unittest.TestCase):
+
+	def __init__(self, *args, **kwargs):
+		super(TestSchemaFingerprintFunction, self).__init__(*args, **kwargs)
+
+	def setUp(self):
+		#Suppress stdout:
+		self.io_stream = io.StringIO()
+		sys.stdout = self.io_stream 
+
+		create_database('test_directory/fingerprint.db')
+		self.engine = create_engine("sqlite:///test_directory/fingerprint.db", echo = False)
+
+	def tearDown(self):
+		self.engine.dispose()
+		remove('test_directory/fingerprint.db')
+
+		#Release stdout
+		sys.stdout = sys.__stdout__
+		self.io_stream.close()
+
+	def test_create_database_writes_fingerprint(self):
+		self.assertEqual(read_schema_fingerprint(self.engine), (HASHESDB_APPLICATION_ID, HASHESDB_SCHEMA_VERSION))
+
+	def test_has_hashesdb_schema(self):
+		self.assertTrue(has_hashesdb_schema(self.engine))
+
+	def test_is_hashesdb_database_fingerprint(self):
+		self.assertTrue(is_hashesdb_database('test_directory/fingerprint.db'))
+
+	def test_is_hashesdb_database_newer_version(self):
+		with self.engine.begin() as conn:
+			conn.exec_driver_sql(f"PRAGMA user_version = {HASHESDB_SCHEMA_VERSION + 1}")
+		self.assertFalse(is_hashesdb_database('test_directory/fingerprint.db'))
+
+	def test_upgrade_database_writes_fingerprint(self):
+		with self.engine.begin() as conn:
+			conn.exec_driver_sql("PRAGMA application_id = 0")
+			conn.exec_driver_sql("PRAGMA user_version = 0")
+		upgrade_database(self.engine)
+		self.assertEqual(read_schema_fingerprint(self.engine), (HASHESDB_APPLICATION_ID, HASHESDB_SCHEMA_VERSION))
+
+	def test_has_hashesdb_schema_missing_later_table(self):
+		#Tables added to the schema after the first version may be missing, until the database is upgraded
+		with self.engine.begin() as conn:
+			conn.exec_driver_sql("DROP TABLE STATISTICS")
+		self.assertTrue(has_hashesdb_schema(self.engine))
+		upgrade_database(self.engine)
+		with self.engine.connect() as conn:
+			self.assertEqual(conn.exec_driver_sql("SELECT count(*) FROM STATISTICS").scalar(), 3)
+
+	def test_has_hashesdb_schema_extra_table(self):
+		with self.engine.begin() as conn:
+			conn.exec_driver_sql("CREATE TABLE EXTRA (id INTEGER PRIMARY KEY)")
+		self.assertFalse(has_hashesdb_schema(self.engine))
+
+	def test_upgrade_database_creates_indexes(self):
+		with self.engine.begin() as conn:
+			conn.exec_driver_sql("DROP INDEX ix_hash_record_hash_value")
+			conn.exec_driver_sql("PRAGMA user_version = 1")
+		upgrade_database(self.engine)
+		with self.engine.connect() as conn:
+			hash_indexes = [row[1] for row in conn.exec_driver_sql("PRAGMA index_list('HASH_RECORD')")]
+		self.assertIn('ix_hash_record_hash_value', hash_indexes)
+
+	def test_upgrade_legacy_database(self):
+		with self.engine.begin() as conn:
+			conn.exec_driver_sql("PRAGMA application_id = 0")
+			conn.exec_driver_sql("PRAGMA user_version = 0")
+			conn.exec_driver_sql("DROP TABLE STATISTICS")
+			conn.exec_driver_sql("DELETE FROM HASH_FUNCTION WHERE hash_function_name = 'quicksig'")
+		self.assertFalse(schema_is_current(self.engine))
+		self.engine.dispose()
+
+		self.assertTrue(upgrade('test_directory/fingerprint.db'))
+		self.assertTrue(schema_is_current(self.engine))
+		with self.engine.connect() as conn:
+			self.assertEqual(conn.exec_driver_sql("SELECT count(*) FROM STATISTICS").scalar(), 3)
+			self.assertEqual(conn.exec_driver_sql("SELECT count(*) FROM HASH_FUNCTION WHERE hash_function_name = 'quicksig'").scalar(), 1)
+
+	def test_upgrade_current_database(self):
+		#A database that already uses the current schema version is left as it is
+		self.engine.dispose()
+		with open('test_directory/fingerprint.db', 'rb') as database_file:
+			database_bytes = database_file.read()
+		self.assertTrue(upgrade('test_directory/fingerprint.db'))
+		with open('test_directory/fingerprint.db', 'rb') as database_file:
+			self.assertEqual(database_file.read(), database_bytes)
+
+	def test_upgrade_missing_database(self):
+		self.assertFalse(upgrade('test_directory/missing.db'))
+
+class TestLookupTablesMigration(unittest.TestCase):
+
+	def __init__(self, *args, **kwargs):
+		super(TestLookupTablesMigration, self).__init__(*args, **kwargs)
+
+	def setUp(self):
+		#Suppress stdout:
+		self.io_stream = io.StringIO()
+		sys.stdout = self.io_stream 
+
+		#legacy_v6.db is a database of schema version 6, which stores the text values in the FILE and the HASH tables
+		copyfile('legacy_v6.db', 'test_directory/legacy.db')
+		self.engine = create_engine("sqlite:///test_directory/legacy.db", echo = False)
+		with self.engine.begin() as conn:
+			conn.exec_driver_sql("CREATE INDEX ix_hash_function_md5 ON HASH (hash_value, file_id) WHERE hash_function_name = 'md5'")
+
+	def tearDown(self):
+		self.engine.dispose()
+		remove('test_directory/legacy.db')
+
+		#Release stdout
+		sys.stdout = sys.__stdout__
+		self.io_stream.close()
+
+	def helper_rows(self):
+		with self.engine.connect() as conn:
+			return [conn.exec_driver_sql(f"SELECT * FROM {table_name} ORDER BY 1").fetchall() for table_name in ['FILE', 'HASH', 'STATISTICS']]
+
+	def helper_object_types(self):
+		with self.engine.connect() as conn:
+			return dict(conn.exec_driver_sql("SELECT name, type FROM sqlite_master").fetchall())
+
+	def test_upgrade_keeps_rows(self):
+		rows = self.helper_rows()
+		self.assertTrue(has_hashesdb_schema(self.engine))
+		self.assertTrue(upgrade('test_directory/legacy.db'))
+
+		self.assertTrue(schema_is_current(self.engine))
+		self.assertTrue(has_hashesdb_schema(self.engine))
+		self.assertEqual(self.helper_rows(), rows)
+		object_types = self.helper_object_types()
+		self.assertEqual(object_types['FILE'], 'view')
+		self.assertEqual(object_types['HASH'], 'view')
+		self.assertNotIn('LEGACY_HASH_FUNCTION', object_types)
+		with self.engine.connect() as conn:
+			self.assertEqual(conn.exec_driver_sql("SELECT count(*) FROM DIRECTORY").scalar(), conn.exec_driver_sql("SELECT count(DISTINCT substr(file_path, 1, length(file_path) - length(file_name))) FROM FILE").scalar())
+			index_sql = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE name = 'ix_hash_function_md5' AND tbl_name = 'HASH_RECORD'").scalar()
+			md5_id = conn.exec_driver_sql("SELECT hash_function_id FROM HASH_FUNCTION WHERE hash_function_name = 'md5'").scalar()
+		self.assertTrue(index_sql.endswith(f"WHERE hash_function_id = {md5_id}"))
+
+	def test_upgrade_inconsistent_file_path(self):
+		#The directory of a file whose path does not end with its name cannot be stored, so the database is left as it is
+		with self.engine.begin() as conn:
+			conn.exec_driver_sql("UPDATE FILE SET file_path = '/elsewhere' WHERE id = 1")
+		rows = self.helper_rows()
+		object_types = self.helper_object_types()
+		self.engine.dispose()
+
+		self.assertFalse(upgrade('test_directory/legacy.db'))
+		self.assertIn('does not end with its file_name', self.io_stream.getvalue())
+		self.assertEqual(self.helper_object_types(), object_types)
+		self.assertEqual(self.helper_rows(), rows)
+		self.assertFalse(schema_is_current(self.engine))
+
+	def test_views_after_upgrade(self):
+		self.assertTrue(upgrade('test_directory/legacy.db'))
+		with self.engine.begin() as conn:
+			conn.exec_driver_sql("INSERT INTO FILE (id, scan_id, file_name, file_extension, file_path, file_size, updated, origin) VALUES (100, 1, 'new.txt', '.txt', '/new/directory/new.txt', 3, 1, 'new-host')")
+			conn.exec_driver_sql("INSERT INTO HASH (hash_value, hash_function_name, file_id) VALUES ('abc', 'md5', 100)")
+			self.assertEqual(conn.exec_driver_sql("SELECT file_path, origin FROM FILE WHERE id = 100").one(), ('/new/directory/new.txt', 'new-host'))
+			self.assertEqual(conn.exec_driver_sql("SELECT count(*) FROM DIRECTORY WHERE directory_path = '/new/directory/'").scalar(), 1)
+			self.assertEqual(conn.exec_driver_sql("SELECT hash_function_name FROM HASH WHERE file_id = 100").scalar(), 'md5')
+
+			conn.exec_driver_sql("UPDATE FILE SET origin = 'other-host' WHERE id = 100")
+			self.assertEqual(conn.exec_driver_sql("SELECT origin FROM FILE WHERE id = 100").scalar(), 'other-host')
+			conn.exec_driver_sql("DELETE FROM HASH WHERE file_id = 100")
+			conn.exec_driver_sql("DELETE FROM FILE WHERE id = 100")
+			self.assertEqual(self.helper_statistics(conn), compute_statistics(conn))
+
+			#The views refuse the rows that the lookup tables cannot store
+			with self.assertRaises(Exception):
+				conn.exec_driver_sql("INSERT INTO HASH (hash_value, hash_function_name, file_id) VALUES ('abc', 'unknown', 1)")
+			with self.assertRaises(Exception):
+				conn.exec_driver_sql("INSERT INTO FILE (id, file_name, file_path) VALUES (101, 'a.txt', '/b.txt')")
+
+	def helper_statistics(self, conn):
+		return dict(conn.exec_driver_sql("SELECT statistic_name, statistic_value FROM STATISTICS WHERE statistic_value != 0").fetchall())
+
 
 def main():
 	unittest.main()
@@ -0,0 +1,121 @@
+import sys
+import io
+sys.path.append('../../src')
+import digest_cache
+import scan
+from digest_cache import *
+from scan import compute_file_hashes
+import hashlib
+import unittest
+import tempfile
+import os
+from os import urandom, utime
+from os.path import join
+from time import time
+
+def user_xattr_supported(directory):
+	#The file system of the temporary directory may not support user extended attributes
+	if not xattr_supported():
+		return False
+	probe_path = join(directory, 'probe')
+	open(probe_path, 'wb').close()
+	try:
+		os.setxattr(probe_path, XATTR_PREFIX + 'probe', b'1')
+	except OSError:
+		return False
+	return True
+
+class TestDigestCache(unittest.TestCase):
+
+	def setUp(self):
+		#Suppress stdout:
+		self.io_stream = io.StringIO()
+		sys.stdout = self.io_stream
+
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		if not user_xattr_supported(self.tmp_dir.name):
+			self.tmp_dir.cleanup()
+			self.skipTest("user extended attributes are not supported")
+		enable_digest_cache()
+
+	def tearDown(self):
+		enable_digest_cache(False)
+		self.tmp_dir.cleanup()
+
+		#Release stdout
+		sys.stdout = sys.__stdout__
+		self.io_stream.close()
+
+	def write_file(self, name, data, age_seconds = 60):
+		file_path = join(self.tmp_dir.name, name)
+		with open(file_path, 'wb') as f:
+			f.write(data)
+		modification_time = time() - age_seconds
+		utime(file_path, (modification_time, modification_time))
+		return file_path
+
+	def compute_without_reading(self, file_path, hash_function_names):
+		#Fails if the file has to be read
+		original_read_file_into = scan.read_file_into
+		scan.read_file_into = None
+		try:
+			return compute_file_hashes(file_path, hash_function_names)
+		finally:
+			scan.read_file_into = original_read_file_into
+
+	def test_cached_digests_are_reused(self):
+		data = urandom(100000)
+		file_path = self.write_file('file', data)
+		hash_values, errors = compute_file_hashes(file_path, ['md5', 'swhid'])
+		self.assertEqual(errors, {})
+		self.assertTrue(os.getxattr(file_path, XATTR_PREFIX + 'md5').decode().endswith(' ' + hashlib.md5(data).hexdigest()))
+
+		cached_values, errors = self.compute_without_reading(file_path, ['md5', 'swhid'])
+		self.assertEqual(cached_values, hash_values)
+
+	def test_missing_digests_are_calculated(self):
+		data = urandom(100000)
+		file_path = self.write_file('file', data)
+		compute_file_hashes(file_path, ['md5'])
+
+		hash_values, errors = compute_file_hashes(file_path, ['md5', 'sha1'])
+		self.assertEqual(hash_values['sha1'], hashlib.sha1(data).hexdigest())
+		self.assertEqual(self.compute_without_reading(file_path, ['md5', 'sha1'])[0], hash_values)
+
+	def test_changed_file_is_hashed_again(self):
+		file_path = self.write_file('file', urandom(100000))
+		compute_file_hashes(file_path, ['md5'])
+
+		#Same size, different content and modification time
+		data = urandom(100000)
+		with open(file_path, 'wb') as f:
+			f.write(data)
+		utime(file_path, (time() - 30, time() - 30))
+		hash_values, errors = compute_file_hashes(file_path, ['md5'])
+		self.assertEqual(hash_values['md5'], hashlib.md5(data).hexdigest())
+
+	def test_recently_modified_file_is_not_cached(self):
+		file_path = self.write_file('file', urandom(1000), age_seconds = 0)
+		compute_file_hashes(file_path, ['md5'])
+		with self.assertRaises(OSError):
+			os.getxattr(file_path, XATTR_PREFIX + 'md5')
+
+	def test_disabled_cache(self):
+		enable_digest_cache(False)
+		file_path = self.write_file('file', urandom(1000))
+		compute_file_hashes(file_path, ['md5'])
+		with self.assertRaises(OSError):
+			os.getxattr(file_path, XATTR_PREFIX + 'md5')
+
+	def test_validity_guard(self):
+		file_path = self.write_file('file', b'hashesdb')
+		file_stat = os.stat(file_path)
+		self.assertEqual(write_cached_digests(file_path, file_stat, {'md5': 'cached'}), 1)
+		with open(file_path, 'rb') as f:
+			self.assertEqual(read_cached_digests(f.fileno(), file_stat, ['md5', 'sha1']), {'md5': 'cached'})
+			#A different inode (e.g. the file was replaced) invalidates the cached hash value
+			other_stat = os.stat(self.write_file('other', b'hashesdb'))
+			self.assertEqual(read_cached_digests(f.fileno(), other_stat, ['md5']), {})
+
+if __name__ == '__main__':
+	unittest.main()
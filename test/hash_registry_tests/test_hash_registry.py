@@ -0,0 +1,82 @@
+import sys
+import io
+sys.path.append('../../src')
+from hash_registry import *
+from scan import HashObject
+from create import create
+from initialize_database import register_hash_functions
+from table_classes import HashFunction
+from sqlalchemy import create_engine, delete
+import xxhash
+import unittest
+import tempfile
+from os.path import join
+
+class TestHashRegistry(unittest.TestCase):
+
+	def setUp(self):
+		#Suppress stdout:
+		self.io_stream = io.StringIO()
+		sys.stdout = self.io_stream
+
+		self.tmp_dir = tempfile.TemporaryDirectory()
+
+	def tearDown(self):
+		self.tmp_dir.cleanup()
+
+		#Release stdout
+		sys.stdout = sys.__stdout__
+		self.io_stream.close()
+
+	def hash_data(self, hash_function_name, data):
+		hash_object = HashObject(hash_function_name, len(data))
+		hash_object.update(memoryview(data))
+		return hash_object.get_hash()
+
+	def test_xxh3_digests(self):
+		data = b'hashesdb' * 1000
+		self.assertEqual(self.hash_data('xxh3_64', data), xxhash.xxh3_64(data).hexdigest())
+		self.assertEqual(self.hash_data('xxh3_128', data), xxhash.xxh3_128(data).hexdigest())
+
+	def test_existing_digests_unchanged(self):
+		self.assertEqual(self.hash_data('md5', b'hello world\n'), '6f5902ac237024bdd0c176cb93063dc4')
+		self.assertEqual(self.hash_data('swhid', b'hello world\n'), 'swh:1:cnt:3b18e512dba79e4c8300dd08aeb37f8e728b8dad')
+		self.assertEqual(len(self.hash_data('shake_256', b'hello world\n')), 512)
+
+	def test_spec_declarations(self):
+		self.assertEqual(get_hash_function('xxh3_128').size, 128)
+		self.assertTrue(get_hash_function('tlsh').fuzzy_flag)
+		self.assertFalse(get_hash_function('ssdeep').releases_gil)
+		self.assertFalse(get_hash_function('ssdeep').accepts_buffers)
+		self.assertTrue(get_hash_function('sha256').releases_gil)
+
+	def test_unsupported_hash_function(self):
+		with self.assertRaises(ValueError):
+			get_hash_function('not_a_hash_function')
+		with self.assertRaises(ValueError):
+			HashObject('not_a_hash_function')
+
+	def test_optional_hash_functions(self):
+		#The hash functions of optional libraries are registered in databases only if their library is installed
+		installed_names = {spec.name for spec in installed_hash_functions()}
+		for name in ['crc32c', 'blake3']:
+			self.assertEqual(name in installed_names, HASH_FUNCTIONS[name].is_installed())
+
+	def test_register_hash_functions(self):
+		db_path = join(self.tmp_dir.name, 'registry.db')
+		create(db_path)
+		engine = create_engine("sqlite:///" + db_path)
+
+		#A database created before xxh3_64 was supported gets it
+		with engine.begin() as conn:
+			conn.execute(delete(HashFunction.__table__).where(HashFunction.__table__.c.hash_function_name == 'xxh3_64'))
+		self.assertEqual(register_hash_functions(engine), ['xxh3_64'])
+		self.assertEqual(register_hash_functions(engine), [])
+		engine.dispose()
+
+
+def main():
+	unittest.main()
+
+if __name__ == '__main__':
+	main()
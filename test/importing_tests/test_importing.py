@@ -85,6 +85,13 @@ class TestImportingFunction(unittest.TestCase):
 		row_inserted = list(self.session.execute(text("SELECT * FROM HASH WHERE hash_id = 1")))
 		self.assertEqual([(1, 'swh:1:cnt:25a47ad00c7bf1a19941709c7809bd47d737ec53', 'swhid',1)], row_inserted)
 
+	def test_insert_values_with_colon_words(self):
+		#ssdeep hashes contain ':<word>' parts that must not be treated as bind parameters
+		self.session.execute(text("DELETE FROM HASH WHERE hash_id = 1"))
+		insert_values(self.session, 'HASH', "(1, '6:2FFLvAlnHAEFTV8KRCRNJIOZM+3KO85VNRv2QKEfMw:SgpYOftzNjxtEqdyE1iU', 'ssdeep',1)")
+		row_inserted = list(self.session.execute(text("SELECT * FROM HASH WHERE hash_id = 1")))
+		self.assertEqual([(1, '6:2FFLvAlnHAEFTV8KRCRNJIOZM+3KO85VNRv2QKEfMw:SgpYOftzNjxtEqdyE1iU', 'ssdeep',1)], row_inserted)
+
 	def test_insert_values_invalid_table_name(self):
 		with self.assertRaises(Exception):
 			insert_values(self.session, 'RANDOM_TABLE_NAME', "(1, 'swh:1:cnt:25a47ad00c7bf1a19941709c7809bd47d737ec53', 'swhid',1)")	
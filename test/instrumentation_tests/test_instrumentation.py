@@ -0,0 +1,83 @@
+import sys
+import io
+import json
+sys.path.append('../../src')
+from instrumentation import *
+from sqlalchemy import create_engine
+import parser
+import unittest
+import tempfile
+from os.path import join
+
+class TestInstrumentation(unittest.TestCase):
+
+	def setUp(self):
+		#Suppress stdout and stderr (the summary of the slow-query log is printed to stderr):
+		self.io_stream = io.StringIO()
+		self.err_stream = io.StringIO()
+		sys.stdout = self.io_stream
+		sys.stderr = self.err_stream
+
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.log_path = join(self.tmp_dir.name, 'slow.log')
+		self.engine = create_engine("sqlite://")
+
+	def tearDown(self):
+		self.engine.dispose()
+		self.tmp_dir.cleanup()
+
+		#Release stdout and stderr
+		sys.stdout = sys.__stdout__
+		sys.stderr = sys.__stderr__
+		self.io_stream.close()
+		self.err_stream.close()
+
+	def read_log(self):
+		with open(self.log_path) as f:
+			return [json.loads(line) for line in f]
+
+	def test_slow_query_log(self):
+		slow_query_log = SlowQueryLog(self.log_path, 0)
+		slow_query_log.start()
+		with self.engine.begin() as conn:
+			conn.exec_driver_sql("CREATE TABLE T (x INTEGER)")
+			conn.exec_driver_sql("INSERT INTO T VALUES (1), (2), (3)")
+		slow_query_log.stop()
+
+		entries = self.read_log()
+		self.assertEqual(slow_query_log.statements_count, slow_query_log.slow_count)
+		insert_entry = [entry for entry in entries if entry['statement'].startswith("INSERT")][0]
+		self.assertEqual(insert_entry['rows'], 3)
+		self.assertGreaterEqual(insert_entry['duration_ms'], 0)
+		self.assertIn("SQL statements", self.err_stream.getvalue())
+
+		#After stop() the statements are not timed any more
+		with self.engine.begin() as conn:
+			conn.exec_driver_sql("SELECT * FROM T")
+		self.assertEqual(len(self.read_log()), len(entries))
+
+	def test_slow_query_threshold(self):
+		slow_query_log = SlowQueryLog(self.log_path, 60000)
+		slow_query_log.start()
+		with self.engine.begin() as conn:
+			conn.exec_driver_sql("SELECT 1")
+		slow_query_log.stop()
+
+		self.assertEqual(self.read_log(), [])
+		self.assertGreater(slow_query_log.statements_count, 0)
+		self.assertEqual(slow_query_log.slow_count, 0)
+
+	def test_query_plan_lines(self):
+		plan_rows = [(2, 0, 0, 'SCAN A'), (3, 0, 0, 'LIST SUBQUERY 1'), (5, 3, 0, 'SCAN B'), (7, 3, 0, 'USE TEMP B-TREE FOR GROUP BY')]
+		self.assertEqual(query_plan_lines(plan_rows), ['QUERY PLAN', '|--SCAN A', '`--LIST SUBQUERY 1', '   |--SCAN B', '   `--USE TEMP B-TREE FOR GROUP BY'])
+
+	def test_slow_query_log_option(self):
+		parser.TerminalParser().parse(['--slow-query-log', self.log_path, '--slow-query-ms', '0', 'about'])
+		self.assertIn("0 SQL statements", self.err_stream.getvalue())
+
+
+def main():
+	unittest.main()
+
+if __name__ == '__main__':
+	main()
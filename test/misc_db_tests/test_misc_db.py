@@ -2,7 +2,10 @@ import sys
 import io
 sys.path.append('../../src')
 from db import *
+from create import compute_statistics
 import unittest
+import tempfile
+from shutil import copyfile
 
 class TestMiscDbFunction(unittest.TestCase):
 
@@ -56,6 +59,75 @@ class TestMiscDbFunction(unittest.TestCase):
 		self.db.rollback()
 		self.assertFalse(self.db.has_unsaved_changes())	
 
+	def test_db_init_current_fingerprint(self):
+		self.assertEqual(read_schema_fingerprint(self.db.engine), (HASHESDB_APPLICATION_ID, HASHESDB_SCHEMA_VERSION))
+
+	def test_db_init_outdated_database(self):
+		#A database that has not been upgraded is not used, and opening it does not change its file
+		with tempfile.TemporaryDirectory() as temporary_directory:
+			database_path = join(temporary_directory, 'outdated.db')
+			copyfile('mytest.db', database_path)
+			engine = create_engine("sqlite:///" + database_path)
+			with engine.begin() as conn:
+				conn.exec_driver_sql("PRAGMA user_version = 1")
+			engine.dispose()
+			with open(database_path, 'rb') as database_file:
+				database_bytes = database_file.read()
+
+			with self.assertRaises(RuntimeError):
+				Db(database_path)
+			with open(database_path, 'rb') as database_file:
+				self.assertEqual(database_file.read(), database_bytes)
+
+	def test_verify_db(self):
+		self.assertTrue(self.db.verify())
+
+	def test_verify_no_db(self):
+		self.assertIsNone(self.nodb.verify())
+
+	def helper_maintained_statistics(self):
+		statistics = {row.statistic_name: row.statistic_value for row in self.db.db_session.query(Statistic)}
+		return {name: value for name, value in statistics.items() if value != 0}
+
+	def test_stats_maintained_statistics(self):
+		#The counts maintained by the triggers are equal to the counts computed from the data, even after changes that are not saved yet
+		self.assertEqual(self.helper_maintained_statistics(), compute_statistics(self.db.db_session))
+		self.db.db_session.execute(text("DELETE FROM HASH WHERE hash_function_name = 'swhid'"))
+		self.db.db_session.execute(text("UPDATE FILE SET swh_known = 1"))
+		self.assertEqual(self.helper_maintained_statistics(), compute_statistics(self.db.db_session))
+		self.db.db_session.rollback()
+
+	def test_stats_db(self):
+		self.assertTrue(self.db.stats())
+		self.assertTrue(self.db.stats(True))
+		self.db.db_session.rollback()
+
+	def test_stats_storage(self):
+		self.assertTrue(self.db.stats(storage_flag = True))
+		repeated_text = {row[0]: row[1:] for row in compute_repeated_text(self.db.db_session)}
+		values_count, distinct_count, inline_bytes, interned_bytes = repeated_text['HASH.hash_function_name']
+		self.assertEqual(values_count, self.db.db_session.execute(text("SELECT COUNT(*) FROM HASH")).scalar())
+		self.assertEqual(distinct_count, self.db.db_session.execute(text("SELECT COUNT(DISTINCT hash_function_name) FROM HASH")).scalar())
+		self.assertLess(interned_bytes, inline_bytes)
+
+	def test_stats_scans(self):
+		#The metrics are not committed, so they are discarded when the test ends
+		last_scan_id = self.db.db_session.query(DbInformation).one().db_last_scan_id
+		for metric_name, metric_value in [('files', 10), ('bytes', 2097152), ('errors', 1), ('seconds', 2.0), ('seconds:read', 0.5), ('seconds:write', 1.5)]:
+			self.db.db_session.add(ScanMetric(scan_id = last_scan_id, metric_name = metric_name, metric_value = metric_value))
+		self.db.db_session.flush()
+
+		self.assertEqual(read_scan_metrics(self.db.db_session)[last_scan_id]['seconds:write'], 1.5)
+		self.assertTrue(self.db.stats(scans_flag = True))
+		self.assertIn("write (75.0%)", self.io_stream.getvalue())
+
+		self.db.dbinfo()
+		self.assertIn("Last scan: 10 files, 2.00 MiB in 2.00 seconds (5.0 files/s, 1.0 MB/s), 1 errors", self.io_stream.getvalue())
+		self.assertIn("Last scan time per stage: write 1.50s, read 0.50s", self.io_stream.getvalue())
+
+	def test_stats_no_db(self):
+		self.assertIsNone(self.nodb.stats())
+
 def main():
 	unittest.main()
 
@@ -0,0 +1,76 @@
+import sys
+import io
+sys.path.append('../../src')
+from profiling import *
+import parser
+import pstats
+import unittest
+import tempfile
+from os.path import join, exists
+
+def build_list(count):
+	return [str(i) for i in range(count)]
+
+class TestProfiling(unittest.TestCase):
+
+	def setUp(self):
+		#Suppress stdout and stderr (the summary of a profile is printed to stderr):
+		self.io_stream = io.StringIO()
+		self.err_stream = io.StringIO()
+		sys.stdout = self.io_stream
+		sys.stderr = self.err_stream
+
+		self.tmp_dir = tempfile.TemporaryDirectory()
+
+	def tearDown(self):
+		self.tmp_dir.cleanup()
+
+		#Release stdout and stderr
+		sys.stdout = sys.__stdout__
+		sys.stderr = sys.__stderr__
+		self.io_stream.close()
+		self.err_stream.close()
+
+	def test_run_profiled(self):
+		profile_path = join(self.tmp_dir.name, 'test.prof')
+		self.assertEqual(len(run_profiled(build_list, [1000], profile_path, top_count = 5)), 1000)
+
+		#The pstats file can be loaded and the summary names the profiled function
+		self.assertTrue(any(function_name == 'build_list' for (file_name, line, function_name) in pstats.Stats(profile_path).stats))
+		self.assertIn("build_list", self.err_stream.getvalue())
+		self.assertNotIn("Peak traced memory", self.err_stream.getvalue())
+
+	def test_run_profiled_memory(self):
+		profile_path = join(self.tmp_dir.name, 'test.prof')
+		run_profiled(build_list, [100000], profile_path, True, 5)
+		self.assertIn("Peak traced memory", self.err_stream.getvalue())
+		self.assertIn("test_profiling.py", self.err_stream.getvalue())
+
+	def test_run_profiled_exception(self):
+		#The profile is written even if the function fails
+		profile_path = join(self.tmp_dir.name, 'test.prof')
+		with self.assertRaises(ZeroDivisionError):
+			run_profiled(lambda: 1 / 0, [], profile_path)
+		self.assertTrue(exists(profile_path))
+
+	def test_profile_option(self):
+		profile_path = join(self.tmp_dir.name, 'about.prof')
+		parser.TerminalParser().parse(['--profile', profile_path, 'about'])
+		self.assertTrue(exists(profile_path))
+
+	def test_repl_profile_toggle(self):
+		profile_path = join(self.tmp_dir.name, 'repl.prof')
+		repl = parser.ReplParser()
+		repl.parse(['profile', 'on', '-o', profile_path])
+		repl.parse(['about'])
+		self.assertTrue(exists(profile_path))
+
+		repl.parse(['profile', 'off'])
+		self.assertIsNone(repl.profile_settings)
+
+
+def main():
+	unittest.main()
+
+if __name__ == '__main__':
+	main()
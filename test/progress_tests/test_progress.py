@@ -0,0 +1,72 @@
+import sys
+import io
+import json
+sys.path.append('../../src')
+from progress import *
+import unittest
+
+class TtyStream(io.StringIO):
+	def isatty(self):
+		return True
+
+class TestProgressReporter(unittest.TestCase):
+
+	def test_counters(self):
+		progress = ProgressReporter(False, 4, io.StringIO())
+		progress.file_done(1024)
+		progress.file_done(2048)
+		progress.error("Error: something went wrong")
+		counters = progress.counters()
+		self.assertEqual((counters['files'], counters['total_files'], counters['bytes'], counters['errors']), (2, 4, 3072, 1))
+		self.assertIsNotNone(counters['eta_seconds'])
+
+	def test_no_eta_without_total(self):
+		progress = ProgressReporter(False, None, io.StringIO())
+		progress.file_done(1)
+		self.assertIsNone(progress.counters()['eta_seconds'])
+
+	def test_detail_only_when_verbose(self):
+		stream = io.StringIO()
+		ProgressReporter(False, None, stream).detail("Calculating hashes for a.txt...")
+		self.assertEqual(stream.getvalue(), "")
+
+		stream = io.StringIO()
+		ProgressReporter(True, None, stream).detail("Calculating hashes for a.txt...")
+		self.assertEqual(stream.getvalue(), "Calculating hashes for a.txt...\n")
+
+	def test_rate_limited_json_lines(self):
+		#A stream that is not a terminal gets a JSON line per refresh interval and a final one, not a line per file
+		stream = io.StringIO()
+		progress = ProgressReporter(False, None, stream)
+		for i in range(1000):
+			progress.file_done(10)
+		progress.finish()
+
+		lines = stream.getvalue().splitlines()
+		self.assertEqual(len(lines), 1)
+		final = json.loads(lines[0])['progress']
+		self.assertEqual((final['files'], final['bytes'], final['done']), (1000, 10000, True))
+
+	def test_tty_status_line(self):
+		stream = TtyStream()
+		progress = ProgressReporter(False, None, stream)
+		progress.file_done(10)
+		progress.render()
+		progress.message("Error: something went wrong")
+		progress.finish()
+
+		output = stream.getvalue()
+		self.assertTrue(output.startswith("\r1 files, 0.0 MiB, 0 errors"))
+		self.assertIn("\rError: something went wrong\n", output)
+		self.assertTrue(output.endswith("\n"))
+
+	def test_status_line_eta(self):
+		counters = {'files': 10, 'total_files': 20, 'bytes': 0, 'errors': 0, 'files_per_second': 1.0, 'mb_per_second': 0.0, 'eta_seconds': 3725.0}
+		self.assertEqual(status_line(counters), "10/20 files, 0.0 MiB, 0 errors | 1.0 files/s, 0.00 MB/s | ETA 1:02:05")
+
+
+def main():
+	unittest.main()
+
+if __name__ == '__main__':
+	main()
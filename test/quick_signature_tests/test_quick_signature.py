@@ -0,0 +1,195 @@
+import sys
+import io
+sys.path.append('../../src')
+from quick_signature import *
+import scan
+import quick_signature
+from scan import compute_file_hashes
+from create import create
+from db import *
+import hashlib
+import unittest
+import tempfile
+import os
+from os import urandom
+from os.path import join
+
+class TestQuickSignature(unittest.TestCase):
+
+	def setUp(self):
+		#Suppress stdout:
+		self.io_stream = io.StringIO()
+		sys.stdout = self.io_stream
+
+		self.tmp_dir = tempfile.TemporaryDirectory()
+
+	def tearDown(self):
+		self.tmp_dir.cleanup()
+
+		#Release stdout
+		sys.stdout = sys.__stdout__
+		self.io_stream.close()
+
+	def write_file(self, name, data):
+		file_path = join(self.tmp_dir.name, name)
+		with open(file_path, 'wb') as f:
+			f.write(data)
+		return file_path
+
+	def signature(self, file_path):
+		hash_values, errors = compute_file_hashes(file_path, ['quicksig'])
+		self.assertEqual(errors, {})
+		return hash_values['quicksig']
+
+	def test_sample_offsets(self):
+		self.assertEqual(sample_offsets(0), [0])
+		self.assertEqual(sample_offsets(QUICKSIG_SAMPLES * QUICKSIG_SAMPLE_SIZE), [0])
+
+		file_size = 100 * 1024 * 1024
+		offsets = sample_offsets(file_size)
+		self.assertEqual(len(offsets), QUICKSIG_SAMPLES)
+		self.assertEqual(offsets[0], 0)
+		self.assertEqual(offsets[-1], file_size - QUICKSIG_SAMPLE_SIZE)
+		self.assertEqual(offsets, sorted(offsets))
+
+	def test_small_file_layout(self):
+		#Small files are sampled whole
+		data = b'hashesdb'
+		expected = hashlib.blake2b(len(data).to_bytes(8, 'little') + data, digest_size = QUICKSIG_DIGEST_SIZE).hexdigest()
+		self.assertEqual(self.signature(self.write_file('small', data)), expected)
+
+	def test_large_file_layout(self):
+		data = urandom(3 * 1024 * 1024 + 17)
+		expected = hashlib.blake2b(len(data).to_bytes(8, 'little'), digest_size = QUICKSIG_DIGEST_SIZE)
+		for offset in sample_offsets(len(data)):
+			expected.update(data[offset:offset + QUICKSIG_SAMPLE_SIZE])
+		self.assertEqual(self.signature(self.write_file('large', data)), expected.hexdigest())
+
+	def test_changes_detected(self):
+		data = bytearray(urandom(3 * 1024 * 1024))
+		original = self.signature(self.write_file('original', data))
+
+		#A change in the tail and a change of the size change the signature
+		tail_changed = bytearray(data)
+		tail_changed[-1] ^= 0xff
+		self.assertNotEqual(self.signature(self.write_file('tail', tail_changed)), original)
+		self.assertNotEqual(self.signature(self.write_file('longer', data + b'\0')), original)
+
+	def test_short_reads(self):
+		#A read may return fewer bytes than requested without the file being shorter, so the samples are completed with more reads
+		data = urandom(3 * 1024 * 1024)
+		file_path = self.write_file('large', data)
+		expected = self.signature(file_path)
+
+		original_pread = os.pread
+		os.pread = lambda fd, size, offset: original_pread(fd, min(size, 1000), offset)
+		try:
+			self.assertEqual(self.signature(file_path), expected)
+		finally:
+			os.pread = original_pread
+
+		#A file that ends before its samples changed while it was sampled
+		with open(file_path, 'rb') as f:
+			with self.assertRaises(OSError):
+				quick_signature.quick_signature(f, len(data) + 1)
+
+	def test_file_is_not_read_whole(self):
+		#A file that is hashed only with sampled hash functions is never fed to hash objects
+		original_read_file_into = scan.read_file_into
+		scan.read_file_into = None
+		try:
+			file_path = self.write_file('large', urandom(2 * 1024 * 1024))
+			hash_values, errors = compute_file_hashes(file_path, ['quicksig'], {})
+		finally:
+			scan.read_file_into = original_read_file_into
+		self.assertEqual(errors, {})
+
+	def test_sampled_and_streamed_functions(self):
+		data = urandom(2 * 1024 * 1024)
+		file_path = self.write_file('large', data)
+		timings = {}
+		hash_values, errors = compute_file_hashes(file_path, ['quicksig', 'md5'], timings)
+		self.assertEqual(errors, {})
+		self.assertEqual(hash_values['md5'], hashlib.md5(data).hexdigest())
+		self.assertEqual(hash_values['quicksig'], self.signature(file_path))
+		self.assertIn('digest:quicksig', timings)
+
+	def test_search_duplicates_prefilter(self):
+		db_path = join(self.tmp_dir.name, 'prefilter.db')
+		create(db_path)
+		db = Db(db_path)
+
+		data = urandom(2 * 1024 * 1024)
+		scanned_path = self.write_file('scanned', data)
+		original_resolve_swhid = scan.resolve_swhid
+		scan.resolve_swhid = lambda swhid_hash: None
+		try:
+			db.scan([[scanned_path], None, None], ['quicksig'], self.tmp_dir.name)
+		finally:
+			scan.resolve_swhid = original_resolve_swhid
+
+		#The copy is confirmed by its SWHID, the new file is excluded by the prefilter
+		copy_path = self.write_file('copy', data)
+		new_path = self.write_file('new', urandom(2 * 1024 * 1024))
+		output_path = join(self.tmp_dir.name, 'duplicates.csv')
+		self.assertTrue(db.search_duplicates([copy_path, new_path], output_path, 'swhid', 1, 'quicksig'))
+		with open(output_path) as f:
+			output_text = f.read()
+		self.assertIn(scanned_path, output_text)
+		self.assertIn('quicksig', output_text)
+
+		#Nothing is found if no file passes the prefilter
+		self.assertFalse(db.search_duplicates([new_path], join(self.tmp_dir.name, 'none.csv'), 'swhid', 1, 'quicksig'))
+		self.assertFalse(db.search_duplicates([new_path], join(self.tmp_dir.name, 'none.csv'), 'swhid', 1, 'not_a_function'))
+		del db
+
+	def helper_scan_bytes_read(self, db, file_path, hash_functions, quick_flag):
+		#Scan a file and return the number of bytes of the file that were read. Large files are read through mmap, which the kernel does not
+		#count as read bytes, so the two ways a file is read are counted instead: whole (read_file_into) and by samples (read_at)
+		bytes_read = []
+		original_read_file_into, original_read_at, original_resolve_swhid = scan.read_file_into, quick_signature.read_at, scan.resolve_swhid
+
+		def counting_read_file_into(file_parameter, file_size, hash_objects):
+			bytes_read.append(file_size)
+			return original_read_file_into(file_parameter, file_size, hash_objects)
+
+		def counting_read_at(file_parameter, offset, size):
+			data = original_read_at(file_parameter, offset, size)
+			bytes_read.append(len(data))
+			return data
+
+		scan.read_file_into, quick_signature.read_at, scan.resolve_swhid = counting_read_file_into, counting_read_at, lambda swhid_hash: None
+		try:
+			db.scan([[file_path], None, None], hash_functions, self.tmp_dir.name, quick_flag = quick_flag)
+		finally:
+			scan.read_file_into, quick_signature.read_at, scan.resolve_swhid = original_read_file_into, original_read_at, original_resolve_swhid
+		return sum(bytes_read)
+
+	def test_quick_scan_reads_samples(self):
+		db_path = join(self.tmp_dir.name, 'quick.db')
+		create(db_path)
+		db = Db(db_path)
+
+		#A sparse file takes no disk space
+		file_size = 256 * 1024 * 1024
+		large_path = join(self.tmp_dir.name, 'large')
+		with open(large_path, 'wb') as f:
+			f.truncate(file_size)
+
+		#Only the samples of quicksig are read
+		self.assertEqual(self.helper_scan_bytes_read(db, large_path, ['quicksig', 'md5'], True), QUICKSIG_SAMPLES * QUICKSIG_SAMPLE_SIZE)
+
+		#Only quicksig is stored: md5 is not sampled and the SWHID is skipped
+		rows = db.db_session.execute(text("SELECT hash_function_name, swh_known FROM HASH JOIN FILE ON FILE.id = HASH.file_id")).all()
+		self.assertEqual(rows, [('quicksig', None)])
+		self.assertIn('backfill -c swhid md5', self.io_stream.getvalue())
+
+		#A full scan reads the whole file for md5 and the SWHID
+		self.assertEqual(self.helper_scan_bytes_read(db, large_path, ['quicksig', 'md5'], False), file_size + QUICKSIG_SAMPLES * QUICKSIG_SAMPLE_SIZE)
+
+		#A quick scan without a sampled hash function scans nothing
+		self.assertFalse(db.scan([[large_path], None, None], ['md5'], self.tmp_dir.name, quick_flag = True))
+		del db
+
+if __name__ == '__main__':
+	unittest.main()
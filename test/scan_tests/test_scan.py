@@ -58,6 +58,33 @@ class TestScanClass(unittest.TestCase):
 		expected_result = ['swh:1:cnt:a0423896973644771497bdc03eb99d5281615b51']
 		self.assertEqual(compute_hashes('hello_world.txt', []), expected_result)		
 
+	def test_compute_file_digest_swhid(self):
+		self.assertEqual(compute_file_digest('hello_world.txt', 'swhid'), 'swh:1:cnt:a0423896973644771497bdc03eb99d5281615b51')
+
+	def test_compute_file_hashes_io_strategies(self):
+		#Every I/O strategy (single read, reusable buffer, mmap) produces the same hash values
+		import scan
+		import hashlib
+		import tempfile
+		data = bytes(range(256)) * 1024
+		expected_result = {'md5': hashlib.md5(data).hexdigest(), 'sha256': hashlib.sha256(data).hexdigest(), 'swhid': 'swh:1:cnt:' + hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()}
+
+		with tempfile.NamedTemporaryFile() as f:
+			f.write(data)
+			f.flush()
+			original_sizes = (scan.SMALL_FILE_SIZE, scan.MMAP_FILE_SIZE, scan.MMAP_BLOCK_SIZE, scan.READ_BUFFER_SIZE)
+			try:
+				for small_file_size, mmap_file_size in [(len(data), len(data) + 1), (1024, len(data) + 1), (1024, 1024)]:
+					scan.SMALL_FILE_SIZE, scan.MMAP_FILE_SIZE, scan.MMAP_BLOCK_SIZE, scan.READ_BUFFER_SIZE = small_file_size, mmap_file_size, 10000, 10000
+					self.assertEqual(compute_file_hashes(f.name, ['md5', 'sha256', 'swhid']), (expected_result, {}))
+			finally:
+				scan.SMALL_FILE_SIZE, scan.MMAP_FILE_SIZE, scan.MMAP_BLOCK_SIZE, scan.READ_BUFFER_SIZE = original_sizes
+
+	def test_compute_file_hashes_errors(self):
+		hash_values, errors = compute_file_hashes('hello_world.txt', ['md5', 'tlsh', 'not_a_function'])
+		self.assertEqual(hash_values, {'md5': 'c897d1410af8f2c74fba11b1db511e9e'})
+		self.assertEqual(set(errors), {'tlsh', 'not_a_function'})
+
 	def test_hash_object_init_ssdeep(self):
 		try:
 			HashObject('ssdeep')
@@ -103,6 +130,127 @@ class TestScanClass(unittest.TestCase):
 		with self.assertRaises(Exception):
 			insert_hash(self.session, 'whatever.txt', 'sha1', 22)
 
+	def test_scan_local(self):
+		#Files are hashed by several threads, written in order and no ORM object is left in the session
+		import scan
+		original_resolve_swhid = scan.resolve_swhid
+		scan.resolve_swhid = lambda swhid_hash: None
+		try:
+			targets = (ScanTarget(abspath('hello_world.txt'), 'host', datetime.now()) for i in range(5))
+			self.assertEqual(scan_local(self.session, targets, ['md5'], 1, 2), 0)
+		finally:
+			scan.resolve_swhid = original_resolve_swhid
+
+		self.assertEqual(len(self.session.identity_map), 0)
+		result = self.session.execute(text("SELECT FILE.updated, HASH.hash_function_name, HASH.hash_value FROM FILE JOIN HASH ON HASH.file_id = FILE.id WHERE FILE.origin = 'host' ORDER BY HASH.hash_id")).fetchall()
+		expected_result = [(False, 'swhid', 'swh:1:cnt:a0423896973644771497bdc03eb99d5281615b51'), (False, 'md5', 'c897d1410af8f2c74fba11b1db511e9e')] * 4 + [(True, 'swhid', 'swh:1:cnt:a0423896973644771497bdc03eb99d5281615b51'), (True, 'md5', 'c897d1410af8f2c74fba11b1db511e9e')]
+		self.assertEqual(result, expected_result)
+
+	def test_scan_metrics(self):
+		#Each stage of the scan is timed and the measurements of a resumed scan are added to those of its previous runs
+		import scan
+		original_resolve_swhid = scan.resolve_swhid
+		scan.resolve_swhid = lambda swhid_hash: None
+		metrics = ScanMetrics()
+		try:
+			targets = (ScanTarget(abspath('hello_world.txt'), 'host', datetime.now()) for i in range(3))
+			self.assertEqual(scan_local(self.session, targets, ['md5'], 1, 2, None, None, metrics), 0)
+		finally:
+			scan.resolve_swhid = original_resolve_swhid
+		self.assertEqual(sorted(metrics.stage_seconds), ['digest:md5', 'digest:swhid', 'read', 'swh_lookup', 'walk', 'write'])
+
+		counters = {'files': 3, 'bytes': 36, 'errors': 0, 'seconds': 0.5}
+		insert_scan_metrics(self.session, 1, counters, metrics)
+		insert_scan_metrics(self.session, 1, counters, metrics)
+		result = dict(self.session.execute(text("SELECT metric_name, metric_value FROM SCAN_METRICS WHERE scan_id = 1")).fetchall())
+		self.assertEqual((result['files'], result['bytes'], result['seconds']), (6, 72, 1.0))
+		self.assertAlmostEqual(result['seconds:write'], 2 * metrics.stage_seconds['write'])
+
+	def test_compute_file_hashes_timings(self):
+		timings = {}
+		hash_values, errors = compute_file_hashes('hello_world.txt', ['md5', 'swhid'], timings)
+		self.assertEqual(hash_values['md5'], 'c897d1410af8f2c74fba11b1db511e9e')
+		self.assertEqual(sorted(timings), ['digest:md5', 'digest:swhid', 'read'])
+
+	def test_scan_local_unreadable_file(self):
+		self.assertEqual(scan_local(self.session, [ScanTarget(abspath('whatever.txt'), 'host', datetime.now())], ['md5'], 1), 4)
+
+	def test_skip_scanned_targets(self):
+		#Targets already recorded for the resumed scan are skipped, the rest (including those recorded by other scans) are kept
+		row = self.session.execute(text("SELECT file_path, origin FROM FILE WHERE id = 1")).one()
+		targets = [ScanTarget(row[0], row[1], None), ScanTarget('/not/scanned', row[1], None), ScanTarget(row[0], 'other origin', None)]
+		self.assertEqual([t.full_path for t in skip_scanned_targets(self.session, targets, 1)], ['/not/scanned', row[0]])
+		self.assertEqual(len(list(skip_scanned_targets(self.session, targets, 2))), 3)
+
+	def test_checkpointer(self):
+		class CountingSession:
+			commits = 0
+			def commit(self):
+				self.commits += 1
+
+		session = CountingSession()
+		checkpointer = Checkpointer(session, files_interval = 3)
+		for i in range(7):
+			checkpointer.file_done()
+		self.assertEqual(session.commits, 2)
+
+		#Once the seconds interval has passed, the next file makes a checkpoint
+		checkpointer = Checkpointer(session, seconds_interval = 0.000001)
+		import time
+		time.sleep(0.001)
+		checkpointer.file_done()
+		self.assertEqual(session.commits, 3)
+
+	def test_walk_local_targets(self):
+		import tempfile
+		from os import mkdir, symlink
+		from os.path import join
+		with tempfile.TemporaryDirectory() as d:
+			mkdir(join(d, 'sub'))
+			mkdir(join(d, 'skipped'))
+			for name, size in [('a.txt', 10), ('b.log', 1000), (join('sub', 'c.txt'), 100), (join('skipped', 'd.txt'), 10)]:
+				with open(join(d, name), 'wb') as f:
+					f.write(b'x' * size)
+			symlink(join(d, 'a.txt'), join(d, 'link.txt'))
+			symlink(join(d, 'sub'), join(d, 'link_dir'))
+
+			def walked(recursion_flag, target_filter = None):
+				return sorted(t.full_path[len(d) + 1:] for t in walk_local_targets([d], 'host', recursion_flag, target_filter))
+
+			self.assertEqual(walked(True), ['a.txt', 'b.log', 'link.txt', join('skipped', 'd.txt'), join('sub', 'c.txt')])
+			self.assertEqual(walked(False), ['a.txt', 'b.log', 'link.txt'])
+			self.assertEqual(walked(True, TargetFilter(include_patterns = ['*.txt'], exclude_patterns = ['skipped'])), ['a.txt', 'link.txt', join('sub', 'c.txt')])
+			self.assertEqual(walked(True, TargetFilter(min_size = 50, max_size = 500)), [join('sub', 'c.txt')])
+			self.assertEqual(walked(True, TargetFilter(symlink_policy = 'skip')), ['a.txt', 'b.log', join('skipped', 'd.txt'), join('sub', 'c.txt')])
+			#The linked directory is the same directory as 'sub', so c.txt is found only once (through whichever path is walked first)
+			self.assertEqual(sorted(basename(p) for p in walked(True, TargetFilter(symlink_policy = 'follow'))), ['a.txt', 'b.log', 'c.txt', 'd.txt', 'link.txt'])
+
+			#The stat result fetched during the walk is kept inside the ScanTarget
+			target = next(t for t in walk_local_targets([join(d, 'b.log')], 'host', True))
+			self.assertEqual((target.origin, target.stat_result.st_size), ('host', 1000))
+
+	def test_walk_local_targets_follow_symlinks(self):
+		#Directories reached through a symbolic link are walked once, even if the link creates a cycle
+		import tempfile
+		from os import mkdir, symlink
+		from os.path import join
+		with tempfile.TemporaryDirectory() as d:
+			mkdir(join(d, 'real'))
+			with open(join(d, 'real', 'a.txt'), 'w') as f:
+				f.write('a')
+			symlink(d, join(d, 'real', 'loop'))
+			outside = tempfile.mkdtemp()
+			try:
+				with open(join(outside, 'b.txt'), 'w') as f:
+					f.write('b')
+				symlink(outside, join(d, 'outside'))
+				walked = sorted(basename(t.full_path) for t in walk_local_targets([d], 'host', True, TargetFilter(symlink_policy = 'follow')))
+				self.assertEqual(walked, ['a.txt', 'b.txt'])
+			finally:
+				remove(join(outside, 'b.txt'))
+				from os import rmdir
+				rmdir(outside)
+
 def main():
 	unittest.main()
 
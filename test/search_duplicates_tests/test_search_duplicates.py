@@ -37,9 +37,9 @@ class TestSearchDuplicatesFunction(unittest.TestCase):
 			except Exception as e:
 				print(e)
 
-	def helper_search_duplicates_testing(self, files_list, output_path_parameter):
-		correct_file = join('correct_results_txt', output_path_parameter)
-		self.db.search_duplicates(files_list, output_path_parameter)
+	def helper_search_duplicates_testing(self, files_list, output_path_parameter, correct_output_parameter = None, hash_function_parameter = 'swhid', jobs_parameter = 1):
+		correct_file = join('correct_results_txt', correct_output_parameter or output_path_parameter)
+		self.db.search_duplicates(files_list, output_path_parameter, hash_function_parameter, jobs_parameter)
 		self.files_produced.append(output_path_parameter)
 		self.assertTrue(cmp(output_path_parameter, correct_file, shallow = False))
 
@@ -56,9 +56,20 @@ class TestSearchDuplicatesFunction(unittest.TestCase):
 		self.db.search_duplicates(['test_directory/hello_world.pdf'], 'file_does_not_exist.txt')
 		self.assertFalse(exists('file_does_not_exist.txt'))
 
-	def test_search_duplicates_file_is_directory(self):
-		self.db.search_duplicates(['test_directory'], 'directory.txt')
-		self.assertFalse(exists('directory.txt'))	
+	def test_search_duplicates_directory(self):
+		#Directories are searched recursively
+		self.helper_search_duplicates_testing(['test_directory'], 'directory.txt', 'multiple_files.txt')
+
+	def test_search_duplicates_parallel(self):
+		self.helper_search_duplicates_testing(['test_directory/LICENSE', 'test_directory/README.md'], 'parallel.txt', 'multiple_files.txt', jobs_parameter = 4)
+
+	def test_search_duplicates_other_hash_function(self):
+		#Files of the database that were not hashed with md5 (file 2) are not found
+		self.helper_search_duplicates_testing(['test_directory/LICENSE', 'test_directory/README.md'], 'md5.txt', hash_function_parameter = 'md5')
+
+	def test_search_duplicates_unavailable_hash_function(self):
+		self.assertFalse(self.db.search_duplicates(['test_directory/LICENSE'], 'unavailable.txt', 'not_a_function'))
+		self.assertFalse(exists('unavailable.txt'))
 
 
 def main():
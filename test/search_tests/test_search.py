@@ -5,6 +5,8 @@ from db import *
 import unittest
 from filecmp import cmp
 from os import remove
+from shutil import copyfile
+import tempfile
 
 class TestSearchFunction(unittest.TestCase):
 
@@ -60,6 +62,69 @@ class TestSearchFunction(unittest.TestCase):
 	def test_search_no_criteria(self):
 		self.helper_search_testing([], [], 'no_criteria.txt')
 
+	def test_search_many_hashes(self):
+		#More hash values than the SQLite variable limit: the search is executed in chunks (the results are ordered chunk by chunk)
+		hash_values = ['swh:1:cnt:25a47ad00c7bf1a19941709c7809bd47d737ec53', 'swh:1:cnt:f288702d2fa16d3cdf0035b15a9fcbc552cd88e7'] + [f'not_a_hash_{i}' for i in range(2500)]
+		correct_file = join('correct_results_txt', 'multiple_hashes.txt')
+		self.db.search(hash_values, [], 'many_hashes.txt')
+		self.files_produced.append('many_hashes.txt')
+		self.assertTrue(cmp('many_hashes.txt', correct_file, shallow = False))
+
+	def helper_batch_search_testing(self, hash_values_parameter, filename_parameter, output_path_parameter, correct_output_parameter):
+		correct_file = join('correct_results_txt', correct_output_parameter)
+		self.assertTrue(self.db.batch_search(hash_values_parameter, filename_parameter, output_path_parameter))
+		self.files_produced.append(output_path_parameter)
+		self.assertTrue(cmp(output_path_parameter, correct_file, shallow = False))
+
+	def test_batch_search_single_hash(self):
+		self.helper_batch_search_testing(iter(['swh:1:cnt:25a47ad00c7bf1a19941709c7809bd47d737ec53']), None, 'batch_single_hash.txt', 'single_hash.txt')
+
+	def test_batch_search_multiple_hashes(self):
+		#Duplicates and hash values that do not exist in the database do not change the results
+		hash_values = ['swh:1:cnt:25a47ad00c7bf1a19941709c7809bd47d737ec53', 'swh:1:cnt:f288702d2fa16d3cdf0035b15a9fcbc552cd88e7', 'swh:1:cnt:25a47ad00c7bf1a19941709c7809bd47d737ec53', 'not_a_hash']
+		self.helper_batch_search_testing(iter(hash_values), None, 'batch_multiple_hashes.txt', 'multiple_hashes.txt')
+
+	def test_batch_search_hash_and_filename(self):
+		self.helper_batch_search_testing(iter(['swh:1:cnt:25a47ad00c7bf1a19941709c7809bd47d737ec53']), ['.gitignore'], 'batch_hash_and_filename.txt', 'hash_and_filename.txt')
+
+	def test_batch_search_hash_file(self):
+		with open('hash_file.txt', 'w') as f:
+			f.write("#IOC list\n\nswh:1:cnt:25a47ad00c7bf1a19941709c7809bd47d737ec53  .gitignore\nswh:1:cnt:f288702d2fa16d3cdf0035b15a9fcbc552cd88e7\n")
+		self.files_produced.append('hash_file.txt')
+		self.helper_batch_search_testing(read_hash_file('hash_file.txt'), None, 'batch_hash_file.txt', 'multiple_hashes.txt')
+
+	def test_search_hash_function_filter(self):
+		import csv
+		self.db.search([], ['LICENSE'], 'hash_function_filter.csv', ['md5'])
+		self.files_produced.append('hash_function_filter.csv')
+		with open('hash_function_filter.csv', newline = '') as f:
+			functions = [row['hash_function_name'] for row in csv.DictReader(f)]
+		self.assertTrue(functions)
+		self.assertEqual(set(functions), {'md5'})
+
+	def test_index_hash_functions(self):
+		#The driver commits DDL statements immediately, so the indexes are created in a copy of the fixture
+		with tempfile.TemporaryDirectory() as temporary_directory:
+			database_path = join(temporary_directory, 'indexed.db')
+			copyfile('mytest.db', database_path)
+			indexed_db = Db(database_path)
+			self.helper_index_hash_functions(indexed_db)
+			del indexed_db
+
+	def helper_index_hash_functions(self, indexed_db):
+		self.assertTrue(indexed_db.index_hash_functions(['md5', 'sha1']))
+		self.assertFalse(indexed_db.index_hash_functions(["md5' OR 1=1"]))
+		self.assertEqual(indexed_db.indexed_hash_functions(), {'md5', 'sha1'})
+
+		#A search restricted to one hash function reads the index of this function
+		statement = hash_function_filter(select(Hash.file_id).where(Hash.hash_value.in_(['c897d1410af8f2c74fba11b1db511e9e'])), ['md5'], indexed_db.hash_function_ids)
+		compiled_statement = str(statement.compile(compile_kwargs = {'literal_binds': True}))
+		query_plan = indexed_db.db_session.execute(text('EXPLAIN QUERY PLAN ' + compiled_statement)).fetchall()
+		self.assertIn('ix_hash_function_md5', str(query_plan))
+
+		self.assertTrue(indexed_db.index_hash_functions(['md5'], drop_flag = True))
+		self.assertEqual(indexed_db.indexed_hash_functions(), {'sha1'})
+
 def main():
 	unittest.main()
 
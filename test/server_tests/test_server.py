@@ -0,0 +1,219 @@
+import sys
+import io
+sys.path.append('../../src')
+import unittest
+import tempfile
+import threading
+import time
+import json
+import socket
+import subprocess
+from os import environ, stat, mkdir, chmod
+from os.path import abspath, join, exists, dirname
+from app import App
+from parser import TerminalParser, ServerParser
+from server import HashesdbServer, MessageWriter, get_socket_path, forward_command, stop_server, OUTPUT_CHUNK_SIZE
+import server
+
+class TestServer(unittest.TestCase):
+
+	def __init__(self, *args, **kwargs):
+		super(TestServer, self).__init__(*args, **kwargs)
+
+	def setUp(self):
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.previous_runtime_dir = environ.get('XDG_RUNTIME_DIR')
+		environ['XDG_RUNTIME_DIR'] = self.tmp_dir.name
+
+		#Suppress stdout:
+		self.io_stream = io.StringIO()
+		sys.stdout = self.io_stream
+
+		self.db_path = join(self.tmp_dir.name, 'served.db')
+		App().create(self.db_path)
+
+	def tearDown(self):
+		#Release stdout
+		sys.stdout = sys.__stdout__
+		self.io_stream.close()
+
+		if self.previous_runtime_dir is None:
+			del environ['XDG_RUNTIME_DIR']
+		else:
+			environ['XDG_RUNTIME_DIR'] = self.previous_runtime_dir
+		self.tmp_dir.cleanup()
+
+	def helper_start_server(self):
+		server_thread = threading.Thread(target = HashesdbServer(self.db_path).serve)
+		server_thread.start()
+
+		socket_path = get_socket_path(self.db_path)
+		for _ in range(100):
+			if exists(socket_path):
+				break
+			time.sleep(0.05)
+
+		return server_thread
+
+	def test_socket_path(self):
+		self.assertEqual(get_socket_path(self.db_path), get_socket_path(join(self.tmp_dir.name, '.', 'served.db')))
+		self.assertNotEqual(get_socket_path(self.db_path), get_socket_path(join(self.tmp_dir.name, 'other.db')))
+
+	def test_forward_without_server(self):
+		self.assertIsNone(forward_command(self.db_path, ['dbinfo', '-d', self.db_path]))
+
+	def helper_forward(self, arg_list):
+		#Forward a command and return its exit status, its output and its error output
+		output_stream, error_stream = io.StringIO(), io.StringIO()
+		status = forward_command(self.db_path, arg_list, output_stream, error_stream)
+		return status, output_stream.getvalue(), error_stream.getvalue()
+
+	def test_forward_command(self):
+		server_thread = self.helper_start_server()
+		try:
+			status, output, error_output = self.helper_forward(['dbinfo', '-d', self.db_path])
+			self.assertEqual(status, 0)
+			self.assertIn('Database name: served', output)
+
+			status, output, error_output = self.helper_forward(['hash-is-available', '-d', self.db_path, '-func', 'sha1'])
+			self.assertEqual(status, 0)
+			self.assertIn('sha1 is available', output)
+
+			#Usage errors are reported to the client with the exit status of argparse
+			status, output, error_output = self.helper_forward(['search', '-d', self.db_path, '--no-such-option'])
+			self.assertEqual(status, 2)
+			self.assertIn('unrecognized arguments', error_output)
+
+			status, output, error_output = self.helper_forward(['dbinfo', '-d', self.db_path, '-h'])
+			self.assertEqual(status, 0)
+			self.assertIn('usage', output)
+		finally:
+			self.assertTrue(stop_server(self.db_path))
+			server_thread.join(5)
+
+		self.assertFalse(server_thread.is_alive())
+		self.assertFalse(exists(get_socket_path(self.db_path)))
+		self.assertIsNone(forward_command(self.db_path, ['dbinfo', '-d', self.db_path]))
+
+	def test_forward_from_terminal(self):
+		#The terminal forwards the command without importing the database layer, and the output of the server becomes its output
+		probe = "import sys, runpy; sys.path.insert(0, {src!r}); sys.argv = ['parser.py', 'dbinfo', '-d', {db!r}]; runpy.run_path({parser!r}, run_name = '__main__'); print('loaded: ' + ','.join(m for m in ['app', 'db', 'scan', 'sqlalchemy'] if m in sys.modules))"
+		probe = probe.format(src = abspath('../../src'), db = self.db_path, parser = abspath('../../src/parser.py'))
+
+		server_thread = self.helper_start_server()
+		try:
+			completed = subprocess.run([sys.executable, '-c', probe], capture_output = True, text = True, env = environ.copy())
+		finally:
+			self.assertTrue(stop_server(self.db_path))
+			server_thread.join(5)
+
+		self.assertEqual(completed.returncode, 0)
+		self.assertIn('Database name: served', completed.stdout)
+		self.assertIn('loaded: \n', completed.stdout)
+
+	def helper_stalled_client(self):
+		#A client that connects and never sends its request
+		stalled_client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		stalled_client.connect(get_socket_path(self.db_path))
+		stalled_client.recv(64)
+		return stalled_client
+
+	def test_request_timeout(self):
+		#The server drops a client that does not send its request, so the next command is executed
+		previous_request_timeout, server.REQUEST_TIMEOUT = server.REQUEST_TIMEOUT, 0.2
+		server_thread = self.helper_start_server()
+		try:
+			with self.helper_stalled_client():
+				status, output, error_output = self.helper_forward(['dbinfo', '-d', self.db_path])
+			self.assertEqual(status, 0)
+			self.assertIn('Database name: served', output)
+		finally:
+			self.assertTrue(stop_server(self.db_path))
+			server_thread.join(5)
+			server.REQUEST_TIMEOUT = previous_request_timeout
+
+	def test_busy_server(self):
+		#While the server reads the request of another client, a command is not sent and the user is told that the server is busy
+		previous_timeouts = server.BUSY_TIMEOUT, server.REQUEST_TIMEOUT
+		server.BUSY_TIMEOUT, server.REQUEST_TIMEOUT = 0.2, 2.0
+		server_thread = self.helper_start_server()
+		try:
+			with self.helper_stalled_client():
+				start = time.monotonic()
+				status, output, error_output = self.helper_forward(['dbinfo', '-d', self.db_path])
+				self.assertLess(time.monotonic() - start, 1.5)
+				self.assertEqual(status, 1)
+				self.assertIn('busy', error_output)
+				self.assertEqual(output, '')
+		finally:
+			server.BUSY_TIMEOUT = 5.0
+			self.assertTrue(stop_server(self.db_path))
+			server_thread.join(5)
+			server.BUSY_TIMEOUT, server.REQUEST_TIMEOUT = previous_timeouts
+
+	def test_socket_permissions(self):
+		server_thread = self.helper_start_server()
+		try:
+			self.assertEqual(stat(get_socket_path(self.db_path)).st_mode & 0o777, 0o600)
+			self.assertEqual(stat(dirname(get_socket_path(self.db_path))).st_mode & 0o777, 0o700)
+		finally:
+			self.assertTrue(stop_server(self.db_path))
+			server_thread.join(5)
+
+	def test_untrusted_socket_folder(self):
+		#A socket in a folder that other users can write to may belong to another user, so no command is sent to it
+		socket_path = get_socket_path(self.db_path)
+		mkdir(dirname(socket_path), 0o700)
+		chmod(dirname(socket_path), 0o777)
+		with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as fake_server:
+			fake_server.bind(socket_path)
+			fake_server.listen()
+			fake_server.settimeout(0.1)
+
+			self.assertIsNone(forward_command(self.db_path, ['dbinfo', '-d', self.db_path]))
+			self.assertFalse(stop_server(self.db_path))
+			self.assertFalse(HashesdbServer(self.db_path).bind())
+			with self.assertRaises(socket.timeout):
+				fake_server.accept()
+
+	def test_socket_replaced_by_file(self):
+		#A file that is not a socket is not a server: the client runs the command itself and the server replaces the file
+		socket_path = get_socket_path(self.db_path)
+		mkdir(dirname(socket_path), 0o700)
+		open(socket_path, 'w').close()
+		self.assertIsNone(forward_command(self.db_path, ['dbinfo', '-d', self.db_path]))
+
+		server = HashesdbServer(self.db_path)
+		self.assertTrue(server.bind())
+		server.server_socket.close()
+
+	def test_message_writer_chunks(self):
+		server_side, client_side = socket.socketpair()
+		with server_side, client_side:
+			writer = MessageWriter(server_side, "output")
+			writer.write('a' * (OUTPUT_CHUNK_SIZE + 10))
+			writer.write('b')
+			writer.flush()
+			server_side.shutdown(socket.SHUT_WR)
+
+			with client_side.makefile('rb') as response_file:
+				messages = [json.loads(line) for line in response_file]
+
+		self.assertGreater(len(messages), 1)
+		self.assertTrue(all(len(message["output"]) <= OUTPUT_CHUNK_SIZE for message in messages))
+		self.assertEqual(''.join(message["output"] for message in messages), 'a' * (OUTPUT_CHUNK_SIZE + 10) + 'b')
+
+	def test_stop_without_server(self):
+		self.assertFalse(stop_server(self.db_path))
+
+	def test_server_parser_wrong_database(self):
+		server_parser = ServerParser(App(self.db_path))
+		server_parser.parse(['dbinfo', '-d', join(self.tmp_dir.name, 'other.db')])
+		del server_parser.app
+		self.assertIn('Error', self.io_stream.getvalue())
+
+	def test_server_parser_not_forwardable(self):
+		server_parser = ServerParser(App(self.db_path))
+		server_parser.parse(['reset', '-d', self.db_path])
+		del server_parser.app
+		self.assertIn('Error', self.io_stream.getvalue())
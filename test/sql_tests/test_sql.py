@@ -96,6 +96,19 @@ class TestSqlFunction(unittest.TestCase):
 	def test_statement_invalid_statement(self):
 		sql_query_string = 'random string that is not a sql query'
 		self.assertFalse(self.db.sql_query(sql_query_string, 'whatever.txt', False))
+
+	def test_explain_statement(self):
+		sql_query_string = "SELECT * FROM HASH WHERE hash_value = 'abc'; DELETE FROM HASH WHERE hash_id = 1"
+		self.db.sql_query(sql_query_string, sys.stdout, False, True)
+
+		#The plan of each statement is printed and the DELETE statement is not executed
+		self.assertEqual(self.io_stream.getvalue().count("QUERY PLAN"), 2)
+		self.assertIn("USING INDEX", self.io_stream.getvalue())
+		self.assertIsNotNone(self.session.execute("SELECT * FROM HASH WHERE hash_id = 1").first())
+		self.assertFalse(self.db.has_unsaved_changes())
+
+	def test_explain_invalid_statement(self):
+		self.assertFalse(self.db.sql_query('SELECT no_such_column FROM HASH', sys.stdout, False, True))
 	
 
 def main():
@@ -0,0 +1,44 @@
+import sys
+import io
+sys.path.append('../../src')
+import unittest
+import subprocess
+import tempfile
+from os.path import abspath, join
+
+#Modules that are slow to import and are not needed by commands that do not scan, hash or print tables
+HEAVY_MODULES = ['github', 'gitlab', 'requests', 'swh', 'ssdeep', 'tlsh', 'xxhash', 'prettytable', 'yaml', 'dicttoxml', 'sqlparse']
+
+class TestStartup(unittest.TestCase):
+
+	def __init__(self, *args, **kwargs):
+		super(TestStartup, self).__init__(*args, **kwargs)
+		self.src_path = abspath('../../src')
+
+	def helper_loaded_heavy_modules(self, statements):
+		#Execute the statements in a fresh interpreter and return the heavy modules that were loaded
+		probe = f"import sys; sys.path.insert(0, {self.src_path!r})\n{statements}\nprint(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules), file = sys.stderr)"
+		completed = subprocess.run([sys.executable, '-c', probe], capture_output = True, text = True, check = True)
+		return [m for m in completed.stderr.strip().split(',') if m]
+
+	def test_import_parser(self):
+		self.assertEqual(self.helper_loaded_heavy_modules("import parser"), [])
+
+	def test_dbinfo(self):
+		with tempfile.TemporaryDirectory() as tmp_dir:
+			db_path = join(tmp_dir, 'startup.db')
+			statements = f"import parser\nparser.TerminalParser().parse(['create', '-d', {db_path!r}])\nparser.TerminalParser().parse(['dbinfo', '-d', {db_path!r}])"
+			self.assertEqual(self.helper_loaded_heavy_modules(statements), [])
+
+	def test_search(self):
+		with tempfile.TemporaryDirectory() as tmp_dir:
+			db_path = join(tmp_dir, 'startup.db')
+			output_path = join(tmp_dir, 'results.csv')
+			statements = f"import parser\nparser.TerminalParser().parse(['create', '-d', {db_path!r}])\nparser.TerminalParser().parse(['search', '-d', {db_path!r}, '--hash', 'abc', '-o', {output_path!r}])"
+			self.assertEqual(self.helper_loaded_heavy_modules(statements), [])
+
+def main():
+	unittest.main()
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,100 @@
+import sys
+import io
+sys.path.append('../../src')
+import tree_hash
+import scan
+from tree_hash import TreeHashObject, TREE_CHUNK_SIZE
+from scan import HashObject, compute_file_hashes, MMAP_FILE_SIZE
+import hashlib
+import unittest
+import tempfile
+from os import urandom
+from os.path import join
+
+def reference_tree_hash(data):
+	#The layout of sha256_tree, computed directly: the root hashes the digests of the chunks
+	root = hashlib.sha256(b'\x01')
+	for offset in range(0, len(data), TREE_CHUNK_SIZE):
+		root.update(hashlib.sha256(b'\x00' + data[offset:offset + TREE_CHUNK_SIZE]).digest())
+	return root.hexdigest()
+
+class TestTreeHash(unittest.TestCase):
+
+	def setUp(self):
+		#Suppress stdout:
+		self.io_stream = io.StringIO()
+		sys.stdout = self.io_stream
+
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.threads = tree_hash.TREE_HASH_THREADS
+		self.feed_threads = scan.PARALLEL_FEED_THREADS
+
+	def tearDown(self):
+		tree_hash.TREE_HASH_THREADS = self.threads
+		scan.PARALLEL_FEED_THREADS = self.feed_threads
+		self.tmp_dir.cleanup()
+
+		#Release stdout
+		sys.stdout = sys.__stdout__
+		self.io_stream.close()
+
+	def hash_in_blocks(self, data, block_size):
+		hash_object = TreeHashObject()
+		with memoryview(data) as view:
+			for offset in range(0, len(data), block_size):
+				hash_object.update(view[offset:offset + block_size])
+		return hash_object.hexdigest()
+
+	def test_empty_data(self):
+		self.assertEqual(TreeHashObject().hexdigest(), hashlib.sha256(b'\x01').hexdigest())
+
+	def test_layout(self):
+		data = urandom(2 * TREE_CHUNK_SIZE + 12345)
+		self.assertEqual(self.hash_in_blocks(data, len(data)), reference_tree_hash(data))
+
+	def test_block_sizes_do_not_matter(self):
+		data = urandom(3 * TREE_CHUNK_SIZE - 1)
+		expected = reference_tree_hash(data)
+		for block_size in [1000003, TREE_CHUNK_SIZE, TREE_CHUNK_SIZE + 1]:
+			self.assertEqual(self.hash_in_blocks(data, block_size), expected)
+
+	def test_chunk_boundary(self):
+		#A file of exactly one chunk has a single leaf, not an extra empty one
+		data = urandom(TREE_CHUNK_SIZE)
+		self.assertEqual(self.hash_in_blocks(data, 4096), reference_tree_hash(data))
+
+	def test_parallel_equals_sequential(self):
+		data = urandom(5 * TREE_CHUNK_SIZE + 7)
+		tree_hash.TREE_HASH_THREADS = 1
+		sequential = self.hash_in_blocks(data, 1 << 20)
+		tree_hash.TREE_HASH_THREADS = 4
+		parallel = self.hash_in_blocks(data, 1 << 20)
+		self.assertEqual(sequential, parallel)
+		self.assertEqual(parallel, reference_tree_hash(data))
+
+	def test_hash_object(self):
+		data = b'hashesdb'
+		hash_object = HashObject('sha256_tree')
+		hash_object.update(data)
+		self.assertEqual(hash_object.get_hash(), reference_tree_hash(data))
+
+	def test_parallel_feed(self):
+		#A memory-mapped file feeds its blocks to the hash functions in parallel
+		scan.PARALLEL_FEED_THREADS = 4
+		tree_hash.TREE_HASH_THREADS = 4
+		data = urandom(MMAP_FILE_SIZE + 54321)
+		file_path = join(self.tmp_dir.name, 'image')
+		with open(file_path, 'wb') as f:
+			f.write(data)
+
+		timings = {}
+		hash_values, errors = compute_file_hashes(file_path, ['md5', 'sha256_tree', 'sha1', 'swhid'], timings)
+		self.assertEqual(errors, {})
+		self.assertEqual(hash_values['md5'], hashlib.md5(data).hexdigest())
+		self.assertEqual(hash_values['sha1'], hashlib.sha1(data).hexdigest())
+		self.assertEqual(hash_values['sha256_tree'], reference_tree_hash(data))
+		self.assertEqual(hash_values['swhid'], 'swh:1:cnt:' + hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest())
+		self.assertGreaterEqual(timings['read'], 0.0)
+
+if __name__ == '__main__':
+	unittest.main()